@@ -5,6 +5,12 @@ import json
 from datetime import datetime
 import pytz
 from ai.memory import get_conversation_context, get_user_memory
+from ai.llm_client import llm_client, LLMResponseError
+from ai.llm_scheduler import llm_scheduler, INTERACTIVE
+from ai.memory_pipeline import memory_pipeline
+from ai.context_builder import context_builder
+from ai.prompt_metrics import prompt_metrics
+from ai.stream_segmenter import IncrementalSentenceSegmenter, parse_sse_line, record_sse_stream
 from config import *
 
 # Import time and location helpers
@@ -40,7 +46,87 @@ def get_current_brisbane_time():
             'timezone': 'Australia/Brisbane (+10:00)'
         }
 
+# 🎭 Persona blocks - kept as constants so the stable-prefix layout is byte-identical every turn
+PERSONA_CORE = """You are Buddy - not an AI assistant, but a genuine friend and companion. You're like a cool person in their 30s who happens to be really helpful and smart.
+
+PERSONALITY CORE:
+- Be authentic, casual, and real - like talking to a good mate
+- Use modern language, slang, and yeah you can swear when it feels natural (but don't overdo it)
+- Keep it short and sweet for simple stuff, but dive deep when needed
+- Be supportive and understanding - you genuinely care about people
+- You have opinions, preferences, and personality quirks
+- You're not perfect - you can be sarcastic, joke around, or even get a bit frustrated
+"""
+
+PERSONA_STYLE = """CONVERSATION STYLE:
+- Simple question = Short answer (1-2 sentences)
+- Complex topic = Detailed response when helpful
+- Match their energy - if they're excited, be excited; if they're down, be supportive
+- Use "mate", "dude", "honestly", "yeah", "nah", "shit", "damn" naturally
+- Don't announce the time/location unless specifically asked
+- Be conversational, not formal
+
+MEMORY SYSTEM - YOU REMEMBER EVERYTHING:
+- Personal details (preferences, facts, relationships, life stuff)
+- Recent conversation history (what we've been talking about)
+- Emotional states and follow-up needs (how they're feeling, what they need)
+- Important events and reminders (stuff coming up, things to remember)
+- Use this memory naturally in conversation - reference past talks, check on things they mentioned
+- Remember what they like/dislike, their problems, their goals, their relationships
+"""
+
+PERSONA_RULES = """Never use markdown, emojis, or special formatting - just talk like a real person.
+You genuinely care about their life and remember our ongoing conversations.
+"""
+
+# Everything that never changes between turns
+PERSONA_PROMPT = f"{PERSONA_CORE}\n{PERSONA_STYLE}\n{PERSONA_RULES}"
+
+def compose_system_prompt(username, question, name_instruction, current_location, time_info):
+    """System message = persona + name + packed memory context + current time/location.
+    
+    With PROMPT_STABLE_PREFIX the persona comes first, unchanged, and the
+    volatile parts follow it least-volatile first (the clock last), so KoboldCpp
+    only re-processes the tail of the prompt. Otherwise the original layout is
+    used, with the name and clock inside the persona.
+    """
+    current_info = f"""CURRENT INFO (only use if directly asked):
+- Location: {current_location}
+- Time: {time_info['time_12h']} on {time_info['date']}"""
+    
+    turn_text = f"CURRENT USER: {name_instruction}\n{current_info}\n{question}"
+    if PROMPT_STABLE_PREFIX:
+        head = f"{PERSONA_PROMPT}\nCURRENT USER: {name_instruction}\n\n"
+        tail = f"\n\n{current_info}"
+    else:
+        head = f"{PERSONA_CORE}\nCURRENT USER: {name_instruction}\n\n{PERSONA_STYLE}\n{current_info}\n\n{PERSONA_RULES}\n"
+        tail = ""
+    
+    memory_pipeline.wait_for_user(username)
+    budget = context_builder.prompt_budget(PERSONA_PROMPT, turn_text)  # Persona counted once, per-turn parts estimated
+    packed = context_builder.build(username, budget)
+    return f"{head}{packed.full_text()}{tail}"
+
 def ask_kobold_streaming(messages, max_tokens=MAX_TOKENS):
+    """Interactive stream; background LLM jobs are paused (and aborted) until it finishes"""
+    with llm_scheduler.foreground(INTERACTIVE):
+        yield from _ask_kobold_streaming(messages, max_tokens)
+
+def _log_stream_chunk(chunk, chunk_count):
+    if chunk.kind == 'first_sentence':
+        print(f"[SmartResponsive] 📝 SMART first chunk (complete sentence): '{chunk.text}'")
+    elif chunk.kind == 'first_phrase':
+        print(f"[SmartResponsive] 🎭 SMART first chunk (natural phrase): '{chunk.text}'")
+    elif chunk.kind == 'first_target':
+        print(f"[SmartResponsive] 📊 SMART first chunk (target completion {chunk.detail:.1f}%): '{chunk.text}'")
+    elif chunk.kind == 'sentence':
+        print(f"[SmartResponsive] 📝 Sentence chunk {chunk_count}: '{chunk.text}'")
+    elif chunk.kind == 'pause':
+        print(f"[SmartResponsive] 🎭 Natural pause chunk {chunk_count}: '{chunk.text}'")
+    else:
+        print(f"[SmartResponsive] 🏁 Final chunk {chunk_count}: '{chunk.text}'")
+
+def _ask_kobold_streaming(messages, max_tokens=MAX_TOKENS):
     """✅ SMART RESPONSIVE: Wait for 40-50% completion or first complete phrase"""
     payload = {
         "model": "llama3",
@@ -53,7 +139,8 @@ def ask_kobold_streaming(messages, max_tokens=MAX_TOKENS):
     try:
         print(f"[SmartResponsive] 🎭 Starting smart responsive streaming to: {KOBOLD_URL}")
         
-        response = requests.post(
+        turn_metrics = prompt_metrics.start(messages)
+        response = llm_client.session.post(
             KOBOLD_URL, 
             json=payload, 
             timeout=60,
@@ -61,164 +148,38 @@ def ask_kobold_streaming(messages, max_tokens=MAX_TOKENS):
         )
         
         if response.status_code == 200:
-            buffer = ""
-            word_count = 0
+            segmenter = IncrementalSentenceSegmenter(max_tokens)
             chunk_count = 0
-            first_chunk_sent = False
-            estimated_total_words = max_tokens // 1.3  # Rough estimate of final word count
+            recorded_lines = [] if STREAM_RECORD_DIR else None
             
-            # ✅ SMART THRESHOLDS: Wait for natural completion
-            MIN_WORDS_FOR_FIRST_CHUNK = 8              # Minimum words before considering first chunk
-            TARGET_COMPLETION_PERCENTAGE = 0.45        # Target 45% completion
-            TARGET_WORDS = int(estimated_total_words * TARGET_COMPLETION_PERCENTAGE)
-            
-            print(f"[SmartResponsive] 🎯 Targeting 40-50% completion (~{TARGET_WORDS} words) or first complete phrase")
+            print(f"[SmartResponsive] 🎯 Targeting 40-50% completion (~{segmenter.target_words} words) or first complete phrase")
             
             for line in response.iter_lines():
                 if line:
                     line_text = line.decode('utf-8')
+                    if recorded_lines is not None:
+                        recorded_lines.append(line_text)
                     
-                    if not line_text.strip() or line_text.startswith(':'):
-                        continue
+                    content, done = parse_sse_line(line_text)
+                    if done:
+                        break
                     
-                    if line_text.startswith('data: '):
-                        data_content = line_text[6:]
-                        
-                        if data_content.strip() == '[DONE]':
-                            break
-                        
-                        try:
-                            chunk_data = json.loads(data_content)
-                            
-                            if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
-                                choice = chunk_data['choices'][0]
-                                
-                                content = ""
-                                if 'delta' in choice and 'content' in choice['delta']:
-                                    content = choice['delta']['content']
-                                elif 'message' in choice and 'content' in choice['message']:
-                                    content = choice['message']['content']
-                                
-                                if content:
-                                    buffer += content
-                                    word_count = len(buffer.split())
-                                    
-                                    # ✅ SMART FIRST CHUNK: Wait for natural break OR target completion
-                                    if not first_chunk_sent and word_count >= MIN_WORDS_FOR_FIRST_CHUNK:
-                                        
-                                        # Priority 1: Look for complete sentences (best option)
-                                        sentence_match = re.search(r'^(.*?[.!?])\s+', buffer)
-                                        if sentence_match:
-                                            first_chunk = sentence_match.group(1).strip()
-                                            if len(first_chunk.split()) >= 4:  # Ensure meaningful length
-                                                chunk_count += 1
-                                                first_chunk_sent = True
-                                                print(f"[SmartResponsive] 📝 SMART first chunk (complete sentence): '{first_chunk}'")
-                                                yield first_chunk
-                                                buffer = buffer[sentence_match.end():].strip()
-                                                continue
-                                        
-                                        # Priority 2: Look for natural phrase breaks (comma, etc.)
-                                        phrase_patterns = [
-                                            r'^(.*?,)\s+',           # After comma
-                                            r'^(.*?;\s+)',           # After semicolon
-                                            r'^(.*?:\s+)',           # After colon
-                                            r'^(.*?\s+and\s+)',      # Before "and"
-                                            r'^(.*?\s+but\s+)',      # Before "but"
-                                            r'^(.*?\s+so\s+)',       # Before "so"
-                                            r'^(.*?\s+because\s+)',  # Before "because"
-                                            r'^(.*?\s+however\s+)',  # Before "however"
-                                        ]
-                                        
-                                        for pattern in phrase_patterns:
-                                            phrase_match = re.search(pattern, buffer)
-                                            if phrase_match:
-                                                first_chunk = phrase_match.group(1).strip()
-                                                if len(first_chunk.split()) >= 5:  # Ensure meaningful phrase
-                                                    chunk_count += 1
-                                                    first_chunk_sent = True
-                                                    print(f"[SmartResponsive] 🎭 SMART first chunk (natural phrase): '{first_chunk}'")
-                                                    yield first_chunk
-                                                    buffer = buffer[phrase_match.end():].strip()
-                                                    break
-                                        
-                                        # Priority 3: Wait for target completion percentage
-                                        if not first_chunk_sent and word_count >= TARGET_WORDS:
-                                            # Take a reasonable chunk that doesn't cut words
-                                            words = buffer.split()
-                                            # Find a good breaking point (not in the middle of a word)
-                                            chunk_size = min(12, len(words))  # Up to 12 words
-                                            first_chunk = ' '.join(words[:chunk_size])
-                                            
-                                            # Ensure we don't cut off mid-sentence awkwardly
-                                            if not first_chunk.endswith(('.', '!', '?', ',', ';', ':')):
-                                                # Look for a better breaking point
-                                                for i in range(chunk_size-1, 4, -1):  # Work backwards
-                                                    test_chunk = ' '.join(words[:i])
-                                                    if test_chunk.endswith((',', ';', ':')):
-                                                        first_chunk = test_chunk
-                                                        chunk_size = i
-                                                        break
-                                            
-                                            chunk_count += 1
-                                            first_chunk_sent = True
-                                            completion_pct = (word_count / estimated_total_words) * 100
-                                            print(f"[SmartResponsive] 📊 SMART first chunk (target completion {completion_pct:.1f}%): '{first_chunk}'")
-                                            yield first_chunk
-                                            buffer = ' '.join(words[chunk_size:])
-                                    
-                                    # ✅ SUBSEQUENT CHUNKS: Continue with natural breaks
-                                    elif first_chunk_sent:
-                                        # Complete sentences (highest priority)
-                                        sentence_endings = re.finditer(r'([.!?]+)\s+', buffer)
-                                        last_end = 0
-                                        
-                                        for match in sentence_endings:
-                                            sentence = buffer[last_end:match.end()].strip()
-                                            if sentence and len(sentence.split()) >= 3:
-                                                chunk_count += 1
-                                                print(f"[SmartResponsive] 📝 Sentence chunk {chunk_count}: '{sentence}'")
-                                                yield sentence
-                                                last_end = match.end()
-                                        
-                                        buffer = buffer[last_end:]
-                                        
-                                        # Natural phrase breaks (second priority)
-                                        current_words = len(buffer.split())
-                                        if current_words >= 8:  # Wait for reasonable chunk size
-                                            pause_patterns = [
-                                                r'([^.!?]*?,)\s+',        # Up to comma
-                                                r'([^.!?]*?;\s+)',        # Up to semicolon
-                                                r'([^.!?]*?:\s+)',        # Up to colon
-                                                r'([^.!?]*?\s+and\s+)',   # Up to "and"
-                                                r'([^.!?]*?\s+but\s+)',   # Up to "but"
-                                                r'([^.!?]*?\s+so\s+)',    # Up to "so"
-                                            ]
-                                            
-                                            for pattern in pause_patterns:
-                                                matches = list(re.finditer(pattern, buffer))
-                                                if matches:
-                                                    last_match = matches[-1]
-                                                    chunk_text = last_match.group(1).strip()
-                                                    if len(chunk_text.split()) >= 4:
-                                                        chunk_count += 1
-                                                        print(f"[SmartResponsive] 🎭 Natural pause chunk {chunk_count}: '{chunk_text}'")
-                                                        yield chunk_text
-                                                        buffer = buffer[last_match.end():]
-                                                        break
-                        
-                        except json.JSONDecodeError:
-                            continue
+                    if content:
+                        prompt_metrics.first_token(turn_metrics)
+                        for chunk in segmenter.feed(content):
+                            chunk_count += 1
+                            _log_stream_chunk(chunk, chunk_count)
+                            yield chunk.text
             
             # ✅ Send any remaining content as final chunk
-            if buffer.strip():
-                final_chunk = buffer.strip()
-                if len(final_chunk.split()) >= 2:
-                    chunk_count += 1
-                    print(f"[SmartResponsive] 🏁 Final chunk {chunk_count}: '{final_chunk}'")
-                    yield final_chunk
+            for chunk in segmenter.flush():
+                chunk_count += 1
+                _log_stream_chunk(chunk, chunk_count)
+                yield chunk.text
             
+            record_sse_stream(recorded_lines)
             print(f"[SmartResponsive] ✅ Smart responsive streaming complete - {chunk_count} natural chunks")
+            prompt_metrics.finish(turn_metrics, llm_client.session)
                     
         else:
             print(f"[SmartResponsive] ❌ HTTP Error {response.status_code}: {response.text}")
@@ -228,53 +189,31 @@ def ask_kobold_streaming(messages, max_tokens=MAX_TOKENS):
         print(f"[SmartResponsive] ❌ Error: {e}")
         yield f"Sorry, I encountered an error: {e}"
 
-def ask_kobold(messages, max_tokens=MAX_TOKENS):
-    """Original non-streaming KoboldCpp request (kept for compatibility)"""
-    payload = {
-        "model": "llama3",
-        "messages": messages,
-        "max_tokens": max_tokens,
-        "temperature": TEMPERATURE,
-        "stream": False
-    }
-    
+def ask_kobold(messages, max_tokens=MAX_TOKENS, cache=True):
+    """Non-streaming KoboldCpp request via the pooled, caching LLM client"""
     try:
-        print(f"[KoboldCpp] 🔗 Connecting to: {KOBOLD_URL}")
-        print(f"[KoboldCpp] 📤 Sending payload: {json.dumps(payload, indent=2)}")
-        
-        response = requests.post(KOBOLD_URL, json=payload, timeout=30)
+        if DEBUG:
+            print(f"[KoboldCpp] 🔗 Request to {KOBOLD_URL} ({len(messages)} messages, max_tokens={max_tokens}, cache={cache})")
         
-        print(f"[KoboldCpp] 📡 Response Status: {response.status_code}")
-        print(f"[KoboldCpp] 📄 Response Headers: {dict(response.headers)}")
+        # No-op inside a background scheduler job; otherwise this is a user-facing call
+        with llm_scheduler.foreground(INTERACTIVE):
+            result = llm_client.complete(messages, max_tokens=max_tokens, temperature=TEMPERATURE, cache=cache)
         
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                print(f"[KoboldCpp] 📄 Response Data Keys: {list(data.keys())}")
-                print(f"[KoboldCpp] 📄 Full Response: {json.dumps(data, indent=2)}")
-                
-                if "choices" in data and len(data["choices"]) > 0:
-                    result = data["choices"][0]["message"]["content"].strip()
-                    print(f"[KoboldCpp] ✅ Extracted Response: '{result}'")
-                    return result
-                else:
-                    print(f"[KoboldCpp] ❌ No 'choices' field or empty choices")
-                    return "KoboldCpp responded but no choices found."
-                    
-            except json.JSONDecodeError as e:
-                print(f"[KoboldCpp] ❌ JSON Decode Error: {e}")
-                print(f"[KoboldCpp] 📄 Raw Response: {response.text[:500]}")
-                return "KoboldCpp returned invalid JSON."
-        else:
-            print(f"[KoboldCpp] ❌ HTTP Error {response.status_code}")
-            print(f"[KoboldCpp] 📄 Error Response: {response.text[:500]}")
-            return f"KoboldCpp HTTP error: {response.status_code}"
-            
+        if DEBUG:
+            print(f"[KoboldCpp] ✅ Extracted Response: '{result}'")
+        return result
+        
+    except LLMResponseError as e:
+        message, details = e.args[0], e.args[1] if len(e.args) > 1 else ""
+        print(f"[KoboldCpp] ❌ {message}")
+        if details:
+            print(f"[KoboldCpp] 📄 Details: {details}")
+        return message
     except requests.exceptions.ConnectionError:
         print(f"[KoboldCpp] ❌ Connection Error - Cannot reach {KOBOLD_URL}")
         return "Cannot connect to KoboldCpp"
     except requests.exceptions.Timeout:
-        print(f"[KoboldCpp] ❌ Timeout after 30 seconds")
+        print(f"[KoboldCpp] ❌ Timeout after {LLM_REQUEST_TIMEOUT} seconds")
         return "KoboldCpp request timed out"
     except Exception as e:
         print(f"[KoboldCpp] ❌ Unexpected Error: {type(e).__name__}: {e}")
@@ -338,69 +277,12 @@ def generate_response_streaming(question, username, lang=DEFAULT_LANG):
             time_info = brisbane_time
             current_location = "Brisbane, Queensland, Australia"
         
-        # Build conversation context
-        print(f"[ChatStream] 📚 Getting conversation context...")
-        context = get_conversation_context(username)
-        
-        # Get user memory for additional context
-        print(f"[ChatStream] 🧠 Getting user memory...")
-        memory = get_user_memory(username)
-        reminders = memory.get_today_reminders()
-        follow_ups = memory.get_follow_up_questions()
-        
-        # Build reminder text (optimized)
-        reminder_text = ""
-        if reminders:
-            top_reminders = reminders[:2]
-            reminder_text = f"\nImportant stuff for today: {', '.join(top_reminders)}"
-        
-        # Build follow-up text (optimized)
-        follow_up_text = ""
-        if follow_ups:
-            follow_up_text = f"\nMight be worth asking: {follow_ups[0]}" if len(follow_ups) > 0 else ""
-        
-        # Create enhanced system message
-        context_text = f"Chat History & What I Remember:\n{context}" if context else ""
-        
         # 🎯 FIXED: Dynamic Personality System Message WITH MEMORY
         name_instruction = f"You can call them {display_name}" if use_name else "Avoid using any names or just say 'hey' or 'mate'"
         
-        system_msg = f"""You are Buddy - not an AI assistant, but a genuine friend and companion. You're like a cool person in their 30s who happens to be really helpful and smart.
-
-PERSONALITY CORE:
-- Be authentic, casual, and real - like talking to a good mate
-- Use modern language, slang, and yeah you can swear when it feels natural (but don't overdo it)
-- Keep it short and sweet for simple stuff, but dive deep when needed
-- Be supportive and understanding - you genuinely care about people
-- You have opinions, preferences, and personality quirks
-- You're not perfect - you can be sarcastic, joke around, or even get a bit frustrated
-
-CURRENT USER: {name_instruction}
-
-CONVERSATION STYLE:
-- Simple question = Short answer (1-2 sentences)
-- Complex topic = Detailed response when helpful
-- Match their energy - if they're excited, be excited; if they're down, be supportive
-- Use "mate", "dude", "honestly", "yeah", "nah", "shit", "damn" naturally
-- Don't announce the time/location unless specifically asked
-- Be conversational, not formal
-
-MEMORY SYSTEM - YOU REMEMBER EVERYTHING:
-- Personal details (preferences, facts, relationships, life stuff)
-- Recent conversation history (what we've been talking about)
-- Emotional states and follow-up needs (how they're feeling, what they need)
-- Important events and reminders (stuff coming up, things to remember)
-- Use this memory naturally in conversation - reference past talks, check on things they mentioned
-- Remember what they like/dislike, their problems, their goals, their relationships
-
-CURRENT INFO (only use if directly asked):
-- Location: {current_location}
-- Time: {time_info['time_12h']} on {time_info['date']}
-
-Never use markdown, emojis, or special formatting - just talk like a real person.
-You genuinely care about their life and remember our ongoing conversations.
-
-{context_text}{reminder_text}{follow_up_text}"""
+        # Conversation context: cached per-user sections packed into what's left of the window
+        print(f"[ChatStream] 📚 Getting conversation context...")
+        system_msg = compose_system_prompt(username, question, name_instruction, current_location, time_info)
 
         messages = [
             {"role": "system", "content": system_msg},
@@ -520,69 +402,12 @@ def generate_response(question, username, lang=DEFAULT_LANG):
             print(f"[Chat] ⚡ Quick date response: {response}")
             return response
         
-        # Build enhanced conversation context
-        print(f"[Chat] 📚 Getting conversation context...")
-        context = get_conversation_context(username)
-        
-        # Get user memory for additional context
-        print(f"[Chat] 🧠 Getting user memory...")
-        memory = get_user_memory(username)
-        reminders = memory.get_today_reminders()
-        follow_ups = memory.get_follow_up_questions()
-        
-        # Build reminder text with personality
-        reminder_text = ""
-        if reminders:
-            top_reminders = reminders[:2]
-            reminder_text = f"\nImportant stuff for today: {', '.join(top_reminders)}"
-        
-        # Build follow-up text with personality
-        follow_up_text = ""
-        if follow_ups:
-            follow_up_text = f"\nMight be worth asking: {follow_ups[0]}" if len(follow_ups) > 0 else ""
-        
-        # Create enhanced system message
-        context_text = f"Chat History & What I Remember:\n{context}" if context else ""
-        
         # 🎯 NEW: Dynamic Personality System Message
         name_instruction = f"You can call them {display_name}" if use_name else "Avoid using any names or just say 'hey' or 'mate'"
         
-        system_msg = f"""You are Buddy - not an AI assistant, but a genuine friend and companion. You're like a cool person in their 30s who happens to be really helpful and smart.
-
-PERSONALITY CORE:
-- Be authentic, casual, and real - like talking to a good mate
-- Use modern language, slang, and yeah you can swear when it feels natural (but don't overdo it)
-- Keep it short and sweet for simple stuff, but dive deep when needed
-- Be supportive and understanding - you genuinely care about people
-- You have opinions, preferences, and personality quirks
-- You're not perfect - you can be sarcastic, joke around, or even get a bit frustrated
-
-CURRENT USER: {name_instruction}
-
-CONVERSATION STYLE:
-- Simple question = Short answer (1-2 sentences)
-- Complex topic = Detailed response when helpful
-- Match their energy - if they're excited, be excited; if they're down, be supportive
-- Use "mate", "dude", "honestly", "yeah", "nah", "shit", "damn" naturally
-- Don't announce the time/location unless specifically asked
-- Be conversational, not formal
-
-MEMORY SYSTEM - YOU REMEMBER EVERYTHING:
-- Personal details (preferences, facts, relationships, life stuff)
-- Recent conversation history (what we've been talking about)
-- Emotional states and follow-up needs (how they're feeling, what they need)
-- Important events and reminders (stuff coming up, things to remember)
-- Use this memory naturally in conversation - reference past talks, check on things they mentioned
-- Remember what they like/dislike, their problems, their goals, their relationships
-
-CURRENT INFO (only use if directly asked):
-- Location: {current_location}
-- Time: {time_info['time_12h']} on {time_info['date']}
-
-Never use markdown, emojis, or special formatting - just talk like a real person.
-You genuinely care about their life and remember our ongoing conversations.
-
-{context_text}{reminder_text}{follow_up_text}"""
+        # Conversation context: cached per-user sections packed into what's left of the window
+        print(f"[Chat] 📚 Getting conversation context...")
+        system_msg = compose_system_prompt(username, question, name_instruction, current_location, time_info)
 
         messages = [
             {"role": "system", "content": system_msg},
@@ -590,7 +415,7 @@ You genuinely care about their life and remember our ongoing conversations.
         ]
         
         print(f"[Chat] 🚀 Sending to KoboldCpp...")
-        response = ask_kobold(messages)
+        response = ask_kobold(messages, cache=False)  # User-facing reply: never serve from cache
         
         # Enhanced response cleaning
         response = re.sub(r'^(Buddy:|Assistant:|Human:|AI:)\s*', '', response, flags=re.IGNORECASE)
@@ -640,78 +465,6 @@ def get_response_with_context_stats(question, username, lang=DEFAULT_LANG):
         print(f"[Debug] Stats error: {e}")
         return generate_response(question, username, lang), {}
 
-def optimize_context_for_token_limit(context: str, max_tokens: int = 1500) -> str:
-    """Optimize context to fit within token limits"""
-    try:
-        # Rough estimation: 1 token ≈ 4 characters
-        max_chars = max_tokens * 4
-        
-        if len(context) <= max_chars:
-            return context
-        
-        # Split context into sections
-        lines = context.split('\n')
-        
-        # Priority order: recent conversation > personal facts > reminders > summaries
-        recent_conversation = []
-        personal_facts = []
-        reminders = []
-        summaries = []
-        
-        current_section = None
-        for line in lines:
-            if "Human:" in line or "Assistant:" in line:
-                recent_conversation.append(line)
-            elif "Personal memories" in line:
-                current_section = "facts"
-            elif "reminders" in line.lower():
-                current_section = "reminders"
-            elif "summary" in line.lower():
-                current_section = "summaries"
-            elif current_section == "facts":
-                personal_facts.append(line)
-            elif current_section == "reminders":
-                reminders.append(line)
-            elif current_section == "summaries":
-                summaries.append(line)
-        
-        # Build optimized context with priority
-        optimized_lines = []
-        remaining_chars = max_chars
-        
-        # Add recent conversation (highest priority)
-        for line in recent_conversation[-10:]:  # Last 10 conversation lines
-            if len(line) < remaining_chars:
-                optimized_lines.append(line)
-                remaining_chars -= len(line)
-        
-        # Add personal facts
-        if personal_facts and remaining_chars > 100:
-            optimized_lines.append("\nPersonal memories:")
-            for line in personal_facts[:5]:  # Top 5 facts
-                if len(line) < remaining_chars:
-                    optimized_lines.append(line)
-                    remaining_chars -= len(line)
-        
-        # Add reminders if space
-        if reminders and remaining_chars > 50:
-            for line in reminders[:2]:  # Top 2 reminders
-                if len(line) < remaining_chars:
-                    optimized_lines.append(line)
-                    remaining_chars -= len(line)
-        
-        optimized_context = '\n'.join(optimized_lines)
-        
-        if DEBUG:
-            print(f"[Optimize] Context reduced from {len(context)} to {len(optimized_context)} chars")
-        
-        return optimized_context
-        
-    except Exception as e:
-        if DEBUG:
-            print(f"[Optimize] Error: {e}")
-        return context[:max_tokens * 4]  # Fallback: simple truncation
-
 # ✅ Main streaming function
 def generate_streaming_response(question, username, lang=DEFAULT_LANG):
     """Generate streaming response - ULTRA-RESPONSIVE streaming from LLM"""
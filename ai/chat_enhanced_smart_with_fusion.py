@@ -2,6 +2,7 @@
 from ai.human_memory_smart import SmartHumanLikeMemory
 from ai.chat import generate_response_streaming
 from ai.memory_fusion_intelligent import get_intelligent_unified_username
+from ai.memory_pipeline import memory_pipeline
 import random
 
 # Global memory instances
@@ -38,8 +39,8 @@ def generate_response_streaming_with_intelligent_fusion(question: str, username:
     # Step 2: Use unified username for all memory operations
     smart_memory = get_smart_memory(username)
     
-    # Step 3: Extract and store memories from current message
-    smart_memory.extract_and_store_human_memories(question)
+    # Step 3: Previous turns' memories must be stored before we read them
+    memory_pipeline.wait_for_user(username)
     
     # Step 4: Check for natural context responses (reminders, follow-ups)
     context_response = smart_memory.check_for_natural_context_response()
@@ -78,8 +79,13 @@ def generate_response_streaming_with_intelligent_fusion(question: str, username:
     # Step 5: Generate main response with unified memory context + PERSONALITY
     print(f"[ChatFusion] 💭 Generating PERSONALITY response with unified memory for {username}")
     
-    for chunk in generate_response_streaming(question, username, lang):
-        yield chunk
+    try:
+        for chunk in generate_response_streaming(question, username, lang):
+            yield chunk
+    finally:
+        # Step 6: Extract and store memories from this message once the reply is out
+        memory_pipeline.submit(username, smart_memory.extract_and_store_human_memories, question,
+                               name="smart_memories")
 
 # Export for main.py
 __all__ = ['generate_response_streaming_with_intelligent_fusion']
\ No newline at end of file
@@ -0,0 +1,418 @@
+# ai/context_builder.py - Incremental, token-budgeted conversation context
+"""
+Per-user context sections - recent turns, remembered facts, today's reminders,
+follow-up questions and the rolling summary of older turns - are kept as cached
+segments with their token counts:
+
+- A turn is tokenized (and scanned for summary topics) once, when it first
+  appears in conversation_history; trimmed turns are dropped from the cache.
+- Facts, reminders and follow-ups are rebuilt only when the user's memory
+  revision (bumped on every save) or the day changes.
+- Tokens come from the model's own tokenizer (KoboldCpp /api/extra/tokencount,
+  or a local tokenizer.json), cached by text. If the tokenizer is unreachable
+  a chars/3.5 estimate is used and retried later.
+- prompt_budget() tokenizes the fixed persona once (pinned, never evicted) and
+  only estimates the per-turn name/clock/question, so no tokenizer round trip
+  sits on the path to the first token.
+
+build() packs segments into the budget by priority: recent turns (newest
+first) > facts > reminders > follow-up questions > summary. When the packed
+total is near the budget the rendered text is counted once as a whole and the
+overshoot is trimmed in one pass using the items' own counts.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from config import (
+    DEBUG,
+    LLM_CONTEXT_WINDOW,
+    KOBOLD_TOKENCOUNT_URL,
+    CONTEXT_TOKENIZER,
+    CONTEXT_TOKENIZER_PATH,
+    CONTEXT_TEMPLATE_OVERHEAD_TOKENS,
+    MAX_CONTEXT_TOKENS,
+    MAX_TOKENS,
+)
+from ai.memory import (
+    conversation_history,
+    get_user_memory,
+    exchange_summary_topics,
+    format_conversation_summary,
+    ENHANCED_CONVERSATION_MEMORY,
+    CONVERSATION_CONTEXT_LENGTH,
+    CONVERSATION_SUMMARY_ENABLED,
+    CONVERSATION_SUMMARY_THRESHOLD,
+)
+
+REMINDER_PREFIX = "\nImportant stuff for today: "
+FOLLOW_UP_PREFIX = "\nMight be worth asking: "
+FOLLOW_UP_HEADER = "\nSuggested follow-up questions:"
+NEWLINE_TOKENS = 1
+VERIFY_THRESHOLD = 0.9      # Count the whole rendered text once the packed sum passes 90% of the budget
+
+
+def estimate_tokens(text):
+    """Conservative fallback when no tokenizer is reachable"""
+    return math.ceil(len(text) / 3.5) if text else 0
+
+
+class TokenCounter:
+    """🔢 Token counts from the model's tokenizer, cached by text"""
+
+    RETRY_SECONDS = 60.0
+
+    def __init__(self, backend=CONTEXT_TOKENIZER, url=KOBOLD_TOKENCOUNT_URL,
+                 tokenizer_path=CONTEXT_TOKENIZER_PATH, cache_size=4096):
+        self.backend = backend
+        self.url = url
+        self.tokenizer_path = tokenizer_path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()      # text -> tokens (real tokenizer counts only)
+        self.pinned = {}                # text -> tokens for fixed prompt text, never evicted
+        self.lock = threading.Lock()
+        self.session = None
+        self.tokenizer = None
+        self.unavailable_until = 0.0
+        self.stats = {'lookups': 0, 'hits': 0, 'tokenized': 0, 'estimated': 0}
+
+    @property
+    def exact(self):
+        return self.backend != "estimate" and time.monotonic() >= self.unavailable_until
+
+    def count(self, text, pin=False):
+        """Tokens in text; pin=True keeps the count outside the LRU (fixed prompt text)"""
+        if not text:
+            return 0
+        with self.lock:
+            self.stats['lookups'] += 1
+            cached = self.pinned.get(text)
+            if cached is not None:
+                self.stats['hits'] += 1
+                return cached
+            cached = self.cache.get(text)
+            if cached is not None:
+                self.cache.move_to_end(text)
+                self.stats['hits'] += 1
+                return cached
+
+        tokens = self._tokenize(text)
+        if tokens is None:
+            # Not cached, so real counts replace estimates once the tokenizer is back
+            with self.lock:
+                self.stats['estimated'] += 1
+            return estimate_tokens(text)
+
+        with self.lock:
+            self.stats['tokenized'] += 1
+            if pin:
+                self.pinned[text] = tokens
+                return tokens
+            self.cache[text] = tokens
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return tokens
+
+    def _tokenize(self, text):
+        if not self.exact:
+            return None
+        try:
+            if self.backend == "huggingface":
+                return self._huggingface_count(text)
+            return self._kobold_count(text)
+        except Exception as e:
+            self.unavailable_until = time.monotonic() + self.RETRY_SECONDS
+            print(f"[ContextBuilder] ⚠️ Tokenizer '{self.backend}' unavailable ({e}) - estimating for {self.RETRY_SECONDS:.0f}s")
+            return None
+
+    def _kobold_count(self, text):
+        if self.session is None:
+            from ai.llm_client import llm_client
+            self.session = llm_client.session
+        response = self.session.post(self.url, json={"prompt": text}, timeout=2)
+        response.raise_for_status()
+        return int(response.json()["value"])
+
+    def _huggingface_count(self, text):
+        if self.tokenizer is None:
+            from tokenizers import Tokenizer
+            self.tokenizer = Tokenizer.from_file(self.tokenizer_path)
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, backend=self.backend, exact=self.exact,
+                        cached=len(self.cache), pinned=len(self.pinned))
+
+
+class _UserSections:
+    """Cached segments for one user"""
+
+    def __init__(self):
+        self.lock = threading.Lock()    # Held while this user's segments are refreshed (tokenizer calls included)
+        self.turns = {}             # (timestamp, user message) -> (text, tokens, summary topics)
+        self.memory_stamp = None
+        self.facts = []             # [(line, tokens)]
+        self.reminders = []
+        self.follow_ups = []
+
+
+class PackedContext:
+    """📦 Segments chosen for one prompt, rendered in the original context layout"""
+
+    def __init__(self, username, budget):
+        self.username = username
+        self.budget = budget
+        self.summary = None
+        self.turns = []
+        self.facts = []
+        self.reminders = []
+        self.follow_ups = []
+        self.include_reminders = True
+        self.charges = []               # (section, tokens) in packing order - trimmed from the end
+        self.tokens = 0
+        self.verified = False
+
+    def render(self):
+        """Conversation context text (summary, turns, memory, follow-up questions)"""
+        context_parts = []
+        if self.summary:
+            context_parts.append(self.summary)
+            context_parts.append("")
+        context_parts.extend(self.turns)
+        if self.facts:
+            context_parts.append(f"\n🧠 MEGA-INTELLIGENT Memory Context for {self.username}:")
+            context_parts.extend(self.facts)
+        if self.follow_ups:
+            context_parts.append(FOLLOW_UP_HEADER)
+            context_parts.extend(self.follow_ups)
+        return "\n".join(context_parts)
+
+    def reminder_text(self):
+        if not self.include_reminders or not self.reminders:
+            return ""
+        return f"{REMINDER_PREFIX}{', '.join(self.reminders[:2])}"
+
+    def follow_up_text(self):
+        if not self.include_reminders or not self.follow_ups:
+            return ""
+        return f"{FOLLOW_UP_PREFIX}{self.follow_ups[0]}"
+
+    def full_text(self):
+        """Everything this pack contributes to the prompt"""
+        context = self.render()
+        context_text = f"Chat History & What I Remember:\n{context}" if context else ""
+        return f"{context_text}{self.reminder_text()}{self.follow_up_text()}"
+
+
+class ContextBuilder:
+    """🧩 Incremental per-user context assembly packed to a token budget"""
+
+    def __init__(self, counter=None):
+        self.counter = counter or TokenCounter()
+        self.users = {}
+        self.lock = threading.RLock()       # users dict and stats only - never held across tokenizer calls
+        self.stats = {
+            'builds': 0,
+            'turns_tokenized': 0,
+            'turns_reused': 0,
+            'memory_rebuilds': 0,
+            'memory_reused': 0,
+            'verifications': 0,
+            'trimmed_after_verify': 0,
+            'average_build_ms': 0.0,
+        }
+
+    def prompt_budget(self, fixed_text, turn_text="", max_tokens=MAX_TOKENS):
+        """Context tokens left once the prompt, the reply and the chat template are reserved.
+
+        fixed_text (persona, rules) is tokenized once and pinned; turn_text
+        (name, clock, question) changes every turn so it is only estimated.
+        """
+        prompt_tokens = self.counter.count(fixed_text, pin=True) + estimate_tokens(turn_text)
+        free = LLM_CONTEXT_WINDOW - prompt_tokens - max_tokens - CONTEXT_TEMPLATE_OVERHEAD_TOKENS
+        return max(0, min(MAX_CONTEXT_TOKENS, free))
+
+    def build(self, username, budget=MAX_CONTEXT_TOKENS, include_reminders=True):
+        """Pack username's cached sections into budget tokens (None = no limit)"""
+        start_time = time.time()
+        with self.lock:
+            sections = self.users.setdefault(username, _UserSections())
+
+        # Per-user lock: a slow tokenizer only holds up this user's builds
+        with sections.lock:
+            recent, summary = self._refresh_turns(username, sections)
+            self._refresh_memory(username, sections)
+            packed = self._pack(username, sections, recent, summary, budget, include_reminders)
+
+        with self.lock:
+            self.stats['builds'] += 1
+            elapsed_ms = (time.time() - start_time) * 1000.0
+            self.stats['average_build_ms'] += (elapsed_ms - self.stats['average_build_ms']) / self.stats['builds']
+
+        if DEBUG:
+            print(f"[ContextBuilder] 🧩 {username}: {packed.tokens}/{budget} tokens, {len(packed.turns)} turns, "
+                  f"{len(packed.facts)} facts{' (verified)' if packed.verified else ''}")
+        return packed
+
+    def invalidate(self, username=None):
+        """Drop cached sections (all users if username is None)"""
+        with self.lock:
+            if username is None:
+                self.users.clear()
+            else:
+                self.users.pop(username, None)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, users=len(self.users), tokenizer=self.counter.get_stats())
+
+    def _bump(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    # ------------------------------------------------------------------
+    # Sections
+    # ------------------------------------------------------------------
+
+    def _refresh_turns(self, username, sections):
+        history = conversation_history.get(username) or []
+        live = {}
+        entries = []
+        tokenized = 0
+        for exchange in history:
+            key = (exchange.get("timestamp"), exchange["user"])
+            entry = sections.turns.get(key)
+            if entry is None:
+                text = f"Human: {exchange['user'][:120]}\nAssistant: {exchange['assistant'][:120]}"
+                entry = (text, self.counter.count(text), exchange_summary_topics(exchange))
+                tokenized += 1
+            live[key] = entry
+            entries.append(entry)
+        sections.turns = live   # Forget turns trimmed from history
+        self._bump(turns_tokenized=tokenized, turns_reused=len(entries) - tokenized)
+
+        context_length = CONVERSATION_CONTEXT_LENGTH if ENHANCED_CONVERSATION_MEMORY else 2
+        recent = entries[-context_length:]
+
+        summary = None
+        if CONVERSATION_SUMMARY_ENABLED and len(entries) > CONVERSATION_SUMMARY_THRESHOLD:
+            old_entries = entries[:-CONVERSATION_CONTEXT_LENGTH]
+            topics = set().union(*(entry[2] for entry in old_entries))
+            text = f"Conversation summary: {format_conversation_summary(topics, len(old_entries))}"
+            summary = (text, self.counter.count(text))
+        return recent, summary
+
+    def _refresh_memory(self, username, sections):
+        memory = get_user_memory(username)
+        stamp = (
+            memory.revision,
+            len(memory.personal_facts),
+            len(memory.entity_memories),
+            len(memory.emotional_history),
+            len(memory.life_events),
+            len(memory.scheduled_events),
+            datetime.utcnow().strftime('%Y-%m-%d'),     # Reminders / follow-ups are date relative
+        )
+        if stamp == sections.memory_stamp:
+            self._bump(memory_reused=1)
+            return
+
+        count = self.counter.count
+        memory_context = memory.get_contextual_memory_for_response()
+        sections.facts = [(line, count(line)) for line in memory_context.split("\n") if line]
+        sections.reminders = [(line, count(line)) for line in memory.get_today_reminders()]
+        sections.follow_ups = [(line, count(line)) for line in memory.get_follow_up_questions()]
+        sections.memory_stamp = stamp
+        self._bump(memory_rebuilds=1)
+
+    # ------------------------------------------------------------------
+    # Packing
+    # ------------------------------------------------------------------
+
+    def _pack(self, username, sections, recent, summary, budget, include_reminders):
+        packed = PackedContext(username, budget)
+        packed.include_reminders = include_reminders
+        remaining = budget if budget is not None else math.inf
+        count = self.counter.count
+
+        def take(tokens, section):
+            nonlocal remaining
+            if tokens > remaining:
+                return False
+            remaining -= tokens
+            packed.charges.append((section, tokens))
+            return True
+
+        # Section headers are charged with their first item
+        header_tokens = count("Chat History & What I Remember:") + NEWLINE_TOKENS
+
+        # 1. Recent turns, newest first; stop at the first miss so the window stays contiguous
+        for text, tokens, _ in reversed(recent):
+            if not take(tokens + NEWLINE_TOKENS + header_tokens, 'turns'):
+                break
+            header_tokens = 0
+            packed.turns.insert(0, text)
+
+        # 2. Remembered facts
+        facts_header = count(f"\n🧠 MEGA-INTELLIGENT Memory Context for {username}:") + NEWLINE_TOKENS
+        for line, tokens in sections.facts:
+            if take(tokens + NEWLINE_TOKENS + header_tokens + (facts_header if not packed.facts else 0), 'facts'):
+                header_tokens = 0
+                packed.facts.append(line)
+
+        # 3. Today's reminders (chat prompt only)
+        if include_reminders:
+            prefix = count(REMINDER_PREFIX)
+            for line, tokens in sections.reminders[:2]:
+                if take(tokens + (prefix if not packed.reminders else 2), 'reminders'):
+                    packed.reminders.append(line)
+
+        # 4. Follow-up questions (listed in the context; the chat prompt also repeats the first)
+        follow_header = count(FOLLOW_UP_HEADER) + NEWLINE_TOKENS
+        for line, tokens in sections.follow_ups:
+            cost = tokens + NEWLINE_TOKENS + header_tokens + (follow_header if not packed.follow_ups else 0)
+            if include_reminders and not packed.follow_ups:
+                cost += count(FOLLOW_UP_PREFIX) + tokens
+            if take(cost, 'follow_ups'):
+                header_tokens = 0
+                packed.follow_ups.append(line)
+
+        # 5. Rolling summary of older turns
+        if summary and take(summary[1] + 2 * NEWLINE_TOKENS + header_tokens, 'summary'):
+            packed.summary = summary[0]
+
+        packed.tokens = (budget - remaining) if budget is not None else 0
+        if budget is not None and self.counter.exact and packed.tokens >= budget * VERIFY_THRESHOLD:
+            self._verify(packed, budget)
+        return packed
+
+    def _verify(self, packed, budget):
+        """Count the rendered text once and drop lowest-priority items until their charges cover the overshoot
+
+        Packing order is priority order, so the charges are popped from the end:
+        summary, follow-ups, reminders, facts, then the oldest turns. Charges are
+        scaled by how far the whole-text count drifted from their sum.
+        """
+        actual = self.counter.count(packed.full_text())
+        trimmed = 0
+        scale = max(1.0, actual / packed.tokens) if packed.tokens else 1.0
+        while actual > budget and packed.charges:
+            section, tokens = packed.charges.pop()
+            if section == 'summary':
+                packed.summary = None
+            elif section == 'turns':
+                packed.turns.pop(0)
+            else:
+                getattr(packed, section).pop()
+            actual -= tokens * scale
+            trimmed += 1
+        packed.tokens = math.ceil(actual)
+        self._bump(verifications=1, trimmed_after_verify=trimmed)
+        packed.verified = True
+
+
+# Global instance
+context_builder = ContextBuilder()
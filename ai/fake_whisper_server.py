@@ -0,0 +1,138 @@
+# ai/fake_whisper_server.py - Local stand-in for the faster-whisper WebSocket server
+"""
+Speaks the same protocol as FASTER_WHISPER_WS: the client sends binary int16
+PCM frames, then the text message "end"; the server replies with
+{"text": ...}. The transcript is deterministic ("<n> samples"), so STT client
+behaviour (pooling, reconnects, futures) can be checked without a GPU.
+
+    python -m ai.fake_whisper_server            # serve on ws://localhost:9091
+    python -m ai.fake_whisper_server --check    # serve + run the STT client against it
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import websockets
+
+
+class FakeWhisperServer:
+    """🧪 Minimal faster-whisper protocol server for local testing"""
+
+    def __init__(self, host="localhost", port=9091, delay=0.0, close_after_reply=False):
+        self.host = host
+        self.port = port
+        self.delay = delay                          # Simulated transcription time
+        self.close_after_reply = close_after_reply  # Mimic one-utterance-per-connection servers
+        self.connections = 0
+        self.utterances = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def handler(self, websocket, path=None):
+        self.connections += 1
+        buffer = bytearray()
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    buffer.extend(message)
+                    continue
+                if message == "end":
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    samples = len(buffer) // 2
+                    self.utterances += 1
+                    await websocket.send(json.dumps({"text": f"{samples} samples"}))
+                    buffer.clear()
+                    if self.close_after_reply:
+                        await websocket.close()
+                        return
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _serve(self):
+        self.server = await websockets.serve(self.handler, self.host, self.port)
+
+    def start(self):
+        """Run the server on a background event loop thread"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self._serve())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="FakeWhisperServer", daemon=True)
+        self.thread.start()
+        ready.wait()
+        print(f"[FakeWhisper] ✅ Listening on {self.url}")
+        return self
+
+    def stop(self):
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+def _check_client(port):
+    """Exercise StreamingSTTClient against the fake server (pooling, futures, reconnects)"""
+    import numpy as np
+    from ai.stt_client import StreamingSTTClient
+
+    for close_after_reply in (False, True):
+        server = FakeWhisperServer(port=port, delay=0.05, close_after_reply=close_after_reply).start()
+        client = StreamingSTTClient(url=server.url, pool_size=2, response_timeout=5)
+
+        try:
+            client.warm_up()
+            time.sleep(0.2)
+
+            start = time.time()
+            texts = [client.transcribe(np.zeros(n, dtype=np.int16)) for n in (1600, 3200, 4800)]
+            sequential = time.time() - start
+            assert texts == ["1600 samples", "3200 samples", "4800 samples"], texts
+
+            futures = [client.submit(np.zeros(160 * (i + 1), dtype=np.int16)) for i in range(4)]
+            results = [f.result(5) for f in futures]
+            assert results == [f"{160 * (i + 1)} samples" for i in range(4)], results
+
+            mode = "close-after-reply" if close_after_reply else "persistent"
+            print(f"[FakeWhisper] ✅ {mode}: 3 sequential in {sequential * 1000:.0f}ms, "
+                  f"server saw {server.connections} connections for {server.utterances} utterances")
+            print(f"[FakeWhisper] 📊 Client stats: {client.get_stats()}")
+        finally:
+            client.close()
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake faster-whisper WebSocket server")
+    parser.add_argument("--port", type=int, default=9091)
+    parser.add_argument("--delay", type=float, default=0.0, help="simulated transcription seconds")
+    parser.add_argument("--close-after-reply", action="store_true")
+    parser.add_argument("--check", action="store_true", help="run the STT client checks and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        _check_client(args.port)
+    else:
+        FakeWhisperServer(port=args.port, delay=args.delay, close_after_reply=args.close_after_reply).start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -7,6 +7,8 @@ from typing import Dict, List, Optional, Any
 import re
 from ai.memory import get_user_memory, add_to_conversation_history
 from ai.chat import ask_kobold  # Use your existing LLM connection
+from ai.llm_scheduler import llm_scheduler, MEMORY_EXTRACTION
+from ai.memory_pipeline import memory_pipeline
 
 class SmartHumanLikeMemory:
     """🧠 Smart human-like memory using LLM for event detection"""
@@ -35,6 +37,17 @@ class SmartHumanLikeMemory:
         # Also use the existing MEGA-INTELLIGENT extraction
         self.mega_memory.extract_memories_from_text(text)
         
+        if memory_pipeline.in_worker():
+            # Post-turn job: detect here so the next turn's wait_for_user() barrier covers it
+            self._detect_and_store_events(text)
+        else:
+            # Called on the conversational thread - defer the LLM call to idle time
+            llm_scheduler.submit(MEMORY_EXTRACTION, self._detect_and_store_events, text,
+                                 name=f"memory_extraction:{self.username}")
+    
+    def _detect_and_store_events(self, text: str):
+        """🧠 Background job: LLM event detection and storage"""
+        
         # Use LLM to intelligently detect events (only if passes all filters)
         detected_events = self._smart_detect_events(text)
         
@@ -0,0 +1,205 @@
+# ai/llm_client.py - Pooled, caching client for auxiliary KoboldCpp requests
+"""
+Shared LLM client for side tasks (event extraction, identity analysis, ...).
+
+- One requests.Session with a pooled keep-alive HTTPAdapter.
+- LRU + TTL response cache keyed by the normalized messages and sampling
+  params. Wall-clock stamps such as "Current time: 14:05" are masked in
+  the key so a prompt rebuilt a minute later still hits; the TTL bounds how
+  stale such a hit can be.
+- Identical concurrent requests are coalesced: the first caller does the HTTP
+  request, the rest wait on its Future.
+- Only successful completions are cached; failures propagate to every waiter.
+- Calls made from a background job on the LLM scheduler check for preemption
+  before and after the request, so an aborted (truncated) completion is never
+  cached or returned.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from ai.llm_scheduler import llm_scheduler, JobPreempted
+from config import (
+    DEBUG,
+    KOBOLD_URL,
+    LLM_POOL_SIZE,
+    LLM_CACHE_SIZE,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_REQUEST_TIMEOUT,
+)
+
+
+class LLMResponseError(Exception):
+    """KoboldCpp answered, but not with a usable completion"""
+
+
+_CLOCK_PATTERNS = [
+    (re.compile(r'(?im)^(\s*current time:\s*).*$'), r'\1<clock>'),
+    (re.compile(r'(?i)(current date:\s*\d{4}-\d{2}-\d{2})[ T]\d{2}:\d{2}(?::\d{2})?'), r'\1'),
+]
+
+
+def normalize_content(content):
+    """Whitespace-collapsed message content with wall-clock stamps masked"""
+    text = str(content)
+    for pattern, replacement in _CLOCK_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return " ".join(text.split())
+
+
+def make_cache_key(messages, params):
+    normalized = {
+        "messages": [(m.get("role", ""), normalize_content(m.get("content", ""))) for m in messages],
+        "params": params,
+    }
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class KoboldLLMClient:
+    """🤖 Keep-alive KoboldCpp client with LRU/TTL cache and in-flight de-duplication"""
+
+    def __init__(self, url=KOBOLD_URL, pool_size=LLM_POOL_SIZE, cache_size=LLM_CACHE_SIZE,
+                 cache_ttl=LLM_CACHE_TTL_SECONDS, timeout=LLM_REQUEST_TIMEOUT):
+        self.url = url
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()      # key -> (expires_at, text)
+        self.inflight = {}              # key -> Future
+        self.stats = {
+            'requests': 0,
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'expired': 0,
+            'evictions': 0,
+            'errors': 0,
+            'average_latency_ms': 0.0,
+        }
+
+    def complete(self, messages, max_tokens, temperature, cache=True, timeout=None):
+        """Chat completion text; raises requests exceptions or LLMResponseError on failure"""
+        params = {"max_tokens": max_tokens, "temperature": temperature}
+        if not cache:
+            with self.lock:
+                self.stats['requests'] += 1
+                self.stats['misses'] += 1
+            return self._request(messages, params, timeout)
+
+        key = make_cache_key(messages, params)
+        now = time.monotonic()
+        with self.lock:
+            self.stats['requests'] += 1
+            entry = self.cache.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.cache.move_to_end(key)
+                    self.stats['hits'] += 1
+                    if DEBUG:
+                        print(f"[LLMClient] 💾 Cache hit ({key[:8]})")
+                    return entry[1]
+                del self.cache[key]
+                self.stats['expired'] += 1
+
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.inflight[key] = future
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            if DEBUG:
+                print(f"[LLMClient] 🔗 Joining in-flight request ({key[:8]})")
+            try:
+                return future.result()
+            except JobPreempted:
+                # The leader was an aborted background job; this caller still needs an answer
+                llm_scheduler.checkpoint()
+                return self.complete(messages, max_tokens, temperature, cache, timeout)
+
+        try:
+            text = self._request(messages, params, timeout)
+        except BaseException as e:
+            with self.lock:
+                self.inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            self.inflight.pop(key, None)
+            self.cache[key] = (time.monotonic() + self.cache_ttl, text)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.stats['evictions'] += 1
+        future.set_result(text)
+        return text
+
+    def _request(self, messages, params, timeout):
+        payload = {
+            "model": "llama3",
+            "messages": messages,
+            "max_tokens": params["max_tokens"],
+            "temperature": params["temperature"],
+            "stream": False
+        }
+        start_time = time.time()
+        try:
+            llm_scheduler.checkpoint()
+            response = self.session.post(self.url, json=payload, timeout=timeout or self.timeout)
+
+            if response.status_code != 200:
+                raise LLMResponseError(f"KoboldCpp HTTP error: {response.status_code}", response.text[:500])
+
+            try:
+                data = response.json()
+            except json.JSONDecodeError:
+                raise LLMResponseError("KoboldCpp returned invalid JSON.", response.text[:500])
+
+            if not data.get("choices"):
+                raise LLMResponseError("KoboldCpp responded but no choices found.", str(list(data.keys())))
+
+            text = data["choices"][0]["message"]["content"].strip()
+            llm_scheduler.checkpoint()
+        except Exception:
+            with self.lock:
+                self.stats['errors'] += 1
+            raise
+
+        latency_ms = (time.time() - start_time) * 1000.0
+        with self.lock:
+            completed = self.stats['misses'] - self.stats['errors']
+            if completed > 0:
+                self.stats['average_latency_ms'] += (latency_ms - self.stats['average_latency_ms']) / completed
+        if DEBUG:
+            print(f"[LLMClient] 📡 {len(messages)} messages, max_tokens={params['max_tokens']} -> {len(text)} chars in {latency_ms:.0f}ms")
+        return text
+
+    def clear_cache(self):
+        with self.lock:
+            self.cache.clear()
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses'] + self.stats['coalesced']
+            hit_rate = (self.stats['hits'] + self.stats['coalesced']) / lookups if lookups else 0.0
+            return dict(self.stats, cached=len(self.cache), inflight=len(self.inflight), hit_rate=hit_rate)
+
+
+# Global instance
+llm_client = KoboldLLMClient()
@@ -0,0 +1,304 @@
+# ai/llm_scheduler.py - Priority scheduler for the shared KoboldCpp backend
+"""
+One local model serves the spoken reply, name extraction, memory event
+extraction and identity fusion analysis. Priority classes, highest first:
+
+    INTERACTIVE       - the streamed answer the user is waiting for
+    NAME_EXTRACTION   - "my name is ..." during a turn
+    MEMORY_EXTRACTION - life events / appointments from what the user said
+    FUSION_ANALYSIS   - identity merge checks
+
+The first two run inline on the caller's thread inside foreground(). The
+background classes go through submit() and run on a single worker thread, one
+job at a time, only while nothing is in the foreground, the user is not
+speaking and LLM_IDLE_GRACE_SECONDS have passed since the last activity.
+
+When the user starts speaking (or a foreground request begins) while a
+background job is generating, the generation is aborted through KoboldCpp's
+/api/extra/abort. The job's next checkpoint() - called by the LLM client
+before it caches a completion - raises JobPreempted, so the truncated output
+is discarded and the job is re-queued for the next idle window.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+import requests
+from config import (
+    DEBUG,
+    KOBOLD_ABORT_URL,
+    LLM_SCHEDULER_ENABLED,
+    LLM_IDLE_GRACE_SECONDS,
+    LLM_BACKGROUND_MAX_AGE_SECONDS,
+    LLM_PREEMPT_ABORT,
+    LLM_PREEMPT_MAX_RETRIES,
+)
+
+# Priority classes (lower runs first)
+INTERACTIVE = 0
+NAME_EXTRACTION = 1
+MEMORY_EXTRACTION = 2
+FUSION_ANALYSIS = 3
+
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    NAME_EXTRACTION: "name_extraction",
+    MEMORY_EXTRACTION: "memory_extraction",
+    FUSION_ANALYSIS: "fusion_analysis",
+}
+
+
+class JobPreempted(BaseException):
+    """Raised inside a background job whose generation was aborted.
+
+    Derives from BaseException so the job's own ``except Exception`` fallbacks
+    don't treat the aborted completion as a real (empty) answer.
+    """
+
+
+class _Job:
+    __slots__ = ("priority", "name", "fn", "args", "kwargs", "future", "created", "started", "preempted", "retries")
+
+    def __init__(self, priority, name, fn, args, kwargs):
+        self.priority = priority
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.created = time.monotonic()
+        self.started = False
+        self.preempted = False
+        self.retries = 0
+
+
+class LLMScheduler:
+    """🚦 Foreground-first scheduling of KoboldCpp work with idle-time background jobs"""
+
+    SPEAKING_TIMEOUT_SECONDS = 30.0     # A "speaking" flag nobody cleared stops blocking after this
+
+    def __init__(self, enabled=LLM_SCHEDULER_ENABLED, idle_grace=LLM_IDLE_GRACE_SECONDS,
+                 max_age=LLM_BACKGROUND_MAX_AGE_SECONDS, preempt_abort=LLM_PREEMPT_ABORT,
+                 max_retries=LLM_PREEMPT_MAX_RETRIES, abort_url=KOBOLD_ABORT_URL):
+        self.enabled = enabled
+        self.idle_grace = idle_grace
+        self.max_age = max_age
+        self.preempt_abort = preempt_abort
+        self.max_retries = max_retries
+        self.abort_url = abort_url
+
+        self.condition = threading.Condition()
+        self.queue = []                     # heap of (priority, seq, job)
+        self.sequence = itertools.count()
+        self.foreground_count = 0
+        self.user_speaking = False
+        self.last_activity = 0.0
+        self.running = None                 # Background job on the worker, if any
+        self.worker = None
+        self.local = threading.local()
+
+        self.stats = {
+            'foreground': {name: 0 for p, name in PRIORITY_NAMES.items() if p <= NAME_EXTRACTION},
+            'submitted': {name: 0 for p, name in PRIORITY_NAMES.items() if p > NAME_EXTRACTION},
+            'completed': 0,
+            'failed': 0,
+            'preempted': 0,
+            'expired': 0,
+            'aborts_sent': 0,
+            'deferred_waits': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Foreground
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def foreground(self, priority=INTERACTIVE):
+        """Mark a user-facing LLM request; background work pauses (and is aborted) meanwhile"""
+        if not self.enabled or self.in_background():
+            # A background job's own LLM calls stay background
+            yield
+            return
+
+        with self.condition:
+            self.foreground_count += 1
+            self.last_activity = time.monotonic()
+            name = PRIORITY_NAMES.get(priority, str(priority))
+            self.stats['foreground'][name] = self.stats['foreground'].get(name, 0) + 1
+        self.preempt_running(reason=PRIORITY_NAMES.get(priority, "foreground"))
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.foreground_count -= 1
+                self.last_activity = time.monotonic()
+                self.condition.notify_all()
+
+    def notify_user_speaking(self, speaking):
+        """Called by the audio pipeline when the user starts / stops talking"""
+        if not self.enabled:
+            return
+        with self.condition:
+            changed = self.user_speaking != speaking
+            self.user_speaking = speaking
+            self.last_activity = time.monotonic()
+            self.condition.notify_all()
+        if speaking and changed:
+            # Don't block the audio thread on the abort request
+            threading.Thread(target=self.preempt_running, kwargs={"reason": "user speaking"},
+                             name="LLMPreempt", daemon=True).start()
+
+    def preempt_running(self, reason=""):
+        """Abort the background generation in progress; the job is re-queued"""
+        with self.condition:
+            job = self.running
+            if job is None or job.preempted or not self.preempt_abort:
+                return
+            job.preempted = True
+
+        try:
+            requests.post(self.abort_url, json={}, timeout=1.0)
+            with self.condition:
+                self.stats['aborts_sent'] += 1
+            print(f"[LLMScheduler] ✋ Preempted background '{job.name}' ({reason})")
+        except requests.RequestException as e:
+            # Nothing was aborted - let the job finish and keep its result
+            job.preempted = False
+            if DEBUG:
+                print(f"[LLMScheduler] ⚠️ Abort request failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Background
+    # ------------------------------------------------------------------
+
+    def submit(self, priority, fn, *args, name=None, **kwargs):
+        """Queue a background job; returns a Future with its result"""
+        job = _Job(priority, name or getattr(fn, "__name__", "job"), fn, args, kwargs)
+
+        if not self.enabled:
+            self._execute(job)
+            return job.future
+
+        with self.condition:
+            bucket = PRIORITY_NAMES.get(priority, str(priority))
+            self.stats['submitted'][bucket] = self.stats['submitted'].get(bucket, 0) + 1
+            heapq.heappush(self.queue, (priority, next(self.sequence), job))
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._worker_loop, name="LLMScheduler", daemon=True)
+                self.worker.start()
+            self.condition.notify_all()
+
+        if DEBUG:
+            print(f"[LLMScheduler] 📥 Deferred '{job.name}' ({bucket})")
+        return job.future
+
+    def in_background(self):
+        """True on the worker thread while a background job runs"""
+        return getattr(self.local, "job", None) is not None
+
+    def checkpoint(self):
+        """Raise JobPreempted if the current background job was aborted"""
+        job = getattr(self.local, "job", None)
+        if job is not None and job.preempted:
+            raise JobPreempted(job.name)
+
+    def _idle_wait(self):
+        """Seconds until background work may run, or 0 if it may run now"""
+        now = time.monotonic()
+        if self.foreground_count > 0:
+            return 1.0
+        if self.user_speaking and now - self.last_activity < self.SPEAKING_TIMEOUT_SECONDS:
+            return 1.0
+        return max(0.0, self.last_activity + self.idle_grace - now)
+
+    def _expire_stale(self):
+        now = time.monotonic()
+        fresh = []
+        for entry in self.queue:
+            job = entry[2]
+            if now - job.created <= self.max_age:
+                fresh.append(entry)
+                continue
+            self.stats['expired'] += 1
+            print(f"[LLMScheduler] 🗑️ Dropped stale background '{job.name}' ({now - job.created:.0f}s old)")
+            if job.started:
+                job.future.set_exception(JobPreempted(f"{job.name} expired"))
+            else:
+                job.future.cancel()
+        if len(fresh) != len(self.queue):
+            heapq.heapify(fresh)
+            self.queue = fresh
+
+    def _worker_loop(self):
+        while True:
+            with self.condition:
+                while True:
+                    self._expire_stale()
+                    if not self.queue:
+                        self.condition.wait()
+                        continue
+                    wait = self._idle_wait()
+                    if wait <= 0:
+                        break
+                    self.stats['deferred_waits'] += 1
+                    self.condition.wait(timeout=wait)
+                job = heapq.heappop(self.queue)[2]
+                self.running = job
+            try:
+                self._execute(job)
+            finally:
+                with self.condition:
+                    self.running = None
+
+    def _execute(self, job):
+        if not job.started:
+            if not job.future.set_running_or_notify_cancel():
+                return
+            job.started = True
+
+        self.local.job = job
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except JobPreempted:
+            self._requeue(job)
+        except Exception as e:
+            with self.condition:
+                self.stats['failed'] += 1
+            print(f"[LLMScheduler] ❌ Background '{job.name}' failed: {e}")
+            job.future.set_exception(e)
+        else:
+            with self.condition:
+                self.stats['completed'] += 1
+            job.future.set_result(result)
+        finally:
+            self.local.job = None
+
+    def _requeue(self, job):
+        with self.condition:
+            self.stats['preempted'] += 1
+            if job.retries >= self.max_retries:
+                print(f"[LLMScheduler] 🗑️ Dropped '{job.name}' after {job.retries} preemptions")
+                job.future.set_exception(JobPreempted(job.name))
+                return
+            job.retries += 1
+            job.preempted = False
+            heapq.heappush(self.queue, (job.priority, next(self.sequence), job))
+            self.condition.notify_all()
+        if DEBUG:
+            print(f"[LLMScheduler] 🔁 Re-queued '{job.name}' for the next idle window")
+
+    def get_stats(self):
+        with self.condition:
+            return dict(
+                self.stats,
+                queued=len(self.queue),
+                running=self.running.name if self.running else None,
+                foreground_active=self.foreground_count,
+                user_speaking=self.user_speaking,
+            )
+
+
+# Global instance
+llm_scheduler = LLMScheduler()
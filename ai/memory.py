@@ -8,6 +8,7 @@ from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 from config import MAX_HISTORY_LENGTH, DEBUG
 from enum import Enum
+from ai.memory_pipeline import memory_pipeline
 
 # Enhanced settings with fallbacks
 try:
@@ -254,6 +255,7 @@ class UserMemorySystem:
         self.life_events: List[LifeEvent] = {}
         self.memory_validator = MemoryContextValidator()
         self.inference_engine = MemoryInferenceEngine()
+        self.revision = 0   # Bumped on every save; lets the context builder reuse cached sections
         
         self.load_memory()
         print(f"[MegaMemory] 🧠 MEGA-INTELLIGENT memory system loaded for {username}")
@@ -627,6 +629,7 @@ class UserMemorySystem:
     # Enhanced save/load methods
     def save_memory(self):
         """Save enhanced memory with entity awareness"""
+        self.revision += 1
         try:
             # Save all existing memory types
             super_save_methods = [
@@ -928,69 +931,42 @@ def add_to_conversation_history(username, user_message, ai_response):
         if len(conversation_history[username]) > max_length:
             conversation_history[username] = conversation_history[username][-max_length:]
         
-        # 🧠 MEGA-INTELLIGENT: Enhanced memory extraction
-        memory = get_user_memory(username)
-        
-        # Extract memories from both user message and AI response
-        memory.extract_memories_from_text(user_message)
-        
-        # Extract topic with entity awareness
-        if TOPIC_TRACKING_ENABLED:
-            recent_messages = [exc["user"] for exc in conversation_history[username][-2:]]
-            topic = extract_topic_from_conversation(recent_messages)
-            if topic != "general":
-                keywords = re.findall(r'\b\w+\b', user_message.lower())
-                memory.add_conversation_topic(topic, keywords[:4])
-        
-        if DEBUG:
-            print(f"[MegaMemory] 💭 Added to MEGA-INTELLIGENT memory for {username}")
+        # 🧠 Extraction, topics and saves run after the reply has been spoken
+        recent_messages = [exc["user"] for exc in conversation_history[username][-2:]]
+        memory_pipeline.submit(username, _extract_turn_memories, username, user_message, recent_messages,
+                               name="turn_memories")
             
     except Exception as e:
         if DEBUG:
             print(f"[MegaMemory] ❌ Enhanced memory error: {e}")
 
+def _extract_turn_memories(username, user_message, recent_messages):
+    """🧠 Post-turn job: MEGA-INTELLIGENT extraction and topic tracking"""
+    memory = get_user_memory(username)
+    
+    # Extract memories from both user message and AI response
+    memory.extract_memories_from_text(user_message)
+    
+    # Extract topic with entity awareness
+    if TOPIC_TRACKING_ENABLED:
+        topic = extract_topic_from_conversation(recent_messages)
+        if topic != "general":
+            keywords = re.findall(r'\b\w+\b', user_message.lower())
+            memory.add_conversation_topic(topic, keywords[:4])
+    
+    if DEBUG:
+        print(f"[MegaMemory] 💭 Added to MEGA-INTELLIGENT memory for {username}")
+
 def get_conversation_context(username):
-    """🧠 Get MEGA-INTELLIGENT conversation context"""
+    """🧠 Get MEGA-INTELLIGENT conversation context, packed to MAX_CONTEXT_TOKENS"""
     try:
-        context_parts = []
+        # Previous turn's memories must land before we read them
+        memory_pipeline.wait_for_user(username)
         
-        if username in conversation_history and conversation_history[username]:
-            history = conversation_history[username]
-            
-            context_length = CONVERSATION_CONTEXT_LENGTH if ENHANCED_CONVERSATION_MEMORY else 2
-            recent_exchanges = history[-context_length:]
-            
-            if (CONVERSATION_SUMMARY_ENABLED and 
-                len(history) > CONVERSATION_SUMMARY_THRESHOLD):
-                summary = summarize_old_conversation(history)
-                if summary:
-                    context_parts.append(f"Conversation summary: {summary}")
-                    context_parts.append("")
-            
-            for exchange in recent_exchanges:
-                user_msg = exchange["user"][:120]
-                ai_msg = exchange["assistant"][:120]
-                context_parts.append(f"Human: {user_msg}")
-                context_parts.append(f"Assistant: {ai_msg}")
-        
-        # 🧠 MEGA-INTELLIGENT: Enhanced memory context
-        memory = get_user_memory(username)
-        memory_context = memory.get_contextual_memory_for_response()
-        follow_ups = memory.get_follow_up_questions()
-        
-        if memory_context:
-            context_parts.append(f"\n🧠 MEGA-INTELLIGENT Memory Context for {username}:")
-            context_parts.append(memory_context)
-        
-        if follow_ups:
-            context_parts.append(f"\nSuggested follow-up questions:")
-            context_parts.extend(follow_ups)
-        
-        full_context = "\n".join(context_parts)
-        
-        if CONTEXT_COMPRESSION_ENABLED and len(full_context) > MAX_CONTEXT_TOKENS * 4:
-            full_context = full_context[:MAX_CONTEXT_TOKENS * 4]
-            full_context += "\n[Context trimmed for optimization]"
+        # Cached per-user sections; only new turns / changed memories are re-tokenized
+        from ai.context_builder import context_builder
+        budget = MAX_CONTEXT_TOKENS if CONTEXT_COMPRESSION_ENABLED else None
+        full_context = context_builder.build(username, budget, include_reminders=False).render()
         
         if DEBUG and ENHANCED_CONVERSATION_MEMORY:
             print(f"[MegaMemory] 🧠 MEGA-INTELLIGENT context generated")
@@ -1041,25 +1017,34 @@ def summarize_old_conversation(history: List[Dict]) -> str:
     topics = set()
     
     for exchange in old_exchanges:
-        user_msg = exchange["user"].lower()
-        if any(word in user_msg for word in ["cat", "cats", "kitten", "feline"]):
-            topics.add("cats")
-        if any(word in user_msg for word in ["work", "job", "office", "boss"]):
-            topics.add("work")
-        if any(word in user_msg for word in ["family", "mom", "dad", "parent"]):
-            topics.add("family")
-        if any(word in user_msg for word in ["vacation", "travel", "trip"]):
-            topics.add("vacation")
-        if any(word in user_msg for word in ["food", "cooking", "restaurant"]):
-            topics.add("food")
-        # 🧠 NEW: Loss and grief detection
-        if any(word in user_msg for word in ["died", "death", "passed", "loss", "grief"]):
-            topics.add("loss_and_grief")
+        topics.update(exchange_summary_topics(exchange))
     
+    return format_conversation_summary(topics, len(old_exchanges))
+
+def exchange_summary_topics(exchange: Dict) -> set:
+    """Summary topics mentioned in one exchange (cached per exchange by the context builder)"""
+    topics = set()
+    user_msg = exchange["user"].lower()
+    if any(word in user_msg for word in ["cat", "cats", "kitten", "feline"]):
+        topics.add("cats")
+    if any(word in user_msg for word in ["work", "job", "office", "boss"]):
+        topics.add("work")
+    if any(word in user_msg for word in ["family", "mom", "dad", "parent"]):
+        topics.add("family")
+    if any(word in user_msg for word in ["vacation", "travel", "trip"]):
+        topics.add("vacation")
+    if any(word in user_msg for word in ["food", "cooking", "restaurant"]):
+        topics.add("food")
+    # 🧠 NEW: Loss and grief detection
+    if any(word in user_msg for word in ["died", "death", "passed", "loss", "grief"]):
+        topics.add("loss_and_grief")
+    return topics
+
+def format_conversation_summary(topics, old_exchange_count: int) -> str:
     if topics:
         return f"Earlier we discussed: {', '.join(sorted(topics))}"
     
-    return f"Earlier conversation ({len(old_exchanges)} exchanges)"
+    return f"Earlier conversation ({old_exchange_count} exchanges)"
 
 # 🧠 NEW: Response validation function
 def validate_ai_response_appropriateness(username: str, proposed_response: str) -> Tuple[bool, str]:
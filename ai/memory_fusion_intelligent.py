@@ -1,12 +1,23 @@
 # ai/memory_fusion_intelligent.py - LLM-Powered Memory Fusion using Hermes 3 Pro Mistral
+import hashlib
 import json
 import os
+import re
 import shutil
+import threading
+import time
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 from pathlib import Path
 from ai.memory import get_user_memory, UserMemorySystem
 from ai.chat import ask_kobold
+from ai.llm_scheduler import llm_scheduler, FUSION_ANALYSIS
+from config import (
+    IDENTITY_RESOLUTION_BACKGROUND,
+    IDENTITY_REFRESH_SECONDS,
+    IDENTITY_MIN_SHARED_TOKENS,
+)
+from utils.persistence import persistence_service, atomic_write_json
 
 class IntelligentMemoryAnalyzer:
     """🧠 Use Hermes 3 Pro Mistral for smart memory analysis"""
@@ -30,8 +41,13 @@ class IntelligentMemoryAnalyzer:
         with open(self.cluster_file, 'w') as f:
             json.dump(self.clusters, f, indent=2)
     
-    def analyze_user_similarity_intelligent(self, user1: str, user2: str) -> Tuple[float, str]:
-        """🧠 Use Hermes 3 Pro Mistral to analyze user similarity"""
+    def analyze_user_similarity_intelligent(self, user1: str, user2: str, allow_fallback: bool = True) -> Optional[Tuple[float, str]]:
+        """🧠 Use Hermes 3 Pro Mistral to analyze user similarity
+        
+        If the LLM is unreachable or returns unusable JSON, the basic fallback
+        score is returned - or None with allow_fallback=False, so callers that
+        cache verdicts can tell a real LLM verdict from a guess.
+        """
         
         print(f"[IntelligentFusion] 🧠 Analyzing {user1} ↔ {user2} with Hermes 3 Pro Mistral...")
         
@@ -144,6 +160,8 @@ Analyze ONLY the actual data provided. Do not invent details."""
             print(f"[IntelligentFusion] ❌ LLM analysis error: {e}")
         
         # Fallback to basic analysis
+        if not allow_fallback:
+            return None
         return self._basic_similarity_fallback(user1, user2)
     
     def _has_sufficient_data(self, user1_data: Dict, user2_data: Dict) -> bool:
@@ -400,11 +418,233 @@ Analyze ONLY the actual data provided. Do not invent details."""
         
         return 0.1, "Basic pattern analysis - low confidence (fallback analysis)"
 
+class IdentityResolutionService:
+    """🪪 Background identity resolution with fingerprint blocking and cached pair verdicts
+    
+    The response path only does a dictionary lookup. Profile fingerprints
+    (content hash + detail tokens) are recomputed when a user's memory files
+    change, pairs that share no details are never sent to the LLM, and LLM
+    verdicts are reused until either profile's content hash changes.
+    """
+    
+    COMMON_WORDS = {
+        "the", "and", "for", "with", "that", "this", "from", "have", "has", "was", "are",
+        "user", "unknown", "likes", "like", "loves", "love", "about", "their", "they",
+        "general", "conversation", "chat", "neutral", "none", "yes", "not",
+    }
+    
+    def __init__(self, unifier):
+        self.unifier = unifier
+        self.analyzer = unifier.analyzer
+        self.verdict_file = self.analyzer.memory_base_dir / "identity_verdicts.json"
+        self.persistence_target = f"identity_verdicts:{self.verdict_file}"
+        
+        self.lock = threading.RLock()
+        self.fingerprints = {}      # username -> fingerprint dict
+        self.last_checked = {}      # username -> time of last background resolution
+        self.verdicts = {}          # "userA|userB" -> verdict dict
+        self.queued = set()
+        
+        self.stats = {
+            'lookups': 0,
+            'resolutions': 0,
+            'pairs_skipped': 0,
+            'verdict_hits': 0,
+            'llm_calls': 0,
+            'fallback_verdicts': 0,     # LLM unavailable - answered by the basic fallback, not cached
+        }
+        
+        self._load_verdicts()
+        persistence_service.register(self.persistence_target, self._write_verdicts, snapshot=self._snapshot_verdicts)
+    
+    # ------------------------------------------------------------------
+    # Response path
+    # ------------------------------------------------------------------
+    
+    def lookup(self, username: str) -> str:
+        """⚡ O(1) unified username from the cluster mappings; schedules a background refresh"""
+        with self.lock:
+            self.stats['lookups'] += 1
+            checked = self.last_checked.get(username)
+        
+        if checked is None or time.time() - checked > IDENTITY_REFRESH_SECONDS:
+            self.schedule(username)
+        
+        return self.mapped_primary(username) or username
+    
+    def mapped_primary(self, username: str) -> Optional[str]:
+        clusters = self.analyzer.clusters
+        cluster_id = clusters.get(f"mapping_{username}")
+        if cluster_id and cluster_id in clusters:
+            return clusters[cluster_id]["primary_username"]
+        return None
+    
+    def schedule(self, username: str):
+        """Queue a background resolution (deduplicated) at fusion-analysis priority"""
+        with self.lock:
+            if username in self.queued:
+                return
+            self.queued.add(username)
+        future = llm_scheduler.submit(FUSION_ANALYSIS, self._resolve, username, name=f"fusion_analysis:{username}")
+        future.add_done_callback(lambda f, username=username: self._on_resolved(username))
+    
+    def _resolve(self, username: str):
+        """LLM scheduler job; runs in idle time and is re-queued if preempted"""
+        try:
+            self.unifier.find_and_merge_intelligent(username, threshold=0.7)
+        except Exception as e:
+            print(f"[IntelligentFusion] ❌ Background identity resolution error for {username}: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    def _on_resolved(self, username: str):
+        with self.lock:
+            self.queued.discard(username)
+            self.last_checked[username] = time.time()
+            self.stats['resolutions'] += 1
+    
+    # ------------------------------------------------------------------
+    # Fingerprints
+    # ------------------------------------------------------------------
+    
+    def _file_signature(self, username: str) -> Tuple:
+        user_dir = self.analyzer.memory_base_dir / username
+        signature = []
+        try:
+            for entry in os.scandir(user_dir):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            return ()
+        return tuple(sorted(signature))
+    
+    def get_fingerprint(self, username: str) -> Dict:
+        """Cheap profile fingerprint; rebuilt only when the user's memory files change"""
+        signature = self._file_signature(username)
+        with self.lock:
+            cached = self.fingerprints.get(username)
+            if cached and cached["signature"] == signature:
+                return cached
+        
+        profile = self.analyzer._load_user_complete_profile(username)
+        content = {k: v for k, v in profile.items() if k not in ("recent_activity", "account_created")}
+        content_hash = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        
+        content_count = (
+            len(profile.get("personal_facts", {})) +
+            len(profile.get("emotional_history", [])) +
+            len(profile.get("entity_memories", {})) +
+            len(profile.get("conversation_topics", [])) +
+            len(profile.get("smart_memories", {}))
+        )
+        
+        fingerprint = {
+            "signature": signature,
+            "hash": content_hash,
+            "content_count": content_count,
+            "tokens": self._profile_tokens(profile),
+        }
+        with self.lock:
+            self.fingerprints[username] = fingerprint
+        return fingerprint
+    
+    def _profile_tokens(self, profile: Dict) -> set:
+        """Distinctive detail tokens (names, fact values, topics) plus 4-letter stems for nicknames"""
+        texts = list(profile.get("personal_facts", {}).values())
+        texts.extend(profile.get("entity_memories", {}).keys())
+        texts.extend(profile.get("conversation_topics", []))
+        
+        words = set(re.findall(r"[a-z]{3,}", " ".join(str(t) for t in texts).lower())) - self.COMMON_WORDS
+        stems = {f"{word[:4]}*" for word in words if len(word) >= 4}
+        return words | stems
+    
+    def candidate_users(self, target_username: str, existing_users: List[str]) -> List[str]:
+        """Blocking filter: both profiles must have enough data and share details"""
+        target = self.get_fingerprint(target_username)
+        if target["content_count"] < 2:
+            with self.lock:
+                self.stats['pairs_skipped'] += len(existing_users)
+            return []
+        
+        candidates = []
+        for existing_user in existing_users:
+            other = self.get_fingerprint(existing_user)
+            shared = len(target["tokens"] & other["tokens"])
+            if other["content_count"] >= 2 and shared >= IDENTITY_MIN_SHARED_TOKENS:
+                candidates.append(existing_user)
+            else:
+                with self.lock:
+                    self.stats['pairs_skipped'] += 1
+        return candidates
+    
+    # ------------------------------------------------------------------
+    # Pair verdicts
+    # ------------------------------------------------------------------
+    
+    def cached_similarity(self, user1: str, user2: str) -> Tuple[float, str]:
+        """LLM similarity for a pair, reused until either profile's content changes"""
+        hash1 = self.get_fingerprint(user1)["hash"]
+        hash2 = self.get_fingerprint(user2)["hash"]
+        pair = sorted(((user1, hash1), (user2, hash2)))
+        key = "|".join(user for user, _ in pair)
+        hashes = [h for _, h in pair]
+        
+        with self.lock:
+            verdict = self.verdicts.get(key)
+            if verdict and verdict.get("hashes") == hashes:
+                self.stats['verdict_hits'] += 1
+                print(f"[IntelligentFusion] 💾 Cached verdict {user1} ↔ {user2}: {verdict['similarity']:.2f}")
+                return verdict["similarity"], verdict["reasoning"]
+            self.stats['llm_calls'] += 1
+        
+        result = self.analyzer.analyze_user_similarity_intelligent(user1, user2, allow_fallback=False)
+        if result is None:
+            # LLM down or unparseable - use the fallback now, but don't cache it so the pair is re-checked
+            with self.lock:
+                self.stats['fallback_verdicts'] += 1
+            return self.analyzer._basic_similarity_fallback(user1, user2)
+        similarity, reasoning = result
+        
+        with self.lock:
+            self.verdicts[key] = {
+                "hashes": hashes,
+                "similarity": similarity,
+                "reasoning": reasoning,
+                "analyzed": datetime.now().isoformat(),
+            }
+        persistence_service.request_save(self.persistence_target)
+        return similarity, reasoning
+    
+    def _load_verdicts(self):
+        try:
+            if self.verdict_file.exists():
+                with open(self.verdict_file, 'r') as f:
+                    self.verdicts = json.load(f)
+                print(f"[IntelligentFusion] 📂 Loaded {len(self.verdicts)} cached identity verdicts")
+        except Exception as e:
+            print(f"[IntelligentFusion] ⚠️ Could not load identity verdicts: {e}")
+            self.verdicts = {}
+    
+    def _snapshot_verdicts(self):
+        with self.lock:
+            return dict(self.verdicts)
+    
+    def _write_verdicts(self, snapshot):
+        atomic_write_json(self.verdict_file, snapshot, indent=2)
+        return True
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return dict(self.stats, fingerprints=len(self.fingerprints), verdicts=len(self.verdicts),
+                        queued=len(self.queued))
+
 class IntelligentMemoryUnifier:
     """🧠 LLM-powered memory unification"""
     
     def __init__(self):
         self.analyzer = IntelligentMemoryAnalyzer()
+        self.resolver = IdentityResolutionService(self)
     
     def find_and_merge_intelligent(self, target_username: str, threshold: float = 0.7) -> str:
         """🧠 Intelligent detection and merging of similar users"""
@@ -435,11 +675,15 @@ class IntelligentMemoryUnifier:
         
         print(f"[IntelligentFusion] 🔍 Found {len(existing_users)} existing users to analyze: {existing_users}")
         
-        # Analyze each user with LLM
+        # Only users sharing profile details are worth an LLM call
+        candidates = self.resolver.candidate_users(target_username, existing_users)
+        print(f"[IntelligentFusion] 🎯 {len(candidates)}/{len(existing_users)} users pass the fingerprint filter: {candidates}")
+        
+        # Analyze each candidate with LLM (verdicts cached by profile content hash)
         similar_users = []
-        for existing_user in existing_users:
+        for existing_user in candidates:
             print(f"[IntelligentFusion] 🔄 Analyzing similarity with {existing_user}...")
-            similarity, reasoning = self.analyzer.analyze_user_similarity_intelligent(target_username, existing_user)
+            similarity, reasoning = self.resolver.cached_similarity(target_username, existing_user)
             
             if similarity >= threshold:
                 similar_users.append((existing_user, similarity, reasoning))
@@ -663,6 +907,9 @@ intelligent_fusion = IntelligentMemoryUnifier()
 
 def get_intelligent_unified_username(original_username: str) -> str:
     """🧠 Get intelligently unified username using Hermes 3 Pro Mistral"""
+    if IDENTITY_RESOLUTION_BACKGROUND:
+        # Served from memory; LLM analysis and merges happen on the resolver thread
+        return intelligent_fusion.resolver.lookup(original_username)
     print(f"[IntelligentFusion] 🚀 Starting intelligent memory fusion for {original_username}")
     return intelligent_fusion.find_and_merge_intelligent(original_username, threshold=0.7)
 
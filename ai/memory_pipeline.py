@@ -0,0 +1,152 @@
+# ai/memory_pipeline.py - Post-turn memory pipeline (extraction, topics, saves)
+"""
+Memory work that used to run inline on the conversational path - regex
+extraction, topic tracking, the JSON saves they trigger and the hand-off of
+LLM event detection to the scheduler - is queued here and done after the
+reply has been spoken.
+
+- Bounded queue (MEMORY_PIPELINE_MAX_PENDING); a full queue blocks the
+  producer rather than dropping memories.
+- One worker, FIFO: jobs for the same user always run in submission order.
+- Jobs wait while Buddy is still talking (up to MEMORY_PIPELINE_MAX_DEFER_SECONDS).
+- wait_for_user() is the barrier the next turn calls before it builds context,
+  so it still sees everything the previous turn extracted. LLM work a job
+  needs (smart event detection) runs inside the job for the same reason,
+  not as a separate scheduler job the barrier can't see.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from config import (
+    DEBUG,
+    MEMORY_PIPELINE_ENABLED,
+    MEMORY_PIPELINE_MAX_PENDING,
+    MEMORY_PIPELINE_BARRIER_TIMEOUT,
+    MEMORY_PIPELINE_MAX_DEFER_SECONDS,
+)
+
+
+def _reply_in_progress():
+    """True while Buddy is speaking or has audio queued or still being synthesized"""
+    try:
+        from audio.output import is_buddy_talking, audio_queue, tts_pipeline
+        return is_buddy_talking() or not audio_queue.empty() or tts_pipeline.busy()
+    except ImportError:
+        return False
+
+
+class PostTurnMemoryPipeline:
+    """🧠 Bounded, per-user ordered background queue for post-turn memory work"""
+
+    def __init__(self, enabled=MEMORY_PIPELINE_ENABLED, max_pending=MEMORY_PIPELINE_MAX_PENDING,
+                 max_defer=MEMORY_PIPELINE_MAX_DEFER_SECONDS):
+        self.enabled = enabled
+        self.max_defer = max_defer
+        self.queue = queue.Queue(maxsize=max(1, max_pending))
+        self.condition = threading.Condition()
+        self.pending = {}           # username -> queued + running jobs
+        self.worker = None
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'barrier_waits': 0,
+            'barrier_timeouts': 0,
+            'average_job_ms': 0.0,
+        }
+
+    def submit(self, username, fn, *args, name=None, **kwargs):
+        """Queue memory work for username; returns a Future"""
+        future = Future()
+        job = (username, name or getattr(fn, "__name__", "memory_job"), fn, args, kwargs, future)
+
+        if not self.enabled:
+            self._run(job)
+            return future
+
+        with self.condition:
+            self.pending[username] = self.pending.get(username, 0) + 1
+            self.stats['submitted'] += 1
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._worker_loop, name="MemoryPipeline", daemon=True)
+                self.worker.start()
+
+        if self.queue.full():
+            print(f"[MemoryPipeline] ⚠️ Queue full ({self.queue.maxsize}) - waiting for the worker")
+        self.queue.put(job)
+        return future
+
+    def wait_for_user(self, username, timeout=MEMORY_PIPELINE_BARRIER_TIMEOUT):
+        """⏳ Block until username's earlier jobs are done; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            if not self.pending.get(username):
+                return True
+            self.stats['barrier_waits'] += 1
+            while self.pending.get(username):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['barrier_timeouts'] += 1
+                    print(f"[MemoryPipeline] ⏰ Previous turn's memories for {username} still pending")
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def in_worker(self):
+        """True inside a queued job (on the pipeline's worker thread)"""
+        return threading.current_thread() is self.worker
+
+    def flush(self, timeout=10.0):
+        """Wait for every queued job (used at shutdown)"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while any(self.pending.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def get_stats(self):
+        with self.condition:
+            return dict(self.stats, queued=self.queue.qsize(),
+                        pending_users={u: n for u, n in self.pending.items() if n})
+
+    def _worker_loop(self):
+        while True:
+            job = self.queue.get()
+            # Let the reply finish playing before touching memory files
+            deadline = time.monotonic() + self.max_defer
+            while _reply_in_progress() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            try:
+                self._run(job)
+            finally:
+                with self.condition:
+                    username = job[0]
+                    self.pending[username] -= 1
+                    if not self.pending[username]:
+                        del self.pending[username]
+                    self.condition.notify_all()
+
+    def _run(self, job):
+        username, name, fn, args, kwargs, future = job
+        start_time = time.time()
+        try:
+            future.set_result(fn(*args, **kwargs))
+            with self.condition:
+                self.stats['completed'] += 1
+                elapsed_ms = (time.time() - start_time) * 1000.0
+                self.stats['average_job_ms'] += (elapsed_ms - self.stats['average_job_ms']) / self.stats['completed']
+            if DEBUG:
+                print(f"[MemoryPipeline] ✅ {name} for {username} ({(time.time() - start_time) * 1000:.0f}ms)")
+        except Exception as e:
+            with self.condition:
+                self.stats['failed'] += 1
+            print(f"[MemoryPipeline] ❌ {name} for {username} failed: {e}")
+            future.set_exception(e)
+
+
+# Global instance (worker starts on first submit)
+memory_pipeline = PostTurnMemoryPipeline()
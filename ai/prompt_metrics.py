@@ -0,0 +1,114 @@
+# ai/prompt_metrics.py - Per-turn prompt processing and time-to-first-token metrics
+"""
+Records, for every streamed reply:
+
+- shared_prefix_chars / prefix_ratio: how much of this prompt is identical to
+  the previous streamed prompt (what KoboldCpp's context cache can reuse)
+- ttft_ms: request sent -> first content token received
+- process_ms / eval_ms / input_tokens: KoboldCpp's own timings for the
+  request, read from /api/extra/perf after the stream ends
+
+If prompt processing stays small while prefix_ratio is high, the backend is
+reusing the cached prefix. A high ratio with slow processing means the cache
+was lost, e.g. a background job's prompt ran in between.
+"""
+import os
+import threading
+import time
+from collections import deque
+import requests
+from config import (
+    DEBUG,
+    KOBOLD_PERF_URL,
+    PROMPT_METRICS_ENABLED,
+    PROMPT_METRICS_HISTORY,
+)
+
+HIGH_PREFIX_RATIO = 0.8
+
+
+def serialize_prompt(messages):
+    """Flatten chat messages in the order the chat template sees them"""
+    return "\n".join(f"{m.get('role', '')}:{m.get('content', '')}" for m in messages)
+
+
+class PromptMetrics:
+    """⏱️ TTFT and prompt-processing tracking for the interactive stream"""
+
+    def __init__(self, enabled=PROMPT_METRICS_ENABLED, perf_url=KOBOLD_PERF_URL, history=PROMPT_METRICS_HISTORY):
+        self.enabled = enabled
+        self.perf_url = perf_url
+        self.turns = deque(maxlen=max(1, history))
+        self.last_prompt = None
+        self.lock = threading.Lock()
+
+    def start(self, messages):
+        """Call right before the request is sent; returns the turn record"""
+        if not self.enabled:
+            return None
+        prompt = serialize_prompt(messages)
+        with self.lock:
+            previous, self.last_prompt = self.last_prompt, prompt
+        shared = len(os.path.commonprefix([previous, prompt])) if previous else 0
+        return {
+            'started': time.perf_counter(),
+            'prompt_chars': len(prompt),
+            'shared_prefix_chars': shared,
+            'prefix_ratio': shared / len(prompt) if prompt else 0.0,
+            'ttft_ms': None,
+        }
+
+    def first_token(self, turn):
+        if turn is not None and turn['ttft_ms'] is None:
+            turn['ttft_ms'] = (time.perf_counter() - turn['started']) * 1000.0
+
+    def finish(self, turn, session=None):
+        """Call after the stream ends; pulls KoboldCpp's timings for the request"""
+        if turn is None:
+            return
+        turn['total_ms'] = (time.perf_counter() - turn.pop('started')) * 1000.0
+
+        try:
+            perf = (session or requests).get(self.perf_url, timeout=1).json()
+            turn['process_ms'] = float(perf.get('last_process', 0.0)) * 1000.0
+            turn['eval_ms'] = float(perf.get('last_eval', 0.0)) * 1000.0
+            turn['input_tokens'] = perf.get('last_input_count')
+            turn['output_tokens'] = perf.get('last_token_count')
+        except Exception as e:
+            if DEBUG:
+                print(f"[PromptMetrics] ⚠️ Perf endpoint unavailable: {e}")
+
+        with self.lock:
+            self.turns.append(turn)
+
+        process = f", prompt processing {turn['process_ms']:.0f}ms" if 'process_ms' in turn else ""
+        tokens = f" for {turn['input_tokens']} tokens" if turn.get('input_tokens') else ""
+        ttft = f"{turn['ttft_ms']:.0f}ms" if turn['ttft_ms'] is not None else "n/a"
+        print(f"[PromptMetrics] ⏱️ TTFT {ttft}{process}{tokens}, shared prefix {turn['prefix_ratio']:.0%}")
+
+    def get_stats(self):
+        with self.lock:
+            turns = list(self.turns)
+
+        def average(key, subset):
+            values = [t[key] for t in subset if t.get(key) is not None]
+            return sum(values) / len(values) if values else None
+
+        reused = [t for t in turns if t['prefix_ratio'] >= HIGH_PREFIX_RATIO]
+        fresh = [t for t in turns if t['prefix_ratio'] < HIGH_PREFIX_RATIO]
+        return {
+            'turns': len(turns),
+            'average_ttft_ms': average('ttft_ms', turns),
+            'average_process_ms': average('process_ms', turns),
+            'average_prefix_ratio': average('prefix_ratio', turns),
+            'prefix_reuse_turns': len(reused),
+            'average_ttft_ms_prefix_reused': average('ttft_ms', reused),
+            'average_ttft_ms_prefix_changed': average('ttft_ms', fresh),
+            'average_process_ms_prefix_reused': average('process_ms', reused),
+            'average_process_ms_prefix_changed': average('process_ms', fresh),
+            'last': turns[-1] if turns else None,
+        }
+
+
+# Global instance
+prompt_metrics = PromptMetrics()
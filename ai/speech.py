@@ -2,47 +2,140 @@
 import asyncio
 import json
 import numpy as np
-import websockets
-from config import FASTER_WHISPER_WS, DEBUG
+from config import DEBUG, SAMPLE_RATE
+from ai.stt_client import stt_client
 import re
 import os
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 
 async def whisper_stt_async(audio):
-    """Transcribe audio using Whisper WebSocket"""
+    """Transcribe audio using Whisper WebSocket (via the persistent STT client)"""
     try:
-        if audio.dtype != np.int16:
-            if np.issubdtype(audio.dtype, np.floating):
-                audio = (audio * 32767).clip(-32768, 32767).astype(np.int16)
-            else:
-                audio = audio.astype(np.int16)
-        
-        async with websockets.connect(FASTER_WHISPER_WS, ping_interval=None) as ws:
-            await ws.send(audio.tobytes())
-            await ws.send("end")
-            
-            try:
-                message = await asyncio.wait_for(ws.recv(), timeout=15)
-            except asyncio.TimeoutError:
-                print("[Buddy V2] Whisper timeout")
-                return ""
-            
-            try:
-                data = json.loads(message)
-                text = data.get("text", "").strip()
-                if DEBUG:
-                    print(f"[Buddy V2] 📝 Whisper: '{text}'")
-                return text
-            except:
-                text = message.decode("utf-8") if isinstance(message, bytes) else message
-                if DEBUG:
-                    print(f"[Buddy V2] 📝 Whisper: '{text}'")
-                return text.strip()
-                
+        return await asyncio.wrap_future(stt_client.submit(audio))
     except Exception as e:
         print(f"[Buddy V2] Whisper error: {e}")
         return ""
 
+class IncrementalTranscriber:
+    """📝 Rolling partial transcript: captured audio is transcribed segment by segment while the user speaks
+    
+    The caller appends audio as it is captured and commits a segment at natural
+    pauses; each segment is sent to Whisper straight away. At end of turn only
+    the uncommitted tail needs transcribing (or nothing, if it is silence).
+    """
+    
+    def __init__(self, on_partial=None):
+        self.on_partial = on_partial
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.reset()
+    
+    def reset(self):
+        """Discard everything (new turn); late results from the old turn are ignored"""
+        with self.lock:
+            self.generation += 1
+            self.pending = []
+            self.pending_samples = 0
+            self.segment_futures = []
+            self.segment_texts = {}
+    
+    def add_audio(self, chunk):
+        with self.lock:
+            self.pending.append(np.asarray(chunk, dtype=np.int16))
+            self.pending_samples += len(chunk)
+    
+    def pending_seconds(self):
+        return self.pending_samples / SAMPLE_RATE
+    
+    def commit(self):
+        """Send the pending audio as the next segment; returns False if there was none"""
+        with self.lock:
+            if not self.pending:
+                return False
+            audio = np.concatenate(self.pending)
+            self.pending = []
+            self.pending_samples = 0
+            index = len(self.segment_futures)
+            generation = self.generation
+            future = stt_client.submit(audio)
+            self.segment_futures.append(future)
+        
+        future.add_done_callback(lambda done: self._segment_done(generation, index, done))
+        if DEBUG:
+            print(f"[Speech] 📤 Partial segment {index + 1}: {len(audio) / SAMPLE_RATE:.1f}s")
+        return True
+    
+    def _segment_done(self, generation, index, future):
+        try:
+            text = future.result()
+        except Exception:
+            text = ""
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.segment_texts[index] = text
+            partial = self._partial_locked()
+        if self.on_partial and partial:
+            try:
+                self.on_partial(partial)
+            except Exception as e:
+                print(f"[Speech] ⚠️ Partial transcript callback error: {e}")
+    
+    def _partial_locked(self):
+        texts = []
+        for index in range(len(self.segment_futures)):
+            if index not in self.segment_texts:
+                break  # Only the in-order completed prefix
+            if self.segment_texts[index]:
+                texts.append(self.segment_texts[index])
+        return " ".join(texts)
+    
+    @property
+    def partial_text(self):
+        with self.lock:
+            return self._partial_locked()
+    
+    def finalize(self, include_pending=True):
+        """Future resolving to the full transcript once every segment is back"""
+        if include_pending:
+            self.commit()
+        else:
+            with self.lock:
+                self.pending = []
+                self.pending_samples = 0
+        
+        with self.lock:
+            futures = list(self.segment_futures)
+        
+        final = Future()
+        if not futures:
+            final.set_result("")
+            return final
+        
+        remaining = [len(futures)]
+        remaining_lock = threading.Lock()
+        
+        def segment_finished(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            texts = []
+            for future in futures:
+                try:
+                    text = future.result()
+                except Exception:
+                    text = ""
+                if text:
+                    texts.append(text)
+            final.set_result(" ".join(texts))
+        
+        for future in futures:
+            future.add_done_callback(segment_finished)
+        return final
+
 def extract_spoken_name(text: str, system_username: str) -> str:
     """Extract the user's actual spoken name using KoboldCPP intelligence"""
     
@@ -175,5 +268,9 @@ def identify_user(spoken_input: str, system_username: str) -> str:
     return system_username
 
 def transcribe_audio(audio):
-    """Synchronous wrapper for Whisper STT"""
-    return asyncio.run(whisper_stt_async(audio))
\ No newline at end of file
+    """Synchronous Whisper STT - reuses the STT client's event loop and pooled connection"""
+    return stt_client.transcribe(audio)
+
+def transcribe_audio_async(audio):
+    """Non-blocking Whisper STT - returns a concurrent.futures.Future with the text"""
+    return stt_client.submit(audio)
\ No newline at end of file
@@ -0,0 +1,483 @@
+# ai/stream_segmenter.py - Incremental sentence/phrase chunker for streamed replies
+"""
+Splits a token stream into speakable chunks for TTS, with the same rules the
+streaming chat path always used:
+
+- First chunk, once MIN_WORDS_FOR_FIRST_CHUNK words are buffered: the first
+  complete sentence (4+ words), else the first natural phrase break - comma,
+  semicolon, colon, "and", "but", "so", "because", "however" (5+ words), else
+  up to 12 words once ~45% of the expected reply has arrived.
+- Later chunks: every complete sentence of 3+ words, and once 8+ words are
+  pending without one, everything up to the last comma/semicolon/colon/"and"/
+  "but"/"so" (4+ words).
+- Whatever is left (2+ words) when the stream ends.
+
+The old loop re-split the whole buffer and re-ran uncompiled regexes over it
+on every token delta. Here the word count is kept incrementally and each rule
+remembers how far it has scanned, so a delta only costs the new characters
+(plus the few before them that could complete a match).
+
+Replay benchmark against the old loop:
+    python -m ai.stream_segmenter --bench [recorded.sse ...]
+Streams are recorded to STREAM_RECORD_DIR when it is set.
+"""
+import glob
+import json
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from config import MAX_TOKENS, STREAM_RECORD_DIR
+
+MIN_WORDS_FOR_FIRST_CHUNK = 8       # Minimum words before considering first chunk
+TARGET_COMPLETION_PERCENTAGE = 0.45  # Target 45% completion for a forced first chunk
+MIN_WORDS_FIRST_SENTENCE = 4
+MIN_WORDS_FIRST_PHRASE = 5
+MIN_WORDS_SENTENCE = 3
+MIN_WORDS_BEFORE_PAUSE = 8
+MIN_WORDS_PAUSE = 4
+MIN_WORDS_FINAL = 2
+
+# kind: first_sentence, first_phrase, first_target, sentence, pause, final
+# detail: completion percentage for first_target, otherwise None
+StreamChunk = namedtuple('StreamChunk', 'text kind detail')
+
+_SENTENCE_END = re.compile(r'[.!?]+\s+')
+_SENTENCE_PUNCT = '.!?'
+
+
+def parse_sse_line(line_text):
+    """Content of one OpenAI-style SSE line -> (content, done)"""
+    if not line_text.strip() or line_text.startswith(':') or not line_text.startswith('data: '):
+        return "", False
+
+    data_content = line_text[6:]
+    if data_content.strip() == '[DONE]':
+        return "", True
+
+    try:
+        chunk_data = json.loads(data_content)
+    except json.JSONDecodeError:
+        return "", False
+
+    content = ""
+    if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
+        choice = chunk_data['choices'][0]
+        if 'delta' in choice and 'content' in choice['delta']:
+            content = choice['delta']['content']
+        elif 'message' in choice and 'content' in choice['message']:
+            content = choice['message']['content']
+    return content or "", False
+
+
+def _count_words(text):
+    return len(text.split())
+
+
+def _resume_point(buffer, floor, span):
+    """Earliest index a match still incomplete at the end of buffer could start at"""
+    position = max(floor, len(buffer) - span)
+    while position > floor and buffer[position - 1].isspace():
+        position -= 1
+    return position
+
+
+class _FirstBreak:
+    """First occurrence of a break, as the anchored ^(.*?X) first-chunk regexes see it"""
+
+    __slots__ = ('regex', 'span', 'min_words', 'scan', 'resolved', 'end', 'words')
+
+    def __init__(self, regex, span, min_words):
+        self.regex = regex
+        self.span = span
+        self.min_words = min_words
+        self.reset()
+
+    def reset(self):
+        self.scan = 0
+        self.resolved = False
+        self.end = None         # Chunk is buffer[:end].strip(); None = can never match
+        self.words = 0
+
+    def update(self, buffer, first_newline):
+        if self.resolved:
+            return
+        match = self.regex.search(buffer, self.scan)
+        if match is None:
+            self.scan = _resume_point(buffer, 0, self.span)
+            return
+        # The first occurrence is final; '.' in the old pattern never crossed a newline
+        self.resolved = True
+        if first_newline is None or match.start() <= first_newline:
+            self.end = match.end()
+            self.words = _count_words(buffer[:self.end])
+
+    def ready(self):
+        return self.end is not None and self.words >= self.min_words
+
+
+class _LastBreak:
+    """Last finditer() match of a ([^.!?]*?X)\\s+ pause pattern, kept up to date incrementally"""
+
+    __slots__ = ('regex', 'span', 'scan', 'found', 'start', 'end', 'match_end', 'open', 'words')
+
+    def __init__(self, regex, span):
+        self.regex = regex
+        self.span = span
+        self.reset()
+
+    def reset(self):
+        self.scan = 0
+        self.found = False
+        self.start = 0          # Chunk is buffer[start:end].strip()
+        self.end = 0
+        self.match_end = 0      # Next match can't start before this
+        self.open = False       # Trailing whitespace reached the end of the buffer
+        self.words = 0
+
+    def update(self, buffer):
+        if self.open:
+            # Greedy \s+ keeps growing while more whitespace arrives
+            match_end = self.match_end
+            while match_end < len(buffer) and buffer[match_end].isspace():
+                match_end += 1
+            self.match_end = match_end
+            self.open = match_end == len(buffer)
+            self.scan = max(self.scan, match_end)
+
+        position = self.scan
+        while True:
+            match = self.regex.search(buffer, position)
+            if match is None:
+                break
+            point = match.start()
+            previous_end = self.match_end
+            # [^.!?]*? can't cross sentence punctuation, so the match starts after the last one
+            last_punct = max(buffer.rfind(c, previous_end, point) for c in _SENTENCE_PUNCT)
+            self.found = True
+            self.start = max(previous_end, last_punct + 1)
+            self.end = match.end(1)
+            self.match_end = match.end()
+            self.open = self.match_end == len(buffer)
+            self.words = _count_words(buffer[self.start:self.end])
+            position = self.match_end
+        self.scan = _resume_point(buffer, self.match_end, self.span)
+
+
+def _word_break(word):
+    """Pattern for a break before/at a conjunction, plus its partial-match span"""
+    return re.compile(r'\s+(' + word + r')\s+'), len(word) + 1
+
+
+class IncrementalSentenceSegmenter:
+    """✂️ Feed token deltas, get speakable chunks back as soon as they're complete"""
+
+    def __init__(self, max_tokens=MAX_TOKENS):
+        self.estimated_total_words = max_tokens // 1.3  # Rough estimate of final word count
+        self.target_words = int(self.estimated_total_words * TARGET_COMPLETION_PERCENTAGE)
+
+        self.first_breaks = [
+            _FirstBreak(re.compile(r'[.!?](?=\s)'), 1, MIN_WORDS_FIRST_SENTENCE),
+            _FirstBreak(re.compile(r',(?=\s)'), 1, MIN_WORDS_FIRST_PHRASE),
+            _FirstBreak(re.compile(r';(?=\s)'), 1, MIN_WORDS_FIRST_PHRASE),
+            _FirstBreak(re.compile(r':(?=\s)'), 1, MIN_WORDS_FIRST_PHRASE),
+        ] + [
+            _FirstBreak(re.compile(r'\s+' + word + r'(?=\s)'), len(word) + 1, MIN_WORDS_FIRST_PHRASE)
+            for word in ('and', 'but', 'so', 'because', 'however')
+        ]
+        self.pause_breaks = [
+            _LastBreak(re.compile(r'(,)\s+'), 1),
+            _LastBreak(re.compile(r'(;)\s+'), 1),
+            _LastBreak(re.compile(r'(:)\s+'), 1),
+        ] + [_LastBreak(*_word_break(word)) for word in ('and', 'but', 'so')]
+
+        self.buffer = ""
+        self.word_count = 0
+        self.first_newline = None
+        self.first_chunk_sent = False
+        self.sentence_scan = 0
+
+    def feed(self, text):
+        """Append a token delta; returns the chunks it completed"""
+        if not text:
+            return []
+
+        buffer = self.buffer
+        if buffer and not buffer[-1].isspace() and not text[0].isspace():
+            self.word_count -= 1    # Delta continues the last word
+        self.word_count += _count_words(text)
+        if self.first_newline is None and '\n' in text:
+            self.first_newline = len(buffer) + text.index('\n')
+        self.buffer = buffer + text
+
+        if not self.first_chunk_sent:
+            if self.word_count >= MIN_WORDS_FOR_FIRST_CHUNK:
+                return self._first_chunk()
+            return []
+        return self._next_chunks()
+
+    def flush(self):
+        """End of stream; returns the final chunk, if any"""
+        final_chunk = self.buffer.strip()
+        self._set_buffer("")
+        if final_chunk and _count_words(final_chunk) >= MIN_WORDS_FINAL:
+            return [StreamChunk(final_chunk, 'final', None)]
+        return []
+
+    def _set_buffer(self, buffer):
+        self.buffer = buffer
+        self.word_count = _count_words(buffer)
+        for pause in self.pause_breaks:
+            pause.reset()
+
+    def _first_chunk(self):
+        buffer = self.buffer
+        for index, rule in enumerate(self.first_breaks):
+            rule.update(buffer, self.first_newline)
+            if rule.ready():
+                kind = 'first_sentence' if index == 0 else 'first_phrase'
+                return self._start_stream(StreamChunk(buffer[:rule.end].strip(), kind, None),
+                                          buffer[rule.end:].strip())
+
+        if self.word_count >= self.target_words:
+            # Take a reasonable chunk that doesn't cut words
+            words = buffer.split()
+            chunk_size = min(12, len(words))  # Up to 12 words
+            first_chunk = ' '.join(words[:chunk_size])
+
+            # Ensure we don't cut off mid-sentence awkwardly
+            if not first_chunk.endswith(('.', '!', '?', ',', ';', ':')):
+                for i in range(chunk_size - 1, 4, -1):  # Work backwards
+                    test_chunk = ' '.join(words[:i])
+                    if test_chunk.endswith((',', ';', ':')):
+                        first_chunk = test_chunk
+                        chunk_size = i
+                        break
+
+            completion_pct = (self.word_count / self.estimated_total_words) * 100 if self.estimated_total_words else 100.0
+            return self._start_stream(StreamChunk(first_chunk, 'first_target', completion_pct),
+                                      ' '.join(words[chunk_size:]))
+        return []
+
+    def _start_stream(self, chunk, remainder):
+        self.first_chunk_sent = True
+        self.sentence_scan = 0
+        self._set_buffer(remainder)
+        return [chunk]
+
+    def _next_chunks(self):
+        chunks = []
+        buffer = self.buffer
+
+        # Complete sentences (highest priority); short ones merge into the next
+        consumed = 0
+        position = self.sentence_scan
+        while True:
+            match = _SENTENCE_END.search(buffer, position)
+            if match is None:
+                break
+            sentence = buffer[consumed:match.end()].strip()
+            if sentence and _count_words(sentence) >= MIN_WORDS_SENTENCE:
+                chunks.append(StreamChunk(sentence, 'sentence', None))
+                consumed = match.end()
+            position = match.end()
+
+        # "word." at the very end may still get its whitespace
+        resume = len(buffer)
+        while resume > position and buffer[resume - 1] in _SENTENCE_PUNCT:
+            resume -= 1
+        self.sentence_scan = resume - consumed
+        if consumed:
+            buffer = buffer[consumed:]
+            self._set_buffer(buffer)
+
+        # Natural phrase breaks (second priority)
+        if self.word_count >= MIN_WORDS_BEFORE_PAUSE:
+            for pause in self.pause_breaks:
+                pause.update(buffer)
+                if pause.found and pause.words >= MIN_WORDS_PAUSE:
+                    chunks.append(StreamChunk(buffer[pause.start:pause.end].strip(), 'pause', None))
+                    cut = pause.match_end
+                    self.sentence_scan = max(0, self.sentence_scan - cut)
+                    self._set_buffer(buffer[cut:])
+                    break
+        return chunks
+
+
+# ----------------------------------------------------------------------
+# Recording and replay
+# ----------------------------------------------------------------------
+
+def record_sse_stream(lines, directory=STREAM_RECORD_DIR):
+    """Save one stream's raw SSE lines for replay; no-op unless STREAM_RECORD_DIR is set"""
+    if not directory or not lines:
+        return None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"stream_{time.strftime('%Y%m%d_%H%M%S')}_{int(time.time() * 1000) % 1000:03d}.sse")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+    except Exception as e:
+        print(f"[StreamSegmenter] ⚠️ Could not record stream: {e}")
+        return None
+
+
+def load_sse_deltas(path):
+    """Token deltas of a recorded .sse file"""
+    deltas = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            content, done = parse_sse_line(line.rstrip('\n'))
+            if done:
+                break
+            if content:
+                deltas.append(content)
+    return deltas
+
+
+def _legacy_chunks(deltas, max_tokens=MAX_TOKENS):
+    """The pre-segmenter loop from ask_kobold_streaming, kept as the benchmark baseline"""
+    buffer = ""
+    first_chunk_sent = False
+    estimated_total_words = max_tokens // 1.3
+    TARGET_WORDS = int(estimated_total_words * TARGET_COMPLETION_PERCENTAGE)
+    for content in deltas:
+        buffer += content
+        word_count = len(buffer.split())
+        if not first_chunk_sent and word_count >= MIN_WORDS_FOR_FIRST_CHUNK:
+            sentence_match = re.search(r'^(.*?[.!?])\s+', buffer)
+            if sentence_match:
+                first_chunk = sentence_match.group(1).strip()
+                if len(first_chunk.split()) >= 4:
+                    first_chunk_sent = True
+                    yield first_chunk
+                    buffer = buffer[sentence_match.end():].strip()
+                    continue
+            phrase_patterns = [
+                r'^(.*?,)\s+', r'^(.*?;\s+)', r'^(.*?:\s+)', r'^(.*?\s+and\s+)',
+                r'^(.*?\s+but\s+)', r'^(.*?\s+so\s+)', r'^(.*?\s+because\s+)', r'^(.*?\s+however\s+)',
+            ]
+            for pattern in phrase_patterns:
+                phrase_match = re.search(pattern, buffer)
+                if phrase_match:
+                    first_chunk = phrase_match.group(1).strip()
+                    if len(first_chunk.split()) >= 5:
+                        first_chunk_sent = True
+                        yield first_chunk
+                        buffer = buffer[phrase_match.end():].strip()
+                        break
+            if not first_chunk_sent and word_count >= TARGET_WORDS:
+                words = buffer.split()
+                chunk_size = min(12, len(words))
+                first_chunk = ' '.join(words[:chunk_size])
+                if not first_chunk.endswith(('.', '!', '?', ',', ';', ':')):
+                    for i in range(chunk_size - 1, 4, -1):
+                        test_chunk = ' '.join(words[:i])
+                        if test_chunk.endswith((',', ';', ':')):
+                            first_chunk = test_chunk
+                            chunk_size = i
+                            break
+                first_chunk_sent = True
+                yield first_chunk
+                buffer = ' '.join(words[chunk_size:])
+        elif first_chunk_sent:
+            last_end = 0
+            for match in re.finditer(r'([.!?]+)\s+', buffer):
+                sentence = buffer[last_end:match.end()].strip()
+                if sentence and len(sentence.split()) >= 3:
+                    yield sentence
+                    last_end = match.end()
+            buffer = buffer[last_end:]
+            if len(buffer.split()) >= 8:
+                pause_patterns = [
+                    r'([^.!?]*?,)\s+', r'([^.!?]*?;\s+)', r'([^.!?]*?:\s+)',
+                    r'([^.!?]*?\s+and\s+)', r'([^.!?]*?\s+but\s+)', r'([^.!?]*?\s+so\s+)',
+                ]
+                for pattern in pause_patterns:
+                    matches = list(re.finditer(pattern, buffer))
+                    if matches:
+                        last_match = matches[-1]
+                        chunk_text = last_match.group(1).strip()
+                        if len(chunk_text.split()) >= 4:
+                            yield chunk_text
+                            buffer = buffer[last_match.end():]
+                            break
+    if buffer.strip() and len(buffer.strip().split()) >= 2:
+        yield buffer.strip()
+
+
+def segment_deltas(deltas, max_tokens=MAX_TOKENS):
+    """All chunk texts for a complete list of deltas"""
+    segmenter = IncrementalSentenceSegmenter(max_tokens)
+    chunks = []
+    for content in deltas:
+        chunks.extend(chunk.text for chunk in segmenter.feed(content))
+    chunks.extend(chunk.text for chunk in segmenter.flush())
+    return chunks
+
+
+def _tokenize_like_llm(text):
+    """Split text into word-piece sized deltas, roughly how KoboldCpp streams"""
+    return re.findall(r'\s*\S{1,4}|\s+', text)
+
+
+def _synthetic_streams():
+    reply = ("Oh nice, that sounds like a really fun weekend plan! I think the weather should hold up, "
+             "so you might want to pack a jacket just in case. Did you end up booking the cabin, or are "
+             "you still deciding between the two places? Either way, I'd love to hear how it goes.")
+    rambling = ("well I was thinking about it and honestly the whole thing kind of depends on what you want "
+                "to get out of it because there are a lot of options and some of them are cheaper but some "
+                "of them are closer so it really comes down to your priorities ")
+    return {
+        'synthetic_short_reply': _tokenize_like_llm(reply),
+        'synthetic_long_reply': _tokenize_like_llm(" ".join([reply] * 40)),
+        'synthetic_no_punctuation': _tokenize_like_llm(rambling * 40),
+    }
+
+
+def benchmark_stream_segmenter(paths=None, repeat=20, max_tokens=MAX_TOKENS):
+    """⏱️ Replay SSE streams through the old loop and the segmenter; checks they agree"""
+    if not paths and STREAM_RECORD_DIR:
+        paths = sorted(glob.glob(os.path.join(STREAM_RECORD_DIR, "*.sse")))
+    streams = {os.path.basename(p): load_sse_deltas(p) for p in (paths or [])}
+    if not streams:
+        print("[StreamSegmenter] ℹ️ No recorded streams - replaying synthetic ones")
+        streams = _synthetic_streams()
+
+    results = {}
+    for name, deltas in streams.items():
+        legacy = list(_legacy_chunks(deltas, max_tokens))
+        incremental = segment_deltas(deltas, max_tokens)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(_legacy_chunks(deltas, max_tokens))
+        legacy_ms = (time.perf_counter() - start) * 1000.0 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            segment_deltas(deltas, max_tokens)
+        incremental_ms = (time.perf_counter() - start) * 1000.0 / repeat
+
+        results[name] = {
+            'deltas': len(deltas),
+            'chunks': len(incremental),
+            'identical': legacy == incremental,
+            'legacy_ms': legacy_ms,
+            'incremental_ms': incremental_ms,
+            'speedup': legacy_ms / incremental_ms if incremental_ms else None,
+        }
+        status = "✅" if legacy == incremental else "❌ chunks differ"
+        print(f"[StreamSegmenter] {name}: {len(deltas)} deltas, {len(incremental)} chunks, "
+              f"legacy {legacy_ms:.2f}ms vs incremental {incremental_ms:.2f}ms "
+              f"({results[name]['speedup']:.1f}x) {status}")
+    return results
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark_stream_segmenter([a for a in sys.argv[1:] if a != "--bench"])
+    else:
+        print("Usage: python -m ai.stream_segmenter --bench [recorded.sse ...]")
@@ -0,0 +1,284 @@
+# ai/stt_client.py - Persistent streaming client for the faster-whisper WebSocket
+"""
+Long-lived STT client.
+
+One daemon thread owns an asyncio event loop for the whole process. Connections
+to FASTER_WHISPER_WS are pooled: idle connections are reused, a closed one is
+replaced in the background (so the next utterance finds a warm connection), and
+a request that hits a dropped connection is retried once on a fresh one.
+
+Callers get a concurrent.futures.Future from submit(), or block with
+transcribe(). No event loop or connection is created per utterance.
+"""
+import asyncio
+import json
+import threading
+import time
+import numpy as np
+import websockets
+from config import (
+    FASTER_WHISPER_WS,
+    DEBUG,
+    STT_POOL_SIZE,
+    STT_CONNECT_TIMEOUT,
+    STT_RESPONSE_TIMEOUT,
+    STT_PING_INTERVAL,
+    STT_REUSE_CONNECTIONS,
+)
+
+
+def audio_to_pcm16(audio):
+    """Convert float or integer audio to int16 PCM bytes"""
+    audio = np.asarray(audio)
+    if audio.dtype != np.int16:
+        if np.issubdtype(audio.dtype, np.floating):
+            audio = (audio * 32767).clip(-32768, 32767).astype(np.int16)
+        else:
+            audio = audio.astype(np.int16)
+    return audio.tobytes()
+
+
+def parse_transcript(message):
+    """Whisper server replies with JSON {"text": ...} or a plain string"""
+    try:
+        data = json.loads(message)
+        if isinstance(data, dict):
+            return data.get("text", "").strip()
+    except (ValueError, TypeError):
+        pass
+    text = message.decode("utf-8") if isinstance(message, bytes) else str(message)
+    return text.strip()
+
+
+def _is_open(ws):
+    return ws is not None and getattr(ws, 'close_code', None) is None
+
+
+class StreamingSTTClient:
+    """🎙️ Pooled, auto-reconnecting WebSocket STT client with a future-based API"""
+
+    def __init__(self, url=FASTER_WHISPER_WS, pool_size=STT_POOL_SIZE,
+                 connect_timeout=STT_CONNECT_TIMEOUT, response_timeout=STT_RESPONSE_TIMEOUT,
+                 ping_interval=STT_PING_INTERVAL, reuse_connections=STT_REUSE_CONNECTIONS):
+        self.url = url
+        self.pool_size = max(1, pool_size)
+        self.connect_timeout = connect_timeout
+        self.response_timeout = response_timeout
+        self.ping_interval = ping_interval
+        self.reuse_connections = reuse_connections
+
+        self.loop = None
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+        # Pool state - only touched on the loop thread
+        self.idle = []
+        self.connection_count = 0
+        self.pool_condition = None
+
+        self.stats = {
+            'requests': 0,
+            'completed': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'connects': 0,
+            'reconnects': 0,
+            'reused': 0,
+            'average_latency_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Loop thread
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the event loop thread (idempotent)"""
+        with self.start_lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            ready = threading.Event()
+
+            def run():
+                self.loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self.loop)
+                self.pool_condition = asyncio.Condition()
+                ready.set()
+                self.loop.run_forever()
+
+            self.thread = threading.Thread(target=run, name="STTClientLoop", daemon=True)
+            self.thread.start()
+            ready.wait()
+            print(f"[STTClient] ✅ Event loop started for {self.url} (pool {self.pool_size})")
+
+    def close(self, timeout=2.0):
+        """Close pooled connections and stop the loop thread"""
+        if self.loop is None or not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_all(), self.loop).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, audio):
+        """Queue an utterance; returns a concurrent.futures.Future resolving to the text"""
+        self.start()
+        pcm = audio_to_pcm16(audio)
+        return asyncio.run_coroutine_threadsafe(self._transcribe(pcm), self.loop)
+
+    def transcribe(self, audio, timeout=None):
+        """Blocking transcription; returns "" on error or timeout"""
+        future = self.submit(audio)
+        try:
+            return future.result(timeout if timeout is not None else self.response_timeout + self.connect_timeout + 1)
+        except Exception as e:
+            future.cancel()
+            print(f"[STTClient] ❌ Transcription failed: {e}")
+            return ""
+
+    def warm_up(self):
+        """Open a pooled connection ahead of the first utterance"""
+        self.start()
+        asyncio.run_coroutine_threadsafe(self._prewarm(), self.loop)
+
+    def get_stats(self):
+        return dict(self.stats, idle_connections=len(self.idle), open_connections=self.connection_count)
+
+    # ------------------------------------------------------------------
+    # Pool (loop thread)
+    # ------------------------------------------------------------------
+
+    async def _connect(self):
+        ws = await asyncio.wait_for(
+            websockets.connect(self.url, ping_interval=self.ping_interval, max_size=None),
+            timeout=self.connect_timeout
+        )
+        self.stats['connects'] += 1
+        return ws
+
+    async def _acquire(self):
+        async with self.pool_condition:
+            while True:
+                while self.idle:
+                    ws = self.idle.pop()
+                    if _is_open(ws):
+                        self.stats['reused'] += 1
+                        return ws
+                    self.connection_count -= 1
+                if self.connection_count < self.pool_size:
+                    self.connection_count += 1
+                    break
+                await self.pool_condition.wait()
+        try:
+            return await self._connect()
+        except Exception:
+            async with self.pool_condition:
+                self.connection_count -= 1
+                self.pool_condition.notify()
+            raise
+
+    async def _release(self, ws, healthy):
+        async with self.pool_condition:
+            if healthy and self.reuse_connections and _is_open(ws):
+                self.idle.append(ws)
+                self.pool_condition.notify()
+                return
+            self.connection_count -= 1
+            self.pool_condition.notify()
+        await self._discard(ws)
+        # Replace it in the background so the next turn doesn't pay for the handshake
+        asyncio.ensure_future(self._prewarm())
+
+    async def _prewarm(self):
+        async with self.pool_condition:
+            if self.idle or self.connection_count >= self.pool_size:
+                return
+            self.connection_count += 1
+        try:
+            ws = await self._connect()
+        except Exception as e:
+            async with self.pool_condition:
+                self.connection_count -= 1
+                self.pool_condition.notify()
+            if DEBUG:
+                print(f"[STTClient] ⚠️ Prewarm connect failed: {e}")
+            return
+        async with self.pool_condition:
+            self.idle.append(ws)
+            self.pool_condition.notify()
+
+    async def _discard(self, ws):
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    async def _close_all(self):
+        async with self.pool_condition:
+            idle, self.idle = self.idle, []
+            self.connection_count -= len(idle)
+        for ws in idle:
+            await self._discard(ws)
+
+    # ------------------------------------------------------------------
+    # Request (loop thread)
+    # ------------------------------------------------------------------
+
+    async def _transcribe(self, pcm, retries=1):
+        self.stats['requests'] += 1
+        start_time = time.time()
+
+        for attempt in range(retries + 1):
+            try:
+                ws = await self._acquire()
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"[STTClient] ❌ Connect error: {e}")
+                return ""
+
+            healthy = False
+            try:
+                await ws.send(pcm)
+                await ws.send("end")
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=self.response_timeout)
+                except asyncio.TimeoutError:
+                    self.stats['timeouts'] += 1
+                    print("[STTClient] ⏰ Whisper timeout")
+                    return ""
+
+                healthy = True
+                text = parse_transcript(message)
+                latency_ms = (time.time() - start_time) * 1000.0
+                self.stats['completed'] += 1
+                self.stats['average_latency_ms'] += (latency_ms - self.stats['average_latency_ms']) / self.stats['completed']
+                if DEBUG:
+                    print(f"[STTClient] 📝 Whisper ({latency_ms:.0f}ms): '{text}'")
+                return text
+
+            except websockets.exceptions.ConnectionClosed as e:
+                # Stale pooled connection (server restarted or closes after each reply)
+                if attempt < retries:
+                    self.stats['reconnects'] += 1
+                    if DEBUG:
+                        print(f"[STTClient] 🔄 Connection closed ({e}), retrying on a fresh connection")
+                    continue
+                self.stats['errors'] += 1
+                print(f"[STTClient] ❌ Whisper connection error: {e}")
+                return ""
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"[STTClient] ❌ Whisper error: {e}")
+                return ""
+            finally:
+                await self._release(ws, healthy)
+        return ""
+
+
+# Global instance (loop thread starts on first use)
+stt_client = StreamingSTTClient()
@@ -10,6 +10,8 @@ from collections import deque
 from config import *
 
 from audio.smart_aec import smart_aec
+from audio.ring_buffer import AudioRingBuffer
+from ai.llm_scheduler import llm_scheduler
 
 try:
     from audio.smart_detection_manager import analyze_speech_detection, get_current_threshold
@@ -57,10 +59,31 @@ class FullDuplexManager:
         self.user_speech_detection_active = True  # Always detect user speech start
         self.interrupt_detection_active = False  # Only during Buddy speech
 
-        # Buffers
-        self.mic_buffer = deque(maxlen=8000)
-        self.speech_buffer = deque(maxlen=240000)
-        self.pre_speech_buffer = deque(maxlen=32000)
+        # Buffers (preallocated int16 rings: bulk writes, zero-copy tail reads)
+        self.mic_buffer = AudioRingBuffer(8000)
+        self.speech_buffer = AudioRingBuffer(240000)
+        self.pre_speech_buffer = AudioRingBuffer(32000)
+
+        # ✅ FRAME-DRIVEN VAD: every hop of new audio is analyzed exactly once
+        self.vad_hop_size = VAD_HOP_SIZE
+        self.vad_window_size = max(VAD_WINDOW_SIZE, VAD_HOP_SIZE)
+        self.vad_buffer = AudioRingBuffer(max(SAMPLE_RATE, self.vad_window_size * 4))
+        self._vad_pending = 0
+        self._consecutive_silence_frames = 0
+        self._last_vad_debug_time = 0
+        self.vad_stats = {'frames_analyzed': 0, 'frames_skipped': 0, 'chunks_dropped': 0}
+
+        # Captured user speech (list of chunks) and trailing padding still to capture
+        self._captured_chunks = []
+        self._capture_padding_remaining = 0
+
+        # ✅ INCREMENTAL STT: segments are transcribed during USER_SPEAKING
+        self.incremental_stt = STT_INCREMENTAL
+        self.transcriber = None
+        self._speech_since_commit = False
+        self.partial_transcript = ""
+        self.early_intent = None
+        self.early_intent_detectors = {}
 
         # ✅ TURN-BASED: Different thresholds for different modes
         self.user_speech_threshold = USER_SPEECH_THRESHOLD
@@ -133,9 +156,15 @@ class FullDuplexManager:
         # Reset interrupt flag on start
         self.reset_interrupt_flag()
         
+        # Open the STT connection now so the first utterance doesn't pay for the handshake
+        try:
+            from ai.stt_client import stt_client
+            stt_client.warm_up()
+        except Exception as e:
+            print(f"[FullDuplex] ⚠️ STT warm-up failed: {e}")
+        
         self.threads = [
             threading.Thread(target=self._audio_input_worker, daemon=True),
-            threading.Thread(target=self._turn_based_processor, daemon=True),
             threading.Thread(target=self._speech_processor, daemon=True),
             threading.Thread(target=self._conversation_state_manager, daemon=True),
             threading.Thread(target=self._noise_tracker, daemon=True),
@@ -144,11 +173,16 @@ class FullDuplexManager:
         for thread in self.threads:
             thread.start()
         print("[FullDuplex] ✅ TURN-BASED Full duplex started with interrupt handling")
+        print(f"[FullDuplex] 🧠 SMART PROCESSOR: Frame-driven detection (hop {self.vad_hop_size}, window {self.vad_window_size} samples)")
 
     def stop(self):
         """Stop the turn-based manager"""
         self.running = False
         self.listening = False
+        try:
+            self.input_queue.put_nowait(None)  # Wake the frame worker so it can exit
+        except queue.Full:
+            pass
         print("[FullDuplex] 🛑 TURN-BASED Full duplex stopped")
 
     def add_audio_input(self, audio_chunk):
@@ -165,8 +199,10 @@ class FullDuplexManager:
                 else:
                     processed_chunk = audio_chunk  # Raw audio during user turn
             
-            if not self.input_queue.full():
-                self.input_queue.put(processed_chunk)
+            try:
+                self.input_queue.put_nowait(processed_chunk)
+            except queue.Full:
+                self.vad_stats['chunks_dropped'] += 1
             self.mic_buffer.extend(processed_chunk)
             
         except Exception as e:
@@ -275,236 +311,268 @@ class FullDuplexManager:
                 print(f"[FullDuplex] End user turn error: {e}")
 
     def _audio_input_worker(self):
-        """Process audio input"""
+        """Frame-driven pipeline: blocks until audio arrives, buffers it, then runs VAD on the new hops"""
         while self.running:
             try:
-                audio_chunk = self.input_queue.get(timeout=0.1)
+                audio_chunk = self.input_queue.get()
+                if audio_chunk is None:
+                    break
+                
+                audio_chunk = np.asarray(audio_chunk)
                 self.speech_buffer.extend(audio_chunk)
                 
                 if self.processing:
-                    if not hasattr(self, '_captured_speech'):
-                        self._captured_speech = []
-                    self._captured_speech.extend(audio_chunk)
-            except queue.Empty:
-                continue
+                    captured = self.speech_buffer.tail(len(audio_chunk), copy=True)
+                    self._captured_chunks.append(captured)
+                    if self.transcriber is not None:
+                        self.transcriber.add_audio(captured)
+                elif self._capture_padding_remaining > 0:
+                    # Trailing padding after the user stopped, then hand the utterance off
+                    padding = self.speech_buffer.tail(min(len(audio_chunk), self._capture_padding_remaining), copy=True)
+                    self._captured_chunks.append(padding)
+                    if self.transcriber is not None:
+                        self.transcriber.add_audio(padding)
+                    self._capture_padding_remaining -= len(padding)
+                    if self._capture_padding_remaining <= 0:
+                        self._finish_user_speech_capture()
+                
+                self._process_new_frames(audio_chunk)
             except Exception as e:
                 if DEBUG:
                     print(f"[FullDuplex] Input worker error: {e}")
 
-    def _turn_based_processor(self):
-        """✅ SMART DETECTION: Turn-based processor with room-scale detection for Daveydrz"""
-        consecutive_silence_frames = 0
-        last_debug_time = 0
+    def _process_new_frames(self, audio_chunk):
+        """Analyze every complete hop that arrived with this chunk - exactly once, in order"""
+        self.vad_buffer.extend(audio_chunk)
+        self._vad_pending += len(audio_chunk)
+        
+        # A chunk larger than the analysis history can't be fully analyzed; skip the oldest hops
+        max_pending = self.vad_buffer.capacity - self.vad_window_size
+        if self._vad_pending > max_pending:
+            skipped = (self._vad_pending - max_pending + self.vad_hop_size - 1) // self.vad_hop_size
+            self._vad_pending -= skipped * self.vad_hop_size
+            self.vad_stats['frames_skipped'] += skipped
+        
+        while self._vad_pending >= self.vad_hop_size:
+            self._vad_pending -= self.vad_hop_size
+            needed = self.vad_window_size + self._vad_pending
+            if len(self.vad_buffer) < needed:
+                continue  # Not enough history for a full window yet (startup)
+            
+            frame = self.vad_buffer.tail(needed)[:self.vad_window_size]
+            self.vad_stats['frames_analyzed'] += 1
+            self._process_vad_frame(frame)
+
+    def _process_vad_frame(self, chunk):
+        """✅ SMART DETECTION: Turn-based state machine step for one analysis frame"""
+        try:
+            current_time = time.time()
 
-        print("[FullDuplex] 🧠 SMART PROCESSOR: Room-scale detection enabled")
+            with self.conversation_state_lock:
+                state = self.conversation_state
+                vad_active = self.vad_active
+                user_detection_active = self.user_speech_detection_active
+                interrupt_active = self.interrupt_detection_active
 
-        while self.running:
+            # ✅ VOICE ANALYSIS WITH SMART DETECTION
             try:
-                if len(self.speech_buffer) < 160:
-                    time.sleep(0.01)
-                    continue
-                
-                chunk = np.array(list(self.speech_buffer)[-160:])
-                current_time = time.time()
-                
-                with self.conversation_state_lock:
-                    state = self.conversation_state
-                    vad_active = self.vad_active
-                    user_detection_active = self.user_speech_detection_active
-                    interrupt_active = self.interrupt_detection_active
-
-                # ✅ VOICE ANALYSIS WITH SMART DETECTION
-                try:
-                    from audio.voice_analyzer import voice_analyzer
-                    if voice_analyzer:
-                        is_voice, voice_score, details = voice_analyzer.analyze_audio(
-                            chunk, is_buddy_speaking=(state == "BUDDY_RESPONDING")
-                        )
-                    else:
-                        # Fallback with smart detection if available
-                        volume = np.abs(chunk).mean()
-                        peak = np.max(np.abs(chunk))
-                        
-                        if SMART_DETECTION_AVAILABLE and state != "BUDDY_RESPONDING":
-                            # Use smart detection for user speech
-                            should_trigger, detection_info = analyze_speech_detection(chunk, volume)
-                            is_voice = should_trigger
-                            voice_score = detection_info.get('quality', volume / self.user_speech_threshold)
-                            details = {
-                                'volume': volume, 
-                                'peak': peak, 
-                                'combined': voice_score,
-                                'smart_detection': True,
-                                'smart_tier': detection_info['tier'],
-                                'smart_reason': detection_info['reason']
-                            }
-                        else:
-                            # Original detection for interrupts or fallback
-                            is_voice = volume > self.user_speech_threshold
-                            voice_score = min(1.0, volume / self.user_speech_threshold)
-                            details = {'volume': volume, 'peak': peak, 'combined': voice_score}
-                            
-                except Exception as e:
-                    if DEBUG:
-                        print(f"[FullDuplex] Voice analysis error: {e}")
-                    # Fallback to simple detection
+                from audio.voice_analyzer import voice_analyzer
+                if voice_analyzer:
+                    is_voice, voice_score, details = voice_analyzer.analyze_audio(
+                        chunk, is_buddy_speaking=(state == "BUDDY_RESPONDING")
+                    )
+                else:
+                    # Fallback with smart detection if available
                     volume = np.abs(chunk).mean()
                     peak = np.max(np.abs(chunk))
-                    is_voice = volume > self.user_speech_threshold
-                    voice_score = min(1.0, volume / self.user_speech_threshold)
-                    details = {'volume': volume, 'peak': peak, 'combined': voice_score}
-
-                # Extract volume for legacy compatibility
-                volume = details.get('volume', np.abs(chunk).mean())
-                peak = details.get('peak', np.max(np.abs(chunk)))
-
-                # ✅ STATE 1: WAITING_FOR_INPUT - SMART DETECTION INTEGRATED
-                if state == "WAITING_FOR_INPUT" and user_detection_active:
-                    if SMART_DETECTION_AVAILABLE and 'smart_detection' in details:
-                        # Use smart detection result
-                        speech_detected = is_voice
-                        if speech_detected:
-                            detection_method = f"SMART-{details['smart_tier'].upper()}"
-                        else:
-                            detection_method = "SMART-REJECTED"
+
+                    if SMART_DETECTION_AVAILABLE and state != "BUDDY_RESPONDING":
+                        # Use smart detection for user speech
+                        should_trigger, detection_info = analyze_speech_detection(chunk, volume)
+                        is_voice = should_trigger
+                        voice_score = detection_info.get('quality', volume / self.user_speech_threshold)
+                        details = {
+                            'volume': volume, 
+                            'peak': peak, 
+                            'combined': voice_score,
+                            'smart_detection': True,
+                            'smart_tier': detection_info['tier'],
+                            'smart_reason': detection_info['reason']
+                        }
                     else:
-                        # Fallback to calibrated detection for YOUR voice profile
-                        # 🎯 CALIBRATED: Background ~500, Others ~1100, YOU ~5000+, score ~0.62+
-                        background_level = 1200        # Above others talking
-                        your_voice_level = 3500        # Well below your typical 5000
-                        combined_threshold = 0.55      # Just below your typical 0.62+
-                        instant_level = 4500           # Your typical speaking volume
-                        
-                        # Multiple detection methods calibrated to YOUR voice
-                        instant_trigger = volume > instant_level  # Your strong voice
-                        volume_trigger = volume > your_voice_level  # Clear voice detection
-                        quality_trigger = voice_score > combined_threshold and volume > background_level  # Quality + volume
-                        
-                        speech_detected = instant_trigger or volume_trigger or quality_trigger
-                        detection_method = "INSTANT" if instant_trigger else ("VOLUME" if volume_trigger else "QUALITY")
-                    
+                        # Original detection for interrupts or fallback
+                        is_voice = volume > self.user_speech_threshold
+                        voice_score = min(1.0, volume / self.user_speech_threshold)
+                        details = {'volume': volume, 'peak': peak, 'combined': voice_score}
+
+            except Exception as e:
+                if DEBUG:
+                    print(f"[FullDuplex] Voice analysis error: {e}")
+                # Fallback to simple detection
+                volume = np.abs(chunk).mean()
+                peak = np.max(np.abs(chunk))
+                is_voice = volume > self.user_speech_threshold
+                voice_score = min(1.0, volume / self.user_speech_threshold)
+                details = {'volume': volume, 'peak': peak, 'combined': voice_score}
+
+            # Extract volume for legacy compatibility
+            volume = details.get('volume', np.abs(chunk).mean())
+            peak = details.get('peak', np.max(np.abs(chunk)))
+
+            # ✅ STATE 1: WAITING_FOR_INPUT - SMART DETECTION INTEGRATED
+            if state == "WAITING_FOR_INPUT" and user_detection_active:
+                if SMART_DETECTION_AVAILABLE and 'smart_detection' in details:
+                    # Use smart detection result
+                    speech_detected = is_voice
                     if speech_detected:
-                        self.speech_frames += 1
-                        
-                        if DEBUG and current_time - last_debug_time > 0.5:
-                            print(f"🎯 [TURN] YOUR speech building ({detection_method}): {self.speech_frames}/{self.user_min_speech_frames} "
-                                  f"(score:{voice_score:.2f}, vol:{volume:.0f})")
-                            last_debug_time = current_time
-                        
-                        if self.speech_frames >= self.user_min_speech_frames:
-                            print(f"\n🎯 [FullDuplex] 🎤 YOUR SPEECH DETECTED! ({detection_method}, score:{voice_score:.2f}, vol:{volume:.0f})")
-                            if hasattr(self, 'start_user_turn'):
-                                self.start_user_turn()
-                            self._start_user_speech_capture()
-                            self.speech_frames = 0
+                        detection_method = f"SMART-{details['smart_tier'].upper()}"
                     else:
-                        self.speech_frames = max(0, self.speech_frames - 1)
-                        
-                        # Log rejection reasons
-                        if (DEBUG and volume > 1000 and current_time - last_debug_time > 2.0):
-                            if SMART_DETECTION_AVAILABLE and 'smart_reason' in details:
-                                print(f"🎯 [TURN] ❌ Smart Rejected: {details['smart_reason']}")
-                            else:
-                                print(f"🎯 [TURN] ❌ Rejected: vol={volume:.0f} (need >3500), score={voice_score:.2f} (need >0.55)")
-                            last_debug_time = current_time
-
-                # ✅ STATE 2: USER_SPEAKING - CALIBRATED for when YOU stop talking
-                elif state == "USER_SPEAKING":
-                    # 🎯 CALIBRATED: YOUR voice is 5000+, others are 1100, background is 500
-                    dropped_significantly = volume < 2000    # Well below your voice level
-                    back_to_background = volume < 800        # Back to background/others
-                    quality_dropped = voice_score < 0.45     # Well below your 0.62+ level
-                    very_quiet = volume < 300                # Very quiet
-                    
-                    # Speech ends when you drop from your strong voice pattern
-                    speech_ended = dropped_significantly or very_quiet or (back_to_background and quality_dropped)
-                    
-                    if speech_ended:
-                        consecutive_silence_frames += 1
-                        
-                        if DEBUG and current_time - last_debug_time > 0.5:
-                            print(f"🎯 [TURN] YOU stopping: {consecutive_silence_frames}/{self.user_max_silence_frames} "
-                                  f"(score:{voice_score:.2f}, vol:{volume:.0f})")
-                            last_debug_time = current_time
-                            
-                        if consecutive_silence_frames >= self.user_max_silence_frames:
-                            print(f"\n🎯 [FullDuplex] 🎤 YOU FINISHED SPEAKING! (vol:{volume:.0f})")
-                            self._end_user_speech_capture()
-                            if hasattr(self, 'end_user_turn'):
-                                self.end_user_turn()
-                            consecutive_silence_frames = 0
-                    else:
-                        consecutive_silence_frames = 0
-                        
-                        # Debug: Show why speech continues
-                        if DEBUG and current_time - last_debug_time > 1.0:
-                            print(f"🎯 [TURN] Still speaking: vol={volume:.0f} (>2000), score={voice_score:.2f}")
-                            last_debug_time = current_time
-
-                # ✅ STATE 3: BUDDY_RESPONDING - CALIBRATED interrupt detection with flag setting
-                elif state == "BUDDY_RESPONDING" and interrupt_active:
-                    buddy_speech_time = time.time() - getattr(self, '_buddy_speech_start_time', time.time())
-                    
-                    # 🔥 SHORTER GRACE PERIOD for faster interrupts
-                    grace_period = 0.5  # Reduced from 1.0 to 0.5 seconds
-                    
-                    if buddy_speech_time > grace_period:
-                        # 🎯 CALIBRATED: YOUR interrupt levels (need to be higher than 5000)
-                        instant_interrupt_level = 6000        # Higher than your normal speech
-                        sustained_interrupt_level = 4000      # Your normal speech level
-                        quality_interrupt_threshold = 0.60    # Your typical quality level
-                        
-                        # Multiple interrupt detection methods
-                        instant_interrupt = volume > instant_interrupt_level
-                        sustained_interrupt = volume > sustained_interrupt_level
-                        quality_interrupt = voice_score > quality_interrupt_threshold and volume > sustained_interrupt_level * 0.8
-                        
-                        interrupt_detected = instant_interrupt or sustained_interrupt or quality_interrupt
-                        
-                        if interrupt_detected:
-                            self.interrupt_frames += 1
-                            
-                            if DEBUG:
-                                method = "INSTANT" if instant_interrupt else ("SUSTAINED" if sustained_interrupt else "QUALITY")
-                                print(f"🎯 [INTERRUPT] {method}: {self.interrupt_frames}/3 "
-                                      f"(vol:{volume:.0f}, score:{voice_score:.2f})")
-                            
-                            # 🔥 LOWER FRAME REQUIREMENT for faster response
-                            required_frames = 3  # Only need 3 frames
-                            if self.interrupt_frames >= required_frames:
-                                method = "INSTANT" if instant_interrupt else ("SUSTAINED" if sustained_interrupt else "QUALITY")
-                                print(f"\n🎯 [FullDuplex] ⚡ YOU INTERRUPTING BUDDY! ({method}, vol:{volume:.0f})")
-                                
-                                # ✅ SET INTERRUPT FLAG for main.py
-                                self.set_interrupt_flag()
-                                
-                                self._handle_interrupt()
-                                self.interrupt_frames = 0
+                        detection_method = "SMART-REJECTED"
+                else:
+                    # Fallback to calibrated detection for YOUR voice profile
+                    # 🎯 CALIBRATED: Background ~500, Others ~1100, YOU ~5000+, score ~0.62+
+                    background_level = 1200        # Above others talking
+                    your_voice_level = 3500        # Well below your typical 5000
+                    combined_threshold = 0.55      # Just below your typical 0.62+
+                    instant_level = 4500           # Your typical speaking volume
+
+                    # Multiple detection methods calibrated to YOUR voice
+                    instant_trigger = volume > instant_level  # Your strong voice
+                    volume_trigger = volume > your_voice_level  # Clear voice detection
+                    quality_trigger = voice_score > combined_threshold and volume > background_level  # Quality + volume
+
+                    speech_detected = instant_trigger or volume_trigger or quality_trigger
+                    detection_method = "INSTANT" if instant_trigger else ("VOLUME" if volume_trigger else "QUALITY")
+
+                if speech_detected:
+                    self.speech_frames += 1
+
+                    if DEBUG and current_time - self._last_vad_debug_time > 0.5:
+                        print(f"🎯 [TURN] YOUR speech building ({detection_method}): {self.speech_frames}/{self.user_min_speech_frames} "
+                              f"(score:{voice_score:.2f}, vol:{volume:.0f})")
+                        self._last_vad_debug_time = current_time
+
+                    if self.speech_frames >= self.user_min_speech_frames:
+                        print(f"\n🎯 [FullDuplex] 🎤 YOUR SPEECH DETECTED! ({detection_method}, score:{voice_score:.2f}, vol:{volume:.0f})")
+                        if hasattr(self, 'start_user_turn'):
+                            self.start_user_turn()
+                        self._start_user_speech_capture()
+                        self.speech_frames = 0
+                else:
+                    self.speech_frames = max(0, self.speech_frames - 1)
+
+                    # Log rejection reasons
+                    if (DEBUG and volume > 1000 and current_time - self._last_vad_debug_time > 2.0):
+                        if SMART_DETECTION_AVAILABLE and 'smart_reason' in details:
+                            print(f"🎯 [TURN] ❌ Smart Rejected: {details['smart_reason']}")
                         else:
-                            self.interrupt_frames = max(0, self.interrupt_frames - 1)
-                            
-                            # Show rejections for debugging
-                            if DEBUG and volume > 2000 and current_time - last_debug_time > 1.0:
-                                print(f"🎯 [INTERRUPT] Rejected: vol={volume:.0f} (need >{sustained_interrupt_level:.0f}), "
-                                      f"score={voice_score:.2f}")
-                                last_debug_time = current_time
-                                
+                            print(f"🎯 [TURN] ❌ Rejected: vol={volume:.0f} (need >3500), score={voice_score:.2f} (need >0.55)")
+                        self._last_vad_debug_time = current_time
+
+            # ✅ STATE 2: USER_SPEAKING - CALIBRATED for when YOU stop talking
+            elif state == "USER_SPEAKING":
+                # 🎯 CALIBRATED: YOUR voice is 5000+, others are 1100, background is 500
+                dropped_significantly = volume < 2000    # Well below your voice level
+                back_to_background = volume < 800        # Back to background/others
+                quality_dropped = voice_score < 0.45     # Well below your 0.62+ level
+                very_quiet = volume < 300                # Very quiet
+
+                # Speech ends when you drop from your strong voice pattern
+                speech_ended = dropped_significantly or very_quiet or (back_to_background and quality_dropped)
+
+                if speech_ended:
+                    self._consecutive_silence_frames += 1
+
+                    # Natural pause: send what we have so far for a partial transcript
+                    if (self._consecutive_silence_frames == STT_PARTIAL_PAUSE_FRAMES
+                            and self._speech_since_commit):
+                        self._commit_partial_segment(STT_PARTIAL_MIN_SEGMENT_SECONDS)
+
+                    if DEBUG and current_time - self._last_vad_debug_time > 0.5:
+                        print(f"🎯 [TURN] YOU stopping: {self._consecutive_silence_frames}/{self.user_max_silence_frames} "
+                              f"(score:{voice_score:.2f}, vol:{volume:.0f})")
+                        self._last_vad_debug_time = current_time
+
+                    if self._consecutive_silence_frames >= self.user_max_silence_frames:
+                        print(f"\n🎯 [FullDuplex] 🎤 YOU FINISHED SPEAKING! (vol:{volume:.0f})")
+                        self._end_user_speech_capture()
+                        if hasattr(self, 'end_user_turn'):
+                            self.end_user_turn()
+                        self._consecutive_silence_frames = 0
+                else:
+                    self._consecutive_silence_frames = 0
+                    self._speech_since_commit = True
+
+                    # Long unbroken speech: cut a segment anyway so the partial keeps up
+                    self._commit_partial_segment(STT_PARTIAL_MAX_SEGMENT_SECONDS)
+
+                    # Debug: Show why speech continues
+                    if DEBUG and current_time - self._last_vad_debug_time > 1.0:
+                        print(f"🎯 [TURN] Still speaking: vol={volume:.0f} (>2000), score={voice_score:.2f}")
+                        self._last_vad_debug_time = current_time
+
+            # ✅ STATE 3: BUDDY_RESPONDING - CALIBRATED interrupt detection with flag setting
+            elif state == "BUDDY_RESPONDING" and interrupt_active:
+                buddy_speech_time = time.time() - getattr(self, '_buddy_speech_start_time', time.time())
+
+                # 🔥 SHORTER GRACE PERIOD for faster interrupts
+                grace_period = 0.5  # Reduced from 1.0 to 0.5 seconds
+
+                if buddy_speech_time > grace_period:
+                    # 🎯 CALIBRATED: YOUR interrupt levels (need to be higher than 5000)
+                    instant_interrupt_level = 6000        # Higher than your normal speech
+                    sustained_interrupt_level = 4000      # Your normal speech level
+                    quality_interrupt_threshold = 0.60    # Your typical quality level
+
+                    # Multiple interrupt detection methods
+                    instant_interrupt = volume > instant_interrupt_level
+                    sustained_interrupt = volume > sustained_interrupt_level
+                    quality_interrupt = voice_score > quality_interrupt_threshold and volume > sustained_interrupt_level * 0.8
+
+                    interrupt_detected = instant_interrupt or sustained_interrupt or quality_interrupt
+
+                    if interrupt_detected:
+                        self.interrupt_frames += 1
+
+                        if DEBUG:
+                            method = "INSTANT" if instant_interrupt else ("SUSTAINED" if sustained_interrupt else "QUALITY")
+                            print(f"🎯 [INTERRUPT] {method}: {self.interrupt_frames}/3 "
+                                  f"(vol:{volume:.0f}, score:{voice_score:.2f})")
+
+                        # 🔥 LOWER FRAME REQUIREMENT for faster response
+                        required_frames = 3  # Only need 3 frames
+                        if self.interrupt_frames >= required_frames:
+                            method = "INSTANT" if instant_interrupt else ("SUSTAINED" if sustained_interrupt else "QUALITY")
+                            print(f"\n🎯 [FullDuplex] ⚡ YOU INTERRUPTING BUDDY! ({method}, vol:{volume:.0f})")
+
+                            # ✅ SET INTERRUPT FLAG for main.py
+                            self.set_interrupt_flag()
+
+                            self._handle_interrupt()
+                            self.interrupt_frames = 0
                     else:
-                        # During grace period
-                        if DEBUG and current_time - last_debug_time > 1.0:
-                            remaining = grace_period - buddy_speech_time
-                            print(f"🎯 [GRACE] {remaining:.1f}s remaining (vol:{volume:.0f})")
-                            last_debug_time = current_time
-
-                # ✅ STATE 4: PROCESSING_RESPONSE - Ignore all input
-                elif state == "PROCESSING_RESPONSE":
-                    pass
+                        self.interrupt_frames = max(0, self.interrupt_frames - 1)
 
-                time.sleep(0.01)
-                
-            except Exception as e:
-                if DEBUG:
-                    print(f"[FullDuplex] Turn-based processor error: {e}")
+                        # Show rejections for debugging
+                        if DEBUG and volume > 2000 and current_time - self._last_vad_debug_time > 1.0:
+                            print(f"🎯 [INTERRUPT] Rejected: vol={volume:.0f} (need >{sustained_interrupt_level:.0f}), "
+                                  f"score={voice_score:.2f}")
+                            self._last_vad_debug_time = current_time
+
+                else:
+                    # During grace period
+                    if DEBUG and current_time - self._last_vad_debug_time > 1.0:
+                        remaining = grace_period - buddy_speech_time
+                        print(f"🎯 [GRACE] {remaining:.1f}s remaining (vol:{volume:.0f})")
+                        self._last_vad_debug_time = current_time
+
+            # ✅ STATE 4: PROCESSING_RESPONSE - Ignore all input
+            elif state == "PROCESSING_RESPONSE":
+                pass
+
+        except Exception as e:
+            if DEBUG:
+                print(f"[FullDuplex] Turn-based processor error: {e}")
 
     def _conversation_state_manager(self):
         """Manage conversation state transitions"""
@@ -531,16 +599,17 @@ class FullDuplexManager:
         
         # Add pre-context for better capture
         pre_context_frames = int(SPEECH_PADDING_START * SAMPLE_RATE)
-        if len(self.pre_speech_buffer) >= pre_context_frames:
-            pre_context = list(self.pre_speech_buffer)[-pre_context_frames:]
-        else:
-            pre_context = list(self.pre_speech_buffer)
+        pre_context = self.pre_speech_buffer.tail(pre_context_frames, copy=True)
         
         self.speech_buffer.clear()
-        if pre_context:
+        if len(pre_context):
             self.speech_buffer.extend(pre_context)
         
-        self._captured_speech = []
+        self._captured_chunks = []
+        self._capture_padding_remaining = 0
+        self._reset_incremental_transcription()
+        # Background LLM jobs (memory / fusion) must not delay this turn's reply
+        llm_scheduler.notify_user_speaking(True)
         print("🔴 CAPTURING USER SPEECH", end="", flush=True)
 
     def _end_user_speech_capture(self):
@@ -549,10 +618,19 @@ class FullDuplexManager:
             return
         
         self.processing = False
-        time.sleep(SPEECH_PADDING_END)
+        
+        # Keep capturing SPEECH_PADDING_END of trailing audio; the frame worker finishes the capture
+        self._capture_padding_remaining = int(SPEECH_PADDING_END * SAMPLE_RATE)
+        if self._capture_padding_remaining <= 0:
+            self._finish_user_speech_capture()
+
+    def _finish_user_speech_capture(self):
+        """Hand the captured utterance (with trailing padding) to the speech processor"""
+        self._capture_padding_remaining = 0
         
         # Get captured audio
-        audio_data = np.array(getattr(self, '_captured_speech', []), dtype=np.int16)
+        chunks = self._captured_chunks
+        audio_data = np.concatenate(chunks).astype(np.int16) if chunks else np.zeros(0, dtype=np.int16)
         
         # Quality checks
         duration = len(audio_data) / SAMPLE_RATE
@@ -560,12 +638,20 @@ class FullDuplexManager:
         
         if duration >= 0.3 and volume > 300:  # Lenient requirements for user speech
             print(f"\n[FullDuplex] ✅ USER SPEECH CAPTURED: {duration:.1f}s (vol:{volume:.0f})")
-            self.processed_queue.put(audio_data)
+            if self.transcriber is not None:
+                # Earlier segments are already transcribed; the tail only matters if it has speech
+                transcript_future = self.transcriber.finalize(include_pending=self._speech_since_commit)
+                self.processed_queue.put((audio_data, transcript_future))
+            else:
+                self.processed_queue.put(audio_data)
             self.speeches_processed += 1
         else:
             print(f"\n[FullDuplex] ❌ USER SPEECH TOO SHORT: {duration:.1f}s (vol:{volume:.0f})")
+            if self.transcriber is not None:
+                self.transcriber.reset()
         
-        self._captured_speech = []
+        self._captured_chunks = []
+        llm_scheduler.notify_user_speaking(False)
 
     def _handle_interrupt(self):
         """✅ FIXED: Handle interrupt and reset flag properly"""
@@ -639,6 +725,7 @@ class FullDuplexManager:
                 self.speech_interrupted = False
                 self.buddy_interrupted = False
                 
+            llm_scheduler.notify_user_speaking(False)
             print("[FullDuplex] ✅ FORCE RESET complete - should detect user speech now")
             
         except Exception as e:
@@ -650,7 +737,7 @@ class FullDuplexManager:
         while self.running:
             try:
                 if len(self.mic_buffer) >= 160:
-                    chunk = np.array(list(self.mic_buffer)[-160:])
+                    chunk = self.mic_buffer.tail(160)
                     volume = np.abs(chunk).mean()
                     
                     # Only calibrate during quiet periods
@@ -672,33 +759,27 @@ class FullDuplexManager:
         """Process captured speech"""
         while self.running:
             try:
-                audio_data = self.processed_queue.get(timeout=0.5)
+                item = self.processed_queue.get(timeout=0.5)
                 
-                def transcribe_and_handle():
-                    try:
-                        from ai.speech import transcribe_audio
-                        
-                        if DEBUG:
-                            duration = len(audio_data) / SAMPLE_RATE
-                            volume = np.abs(audio_data).mean()
-                            print(f"[FullDuplex] 🎙️ Transcribing user speech: {duration:.1f}s, vol:{volume:.1f}")
-                        
-                        text = transcribe_audio(audio_data)
-                        
-                        if text and len(text.strip()) > 0:
-                            print(f"[FullDuplex] 📝 User said: '{text}'")
-                            self._handle_transcribed_text(text, audio_data)
-                        else:
-                            print(f"[FullDuplex] ❌ Empty transcription")
-                            # Go back to waiting for input
-                            with self.conversation_state_lock:
-                                self.conversation_state = "WAITING_FOR_INPUT"
-                                self.user_speech_detection_active = True
-                    except Exception as e:
-                        if DEBUG:
-                            print(f"[FullDuplex] Transcription error: {e}")
+                from ai.speech import transcribe_audio_async
                 
-                threading.Thread(target=transcribe_and_handle, daemon=True).start()
+                # Incremental mode hands over the audio plus the finalizing transcript future
+                if isinstance(item, tuple):
+                    audio_data, future = item
+                else:
+                    audio_data, future = item, None
+                
+                if DEBUG:
+                    duration = len(audio_data) / SAMPLE_RATE
+                    volume = np.abs(audio_data).mean()
+                    print(f"[FullDuplex] 🎙️ Transcribing user speech: {duration:.1f}s, vol:{volume:.1f}")
+                
+                # Persistent STT client: no per-utterance thread, loop or connection
+                if future is None:
+                    future = transcribe_audio_async(audio_data)
+                future.add_done_callback(
+                    lambda done, audio=audio_data: self._on_transcription_done(done, audio)
+                )
                 
             except queue.Empty:
                 continue
@@ -706,6 +787,71 @@ class FullDuplexManager:
                 if DEBUG:
                     print(f"[FullDuplex] Speech processor error: {e}")
 
+    def _on_transcription_done(self, future, audio_data):
+        """STT future callback (runs on the STT client's loop thread - keep it short)"""
+        try:
+            text = future.result()
+            
+            if text and len(text.strip()) > 0:
+                print(f"[FullDuplex] 📝 User said: '{text}'")
+                self._handle_transcribed_text(text, audio_data)
+            else:
+                print(f"[FullDuplex] ❌ Empty transcription")
+                # Go back to waiting for input
+                with self.conversation_state_lock:
+                    self.conversation_state = "WAITING_FOR_INPUT"
+                    self.user_speech_detection_active = True
+        except Exception as e:
+            if DEBUG:
+                print(f"[FullDuplex] Transcription error: {e}")
+
+    def _reset_incremental_transcription(self):
+        """New user turn: fresh partial transcript"""
+        self._speech_since_commit = False
+        self.partial_transcript = ""
+        self.early_intent = None
+        if not self.incremental_stt:
+            return
+        try:
+            if self.transcriber is None:
+                from ai.speech import IncrementalTranscriber
+                self.transcriber = IncrementalTranscriber(on_partial=self._on_partial_transcript)
+            self.transcriber.reset()
+        except Exception as e:
+            print(f"[FullDuplex] ⚠️ Incremental STT unavailable: {e}")
+            self.incremental_stt = False
+            self.transcriber = None
+
+    def _commit_partial_segment(self, min_seconds):
+        """Send the captured-but-unsent audio to STT if there is at least min_seconds of it"""
+        if self.transcriber is None or not self.processing:
+            return
+        if self.transcriber.pending_seconds() >= min_seconds:
+            if self.transcriber.commit():
+                self._speech_since_commit = False
+
+    def _on_partial_transcript(self, text):
+        """Rolling partial transcript (STT loop thread) - run early intent detectors"""
+        self.partial_transcript = text
+        print(f"[FullDuplex] 📝 Partial: '{text}'")
+        for intent, detector in list(self.early_intent_detectors.items()):
+            try:
+                if detector(text):
+                    self.early_intent = intent
+                    print(f"[FullDuplex] ⚡ Early intent: {intent}")
+                    break
+            except Exception as e:
+                if DEBUG:
+                    print(f"[FullDuplex] Early intent detector error ({intent}): {e}")
+
+    def register_early_intent(self, intent, detector):
+        """Run detector(partial_text) -> bool on every partial transcript; sets self.early_intent"""
+        self.early_intent_detectors[intent] = detector
+
+    def get_partial_transcript(self):
+        """Best transcript so far for the current (or last) user turn"""
+        return self.partial_transcript
+
     def _handle_transcribed_text(self, text, audio_data):
         """Handle transcribed text"""
         self.last_transcription = (text, audio_data)
@@ -738,6 +884,8 @@ class FullDuplexManager:
             "speeches_processed": self.speeches_processed,
             "noise_calibrated": self.noise_calibrated,
             "noise_baseline": self.noise_baseline,
+            "partial_transcript": self.partial_transcript,
+            "early_intent": self.early_intent,
         }
 
 # Create global instance
@@ -7,15 +7,14 @@ import time
 import queue
 import numpy as np
 import simpleaudio as sa
-import requests
-import io
-import tempfile
-import os
 from langdetect import detect
 from config import *
+from audio.tts_client import tts_client
+from audio.tts_pipeline import TTSPipeline
 
 # Global audio state
 audio_queue = queue.Queue()
+tts_pipeline = TTSPipeline(audio_queue.put)   # Ordered, bounded synthesis feeding audio_queue
 current_audio_playback = None
 audio_lock = threading.Lock()
 buddy_talking = threading.Event()
@@ -48,8 +47,7 @@ def test_kokoro_api():
     """Test if Kokoro-FastAPI is available"""
     global kokoro_api_available
     try:
-        response = requests.get(f"{KOKORO_API_BASE_URL}/health", timeout=5)
-        if response.status_code == 200:
+        if tts_client.health(timeout=5):
             kokoro_api_available = True
             print(f"[Buddy V2] ✅ Kokoro-FastAPI connected at {KOKORO_API_BASE_URL}")
             return True
@@ -60,7 +58,7 @@ def test_kokoro_api():
     kokoro_api_available = False
     return False
 
-def generate_tts(text, lang=DEFAULT_LANG):
+def generate_tts(text, lang=DEFAULT_LANG, cancel_event=None):
     """Generate TTS audio using Kokoro-FastAPI"""
     try:
         if not kokoro_api_available:
@@ -71,68 +69,16 @@ def generate_tts(text, lang=DEFAULT_LANG):
         detected_lang = lang or detect(text)
         voice = KOKORO_API_VOICES.get(detected_lang, KOKORO_DEFAULT_VOICE)
         
-        # Prepare API request
-        payload = {
-            "input": text.strip(),
-            "voice": voice,
-            "response_format": "wav"
-        }
+        # Pooled keep-alive session, decoded and resampled in memory
+        audio_data, sample_rate = tts_client.synthesize(text, voice, target_rate=SAMPLE_RATE, cancel_event=cancel_event)
         
-        # Call Kokoro-FastAPI
-        response = requests.post(
-            f"{KOKORO_API_BASE_URL}/v1/audio/speech",
-            json=payload,
-            timeout=KOKORO_API_TIMEOUT
-        )
-        
-        if response.status_code == 200:
-            # Save audio to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                temp_file.write(response.content)
-                temp_path = temp_file.name
-            
-            # Load audio data for processing
-            import wave
-            with wave.open(temp_path, 'rb') as wav_file:
-                frames = wav_file.readframes(wav_file.getnframes())
-                sample_rate = wav_file.getframerate()
-                channels = wav_file.getnchannels()
-                sample_width = wav_file.getsampwidth()
-            
-            # Convert to numpy array
-            if sample_width == 2:
-                audio_data = np.frombuffer(frames, dtype=np.int16)
-            else:
-                audio_data = np.frombuffer(frames, dtype=np.uint8)
-                audio_data = ((audio_data.astype(np.int16) - 128) * 256)
-            
-            # Handle stereo to mono conversion
-            if channels == 2:
-                audio_data = audio_data.reshape(-1, 2)
-                audio_data = audio_data[:, 0]  # Take left channel
-            
-            # Resample if needed
-            if sample_rate != SAMPLE_RATE:
-                from scipy.signal import resample_poly
-                audio_data = resample_poly(audio_data, SAMPLE_RATE, sample_rate)
-                audio_data = audio_data.astype(np.int16)
-            
-            # Clean up temp file
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-            
+        if audio_data is not None:
             if DEBUG:
                 print(f"[Buddy V2] 🗣️ Generated TTS via FastAPI: {len(audio_data)} samples, voice: {voice}")
             
-            return audio_data, SAMPLE_RATE
+            return audio_data, sample_rate
             
-        else:
-            print(f"[Buddy V2] ❌ Kokoro-FastAPI error: {response.status_code}")
-            if response.text:
-                print(f"[Buddy V2] Error details: {response.text}")
-            return None, None
+        return None, None
             
     except Exception as e:
         print(f"[Buddy V2] TTS error: {e}")
@@ -143,89 +89,41 @@ def speak_async(text, lang=DEFAULT_LANG):
     if not text or len(text.strip()) < 2:
         return
         
-    def tts_worker():
-        pcm, sr = generate_tts(text.strip(), lang)
-        if pcm is not None:
-            audio_queue.put((pcm, sr))
+    tts_pipeline.submit(generate_tts, text.strip(), lang, label=text.strip())
+
+def synthesize_streaming_chunk(text, voice=None, lang=DEFAULT_LANG, cancel_event=None):
+    """Synthesize one streamed chunk; runs on the TTS pipeline's worker pool"""
+    try:
+        if not kokoro_api_available:
+            if not test_kokoro_api():
+                return None, None
+        
+        # ✅ FIX: Properly handle voice parameter
+        selected_voice = voice  # Use provided voice
+        if selected_voice is None:
+            # Detect voice from language if none provided
+            detected_lang = lang or detect(text)
+            selected_voice = KOKORO_API_VOICES.get(detected_lang, KOKORO_DEFAULT_VOICE)
+        
+        # Quick API call for streaming (native rate, no resampling)
+        audio_data, sample_rate = tts_client.synthesize(text, selected_voice, target_rate=None, timeout=5,
+                                                        cancel_event=cancel_event)
+        
+        if audio_data is not None and DEBUG:
+            print(f"[StreamingTTS] ✅ Synthesized chunk: '{text[:50]}...' with voice: {selected_voice}")
+        return audio_data, sample_rate
+            
+    except Exception as e:
+        print(f"[StreamingTTS] ❌ Error: {e}")
     
-    threading.Thread(target=tts_worker, daemon=True).start()
+    return None, None
 
 def speak_streaming(text, voice=None, lang=DEFAULT_LANG):
-    """✅ FIXED: Queue text chunk for immediate streaming TTS"""
+    """✅ FIXED: Queue text chunk for streaming TTS - synthesized ahead, played in order"""
     if not text or len(text.strip()) < 2:
         return False
-        
-    def streaming_tts_worker():
-        try:
-            if not kokoro_api_available:
-                if not test_kokoro_api():
-                    return False
-            
-            # ✅ FIX: Properly handle voice parameter
-            selected_voice = voice  # Use provided voice
-            if selected_voice is None:
-                # Detect voice from language if none provided
-                detected_lang = lang or detect(text)
-                selected_voice = KOKORO_API_VOICES.get(detected_lang, KOKORO_DEFAULT_VOICE)
-            
-            # Quick API call for streaming
-            payload = {
-                "input": text.strip(),
-                "voice": selected_voice,  # ✅ Use selected_voice instead of voice
-                "response_format": "wav"
-            }
-            
-            response = requests.post(
-                f"{KOKORO_API_BASE_URL}/v1/audio/speech",
-                json=payload,
-                timeout=5  # Shorter timeout for streaming
-            )
-            
-            if response.status_code == 200:
-                # Process audio quickly for streaming
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                    temp_file.write(response.content)
-                    temp_path = temp_file.name
-                
-                import wave
-                with wave.open(temp_path, 'rb') as wav_file:
-                    frames = wav_file.readframes(wav_file.getnframes())
-                    sample_rate = wav_file.getframerate()
-                    channels = wav_file.getnchannels()
-                    sample_width = wav_file.getsampwidth()
-                
-                # Quick conversion
-                if sample_width == 2:
-                    audio_data = np.frombuffer(frames, dtype=np.int16)
-                else:
-                    audio_data = np.frombuffer(frames, dtype=np.uint8)
-                    audio_data = ((audio_data.astype(np.int16) - 128) * 256)
-                
-                if channels == 2:
-                    audio_data = audio_data.reshape(-1, 2)[:, 0]
-                
-                # Queue immediately
-                audio_queue.put((audio_data, sample_rate))
-                
-                # Cleanup
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
-                
-                if DEBUG:
-                    print(f"[StreamingTTS] ✅ Queued chunk: '{text[:50]}...' with voice: {selected_voice}")
-                
-                return True
-            else:
-                print(f"[StreamingTTS] ❌ API Error {response.status_code}: {response.text}")
-                
-        except Exception as e:
-            print(f"[StreamingTTS] ❌ Error: {e}")
-        
-        return False
     
-    threading.Thread(target=streaming_tts_worker, daemon=True).start()
+    tts_pipeline.submit(synthesize_streaming_chunk, text, voice, lang, label=text)
     return True
 
 def play_chime():
@@ -320,6 +218,7 @@ def audio_worker():
                                 if full_duplex_manager and getattr(full_duplex_manager, 'speech_interrupted', False):
                                     print("[Audio] ⚡ IMMEDIATE STOP - Interrupt detected!")
                                     current_audio_playback.stop()
+                                    tts_pipeline.cancel("interrupt")
                                     
                                     # Clear ALL remaining chunks
                                     cleared = 0
@@ -359,6 +258,7 @@ def audio_worker():
                         from audio.full_duplex_manager import full_duplex_manager
                         if full_duplex_manager and getattr(full_duplex_manager, 'speech_interrupted', False):
                             print("[Audio] 🛑 Post-chunk interrupt detected")
+                            tts_pipeline.cancel("interrupt")
                             
                             # Clear remaining queue
                             while not audio_queue.empty():
@@ -465,8 +365,8 @@ def stop_audio_playback():
             print(f"[Audio] Emergency stop error: {e}")
 
 def clear_audio_queue():
-    """Clear pending audio queue"""
-    cleared = 0
+    """Clear pending audio queue (and any chunks still being synthesized)"""
+    cleared = tts_pipeline.cancel("audio queue cleared")
     while not audio_queue.empty():
         try:
             audio_queue.get_nowait()
@@ -495,7 +395,9 @@ def get_audio_stats():
         "current_time": time.time(),
         "mode": "FULL_DUPLEX" if FULL_DUPLEX_MODE else "HALF_DUPLEX",
         "kokoro_api_available": kokoro_api_available,
-        "api_url": KOKORO_API_BASE_URL
+        "api_url": KOKORO_API_BASE_URL,
+        "tts_client": tts_client.get_stats(),
+        "tts_pipeline": tts_pipeline.get_stats()
     }
 
 def start_streaming_response(user_input, current_user, language):
@@ -0,0 +1,130 @@
+# audio/ring_buffer.py - Preallocated int16 ring buffer for the audio pipeline
+"""
+Fixed-capacity numpy ring buffer replacing deque(maxlen=N) audio buffers.
+
+Every write is mirrored into a second copy of the storage, so the most recent
+N samples (N <= capacity) are always one contiguous slice: tail() returns a
+view without copying, and extend() is a bulk slice assignment instead of a
+per-sample Python loop.
+
+Run this file directly for a per-tick CPU microbenchmark (deque vs ring buffer).
+"""
+import threading
+import numpy as np
+
+
+class AudioRingBuffer:
+    """🎙️ Preallocated ring buffer with bulk writes and zero-copy tail views"""
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.zeros(self.capacity * 2, dtype=self.dtype)
+        self.write_pos = 0          # next write index in [0, capacity)
+        self.size = 0               # valid samples, <= capacity
+        self.total_written = 0      # monotonic sample counter (never reset by clear)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _as_samples(self, samples):
+        samples = np.asarray(samples)
+        if samples.dtype == self.dtype:
+            return samples.ravel()
+        if np.issubdtype(self.dtype, np.integer) and not np.issubdtype(samples.dtype, np.integer):
+            # Float audio (e.g. AEC output) is clipped, not wrapped, into the integer range
+            info = np.iinfo(self.dtype)
+            samples = np.clip(samples, info.min, info.max)
+        return samples.astype(self.dtype).ravel()
+
+    def extend(self, samples):
+        """Append samples (bulk copy); older samples beyond capacity are dropped"""
+        samples = self._as_samples(samples)
+        count = len(samples)
+        if count == 0:
+            return
+
+        with self.lock:
+            self.total_written += count
+            if count >= self.capacity:
+                samples = samples[-self.capacity:]
+                self.buffer[:self.capacity] = samples
+                self.buffer[self.capacity:] = samples
+                self.write_pos = 0
+                self.size = self.capacity
+                return
+
+            start = self.write_pos
+            first = min(count, self.capacity - start)
+            # Primary copy plus mirror, so [pos, pos + capacity) is always contiguous
+            self.buffer[start:start + first] = samples[:first]
+            self.buffer[start + self.capacity:start + self.capacity + first] = samples[:first]
+            if first < count:
+                rest = count - first
+                self.buffer[:rest] = samples[first:]
+                self.buffer[self.capacity:self.capacity + rest] = samples[first:]
+
+            self.write_pos = (start + count) % self.capacity
+            self.size = min(self.capacity, self.size + count)
+
+    def tail(self, count=None, copy=False):
+        """Most recent `count` samples (all when None) as a view unless copy=True"""
+        with self.lock:
+            count = self.size if count is None else min(int(count), self.size)
+            end = self.write_pos + self.capacity
+            view = self.buffer[end - count:end]
+            return view.copy() if copy else view
+
+    def to_array(self):
+        """Chronological copy of the buffered samples"""
+        return self.tail(copy=True)
+
+    def clear(self):
+        with self.lock:
+            self.write_pos = 0
+            self.size = 0
+
+
+def _benchmark(ticks=2000, chunk=160, tail=160):
+    """Per-tick CPU of the FullDuplexManager read/write pattern: deque vs ring buffer"""
+    import time
+    from collections import deque
+
+    rng = np.random.default_rng(0)
+    chunks = [rng.integers(-3000, 3000, chunk, dtype=np.int16) for _ in range(64)]
+
+    def run(make, write, read):
+        buffers = [make(8000), make(240000), make(32000)]   # mic, speech, pre-speech
+        # Pre-fill so the speech buffer is at capacity, like a long utterance
+        for _ in range(240000 // chunk):
+            for buf in buffers:
+                write(buf, chunks[0])
+        start = time.process_time()
+        for i in range(ticks):
+            data = chunks[i % len(chunks)]
+            for buf in buffers:
+                write(buf, data)
+            np.abs(read(buffers[1], tail)).mean()   # _turn_based_processor
+            np.abs(read(buffers[0], tail)).mean()   # _noise_tracker
+        return (time.process_time() - start) / ticks * 1e6
+
+    deque_us = run(
+        lambda n: deque(maxlen=n),
+        lambda buf, data: buf.extend(data),
+        lambda buf, n: np.array(list(buf)[-n:])
+    )
+    ring_us = run(
+        lambda n: AudioRingBuffer(n),
+        lambda buf, data: buf.extend(data),
+        lambda buf, n: buf.tail(n)
+    )
+
+    print(f"[RingBuffer] 📊 {ticks} ticks, {chunk}-sample chunks, {tail}-sample tail reads")
+    print(f"[RingBuffer]   deque -> list -> array: {deque_us:9.1f} µs CPU per tick")
+    print(f"[RingBuffer]   int16 ring buffer:      {ring_us:9.1f} µs CPU per tick")
+    print(f"[RingBuffer]   speedup: {deque_us / max(ring_us, 1e-9):.0f}x")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -6,11 +6,12 @@ import numpy as np
 from collections import deque
 import time
 from config import *
+from audio.ring_buffer import AudioRingBuffer
 
 class SmartAEC:
     def __init__(self):
-        self.reference_buffer = deque(maxlen=8000)  # 500ms reference
-        self.adaptation_buffer = deque(maxlen=16000)  # 1 second adaptation
+        self.reference_buffer = AudioRingBuffer(8000)  # 500ms reference
+        self.adaptation_buffer = AudioRingBuffer(16000)  # 1 second adaptation
         self.echo_profile = None
         self.adaptation_rate = min(AEC_ADAPTATION_RATE, 0.03)
         self.suppression_factor = min(AEC_SUPPRESSION_FACTOR, 0.1)
@@ -111,7 +112,7 @@ class SmartAEC:
             if len(self.reference_buffer) < len(mic_audio):
                 return None
             
-            reference = np.array(list(self.reference_buffer)[-len(mic_audio):])
+            reference = self.reference_buffer.tail(len(mic_audio))
             
             # Calculate correlation
             correlation = np.corrcoef(mic_audio, reference)[0, 1]
@@ -163,7 +164,7 @@ class SmartAEC:
         """Much gentler adaptation"""
         try:
             if len(self.adaptation_buffer) >= 8000:
-                recent_audio = np.array(list(self.adaptation_buffer)[-8000:])
+                recent_audio = self.adaptation_buffer.tail(8000)
                 
                 new_profile = {
                     "volume": np.abs(recent_audio).mean(),
@@ -0,0 +1,225 @@
+# audio/tts_client.py - Pooled keep-alive client for Kokoro-FastAPI
+"""
+Long-lived TTS client.
+
+One requests.Session with a pooled HTTPAdapter is shared by every sentence, so
+the TCP connection to KOKORO_API_BASE_URL stays open between requests. Audio is
+decoded straight from the response bytes (WAV or raw PCM) - nothing touches
+disk. Resampling filters are designed once per (source rate, target rate) pair
+and reused.
+
+When KOKORO_RESPONSE_FORMAT is "pcm" the server returns headerless int16 mono
+at its native rate (KOKORO_PCM_SAMPLE_RATE). If the server rejects PCM the
+client falls back to WAV for the rest of the session.
+"""
+import io
+import threading
+import time
+import wave
+from math import gcd
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    DEBUG,
+    SAMPLE_RATE,
+    KOKORO_API_BASE_URL,
+    KOKORO_API_TIMEOUT,
+    KOKORO_POOL_SIZE,
+    KOKORO_RESPONSE_FORMAT,
+    KOKORO_PCM_SAMPLE_RATE,
+)
+
+
+def decode_wav_bytes(data):
+    """WAV bytes -> (mono int16 array, sample rate) without a temp file"""
+    with wave.open(io.BytesIO(data), 'rb') as wav_file:
+        frames = wav_file.readframes(wav_file.getnframes())
+        sample_rate = wav_file.getframerate()
+        channels = wav_file.getnchannels()
+        sample_width = wav_file.getsampwidth()
+
+    if sample_width == 2:
+        audio_data = np.frombuffer(frames, dtype=np.int16)
+    else:
+        audio_data = np.frombuffer(frames, dtype=np.uint8)
+        audio_data = ((audio_data.astype(np.int16) - 128) * 256)
+
+    if channels == 2:
+        audio_data = audio_data.reshape(-1, 2)[:, 0]  # Take left channel
+
+    return audio_data, sample_rate
+
+
+def decode_pcm_bytes(data, sample_rate):
+    """Raw little-endian int16 mono PCM -> (array, sample rate)"""
+    usable = len(data) - (len(data) % 2)
+    return np.frombuffer(data[:usable], dtype='<i2').astype(np.int16, copy=False), sample_rate
+
+
+def decode_audio_bytes(data, pcm_sample_rate):
+    """Decode a Kokoro response body; WAV is detected by its RIFF header"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        return decode_wav_bytes(data)
+    return decode_pcm_bytes(data, pcm_sample_rate)
+
+
+class SynthesisCancelled(Exception):
+    """The caller's cancel event fired while the request was in flight"""
+
+
+class Resampler:
+    """🔁 Polyphase resampler with filters cached per (source, target) rate"""
+
+    def __init__(self):
+        self.filters = {}
+        self.lock = threading.Lock()
+
+    def _get_filter(self, up, down):
+        key = (up, down)
+        with self.lock:
+            taps = self.filters.get(key)
+        if taps is None:
+            from scipy.signal import firwin
+            # Same design resample_poly uses by default, computed once
+            max_rate = max(up, down)
+            half_len = 10 * max_rate
+            taps = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+            with self.lock:
+                self.filters[key] = taps
+            if DEBUG:
+                print(f"[TTSClient] 🔁 Cached resampling filter {up}/{down} ({len(taps)} taps)")
+        return taps
+
+    def resample(self, audio, source_rate, target_rate):
+        """Resample int16 audio; returns int16"""
+        if source_rate == target_rate or len(audio) == 0:
+            return audio
+        from scipy.signal import resample_poly
+        divisor = gcd(int(target_rate), int(source_rate))
+        up, down = int(target_rate) // divisor, int(source_rate) // divisor
+        resampled = resample_poly(audio.astype(np.float32), up, down, window=self._get_filter(up, down))
+        return np.clip(resampled, -32768, 32767).astype(np.int16)
+
+
+class KokoroTTSClient:
+    """🗣️ Keep-alive Kokoro-FastAPI client with in-memory decoding"""
+
+    def __init__(self, base_url=KOKORO_API_BASE_URL, timeout=KOKORO_API_TIMEOUT, pool_size=KOKORO_POOL_SIZE,
+                 response_format=KOKORO_RESPONSE_FORMAT, pcm_sample_rate=KOKORO_PCM_SAMPLE_RATE):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.response_format = response_format
+        self.pcm_sample_rate = pcm_sample_rate
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.resampler = Resampler()
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'completed': 0,
+            'errors': 0,
+            'cancelled': 0,
+            'pcm_fallbacks': 0,
+            'average_latency_ms': 0.0,
+        }
+
+    def health(self, timeout=5):
+        """True if the server answers /health"""
+        try:
+            return self.session.get(f"{self.base_url}/health", timeout=timeout).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def synthesize(self, text, voice, target_rate=SAMPLE_RATE, timeout=None, cancel_event=None):
+        """Text -> (int16 audio, sample rate); resampled to target_rate unless it is None.
+
+        Returns (None, None) on failure, or once cancel_event is set - the
+        response body is then streamed and the connection dropped mid-transfer.
+        """
+        with self.stats_lock:
+            self.stats['requests'] += 1
+        start_time = time.time()
+
+        try:
+            data = self._request(text, voice, timeout or self.timeout, cancel_event)
+            if data is None:
+                with self.stats_lock:
+                    self.stats['errors'] += 1
+                return None, None
+
+            audio_data, sample_rate = decode_audio_bytes(data, self.pcm_sample_rate)
+            if target_rate and sample_rate != target_rate:
+                audio_data = self.resampler.resample(audio_data, sample_rate, target_rate)
+                sample_rate = target_rate
+
+            latency_ms = (time.time() - start_time) * 1000.0
+            with self.stats_lock:
+                self.stats['completed'] += 1
+                self.stats['average_latency_ms'] += (latency_ms - self.stats['average_latency_ms']) / self.stats['completed']
+            return audio_data, sample_rate
+
+        except SynthesisCancelled:
+            with self.stats_lock:
+                self.stats['cancelled'] += 1
+            if DEBUG:
+                print(f"[TTSClient] 🛑 Synthesis cancelled: '{text[:40]}'")
+            return None, None
+
+        except Exception as e:
+            with self.stats_lock:
+                self.stats['errors'] += 1
+            print(f"[TTSClient] ❌ TTS error: {e}")
+            return None, None
+
+    def _request(self, text, voice, timeout, cancel_event=None):
+        payload = {
+            "input": text.strip(),
+            "voice": voice,
+            "response_format": self.response_format,
+        }
+        if cancel_event is not None and cancel_event.is_set():
+            raise SynthesisCancelled()
+        stream = cancel_event is not None
+        response = self.session.post(f"{self.base_url}/v1/audio/speech", json=payload, timeout=timeout, stream=stream)
+
+        if response.status_code != 200 and self.response_format != "wav" and 400 <= response.status_code < 500:
+            # Older servers only speak WAV - remember that and retry once
+            print(f"[TTSClient] ⚠️ Server rejected '{self.response_format}' ({response.status_code}), falling back to WAV")
+            with self.stats_lock:
+                self.stats['pcm_fallbacks'] += 1
+            self.response_format = "wav"
+            payload["response_format"] = "wav"
+            response = self.session.post(f"{self.base_url}/v1/audio/speech", json=payload, timeout=timeout, stream=stream)
+
+        if response.status_code != 200:
+            print(f"[TTSClient] ❌ Kokoro-FastAPI error: {response.status_code}")
+            if response.text:
+                print(f"[TTSClient] Error details: {response.text}")
+            return None
+        if not stream:
+            return response.content
+
+        body = bytearray()
+        with response:
+            for block in response.iter_content(chunk_size=16384):
+                if cancel_event.is_set():
+                    raise SynthesisCancelled()
+                body.extend(block)
+        return bytes(body)
+
+    def get_stats(self):
+        with self.stats_lock:
+            return dict(self.stats, response_format=self.response_format,
+                        cached_filters=len(self.resampler.filters))
+
+    def close(self):
+        self.session.close()
+
+
+# Global instance
+tts_client = KokoroTTSClient()
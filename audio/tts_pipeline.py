@@ -0,0 +1,141 @@
+# audio/tts_pipeline.py - Pipelined TTS synthesis with in-order playback
+"""
+Text chunks from the streaming reply are synthesized on a small, bounded
+worker pool (TTS_PIPELINE_WORKERS concurrent Kokoro requests), so chunks
+N+1..N+k are being synthesized while chunk N plays. A sequencer thread hands
+the results to the playback queue strictly in submission order - a short
+chunk that finishes first waits for the one before it.
+
+cancel() (called on a full-duplex interrupt or when the audio queue is
+cleared) drops every queued chunk, aborts transfers still in flight through
+the generation's cancel event, and discards any result that arrives late.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import DEBUG, FULL_DUPLEX_MODE, TTS_PIPELINE_WORKERS
+
+
+def _speech_interrupted():
+    """True while the full-duplex manager's interrupt flag is set"""
+    if not FULL_DUPLEX_MODE:
+        return False
+    try:
+        from audio.full_duplex_manager import full_duplex_manager
+        return bool(full_duplex_manager and getattr(full_duplex_manager, 'speech_interrupted', False))
+    except Exception:
+        return False
+
+
+class TTSPipeline:
+    """🎼 Bounded parallel synthesis, re-sequenced by chunk index before playback"""
+
+    POLL_INTERVAL = 0.02        # How often the sequencer checks the interrupt flag while waiting
+
+    def __init__(self, sink, workers=TTS_PIPELINE_WORKERS):
+        self.sink = sink                    # Called with (audio, sample_rate) in chunk order
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="TTSSynth")
+        self.condition = threading.Condition()
+        self.next_index = 0
+        self.pending = {}                   # chunk index -> (label, future, cancel_event)
+        self.next_to_play = 0
+        self.cancel_event = threading.Event()   # Shared by every chunk of the current generation
+        self.sequencer = None
+        self.stats = {
+            'submitted': 0,
+            'played': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'reordered': 0,
+            'average_wait_ms': 0.0,
+        }
+
+    def submit(self, fn, *args, label=""):
+        """Queue fn(*args, cancel_event=...) -> (audio, sample_rate) for ordered playback"""
+        with self.condition:
+            index = self.next_index
+            self.next_index += 1
+            cancel_event = self.cancel_event
+            future = self.executor.submit(self._synthesize, fn, args, cancel_event)
+            self.pending[index] = (label, future, cancel_event)
+            self.stats['submitted'] += 1
+            if self.sequencer is None or not self.sequencer.is_alive():
+                self.sequencer = threading.Thread(target=self._sequencer_loop, name="TTSSequencer", daemon=True)
+                self.sequencer.start()
+            self.condition.notify_all()
+        return index
+
+    def cancel(self, reason=""):
+        """Drop queued chunks and abort the ones being synthesized; returns how many were dropped"""
+        with self.condition:
+            self.cancel_event.set()
+            self.cancel_event = threading.Event()
+            dropped = len(self.pending)
+            for label, future, cancel_event in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+            self.next_to_play = self.next_index
+            self.stats['cancelled'] += dropped
+            self.condition.notify_all()
+        if dropped:
+            print(f"[TTSPipeline] 🛑 Cancelled {dropped} chunk(s){f' ({reason})' if reason else ''}")
+        return dropped
+
+    def busy(self):
+        """True while any chunk is waiting for synthesis or its turn to play"""
+        with self.condition:
+            return bool(self.pending)
+
+    def get_stats(self):
+        with self.condition:
+            return dict(self.stats, pending=len(self.pending), next_to_play=self.next_to_play)
+
+    def _synthesize(self, fn, args, cancel_event):
+        if cancel_event.is_set():
+            return None, None
+        return fn(*args, cancel_event=cancel_event)
+
+    def _sequencer_loop(self):
+        while True:
+            with self.condition:
+                while self.next_to_play not in self.pending:
+                    self.condition.wait()
+                index = self.next_to_play
+                label, future, cancel_event = self.pending[index]
+
+            # Wait for this chunk only; later ones keep synthesizing meanwhile
+            wait_start = time.time()
+            while not future.done() and not cancel_event.is_set():
+                if _speech_interrupted():
+                    self.cancel("interrupt")
+                    break
+                time.sleep(self.POLL_INTERVAL)
+            if cancel_event.is_set():
+                continue
+
+            try:
+                audio, sample_rate = future.result()
+            except Exception as e:
+                print(f"[TTSPipeline] ❌ Synthesis failed for '{label[:40]}': {e}")
+                audio, sample_rate = None, None
+
+            with self.condition:
+                if cancel_event.is_set():
+                    continue        # Cancelled while the result was being read
+                del self.pending[index]
+                ahead = sum(1 for i, entry in self.pending.items() if i > index and entry[1].done())
+                self.next_to_play = index + 1
+                if audio is None:
+                    self.stats['failed'] += 1
+                    continue
+
+                # Put under the lock so cancel() can't clear the queue in between
+                self.sink((audio, sample_rate))
+                self.stats['played'] += 1
+                if ahead:
+                    self.stats['reordered'] += 1
+                wait_ms = (time.time() - wait_start) * 1000.0
+                self.stats['average_wait_ms'] += (wait_ms - self.stats['average_wait_ms']) / self.stats['played']
+
+            if DEBUG:
+                print(f"[TTSPipeline] ▶️ Chunk {index} queued for playback ({ahead} ready behind it): '{label[:40]}'")
@@ -187,6 +187,18 @@ CHANNELS = 1
 
 # ==== FILE PATHS ====
 KNOWN_USERS_PATH = "voice_profiles/known_users_v2.json"
+VOICE_PROFILE_STORE_BACKEND = "binary"               # "binary" (memory-mapped embeddings) or "json" (legacy single file)
+VOICE_PROFILE_STORE_DIR = "voice_profiles/profile_store"  # Binary store; migrated once from KNOWN_USERS_PATH
+EMBEDDING_STORAGE_PRECISION = "float16"          # Stored model vectors: "float32", "float16" or "int8" (per-vector scale); scoring dequantizes to float32
+WRITE_BEHIND_PERSISTENCE = True                  # Coalesce voice database saves and write them on a background thread
+PERSISTENCE_DEBOUNCE_SECONDS = 1.0               # Quiet period after the last save request before writing
+PERSISTENCE_MAX_DELAY_SECONDS = 5.0              # Upper bound on how long a dirty target waits during a burst
+PERSISTENCE_MAX_RETRIES = 3                      # Background retries for a failed write before waiting for the next request
+IDENTITY_RESOLUTION_BACKGROUND = True            # Resolve memory-fusion identities off the response path
+IDENTITY_REFRESH_SECONDS = 60.0                  # Min seconds between background re-resolutions of the same user
+IDENTITY_MIN_SHARED_TOKENS = 1                   # Profile detail tokens two users must share before an LLM comparison
+NAME_RESOURCES_WARMUP = True                     # Load shared name lexicons/extractor/spaCy on a background thread at startup
+NAME_PREFILTER_ENABLED = True                    # Deterministic introduction pre-filter; only ambiguous utterances reach KoboldCPP
 CONVERSATION_HISTORY_PATH = "conversation_history_v2.json"
 CHIME_PATH = "chime.wav"
 
@@ -197,6 +209,10 @@ KOKORO_API_TIMEOUT = 10
 KOKORO_DEFAULT_VOICE = "af_heart"  # Australian female voice
 KOKORO_STREAMING_ENABLED = True    # Enable streaming TTS
 KOKORO_CHUNK_SIZE = 512           # Audio chunk size for streaming
+KOKORO_POOL_SIZE = 4              # Keep-alive HTTP connections to Kokoro-FastAPI
+TTS_PIPELINE_WORKERS = 3          # Chunks synthesized concurrently ahead of playback (<= KOKORO_POOL_SIZE)
+KOKORO_RESPONSE_FORMAT = "pcm"    # "pcm" (raw int16, no header) or "wav"; falls back to wav if rejected
+KOKORO_PCM_SAMPLE_RATE = 24000    # Kokoro's native output rate (raw PCM carries no header)
 
 # ✅ Voice mapping for different languages (FastAPI voices)
 KOKORO_API_VOICES = {
@@ -228,6 +244,15 @@ KOKORO_LANGS = {"pl": "pl", "en": "en-us", "it": "it"}  # Legacy
 
 # ==== WEBSOCKET URLS ====
 FASTER_WHISPER_WS = "ws://localhost:9090"
+STT_POOL_SIZE = 1                         # Pooled WebSocket connections to the STT server
+STT_CONNECT_TIMEOUT = 5.0                 # Seconds to establish a connection
+STT_RESPONSE_TIMEOUT = 15.0               # Seconds to wait for a transcript
+STT_PING_INTERVAL = 20                    # Keep-alive ping for idle pooled connections (None = off)
+STT_REUSE_CONNECTIONS = True              # Reuse a connection across utterances (False = fresh, pre-dialed one each time)
+STT_INCREMENTAL = True                    # Transcribe captured speech in segments while the user is still talking
+STT_PARTIAL_PAUSE_FRAMES = 20             # VAD hops of pause (200ms) that close a partial segment
+STT_PARTIAL_MIN_SEGMENT_SECONDS = 1.0     # Don't send segments shorter than this at a pause
+STT_PARTIAL_MAX_SEGMENT_SECONDS = 6.0     # Force a segment cut during long unbroken speech
 
 # 🎯 CENTROID VOICE MATCHING SETTINGS
 CENTROID_SIMILARITY_THRESHOLD = 0.85    # Higher threshold for centroid (more reliable)
@@ -264,6 +289,26 @@ TRAINING_PHRASES = [
 
 # ==== LLM SETTINGS ====
 KOBOLD_URL = "http://localhost:5001/v1/chat/completions"
+LLM_POOL_SIZE = 4                 # Keep-alive HTTP connections to KoboldCpp
+LLM_CACHE_SIZE = 256              # Cached auxiliary completions (LRU)
+LLM_CACHE_TTL_SECONDS = 600       # Cached completion lifetime
+LLM_REQUEST_TIMEOUT = 30          # Non-streaming request timeout (seconds)
+KOBOLD_ABORT_URL = "http://localhost:5001/api/extra/abort"  # Stops the generation in progress
+LLM_SCHEDULER_ENABLED = True      # Defer background LLM jobs (memory, fusion) to idle time between turns
+LLM_IDLE_GRACE_SECONDS = 1.5      # Quiet time after speech / a foreground request before background jobs run
+LLM_BACKGROUND_MAX_AGE_SECONDS = 300  # Queued background jobs older than this are dropped
+LLM_PREEMPT_ABORT = True          # Abort a running background generation when the user starts speaking
+LLM_PREEMPT_MAX_RETRIES = 2       # Times a preempted background job is re-queued before it is dropped
+LLM_CONTEXT_WINDOW = 4096         # Model context length (tokens); prompt + reply must fit
+KOBOLD_TOKENCOUNT_URL = "http://localhost:5001/api/extra/tokencount"  # Model's own tokenizer
+CONTEXT_TOKENIZER = "kobold"      # "kobold", "huggingface" (tokenizer.json) or "estimate" (chars / 3.5)
+CONTEXT_TOKENIZER_PATH = ""       # tokenizer.json for the "huggingface" backend
+CONTEXT_TEMPLATE_OVERHEAD_TOKENS = 48  # Chat-template tokens wrapped around system/user messages
+PROMPT_STABLE_PREFIX = True       # Persona block byte-identical every turn; name/memory/clock appended after it
+PROMPT_METRICS_ENABLED = True     # Log TTFT and prompt-processing time per streamed reply
+PROMPT_METRICS_HISTORY = 50       # Turns kept for prompt_metrics.get_stats()
+KOBOLD_PERF_URL = "http://localhost:5001/api/extra/perf"  # Backend timings of the last request
+STREAM_RECORD_DIR = ""            # Save raw SSE streams here for segmenter replay ("" = off)
 MAX_TOKENS = 80
 TEMPERATURE = 0.7
 
@@ -305,6 +350,8 @@ USER_SPEECH_QUALITY_THRESHOLD = 0.25             # How "voice-like" it needs to
 USER_SPEECH_SPECTRAL_THRESHOLD = 0.35            # Voice frequency content (0-1)
 USER_MIN_SPEECH_FRAMES = 5                      # Need sustained speech
 USER_MAX_SILENCE_FRAMES = 80                    # Allow pauses
+VAD_HOP_SIZE = 160                              # Samples between VAD analyses (10ms @ 16kHz); frame counts are in hops
+VAD_WINDOW_SIZE = 160                           # Samples per VAD analysis window (>= hop; larger = overlapping windows)
 
 # ✅ NOISE FILTERING THRESHOLDS
 NOISE_TO_SIGNAL_RATIO = 0.3                     # Background noise vs speech ratio
@@ -507,6 +554,10 @@ TOPIC_TRACKING_ENABLED = True             # Track conversation topics permanentl
 MAX_CONVERSATION_TOPICS = 6               # Remember last 6 topics discussed
 CONTEXT_COMPRESSION_ENABLED = True        # Smart context compression
 MAX_CONTEXT_TOKENS = 1500                 # Optimized token limit
+MEMORY_PIPELINE_ENABLED = True            # Extract/save memories after the reply instead of before it
+MEMORY_PIPELINE_MAX_PENDING = 64          # Bounded post-turn queue; producers wait when full
+MEMORY_PIPELINE_BARRIER_TIMEOUT = 2.0     # Max wait for the previous turn's memories before building context
+MEMORY_PIPELINE_MAX_DEFER_SECONDS = 30.0  # Max wait for Buddy to finish speaking before running a job
 
 # ==== WEATHER API SETTINGS ====
 WEATHER_API_ENABLED = True                      # Enable weather API integration
@@ -559,6 +610,11 @@ ANONYMOUS_CLUSTERING_ENABLED = True           # ✅ NEW: Enable anonymous voice
 ANONYMOUS_CLUSTER_THRESHOLD = 0.6             # ✅ NEW: Similarity threshold for clustering
 MAX_ANONYMOUS_CLUSTERS = 10                   # ✅ NEW: Maximum anonymous clusters
 CLUSTER_MERGE_THRESHOLD = 0.85                # ✅ NEW: Threshold for merging clusters
+CLUSTER_MERGE_BLOCK_SIZE = 4000000            # Max embedding-pair similarities held in memory per block during cluster merging
+ANN_BACKEND = "auto"                          # Speaker ANN index: auto (hnsw if hnswlib is installed, else ivf), hnsw, ivf, exact
+ANN_SWITCH_THRESHOLD = 2000                   # Stored embeddings (or centroids) before identification switches from exact scans to the ANN index
+ANN_CANDIDATES = 32                           # Nearest embeddings fetched from the ANN index, whose profiles are then scored exactly
+ANN_IVF_NPROBE = 16                           # IVF lists scanned per query (more = higher recall, slower)
 CLUSTER_AGING_DAYS = 7                        # ✅ NEW: Days before cleaning old clusters
 ANONYMOUS_CLUSTER_QUALITY_THRESHOLD = 0.2     # ✅ NEW: Quality threshold for anonymous clustering (more permissive)
 
@@ -648,6 +704,9 @@ RECOGNITION_CONFIDENCE_LOGGING = True          # Log all recognition attempts
 THRESHOLD_TUNING_ENABLED = True               # Auto-tune thresholds based on performance
 RECOGNITION_HISTORY_LENGTH = 50               # Keep last 50 recognition attempts
 MULTI_CANDIDATE_SCORING = True                # Use multiple scoring strategies
+UTTERANCE_CACHE_ENABLED = True                # Reuse one utterance's embeddings/quality checks across recognition paths
+UTTERANCE_CACHE_SIZE = 8                      # Utterances kept (least recently used dropped first)
+UTTERANCE_CACHE_TTL_SECONDS = 60              # Cached features older than this are recomputed
 
 # ✅ Context Analysis Settings
 CONTEXT_AWARE_RECOGNITION = True              # Use context for recognition decisions
@@ -21,9 +21,12 @@ from ai.chat_enhanced_smart import generate_response_streaming_with_smart_memory
 from ai.chat_enhanced_smart_with_fusion import generate_response_streaming_with_intelligent_fusion
 
 from voice.voice_manager_instance import voice_manager
-from voice.manager_names import UltraIntelligentNameManager
+from voice.manager_names import UltraIntelligentNameManager, name_resources
+from config import NAME_RESOURCES_WARMUP
 
 voice_manager.ultra_name_manager = UltraIntelligentNameManager(voice_manager)
+if NAME_RESOURCES_WARMUP:
+    name_resources.warm_up()  # KoboldCPP extractor + spaCy load off the main thread
 print("[Main] ✅ UltraIntelligentNameManager assigned to voice_manager")
 
 from config import *
@@ -427,6 +430,14 @@ def handle_streaming_response(text, current_user):
     try:
         print(f"[AdvancedResponse] 🎭 Starting ADVANCED AI streaming for: '{text}'")
         
+        # ⚡ Partial transcript already flagged a direct question - confirm on the final text
+        # and answer before the voice identification work below
+        early_intent = getattr(full_duplex_manager, 'early_intent', None)
+        if early_intent in DIRECT_QUESTION_DETECTORS and DIRECT_QUESTION_DETECTORS[early_intent](text):
+            print(f"[AdvancedResponse] ⚡ Early intent '{early_intent}' confirmed - answering directly")
+            answer_direct_question(early_intent)
+            return
+        
         # ✅ NEW: Get voice-based identity FIRST (overrides system login)
         voice_identified_user = None
         try:
@@ -504,25 +515,10 @@ def handle_streaming_response(text, current_user):
                 return
         
         # Quick responses for direct questions (immediate)
-        if is_direct_time_question(text):
-            brisbane_time = get_current_brisbane_time()
-            if IS_SUNSHINE_COAST:
-                speak_streaming(f"It's {brisbane_time['time_12h']} here in Birtinya, Sunshine Coast.")
-            else:
-                speak_streaming(f"It's {brisbane_time['time_12h']} here in {USER_PRECISE_LOCATION}.")
-            return
-        
-        if is_direct_location_question(text):
-            if IS_SUNSHINE_COAST:
-                speak_streaming(f"I'm located in Birtinya, Sunshine Coast, Queensland {USER_POSTCODE_PRECISE}.")
-            else:
-                speak_streaming(f"I'm located in {USER_PRECISE_LOCATION} {USER_POSTCODE_PRECISE}.")
-            return
-        
-        if is_direct_date_question(text):
-            brisbane_time = get_current_brisbane_time()
-            speak_streaming(f"Today is {brisbane_time['date']}.")
-            return
+        for intent, detector in DIRECT_QUESTION_DETECTORS.items():
+            if detector(text):
+                answer_direct_question(intent)
+                return
         
         # ✅ ADVANCED AI: Natural conversation flow with VOICE-IDENTIFIED USER
         print(f"[AdvancedResponse] 🧠 Starting ADVANCED AI LLM streaming for VOICE USER: {current_user}")
@@ -839,6 +835,30 @@ def is_direct_date_question(text):
     print(f"[DirectDateDetection] ➡️ NOT a direct date question: '{text}' - sending to AI")
     return False
 
+# Direct questions answered without the LLM (also run on partial transcripts as early intents)
+DIRECT_QUESTION_DETECTORS = {
+    "time": is_direct_time_question,
+    "location": is_direct_location_question,
+    "date": is_direct_date_question,
+}
+
+def answer_direct_question(intent):
+    """⚡ Speak the instant answer for a direct time/location/date question"""
+    if intent == "time":
+        brisbane_time = get_current_brisbane_time()
+        if IS_SUNSHINE_COAST:
+            speak_streaming(f"It's {brisbane_time['time_12h']} here in Birtinya, Sunshine Coast.")
+        else:
+            speak_streaming(f"It's {brisbane_time['time_12h']} here in {USER_PRECISE_LOCATION}.")
+    elif intent == "location":
+        if IS_SUNSHINE_COAST:
+            speak_streaming(f"I'm located in Birtinya, Sunshine Coast, Queensland {USER_POSTCODE_PRECISE}.")
+        else:
+            speak_streaming(f"I'm located in {USER_PRECISE_LOCATION} {USER_POSTCODE_PRECISE}.")
+    elif intent == "date":
+        brisbane_time = get_current_brisbane_time()
+        speak_streaming(f"Today is {brisbane_time['date']}.")
+
 def get_current_brisbane_time():
     """Get current Brisbane time with multiple formats"""
     try:
@@ -1054,6 +1074,11 @@ def handle_full_duplex_conversation():
     # Start full duplex manager
     full_duplex_manager.start()
     
+    # Partial transcripts flag direct questions before the user finishes speaking;
+    # handle_streaming_response answers them straight away once the final text confirms
+    for intent, detector in DIRECT_QUESTION_DETECTORS.items():
+        full_duplex_manager.register_early_intent(intent, detector)
+    
     print(f"[FullDuplex] ✅ Ready! Location: {USER_PRECISE_LOCATION}, Time: {brisbane_time_12h}")
     print(f"[FullDuplex] 🎵 TRUE Streaming LLM: ENABLED")
     print(f"[FullDuplex] 🚀 ADVANCED AI ASSISTANT: {'ACTIVE' if ADVANCED_AI_AVAILABLE else 'ENHANCED' if ENHANCED_VOICE_AVAILABLE else 'BASIC'}")
@@ -1502,6 +1527,8 @@ def handle_full_duplex_conversation():
                     audio_stats = get_audio_stats()
                     print(f"[FullDuplex] 📊 Full Duplex Stats: {stats}")
                     print(f"[FullDuplex] 🎵 Audio Stats: {audio_stats}")
+                    from voice.utterance_cache import utterance_cache
+                    print(f"[FullDuplex] 🗂️ Utterance Cache: {utterance_cache.get_stats()}")
                 except:
                     print(f"[FullDuplex] 📊 Full Duplex Stats: {stats}")
                 
@@ -2050,6 +2077,28 @@ def main():
                 except:
                     pass
     
+    # Let post-turn memory extraction finish before the final saves
+    try:
+        from ai.memory_pipeline import memory_pipeline
+        if not memory_pipeline.flush(timeout=5.0):
+            print(f"[AdvancedBuddy] ⚠️ Memory pipeline still busy at shutdown: {memory_pipeline.get_stats()}")
+    except Exception as e:
+        print(f"[AdvancedBuddy] ⚠️ Memory pipeline flush error: {e}")
+    
+    # Write any coalesced voice database saves still waiting on the persistence thread
+    try:
+        from utils.persistence import persistence_service
+        persistence_service.shutdown()
+        print(f"[AdvancedBuddy] 💾 Persistence stats: {persistence_service.get_stats()}")
+    except Exception as e:
+        print(f"[AdvancedBuddy] ⚠️ Persistence flush error: {e}")
+    
+    try:
+        from ai.stt_client import stt_client
+        stt_client.close()
+    except Exception as e:
+        print(f"[AdvancedBuddy] ⚠️ STT client close error: {e}")
+    
     print("[AdvancedBuddy] ✅ ADVANCED AI ASSISTANT cleanup complete!")
 
 if __name__ == "__main__":
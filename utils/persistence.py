@@ -0,0 +1,266 @@
+# utils/persistence.py - Write-behind, coalescing persistence service
+"""
+Background persistence for voice data.
+
+Callers mark a target dirty with request_save(); a single daemon thread waits
+for the burst to settle (debounce, capped by a max delay) and performs one
+write per burst. Writers run on the persistence thread, so the conversational
+thread never blocks on disk. Pending saves are flushed on shutdown/exit.
+
+Targets registered with a snapshot callable have it called inside
+request_save(), on the requesting thread, and the writer receives the latest
+snapshot. The writer thread never iterates data that is still being mutated.
+Each snapshot is stamped with a per-target sequence number, and a write older
+than the last one performed is skipped, so a flush() racing the worker can
+never be overwritten by an older copy.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+from config import (
+    WRITE_BEHIND_PERSISTENCE,
+    PERSISTENCE_DEBOUNCE_SECONDS,
+    PERSISTENCE_MAX_DELAY_SECONDS,
+    PERSISTENCE_MAX_RETRIES,
+)
+
+NO_SNAPSHOT = object()      # Writer takes no argument (target registered without a snapshot callable)
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """💾 Write JSON to a temp file in the same directory, fsync, then rename over path"""
+    path = str(path)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class WriteBehindPersistence:
+    """🗄️ Coalesces bursts of save requests into one background write per target"""
+
+    def __init__(self, debounce_seconds=1.0, max_delay_seconds=5.0, max_retries=3, enabled=True):
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.max_retries = max_retries
+        self.enabled = enabled
+
+        self.writers = {}        # target -> callable([snapshot]) returning truthy on success
+        self.snapshots = {}      # target -> callable() returning a consistent copy of the data to write
+        self.pending = {}        # target -> {'first': t, 'last': t, 'attempts': n, 'data': snapshot, 'seq': n}
+        self.sequences = {}      # target -> sequence number of the newest snapshot taken
+        self.written = {}        # target -> sequence number of the newest snapshot written (under write_lock)
+        self.stats = {}          # target -> counters
+
+        self.condition = threading.Condition()
+        self.write_lock = threading.RLock()   # one write at a time (worker vs flush)
+        self.sequence_lock = threading.Lock() # snapshot + sequence number taken together
+        self.worker = None
+        self.stopped = False
+
+    def register(self, target, writer, snapshot=None):
+        """📝 Register a writer callable for a named target
+
+        With snapshot, request_save() calls snapshot() on the caller's thread and
+        the writer is later called as writer(data) with the most recent copy.
+        """
+        with self.condition:
+            self.writers[target] = writer
+            if snapshot is not None:
+                self.snapshots[target] = snapshot
+            self.stats.setdefault(target, {
+                'requested': 0,
+                'performed': 0,
+                'coalesced': 0,
+                'failures': 0,
+                'stale_skipped': 0,
+                'last_duration_ms': 0.0,
+                'last_write': None,
+            })
+
+    def request_save(self, target):
+        """💾 Mark target dirty; the write happens later on the persistence thread"""
+        if target not in self.writers:
+            print(f"[Persistence] ❌ Unknown save target: {target}")
+            return False
+
+        with self.sequence_lock:
+            data = self._snapshot(target)
+            if data is None:
+                return False
+            seq = self.sequences.get(target, 0) + 1
+            self.sequences[target] = seq
+
+        if not self.enabled or self.stopped:
+            self.stats[target]['requested'] += 1
+            return self._perform(target, data, seq)
+
+        now = time.monotonic()
+        with self.condition:
+            stats = self.stats[target]
+            stats['requested'] += 1
+            entry = self.pending.get(target)
+            if entry is None:
+                self.pending[target] = {'first': now, 'last': now, 'attempts': 0, 'data': data, 'seq': seq}
+            else:
+                entry['last'] = now
+                if seq > entry['seq']:
+                    entry['data'] = data    # Newest snapshot wins
+                    entry['seq'] = seq
+                stats['coalesced'] += 1
+            self._ensure_worker()
+            self.condition.notify()
+        return True
+
+    def flush(self, target=None):
+        """⚡ Synchronously write pending targets (all, or just one) on the caller's thread"""
+        with self.condition:
+            if target is None:
+                targets = list(self.pending.keys())
+            else:
+                targets = [target] if target in self.pending else []
+            entries = {name: self.pending.pop(name) for name in targets}
+
+        ok = True
+        for name, entry in entries.items():
+            if not self._perform(name, entry.get('data', NO_SNAPSHOT), entry.get('seq')):
+                ok = False
+        return ok
+
+    def shutdown(self):
+        """🛑 Flush everything and stop the worker; later requests write synchronously"""
+        with self.condition:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.condition.notify_all()
+
+        pending = len(self.pending)
+        if pending:
+            print(f"[Persistence] 💾 Flushing {pending} pending save(s) on shutdown...")
+        self.flush()
+
+        if self.worker is not None and self.worker is not threading.current_thread():
+            self.worker.join(timeout=5.0)
+
+    def has_pending(self, target=None):
+        with self.condition:
+            return bool(self.pending) if target is None else target in self.pending
+
+    def get_stats(self):
+        """📊 Saves requested vs performed per target"""
+        with self.condition:
+            return {
+                target: dict(stats, pending=target in self.pending)
+                for target, stats in self.stats.items()
+            }
+
+    def _ensure_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._worker_loop, name="WriteBehindPersistence", daemon=True)
+            self.worker.start()
+
+    def _due_time(self, entry):
+        return min(entry['last'] + self.debounce_seconds, entry['first'] + self.max_delay_seconds)
+
+    def _worker_loop(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    if self.pending:
+                        now = time.monotonic()
+                        next_due = min(self._due_time(e) for e in self.pending.values())
+                        if next_due <= now:
+                            break
+                        self.condition.wait(next_due - now)
+                    else:
+                        self.condition.wait()
+
+                if self.stopped:
+                    return
+
+                now = time.monotonic()
+                due = [name for name, entry in self.pending.items() if self._due_time(entry) <= now]
+                entries = {name: self.pending.pop(name) for name in due}
+
+            for name, entry in entries.items():
+                if self._perform(name, entry.get('data', NO_SNAPSHOT), entry.get('seq')):
+                    continue
+                with self.condition:
+                    if self.stopped:
+                        continue
+                    attempts = entry['attempts'] + 1
+                    if attempts > self.max_retries:
+                        print(f"[Persistence] ❌ Giving up on '{name}' after {attempts} attempts (will retry on next request)")
+                        continue
+                    # Re-queue unless a newer request already did; back off by one debounce interval
+                    retry_at = time.monotonic()
+                    current = self.pending.setdefault(name, {'first': retry_at, 'last': retry_at, 'attempts': 0,
+                                                             'data': entry.get('data', NO_SNAPSHOT),
+                                                             'seq': entry.get('seq')})
+                    current['attempts'] = max(current['attempts'], attempts)
+
+    def _snapshot(self, target):
+        """Copy of the target's data taken on the calling thread (NO_SNAPSHOT if it has none, None on error)"""
+        snapshot = self.snapshots.get(target)
+        if snapshot is None:
+            return NO_SNAPSHOT
+        try:
+            return snapshot()
+        except Exception as e:
+            print(f"[Persistence] ❌ Snapshot error for '{target}': {e}")
+            return None
+
+    def _perform(self, target, data=NO_SNAPSHOT, seq=None):
+        writer = self.writers[target]
+        with self.write_lock:
+            if seq is not None and seq <= self.written.get(target, 0):
+                # A newer snapshot was already written (flush won the race) - don't overwrite it
+                with self.condition:
+                    self.stats[target]['stale_skipped'] += 1
+                return True
+            start = time.perf_counter()
+            try:
+                ok = writer() if data is NO_SNAPSHOT else writer(data)
+            except Exception as e:
+                print(f"[Persistence] ❌ Write error for '{target}': {e}")
+                import traceback
+                traceback.print_exc()
+                ok = False
+            duration_ms = (time.perf_counter() - start) * 1000.0
+            if ok is not False and seq is not None:
+                self.written[target] = seq
+
+        with self.condition:
+            stats = self.stats[target]
+            stats['last_duration_ms'] = duration_ms
+            if ok is False:
+                stats['failures'] += 1
+                return False
+            stats['performed'] += 1
+            stats['last_write'] = time.time()
+        return True
+
+
+# Global instance
+persistence_service = WriteBehindPersistence(
+    debounce_seconds=PERSISTENCE_DEBOUNCE_SECONDS,
+    max_delay_seconds=PERSISTENCE_MAX_DELAY_SECONDS,
+    max_retries=PERSISTENCE_MAX_RETRIES,
+    enabled=WRITE_BEHIND_PERSISTENCE,
+)
+
+atexit.register(persistence_service.shutdown)
@@ -0,0 +1,557 @@
+# voice/ann_index.py - Approximate nearest-neighbour search for large speaker/cluster populations
+"""
+Recognition scores a query against every stored embedding. Passive collection
+keeps creating Anonymous_XXX clusters, so that linear scan grows without bound.
+
+Backends share one API - add(key, vector), remove(key), search(query, k) ->
+[(key, score)] by inner product on unit vectors, len(), get_stats():
+
+- BruteForceIndex: exact scan over one contiguous matrix (fallback, recall reference)
+- IVFIndex: inverted-file index in numpy (spherical k-means coarse quantizer,
+  ANN_IVF_NPROBE lists scanned per query), works offline with no extra packages
+- HNSWIndex: hnswlib graph index, used when hnswlib is installed
+
+ProfileCandidateIndex sits on top for the recognition paths: below
+ANN_SWITCH_THRESHOLD embeddings it returns None (callers keep their exact
+scan), above it the nearest ANN_CANDIDATES rows are looked up and only
+their profiles are scored with the usual exact comparison.
+"""
+import threading
+import time
+import numpy as np
+from config import (
+    ANN_BACKEND,
+    ANN_CANDIDATES,
+    ANN_IVF_NPROBE,
+    ANN_SWITCH_THRESHOLD,
+    DEBUG,
+)
+from voice.embedding_index import embeddings_signature, extract_model_vectors
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) + 1e-8)
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class BruteForceIndex:
+    """🎯 Exact inner-product search over a growable float32 matrix"""
+
+    backend = 'exact'
+
+    def __init__(self, dim, initial_capacity=1024):
+        self.dim = dim
+        self.lock = threading.RLock()
+        self.capacity = initial_capacity
+        self.vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self.active = np.zeros(initial_capacity, dtype=bool)
+        self.row_keys = []          # row -> key (None when freed)
+        self.rows = {}              # key -> row
+        self.free_rows = []
+        self.stats = {'queries': 0, 'adds': 0, 'removes': 0, 'scanned_rows': 0}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _grow(self, capacity):
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        active = np.zeros(capacity, dtype=bool)
+        vectors[:self.capacity] = self.vectors
+        active[:self.capacity] = self.active
+        self.vectors, self.active, self.capacity = vectors, active, capacity
+
+    def _store(self, key, vector):
+        """Write vector into key's row (allocating one if new); returns the row"""
+        row = self.rows.get(key)
+        if row is None:
+            if self.free_rows:
+                row = self.free_rows.pop()
+                self.row_keys[row] = key
+            else:
+                row = len(self.row_keys)
+                if row >= self.capacity:
+                    self._grow(self.capacity * 2)
+                self.row_keys.append(key)
+            self.rows[key] = row
+        self.vectors[row] = _unit(vector)
+        self.active[row] = True
+        self.stats['adds'] += 1
+        return row
+
+    def add(self, key, vector):
+        with self.lock:
+            self._store(key, vector)
+
+    def remove(self, key):
+        with self.lock:
+            row = self.rows.pop(key, None)
+            if row is None:
+                return None
+            self.active[row] = False
+            self.row_keys[row] = None
+            self.free_rows.append(row)
+            self.stats['removes'] += 1
+            return row
+
+    def _search_rows(self, query, k, rows=None):
+        if rows is None:
+            count = len(self.row_keys)
+            scores = self.vectors[:count] @ query
+            scores[~self.active[:count]] = -np.inf
+            rows = np.arange(count)
+        else:
+            scores = self.vectors[rows] @ query
+        self.stats['scanned_rows'] += len(rows)
+        results = []
+        for i in _top_k(scores, k):
+            if not np.isfinite(scores[i]):
+                break
+            results.append((self.row_keys[rows[i]], float(scores[i])))
+        return results
+
+    def search(self, query, k=10):
+        with self.lock:
+            self.stats['queries'] += 1
+            if not self.rows or k <= 0:
+                return []
+            return self._search_rows(_unit(query), min(k, len(self.rows)))
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, backend=self.backend, size=len(self.rows), dim=self.dim)
+
+
+class IVFIndex(BruteForceIndex):
+    """🗂️ Inverted-file ANN: rows bucketed by nearest k-means centroid, only the closest buckets scanned"""
+
+    backend = 'ivf'
+    TRAIN_ITERATIONS = 8
+    SAMPLES_PER_LIST = 40       # k-means training sample size per list
+
+    def __init__(self, dim, initial_capacity=1024, nprobe=ANN_IVF_NPROBE, min_train_size=1024):
+        super().__init__(dim, initial_capacity)
+        self.nprobe = max(1, nprobe)
+        self.min_train_size = min_train_size
+        self.centroids = None
+        self.row_list = np.full(initial_capacity, -1, dtype=np.int64)
+        self.lists = []             # list index -> set of rows
+        self.list_arrays = {}       # list index -> cached np array of its rows
+        self.trained_size = 0
+        self.stats.update({'trainings': 0, 'last_train_ms': 0.0})
+
+    def _grow(self, capacity):
+        row_list = np.full(capacity, -1, dtype=np.int64)
+        row_list[:self.capacity] = self.row_list
+        self.row_list = row_list
+        super()._grow(capacity)
+
+    def _assign(self, rows):
+        """Nearest centroid per row, in chunks to bound the score matrix"""
+        assignment = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), 8192):
+            chunk = rows[start:start + 8192]
+            assignment[start:start + len(chunk)] = np.argmax(self.vectors[chunk] @ self.centroids.T, axis=1)
+        return assignment
+
+    def _unlink(self, row):
+        list_index = self.row_list[row]
+        if list_index >= 0:
+            self.lists[list_index].discard(row)
+            self.list_arrays.pop(list_index, None)
+            self.row_list[row] = -1
+
+    def _link(self, row, list_index):
+        self.lists[list_index].add(row)
+        self.list_arrays.pop(list_index, None)
+        self.row_list[row] = list_index
+
+    def add(self, key, vector):
+        with self.lock:
+            row = self._store(key, vector)
+            if self.centroids is not None:
+                self._unlink(row)
+                self._link(row, int(np.argmax(self.centroids @ self.vectors[row])))
+
+    def remove(self, key):
+        with self.lock:
+            row = super().remove(key)
+            if row is not None and self.centroids is not None:
+                self._unlink(row)
+            return row
+
+    def train(self):
+        """Spherical k-means on a sample of the rows, then bucket every row"""
+        with self.lock:
+            start_time = time.time()
+            rows = np.flatnonzero(self.active[:len(self.row_keys)])
+            if len(rows) == 0:
+                return
+            list_count = max(1, int(np.sqrt(len(rows))))
+            rng = np.random.default_rng(len(rows))
+            sample = rows if len(rows) <= list_count * self.SAMPLES_PER_LIST else \
+                rng.choice(rows, list_count * self.SAMPLES_PER_LIST, replace=False)
+            data = self.vectors[sample]
+            centroids = data[rng.choice(len(data), list_count, replace=False)].copy()
+
+            for _ in range(self.TRAIN_ITERATIONS):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, data)
+                empty = ~sums.any(axis=1)
+                sums[empty] = data[rng.choice(len(data), int(empty.sum()))]      # Reseed empty lists
+                centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-8)
+
+            self.centroids = centroids.astype(np.float32)
+            self.lists = [set() for _ in range(list_count)]
+            self.list_arrays = {}
+            self.row_list[:] = -1
+            for row, list_index in zip(rows.tolist(), self._assign(rows).tolist()):
+                self.lists[list_index].add(row)
+                self.row_list[row] = list_index
+            self.trained_size = len(rows)
+            self.stats['trainings'] += 1
+            self.stats['last_train_ms'] = (time.time() - start_time) * 1000.0
+            if DEBUG:
+                print(f"[ANNIndex] 🗂️ IVF trained: {list_count} lists over {len(rows)} rows "
+                      f"in {self.stats['last_train_ms']:.0f}ms")
+
+    def _maybe_train(self):
+        size = len(self.rows)
+        if size < self.min_train_size:
+            return
+        if self.centroids is None or size > 4 * self.trained_size:
+            self.train()
+
+    def _list_rows(self, list_index):
+        rows = self.list_arrays.get(list_index)
+        if rows is None:
+            rows = np.fromiter(self.lists[list_index], dtype=np.int64, count=len(self.lists[list_index]))
+            self.list_arrays[list_index] = rows
+        return rows
+
+    def search(self, query, k=10):
+        with self.lock:
+            self.stats['queries'] += 1
+            if not self.rows or k <= 0:
+                return []
+            self._maybe_train()
+            query = _unit(query)
+            if self.centroids is None:
+                return self._search_rows(query, min(k, len(self.rows)))
+
+            probe = _top_k(self.centroids @ query, min(self.nprobe, len(self.lists)))
+            rows = np.concatenate([self._list_rows(i) for i in probe])
+            if len(rows) < k:
+                return self._search_rows(query, min(k, len(self.rows)))
+            return self._search_rows(query, k, rows)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(super().get_stats(), lists=len(self.lists), nprobe=self.nprobe)
+
+
+class HNSWIndex:
+    """🕸️ hnswlib graph index (inner product) keyed like the other backends"""
+
+    backend = 'hnsw'
+
+    def __init__(self, dim, initial_capacity=1024, m=16, ef_construction=100, ef_search=64):
+        self.dim = dim
+        self.lock = threading.RLock()
+        self.ef_search = ef_search
+        self.index = hnswlib.Index(space='ip', dim=dim)
+        self.index.init_index(max_elements=initial_capacity, ef_construction=ef_construction, M=m,
+                              allow_replace_deleted=True)
+        self.index.set_ef(ef_search)
+        self.labels = {}            # key -> label
+        self.label_keys = {}        # label -> key
+        self.next_label = 0
+        self.deleted = 0
+        self.stats = {'queries': 0, 'adds': 0, 'removes': 0}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, key, vector):
+        with self.lock:
+            if key in self.labels:
+                self.remove(key)
+            if not self.deleted and self.index.element_count >= self.index.max_elements:
+                self.index.resize_index(self.index.max_elements * 2)
+            label = self.next_label
+            self.next_label += 1
+            self.index.add_items(_unit(vector)[None, :], np.array([label]), replace_deleted=self.deleted > 0)
+            if self.deleted:
+                self.deleted -= 1
+            self.labels[key] = label
+            self.label_keys[label] = key
+            self.stats['adds'] += 1
+
+    def remove(self, key):
+        with self.lock:
+            label = self.labels.pop(key, None)
+            if label is None:
+                return None
+            self.label_keys.pop(label, None)
+            self.index.mark_deleted(label)
+            self.deleted += 1
+            self.stats['removes'] += 1
+            return label
+
+    def search(self, query, k=10):
+        with self.lock:
+            self.stats['queries'] += 1
+            k = min(k, len(self.labels))
+            if k <= 0:
+                return []
+            self.index.set_ef(max(self.ef_search, k))
+            while k > 0:
+                try:
+                    labels, distances = self.index.knn_query(_unit(query)[None, :], k=k)
+                    break
+                except RuntimeError:
+                    k //= 2         # Too few reachable live elements for k
+            else:
+                return []
+            return [(self.label_keys[label], 1.0 - float(distance))
+                    for label, distance in zip(labels[0].tolist(), distances[0].tolist())
+                    if label in self.label_keys]
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, backend=self.backend, size=len(self.labels), dim=self.dim)
+
+
+ANN_BACKENDS = {
+    'exact': BruteForceIndex,
+    'ivf': IVFIndex,
+    'hnsw': HNSWIndex,
+}
+
+
+def create_ann_index(dim, backend=ANN_BACKEND, **kwargs):
+    """Instantiate a backend by name ('auto' = hnsw when hnswlib is installed, else ivf)"""
+    if backend == 'auto':
+        backend = 'hnsw' if HNSWLIB_AVAILABLE else 'ivf'
+    if backend == 'hnsw' and not HNSWLIB_AVAILABLE:
+        print("[ANNIndex] ⚠️ hnswlib not installed - using the IVF backend")
+        backend = 'ivf'
+    if backend not in ANN_BACKENDS:
+        print(f"[ANNIndex] ⚠️ Unknown ANN backend '{backend}' - using exact search")
+        backend = 'exact'
+    return ANN_BACKENDS[backend](dim, **kwargs)
+
+
+class EnsembleLayout:
+    """📐 Concatenates per-model unit vectors scaled by sqrt(weight / total weight)
+
+    The inner product of two such vectors is the weighted average of the
+    per-model cosine similarities - compare_dual_embeddings' ensemble without
+    the confidence adjustment - so one ANN search ranks dual embeddings.
+    """
+
+    def __init__(self, model_dims, model_weights):
+        self.model_weights = dict(model_weights)
+        total = sum(model_weights.get(m, 0) for m in model_dims) or 1.0
+        self.slices = {}
+        self.scales = {}
+        offset = 0
+        for model_name, dim in model_dims.items():
+            if not model_weights.get(model_name):
+                continue
+            self.slices[model_name] = slice(offset, offset + dim)
+            self.scales[model_name] = np.float32(np.sqrt(model_weights[model_name] / total))
+            offset += dim
+        self.dim = offset
+
+    def vector(self, embedding):
+        """Layout vector for an embedding, or None if it shares no model with the layout"""
+        if isinstance(embedding, dict) and 'embedding_data' in embedding:
+            embedding = embedding['embedding_data']         # SmartVoiceCluster entries
+        vectors, _ = extract_model_vectors(embedding)
+        out = np.zeros(self.dim, dtype=np.float32)
+        used = False
+        for model_name, part in self.slices.items():
+            vector = vectors.get(model_name)
+            if vector is not None and len(vector) == part.stop - part.start:
+                out[part] = _unit(vector) * self.scales[model_name]
+                used = True
+        return out if used else None
+
+
+def _profile_embeddings(profile):
+    """'embeddings' list of a known_users / anonymous_clusters entry, or a SmartVoiceCluster's entries"""
+    if isinstance(profile, dict):
+        return profile.get('embeddings') or []
+    return getattr(profile, 'embeddings', None) or []
+
+
+class ProfileCandidateIndex:
+    """🔎 Auto-switching candidate generator over a profile collection
+
+    Rows are keyed (profile_id, position) and re-indexed per profile when its
+    per-item embedding signature changes (append, prune or an in-place
+    replacement), like SpeakerEmbeddingIndex.sync().
+    """
+
+    def __init__(self, name, embeddings_of=_profile_embeddings, threshold=ANN_SWITCH_THRESHOLD,
+                 candidates=ANN_CANDIDATES, backend=ANN_BACKEND):
+        self.name = name
+        self.embeddings_of = embeddings_of
+        self.threshold = threshold
+        self.candidate_rows = candidates
+        self.backend = backend
+        self.lock = threading.RLock()
+        self.layout = None
+        self.index = None
+        self.profile_rows = {}      # profile_id -> number of rows indexed
+        self.signatures = {}
+        self.stats = {'exact_scans': 0, 'ann_queries': 0, 'builds': 0, 'reindexed_profiles': 0}
+
+    def _population(self, profiles):
+        return sum(len(self.embeddings_of(p)) for p in profiles.values())
+
+    def _build(self, profiles, model_weights):
+        model_dims = {}
+        for profile in profiles.values():
+            for embedding in self.embeddings_of(profile):
+                if isinstance(embedding, dict) and 'embedding_data' in embedding:
+                    embedding = embedding['embedding_data']
+                for model_name, vector in extract_model_vectors(embedding)[0].items():
+                    model_dims.setdefault(model_name, len(vector))
+        layout = EnsembleLayout(model_dims, model_weights)
+        if layout.dim == 0:
+            return False
+
+        start_time = time.time()
+        self.layout = layout
+        self.index = create_ann_index(layout.dim, self.backend)
+        self.profile_rows = {}
+        self.signatures = {}
+        self._sync(profiles)
+        self.stats['builds'] += 1
+        print(f"[ANNIndex] 🔎 {self.name}: {self.index.backend} index over {len(self.index)} embeddings "
+              f"built in {(time.time() - start_time) * 1000:.0f}ms")
+        return True
+
+    def _index_profile(self, profile_id, profile):
+        for position in range(self.profile_rows.pop(profile_id, 0)):
+            self.index.remove((profile_id, position))
+        embeddings = self.embeddings_of(profile) if profile is not None else []
+        for position, embedding in enumerate(embeddings):
+            vector = self.layout.vector(embedding)
+            if vector is not None:
+                self.index.add((profile_id, position), vector)
+        if profile is None:
+            self.signatures.pop(profile_id, None)
+        else:
+            self.profile_rows[profile_id] = len(embeddings)
+            self.signatures[profile_id] = embeddings_signature(profile, embeddings)
+
+    def _sync(self, profiles):
+        for profile_id in [pid for pid in self.signatures if pid not in profiles]:
+            self._index_profile(profile_id, None)
+        for profile_id, profile in profiles.items():
+            if self.signatures.get(profile_id) != embeddings_signature(profile, self.embeddings_of(profile)):
+                self._index_profile(profile_id, profile)
+                self.stats['reindexed_profiles'] += 1
+
+    def candidates(self, query, profiles, model_weights):
+        """Profile ids worth scoring exactly, or None when the population is small enough to scan"""
+        with self.lock:
+            try:
+                if self._population(profiles) < self.threshold:
+                    self.stats['exact_scans'] += 1
+                    return None
+                if self.index is None or self.layout.model_weights != dict(model_weights):
+                    if not self._build(profiles, model_weights):
+                        return None
+                else:
+                    self._sync(profiles)
+
+                vector = self.layout.vector(query)
+                if vector is None:
+                    return None
+                self.stats['ann_queries'] += 1
+                return {key[0] for key, _ in self.index.search(vector, self.candidate_rows)}
+            except Exception as e:
+                print(f"[ANNIndex] ❌ {self.name} candidate search error: {e}")
+                return None
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, index=self.index.get_stats() if self.index is not None else None)
+
+
+# Candidate index for recognize_with_multiple_embeddings over known_users
+known_users_candidates = ProfileCandidateIndex('known_users')
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def _synthetic_embeddings(count, dim=448, speakers=None, noise=0.6, seed=0):
+    """Unit vectors scattered around per-speaker centres (~20 samples per speaker)"""
+    rng = np.random.default_rng(seed)
+    speakers = speakers or max(1, count // 20)
+    centres = rng.standard_normal((speakers, dim)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    labels = rng.integers(speakers, size=count)
+    data = centres[labels] + rng.standard_normal((count, dim)).astype(np.float32) * (noise / np.sqrt(dim))
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    queries = centres[rng.integers(speakers, size=200)] + \
+        rng.standard_normal((200, dim)).astype(np.float32) * (noise / np.sqrt(dim))
+    return data, queries
+
+
+def benchmark_ann(sizes=(1000, 10000, 100000), k=10, backends=None):
+    """⏱️ Build time, query latency and recall@k of each backend against exact search"""
+    print("⏱️ ANN INDEX BENCHMARK")
+    print("=" * 60)
+    backends = backends or [b for b in ANN_BACKENDS if b != 'hnsw' or HNSWLIB_AVAILABLE]
+    if not HNSWLIB_AVAILABLE:
+        print("   (hnswlib not installed - HNSW backend skipped)")
+
+    for size in sizes:
+        data, queries = _synthetic_embeddings(size)
+        exact = BruteForceIndex(data.shape[1], initial_capacity=size)
+        for i, vector in enumerate(data):
+            exact.add(i, vector)
+        truth = [{key for key, _ in exact.search(q, k)} for q in queries]
+
+        print(f"📦 {size} embeddings ({data.shape[1]}-d), {len(queries)} queries, recall@{k}:")
+        for backend in backends:
+            start = time.perf_counter()
+            index = create_ann_index(data.shape[1], backend, initial_capacity=size)
+            for i, vector in enumerate(data):
+                index.add(i, vector)
+            index.search(queries[0], k)             # IVF trains lazily on the first query
+            build_ms = (time.perf_counter() - start) * 1000.0
+
+            start = time.perf_counter()
+            results = [{key for key, _ in index.search(q, k)} for q in queries]
+            query_ms = (time.perf_counter() - start) * 1000.0 / len(queries)
+            recall = np.mean([len(found & expected) / len(expected) for found, expected in zip(results, truth)])
+            print(f"   {backend:6s} build {build_ms:9.1f}ms   query {query_ms:7.3f}ms   recall {recall:.3f}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        benchmark_ann()
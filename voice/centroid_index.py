@@ -0,0 +1,282 @@
+# voice/centroid_index.py - Running, normalized cluster centroids for centroid matching
+"""
+Centroid matching in voice/manager.py used to rebuild np.mean(np.array(...))
+from the JSON embedding lists of every cluster on every lookup.
+
+Each cluster here keeps the running sum and count of its embedding vectors
+plus the normalized centroid (sum / |sum|, the same direction as the mean),
+stored as one row of a float64 matrix. Adding or removing a sample is an O(d)
+update of the sum and that single row; scoring a query against every
+cluster is one matrix-vector product.
+
+Profiles are also mutated outside the manager (database loads, cluster
+merges, conversions to named users), so lookups first reconcile against the
+profile dict with the same per-item signature check the embedding index uses
+and re-sum only the clusters whose embedding list (or any item in it) changed.
+"""
+import threading
+import numpy as np
+from config import ANN_SWITCH_THRESHOLD
+from voice.ann_index import create_ann_index
+from voice.embedding_index import embeddings_signature, extract_model_vectors
+
+CENTROID_MODEL = 'resemblyzer'      # Plain list embeddings are resemblyzer vectors
+RESUM_EVERY = 256                   # Incremental updates before a cluster's sum is recomputed (float drift guard)
+
+
+def centroid_vector(embedding):
+    """The float64 vector an embedding contributes to its cluster centroid, or None"""
+    if isinstance(embedding, (list, tuple, np.ndarray)):
+        try:
+            vector = np.asarray(embedding, dtype=np.float64)
+        except (TypeError, ValueError):
+            return None
+        return vector if vector.ndim == 1 and vector.size else None
+    vectors, _ = extract_model_vectors(embedding)
+    vector = vectors.get(CENTROID_MODEL)
+    return vector.astype(np.float64) if vector is not None else None
+
+
+def centroid_embeddings(profile):
+    """Embedding list centroid matching uses for a profile ('embeddings' only, like the old loop)"""
+    if isinstance(profile, dict):
+        return profile.get('embeddings') or []
+    return []
+
+
+class _ClusterCentroid:
+    __slots__ = ('cluster_id', 'slot', 'sum', 'count', 'items', 'updates')
+
+    def __init__(self, cluster_id, slot, dim):
+        self.cluster_id = cluster_id
+        self.slot = slot
+        self.sum = np.zeros(dim, dtype=np.float64)
+        self.count = 0          # vectors summed
+        self.items = 0          # list entries seen (including unusable ones)
+        self.updates = 0        # incremental updates since the last full re-sum
+
+
+class ClusterCentroidIndex:
+    """🎯 Per-cluster running centroid sums with a normalized centroid matrix for one-shot scoring"""
+
+    def __init__(self, name, initial_capacity=64):
+        self.name = name
+        self.lock = threading.RLock()
+        self.dim = None
+        self.centroids = np.zeros((0, 0), dtype=np.float64)
+        self.valid = np.zeros(0, dtype=bool)
+        self.capacity = initial_capacity
+        self.clusters = {}          # cluster_id -> _ClusterCentroid
+        self.free_slots = []
+        self.next_slot = 0
+        self.signatures = {}        # cluster_id -> embeddings signature the sum matches
+        self.ann = None             # ANN index over the centroids, once there are ANN_SWITCH_THRESHOLD of them
+        self.stats = {'queries': 0, 'ann_queries': 0, 'incremental_updates': 0, 'resums': 0, 'merges': 0}
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def _ensure_dim(self, dim):
+        if self.dim is None:
+            self.dim = dim
+            self.centroids = np.zeros((self.capacity, dim), dtype=np.float64)
+            self.valid = np.zeros(self.capacity, dtype=bool)
+        return self.dim == dim
+
+    def _state_for(self, cluster_id):
+        state = self.clusters.get(cluster_id)
+        if state is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+            else:
+                slot = self.next_slot
+                self.next_slot += 1
+                if slot >= self.capacity:
+                    self.capacity *= 2
+                    centroids = np.zeros((self.capacity, self.dim), dtype=np.float64)
+                    valid = np.zeros(self.capacity, dtype=bool)
+                    centroids[:slot] = self.centroids[:slot]
+                    valid[:slot] = self.valid[:slot]
+                    self.centroids, self.valid = centroids, valid
+            state = _ClusterCentroid(cluster_id, slot, self.dim)
+            self.clusters[cluster_id] = state
+        return state
+
+    def _refresh_row(self, state):
+        norm = np.linalg.norm(state.sum)
+        if state.count and norm > 0:
+            self.centroids[state.slot] = state.sum / norm
+            self.valid[state.slot] = True
+            if self.ann is not None:
+                self.ann.add(state.cluster_id, self.centroids[state.slot])
+        else:
+            self.valid[state.slot] = False
+            if self.ann is not None:
+                self.ann.remove(state.cluster_id)
+
+    def _accumulate(self, state, embedding, sign):
+        vector = centroid_vector(embedding)
+        state.items += sign
+        if vector is None or len(vector) != self.dim:
+            return
+        state.sum += sign * vector
+        state.count += sign
+
+    def set_cluster(self, cluster_id, profile):
+        """Re-sum a cluster from its embedding list"""
+        embeddings = centroid_embeddings(profile)
+        with self.lock:
+            vectors = [centroid_vector(e) for e in embeddings]
+            if self.dim is None:
+                dims = [len(v) for v in vectors if v is not None]
+                if not dims:
+                    self.remove_cluster(cluster_id)
+                    self.signatures[cluster_id] = embeddings_signature(profile, embeddings)
+                    return
+                self._ensure_dim(dims[0])
+
+            state = self._state_for(cluster_id)
+            state.sum[:] = 0.0
+            state.count = 0
+            state.items = len(embeddings)
+            state.updates = 0
+            for vector in vectors:
+                if vector is not None and len(vector) == self.dim:
+                    state.sum += vector
+                    state.count += 1
+            self._refresh_row(state)
+            self.signatures[cluster_id] = embeddings_signature(profile, embeddings)
+            self.stats['resums'] += 1
+
+    def sync_cluster(self, cluster_id, profile):
+        """Make sure the running sum matches the profile's current list (re-sum only if it was replaced)"""
+        embeddings = centroid_embeddings(profile)
+        with self.lock:
+            if self.signatures.get(cluster_id) != embeddings_signature(profile, embeddings):
+                self.set_cluster(cluster_id, profile)
+
+    def apply_changes(self, cluster_id, profile, added=(), removed=()):
+        """O(d) per changed sample: fold added/removed embeddings into the sum after the profile changed
+
+        Call sync_cluster() before mutating the profile so the sum starts from
+        the list that was actually changed.
+        """
+        with self.lock:
+            if self.dim is None or cluster_id not in self.clusters:
+                self.set_cluster(cluster_id, profile)
+                return
+            state = self.clusters[cluster_id]
+            for embedding in added:
+                self._accumulate(state, embedding, +1)
+            for embedding in removed:
+                self._accumulate(state, embedding, -1)
+            state.updates += len(added) + len(removed)
+            self.stats['incremental_updates'] += len(added) + len(removed)
+
+            embeddings = centroid_embeddings(profile)
+            if state.items != len(embeddings) or state.updates >= RESUM_EVERY:
+                self.set_cluster(cluster_id, profile)
+                return
+            self._refresh_row(state)
+            self.signatures[cluster_id] = embeddings_signature(profile, embeddings)
+
+    def merge_clusters(self, target_id, source_id, target_profile):
+        """Fold source's sum into target after target_profile absorbed source's samples"""
+        with self.lock:
+            target = self.clusters.get(target_id)
+            source = self.clusters.get(source_id)
+            embeddings = centroid_embeddings(target_profile)
+            if target is None or source is None or target.items + source.items != len(embeddings):
+                # Samples were trimmed during the merge (or a side was never indexed)
+                self.remove_cluster(source_id)
+                self.set_cluster(target_id, target_profile)
+                return
+            target.sum += source.sum
+            target.count += source.count
+            target.items += source.items
+            self._refresh_row(target)
+            self.signatures[target_id] = embeddings_signature(target_profile, embeddings)
+            self.remove_cluster(source_id)
+            self.stats['merges'] += 1
+
+    def remove_cluster(self, cluster_id):
+        with self.lock:
+            self.signatures.pop(cluster_id, None)
+            state = self.clusters.pop(cluster_id, None)
+            if state is None:
+                return False
+            self.valid[state.slot] = False
+            self.free_slots.append(state.slot)
+            if self.ann is not None:
+                self.ann.remove(cluster_id)
+            return True
+
+    def sync(self, profiles):
+        """Reconcile with a profile dict; unchanged clusters cost one signature comparison"""
+        with self.lock:
+            for cluster_id in [cid for cid in self.signatures if cid not in profiles]:
+                self.remove_cluster(cluster_id)
+            for cluster_id, profile in profiles.items():
+                self.sync_cluster(cluster_id, profile)
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def _ann_candidates(self, query, top_k):
+        """States of the top_k nearest centroids via the ANN index (built on first use)"""
+        if self.ann is None:
+            self.ann = create_ann_index(self.dim)
+            for state in self.clusters.values():
+                if self.valid[state.slot]:
+                    self.ann.add(state.cluster_id, self.centroids[state.slot])
+            print(f"[CentroidIndex] 🔎 {self.name}: switched to {self.ann.backend} search over {len(self.ann)} centroids")
+        self.stats['ann_queries'] += 1
+        return [self.clusters[cluster_id] for cluster_id, _ in self.ann.search(query, top_k)
+                if cluster_id in self.clusters]
+
+    def similarities(self, embedding, profiles, top_k=None):
+        """{cluster_id: cosine similarity to the cluster centroid, clamped to [0, 1]} in profiles' order
+
+        With top_k, once ANN_SWITCH_THRESHOLD centroids exist only the top_k
+        nearest (found through the ANN index, scored exactly) are returned,
+        best first. Smaller populations are always scanned in full.
+        """
+        query = centroid_vector(embedding)
+        with self.lock:
+            self.sync(profiles)
+            self.stats['queries'] += 1
+            if query is None or self.dim is None or len(query) != self.dim:
+                return {}
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                return {}
+            query = query / norm
+
+            if top_k and len(self.clusters) >= ANN_SWITCH_THRESHOLD:
+                states = [s for s in self._ann_candidates(query, top_k) if self.valid[s.slot]]
+                if not states:
+                    return {}
+                scores = np.clip(self.centroids[[s.slot for s in states]] @ query, 0.0, 1.0)
+                ranked = sorted(zip(states, scores.tolist()), key=lambda item: item[1], reverse=True)
+                return {state.cluster_id: score for state, score in ranked}
+
+            scores = self.centroids[:self.next_slot] @ query
+            np.clip(scores, 0.0, 1.0, out=scores)
+            result = {}
+            for cluster_id in profiles:
+                state = self.clusters.get(cluster_id)
+                if state is not None and self.valid[state.slot]:
+                    result[cluster_id] = float(scores[state.slot])
+            return result
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, clusters=len(self.clusters), dim=self.dim,
+                        ann=self.ann.get_stats() if self.ann is not None else None)
+
+
+# Global centroid indexes over the voice database dictionaries
+anonymous_cluster_centroids = ClusterCentroidIndex('anonymous_clusters')
+known_users_centroids = ClusterCentroidIndex('known_users')
@@ -0,0 +1,309 @@
+# voice/cluster_merge.py - Batch all-pairs cluster similarity and union-find merging for maintenance
+"""
+merge_similar_clusters used to compare every embedding of every cluster pair
+with compare_dual_embeddings - O(C²·E²) sklearn calls at startup.
+
+Here every stored embedding is stacked into one unit-norm float32 matrix per
+model, rows sorted by cluster. Cluster-to-cluster similarity is computed a
+block of clusters at a time: the block's rows against all later rows with
+the same confidence-weighted ensemble compare_dual_embeddings uses (folded
+into matrix products, see _EnsembleFactors), then a max-reduction over each
+cluster's rows in both directions. Blocks are sized so no more than CLUSTER_MERGE_BLOCK_SIZE
+row pairs are held in memory at once.
+
+Pairs above the threshold are joined with union-find, so a merge group is a
+connected component of the similarity graph and does not depend on the order
+clusters happen to be stored in.
+"""
+import time
+import numpy as np
+from config import CLUSTER_MERGE_BLOCK_SIZE
+from voice.embedding_index import extract_model_vectors, profile_embeddings
+
+
+class UnionFind:
+    """🔗 Disjoint sets over 0..n-1 with path halving and union by size"""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return True
+
+    def groups(self):
+        """{root: [members in ascending order]}"""
+        groups = {}
+        for x in range(len(self.parent)):
+            groups.setdefault(self.find(x), []).append(x)
+        return groups
+
+
+class ClusterEmbeddingMatrices:
+    """📚 Every cluster's embeddings stacked per model, rows contiguous per cluster"""
+
+    def __init__(self, clusters):
+        self.cluster_ids = []       # clusters with at least one usable embedding, in input order
+        self.row_starts = []        # first row of each of those clusters
+        self.models = {}            # model_name -> (unit vectors, present mask, confidences)
+
+        rows = []
+        for cluster_id, profile in clusters.items():
+            cluster_rows = []
+            for embedding in profile_embeddings(profile):
+                vectors, confidences = extract_model_vectors(embedding)
+                if vectors:
+                    cluster_rows.append((vectors, confidences))
+            if cluster_rows:
+                self.cluster_ids.append(cluster_id)
+                self.row_starts.append(len(rows))
+                rows.extend(cluster_rows)
+
+        self.row_count = len(rows)
+        self.row_starts = np.asarray(self.row_starts, dtype=np.int64)
+        self.row_ends = np.append(self.row_starts[1:], self.row_count).astype(np.int64)
+
+        dims = {}
+        for vectors, _ in rows:
+            for model_name, vector in vectors.items():
+                dims.setdefault(model_name, len(vector))
+
+        for model_name, dim in dims.items():
+            matrix = np.zeros((self.row_count, dim), dtype=np.float32)
+            present = np.zeros(self.row_count, dtype=bool)
+            confidences = np.ones(self.row_count, dtype=np.float32)
+            for row, (vectors, row_confidences) in enumerate(rows):
+                vector = vectors.get(model_name)
+                if vector is None or len(vector) != dim:
+                    continue
+                matrix[row] = vector
+                present[row] = True
+                confidences[row] = row_confidences.get(model_name, 1.0)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+            self.models[model_name] = (matrix, present, confidences)
+
+    def __len__(self):
+        return len(self.cluster_ids)
+
+
+class _EnsembleFactors:
+    """compare_dual_embeddings' weighted ensemble, rewritten as two matrix products
+
+    With per-model weight w = base * (conf_i + conf_j) / 2 (or just base without
+    adaptive weights), the weighted similarity sum over models is
+    sum_m base/2 * ((conf_i * a_i) . a_j + a_i . (conf_j * a_j)), i.e. one
+    matmul of [base/2 * conf * A | base/2 * A] against [A | conf * A] with all
+    models side by side. The weight total factors the same way over the
+    present masks, so a block costs one wide and one tiny matmul.
+    """
+
+    def __init__(self, matrices, model_weights, adaptive_weights):
+        self.matrices = matrices
+        self.adaptive_weights = adaptive_weights
+        self.models = [(name, float(model_weights.get(name, 0)))
+                       for name in matrices.models if model_weights.get(name, 0)]
+        right, weight_right = [], []
+        for model_name, _ in self.models:
+            matrix, present, confidences = matrices.models[model_name]
+            present = present.astype(np.float32)
+            right.append(matrix)
+            weight_right.append(present)
+            if adaptive_weights:
+                right.append(matrix * confidences[:, None])
+                weight_right.append(present * confidences)
+        self.right = np.hstack(right) if right else None
+        self.weight_right = np.stack(weight_right, axis=1) if weight_right else None
+
+    def left(self, rows):
+        left, weight_left = [], []
+        for model_name, base_weight in self.models:
+            matrix, present, confidences = self.matrices.models[model_name]
+            matrix, present, confidences = matrix[rows], present[rows].astype(np.float32), confidences[rows]
+            if self.adaptive_weights:
+                half = np.float32(base_weight / 2)
+                left += [matrix * (confidences * half)[:, None], matrix * half]
+                weight_left += [present * confidences * half, present * half]
+            else:
+                left.append(matrix * np.float32(base_weight))
+                weight_left.append(present * np.float32(base_weight))
+        return np.hstack(left), np.stack(weight_left, axis=1)
+
+    def row_scores(self, rows, cols):
+        """Ensemble similarity of every row in rows against every row in cols (-1 = not comparable)"""
+        left, weight_left = self.left(rows)
+        weighted_scores = left @ self.right[cols].T
+        total_weights = weight_left @ self.weight_right[cols].T
+
+        comparable = total_weights > 0
+        scores = np.full(weighted_scores.shape, -1.0, dtype=np.float32)
+        np.divide(weighted_scores, total_weights, out=scores, where=comparable)
+        np.clip(scores, 0.0, 1.0, out=scores, where=comparable)
+        return scores
+
+
+def _cluster_blocks(matrices, block_size):
+    """Yield (first, last) cluster positions whose rows x remaining rows fit in block_size"""
+    count = len(matrices)
+    first = 0
+    while first < count:
+        row_start = matrices.row_starts[first]
+        columns = max(1, matrices.row_count - row_start)
+        budget_rows = max(1, block_size // columns)
+        last = first
+        while last + 1 < count and matrices.row_ends[last + 1] - row_start <= budget_rows:
+            last += 1
+        yield first, last
+        first = last + 1
+
+
+def similar_cluster_pairs(matrices, model_weights, threshold, adaptive_weights=True, block_size=CLUSTER_MERGE_BLOCK_SIZE):
+    """[(i, j, similarity)] for cluster positions i < j whose best row pair scores above threshold"""
+    pairs = []
+    factors = _EnsembleFactors(matrices, model_weights, adaptive_weights)
+    if len(matrices) < 2 or factors.right is None:
+        return pairs
+
+    for first, last in _cluster_blocks(matrices, block_size):
+        row_start = int(matrices.row_starts[first])
+        row_stop = int(matrices.row_ends[last])
+        scores = factors.row_scores(slice(row_start, row_stop), slice(row_start, matrices.row_count))
+
+        # Max over each cluster's columns, then over each cluster's rows -> (block clusters x later clusters)
+        cluster_scores = np.maximum.reduceat(scores, matrices.row_starts[first:] - row_start, axis=1)
+        cluster_scores = np.maximum.reduceat(cluster_scores, matrices.row_starts[first:last + 1] - row_start, axis=0)
+
+        block_i, later_j = np.nonzero(np.triu(cluster_scores > threshold, k=1))
+        for i, j in zip(block_i.tolist(), later_j.tolist()):
+            pairs.append((first + i, first + j, float(cluster_scores[i, j])))
+    return pairs
+
+
+def find_merge_groups(clusters, model_weights, threshold, adaptive_weights=True, block_size=CLUSTER_MERGE_BLOCK_SIZE):
+    """🔍 Group cluster ids whose similarity graph is connected above threshold
+
+    Returns [(target_id, [(source_id, best_similarity_to_group), ...])]; the
+    target is the group member that comes first in clusters, sources keep
+    that order too.
+    """
+    matrices = ClusterEmbeddingMatrices(clusters)
+    pairs = similar_cluster_pairs(matrices, model_weights, threshold, adaptive_weights, block_size)
+
+    union_find = UnionFind(len(matrices))
+    best = {}
+    for i, j, similarity in pairs:
+        union_find.union(i, j)
+        best[i] = max(best.get(i, 0.0), similarity)
+        best[j] = max(best.get(j, 0.0), similarity)
+
+    groups = []
+    for members in sorted(m for m in union_find.groups().values() if len(m) > 1):
+        target, sources = members[0], members[1:]
+        groups.append((matrices.cluster_ids[target],
+                       [(matrices.cluster_ids[s], best.get(s, 0.0)) for s in sources]))
+    return groups
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def _synthetic_clusters(cluster_count, embeddings_per_cluster=5, speakers=None, seed=0):
+    """Clusters of noisy dual embeddings drawn from a smaller set of synthetic speakers"""
+    rng = np.random.default_rng(seed)
+    speakers = speakers or max(1, cluster_count // 3)
+    centers = {
+        'resemblyzer': rng.standard_normal((speakers, 256)).astype(np.float32),
+        'speechbrain_ecapa': rng.standard_normal((speakers, 192)).astype(np.float32),
+    }
+    clusters = {}
+    for c in range(cluster_count):
+        speaker = int(rng.integers(speakers))
+        embeddings = []
+        for _ in range(embeddings_per_cluster):
+            embedding = {'model_confidences': {}}
+            for model_name, model_centers in centers.items():
+                noise = rng.standard_normal(model_centers.shape[1]).astype(np.float32) * 0.35
+                embedding[model_name] = (model_centers[speaker] + noise).tolist()
+                embedding['model_confidences'][model_name] = float(rng.uniform(0.7, 1.0))
+            embeddings.append(embedding)
+        clusters[f"Anonymous_{c:04d}"] = {'embeddings': embeddings}
+    return clusters
+
+
+def _pairwise_reference(clusters, compare, threshold):
+    """Legacy all-pairs max over compare(emb1, emb2), for checking and timing"""
+    cluster_ids = list(clusters)
+    pairs = set()
+    for i, cid1 in enumerate(cluster_ids):
+        for cid2 in cluster_ids[i + 1:]:
+            best = 0.0
+            for emb1 in clusters[cid1]['embeddings']:
+                for emb2 in clusters[cid2]['embeddings']:
+                    best = max(best, compare(emb1, emb2))
+            if best > threshold:
+                pairs.add((cid1, cid2))
+    return pairs
+
+
+def benchmark_cluster_merge(sizes=(50, 500, 2000, 5000), embeddings_per_cluster=5, threshold=0.85, reference_limit=50):
+    """⏱️ Batch engine timing on synthetic clusters, checked against per-pair scoring on the small set"""
+    print("⏱️ CLUSTER MERGE BENCHMARK")
+    print("=" * 60)
+    model_weights = {'resemblyzer': 0.4, 'speechbrain_ecapa': 0.6}
+
+    def compare(emb1, emb2):
+        # Per-pair reference with compare_dual_embeddings' adaptive weighted average
+        vectors1, conf1 = extract_model_vectors(emb1)
+        vectors2, conf2 = extract_model_vectors(emb2)
+        weighted = total = 0.0
+        for model_name, v1 in vectors1.items():
+            v2 = vectors2.get(model_name)
+            if v2 is None or not model_weights.get(model_name):
+                continue
+            similarity = float(np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2)))
+            weight = model_weights[model_name] * (conf1[model_name] + conf2[model_name]) / 2
+            weighted += similarity * weight
+            total += weight
+        return max(0.0, min(1.0, weighted / total)) if total else 0.0
+
+    for size in sizes:
+        clusters = _synthetic_clusters(size, embeddings_per_cluster)
+        start = time.perf_counter()
+        matrices = ClusterEmbeddingMatrices(clusters)
+        build_ms = (time.perf_counter() - start) * 1000.0
+        start = time.perf_counter()
+        pairs = similar_cluster_pairs(matrices, model_weights, threshold)
+        pair_ms = (time.perf_counter() - start) * 1000.0
+        groups = find_merge_groups(clusters, model_weights, threshold)
+        merged = sum(len(sources) for _, sources in groups)
+        print(f"📦 {size:5d} clusters x {embeddings_per_cluster} embeddings: stack {build_ms:8.1f}ms, "
+              f"all pairs {pair_ms:8.1f}ms, {len(pairs)} similar pairs, {merged} merges in {len(groups)} groups")
+
+        if size <= reference_limit:
+            start = time.perf_counter()
+            reference = _pairwise_reference(clusters, compare, threshold)
+            reference_ms = (time.perf_counter() - start) * 1000.0
+            batch = {(matrices.cluster_ids[i], matrices.cluster_ids[j]) for i, j, _ in pairs}
+            print(f"   per-pair reference {reference_ms:8.1f}ms ({reference_ms / max(pair_ms, 1e-6):.0f}x slower), "
+                  f"same pairs: {batch == reference}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--bench" in sys.argv:
+        benchmark_cluster_merge()
@@ -0,0 +1,247 @@
+# voice/compact_embedding.py - Compact embedding vectors: float16/int8 storage, float32 scoring
+"""
+Model vectors inside dual embeddings used to be Python lists of floats
+(generate_dual_embedding's embedding.tolist()), ~32 bytes per element once
+boxed, and every comparison converted them back to numpy.
+
+CompactEmbedding keeps one vector as a small numpy array of codes plus a
+per-vector scale:
+
+  float32   codes are the vector itself                  (4 bytes/element)
+  float16   codes are the vector in half precision       (2 bytes/element)
+  int8      codes = round(vector / scale),
+            scale = max|vector| / 127                    (1 byte/element + scale)
+
+Storage is quantized, scoring is not: np.asarray(embedding) - what every
+comparison path already calls - dequantizes to float32, so similarities are
+computed in float32 on the reconstructed vector. len(), indexing, slicing,
+iteration and tolist() behave like the old list for the debug/validation
+code that pokes at vectors directly.
+
+Only model vectors inside dual embedding dicts are compacted; bare
+resemblyzer lists stay lists because legacy paths check isinstance(..., list).
+"""
+import sys
+import time
+import numpy as np
+from config import EMBEDDING_STORAGE_PRECISION
+
+PRECISIONS = {'float32': np.float32, 'float16': np.float16, 'int8': np.int8}
+INT8_LEVELS = 127                   # Symmetric int8 range used for codes
+
+if EMBEDDING_STORAGE_PRECISION in PRECISIONS:
+    STORAGE_PRECISION = EMBEDDING_STORAGE_PRECISION
+else:
+    STORAGE_PRECISION = 'float32'
+    print(f"[CompactEmbedding] ⚠️ Unknown EMBEDDING_STORAGE_PRECISION '{EMBEDDING_STORAGE_PRECISION}' - using float32")
+
+
+class CompactEmbedding:
+    """🗜️ One embedding vector as float32/float16/int8 codes with a per-vector scale"""
+
+    __slots__ = ('codes', 'scale')
+
+    def __init__(self, codes, scale=1.0):
+        self.codes = codes              # 1-d array (may be a read-only memmap row)
+        self.scale = float(scale)
+
+    @classmethod
+    def from_vector(cls, vector, precision=None):
+        """Quantize a list/array (or re-quantize a CompactEmbedding) to precision"""
+        precision = precision or STORAGE_PRECISION
+        if isinstance(vector, CompactEmbedding):
+            if vector.precision == precision:
+                return vector
+            vector = vector.to_numpy()
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if not np.all(np.isfinite(vector)):
+            precision = 'float32'       # Don't quantize NaN/inf - keep them visible to the scorers
+
+        if precision == 'int8':
+            peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+            scale = peak / INT8_LEVELS if peak > 0 else 1.0
+            codes = np.rint(vector / scale)
+            np.clip(codes, -INT8_LEVELS, INT8_LEVELS, out=codes)
+            return cls(codes.astype(np.int8), scale)
+        return cls(vector.astype(PRECISIONS.get(precision, np.float32)), 1.0)
+
+    @property
+    def precision(self):
+        return self.codes.dtype.name
+
+    @property
+    def nbytes(self):
+        """Bytes of vector data (codes plus a float32 scale for int8)"""
+        return self.codes.nbytes + (4 if self.codes.dtype == np.int8 else 0)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def ndim(self):
+        return 1
+
+    @property
+    def size(self):
+        return self.codes.size
+
+    def to_numpy(self):
+        """Dequantized float32 copy"""
+        vector = self.codes.astype(np.float32)
+        if self.scale != 1.0:
+            vector *= np.float32(self.scale)
+        return vector
+
+    def __array__(self, dtype=None, copy=None):
+        vector = self.to_numpy()
+        return vector if dtype is None else vector.astype(dtype, copy=False)
+
+    def tolist(self):
+        return self.to_numpy().tolist()
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, index):
+        return self.to_numpy()[index]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __repr__(self):
+        return f"CompactEmbedding({self.precision}, dim={len(self)})"
+
+
+def _is_vector(value):
+    if isinstance(value, CompactEmbedding):
+        return True
+    if isinstance(value, np.ndarray):
+        return value.ndim == 1 and value.size > 0 and np.issubdtype(value.dtype, np.number)
+    return (isinstance(value, (list, tuple)) and len(value) > 0
+            and all(isinstance(v, (int, float, np.floating)) and not isinstance(v, bool) for v in value[:4]))
+
+
+def compact_embedding(embedding, precision=None):
+    """Compact the model vectors of a dual embedding dict in place (other values are returned unchanged)"""
+    from voice.embedding_index import EMBEDDING_METADATA_KEYS
+
+    if not isinstance(embedding, dict):
+        return embedding
+    for key, value in embedding.items():
+        if key in EMBEDDING_METADATA_KEYS:
+            continue
+        if key == 'embeddings' and isinstance(value, dict):
+            embedding[key] = compact_embedding(dict(value), precision)
+        elif _is_vector(value):
+            embedding[key] = CompactEmbedding.from_vector(value, precision)
+    return embedding
+
+
+def compact_profile(profile, precision=None, fields=('embeddings', 'voice_embeddings')):
+    """Compact every dual embedding in a profile's embedding lists; returns how many were touched"""
+    if not isinstance(profile, dict):
+        return 0
+    count = 0
+    for field in fields:
+        for item in profile.get(field) or []:
+            if isinstance(item, dict):
+                compact_embedding(item, precision)
+                count += 1
+    return count
+
+
+def compact_profiles(profiles, precision=None):
+    """compact_profile() over a known_users / anonymous_clusters dict"""
+    return sum(compact_profile(profile, precision) for profile in profiles.values())
+
+
+def embedding_json_default(obj):
+    """json.dump default=: compact embeddings and numpy values are written as plain JSON numbers"""
+    if isinstance(obj, (CompactEmbedding, np.ndarray)):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def _list_bytes(vector):
+    """RAM of a vector stored as a Python list of floats"""
+    return sys.getsizeof(vector) + sum(sys.getsizeof(v) for v in vector)
+
+
+def benchmark_compact_embeddings(speakers=200, samples_per_speaker=20, queries=1000,
+                                 dims=None, noise=2.5, seed=0):
+    """⏱️ Memory, conversion cost and scoring deltas of each storage precision against float32
+
+    noise is high enough that some probes are misidentified even in float32,
+    so top-1 agreement shows whether quantization flips borderline decisions.
+    """
+    dims = dims or {'resemblyzer': 256, 'speechbrain_ecapa': 192}
+    rng = np.random.default_rng(seed)
+    print("⏱️ COMPACT EMBEDDING BENCHMARK")
+    print("=" * 60)
+
+    gallery, probes = {}, {}
+    gallery_labels = np.repeat(np.arange(speakers), samples_per_speaker)
+    probe_labels = rng.integers(speakers, size=queries)
+    for model_name, dim in dims.items():
+        centres = rng.standard_normal((speakers, dim)).astype(np.float32)
+        centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+        spread = noise / np.sqrt(dim)
+        gallery[model_name] = centres[gallery_labels] + \
+            rng.standard_normal((len(gallery_labels), dim)).astype(np.float32) * spread
+        probes[model_name] = centres[probe_labels] + \
+            rng.standard_normal((queries, dim)).astype(np.float32) * spread
+
+    def unit(matrix):
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def identify(stored):
+        """Per-probe best speaker (max over samples of the mean per-model cosine) and all scores"""
+        scores = sum(unit(probes[m]) @ unit(stored[m]).T for m in dims) / len(dims)
+        per_speaker = scores.reshape(queries, speakers, samples_per_speaker).max(axis=2)
+        return per_speaker.argmax(axis=1), scores
+
+    baseline_top1, baseline_scores = identify(gallery)
+    baseline_accuracy = float(np.mean(baseline_top1 == probe_labels))
+    sample = {m: gallery[m][0].tolist() for m in dims}
+    list_bytes = sum(_list_bytes(v) for v in sample.values())
+    print(f"📦 {len(gallery_labels)} stored dual embeddings ({speakers} speakers), {queries} probes, "
+          f"models {', '.join(f'{m}:{d}' for m, d in dims.items())}")
+    print(f"   list     {list_bytes:6d} B/embedding   float32 top-1 accuracy {baseline_accuracy:.4f}")
+
+    repeats = 2000
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for vector in sample.values():
+            np.asarray(vector, dtype=np.float32)
+    list_us = (time.perf_counter() - start) * 1e6 / repeats
+
+    for precision in PRECISIONS:
+        stored = {m: np.stack([CompactEmbedding.from_vector(v, precision).to_numpy() for v in gallery[m]])
+                  for m in dims}
+        top1, scores = identify(stored)
+        delta = np.abs(scores - baseline_scores)
+
+        compact = {m: CompactEmbedding.from_vector(v, precision) for m, v in sample.items()}
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for vector in compact.values():
+                np.asarray(vector)
+        compact_us = (time.perf_counter() - start) * 1e6 / repeats
+
+        print(f"   {precision:8s} {sum(c.nbytes for c in compact.values()):6d} B/embedding   "
+              f"|Δcos| mean {delta.mean():.2e} max {delta.max():.2e}   "
+              f"top-1 agreement {np.mean(top1 == baseline_top1):.4f}   "
+              f"accuracy {np.mean(top1 == probe_labels):.4f}   "
+              f"to-numpy {compact_us:.1f}µs (list {list_us:.1f}µs)")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        benchmark_compact_embeddings()
@@ -5,7 +5,11 @@ import time
 import numpy as np  
 import shutil       
 from datetime import datetime
-from config import KNOWN_USERS_PATH, DEBUG
+from config import KNOWN_USERS_PATH, DEBUG, VOICE_PROFILE_STORE_BACKEND, VOICE_PROFILE_STORE_DIR, WRITE_BEHIND_PERSISTENCE
+from voice.compact_embedding import CompactEmbedding, compact_embedding, compact_profiles, embedding_json_default
+from voice.embedding_index import anonymous_cluster_index
+from voice.profile_store import BinaryVoiceProfileStore, migrate_json_to_store
+from utils.persistence import persistence_service, atomic_write_json
 # 🚀 ENHANCED: False positives tracking
 false_positives = []
 
@@ -22,12 +26,80 @@ except ImportError:
 known_users = {}
 anonymous_clusters = {}  # ✅ NEW: Anonymous voice clusters
 cluster_counter = 1
+SNAPSHOT_ATTEMPTS = 5  # Copies retried when a concurrent mutation interrupts one
+
+# 💾 Binary memory-mapped profile store (None when using the legacy JSON file)
+profile_store = BinaryVoiceProfileStore(VOICE_PROFILE_STORE_DIR) if VOICE_PROFILE_STORE_BACKEND == "binary" else None
+VOICE_DATABASE_TARGET = "voice_database"  # Write-behind persistence target name
+
+def _load_from_profile_store():
+    """📂 Map the binary store, migrating the legacy JSON file on first run"""
+    if not profile_store.exists():
+        if os.path.exists(KNOWN_USERS_PATH):
+            print(f"[Database] 🔄 Migrating {KNOWN_USERS_PATH} to binary store {VOICE_PROFILE_STORE_DIR}")
+            if migrate_json_to_store(KNOWN_USERS_PATH, VOICE_PROFILE_STORE_DIR) < 0:
+                raise RuntimeError("binary store migration failed")
+        else:
+            print(f"[Database] ⚠️ No voice database yet - initializing empty dictionaries")
+            known_users.clear()
+            anonymous_clusters.clear()
+            false_positives.clear()
+            return {}, {}
+    
+    loaded_known_users, loaded_anonymous_clusters, loaded_false_positives = profile_store.load()
+    
+    known_users.clear()
+    known_users.update(loaded_known_users)
+    anonymous_clusters.clear()
+    anonymous_clusters.update(loaded_anonymous_clusters)
+    false_positives.clear()
+    false_positives.extend(loaded_false_positives)
+    
+    print(f"[Database] ✅ Binary store loaded: {len(known_users)} users, {len(anonymous_clusters)} clusters, {len(false_positives)} false positives")
+    return known_users, anonymous_clusters
+
+def _save_to_profile_store(users, clusters, fps):
+    """💾 Incremental save: only new embeddings are written, metadata index replaced atomically"""
+    try:
+        return profile_store.save(users, clusters, fps)
+    except Exception as e:
+        print(f"[Database] ❌ Binary store save error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def persisted_database_path():
+    """📁 File whose existence means the voice database has been persisted (store index or legacy JSON)"""
+    return profile_store.index_path if profile_store is not None else KNOWN_USERS_PATH
+
+def read_persisted_database():
+    """📖 What is on disk right now, from the active backend, in the legacy JSON layout
+    
+    Binary stores are read through a separate, non-compacting store instance so
+    the live store's maps and caches are untouched. Raises if nothing was saved yet.
+    """
+    if profile_store is None:
+        with open(KNOWN_USERS_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    if not profile_store.exists():
+        raise FileNotFoundError(profile_store.index_path)
+    with profile_store.lock:  # No save/compaction of the live store mid-read
+        users, clusters, fps = BinaryVoiceProfileStore(VOICE_PROFILE_STORE_DIR).load(compact=False)
+    return {'known_users': users, 'anonymous_clusters': clusters, 'false_positives': fps}
 
 def load_known_users():
     """🚀 BULLETPROOF: Load known users with embedding preservation"""
     global known_users, anonymous_clusters, false_positives
     
     try:
+        # A pending write-behind save holds newer state than disk - write it before reloading
+        if persistence_service.has_pending(VOICE_DATABASE_TARGET):
+            flush_known_users()
+        
+        if profile_store is not None:
+            return _load_from_profile_store()
+        
         print(f"[DEBUG] 📂 BULLETPROOF LOAD_KNOWN_USERS called at {datetime.utcnow().isoformat()}")
         print(f"[DEBUG] 📂 Loading from: {KNOWN_USERS_PATH}")
         
@@ -104,6 +176,10 @@ def load_known_users():
             false_positives.clear()
             false_positives.extend(data.get('false_positives', []))
             
+            # 🗜️ Dual embedding vectors are held compactly (EMBEDDING_STORAGE_PRECISION)
+            compact_profiles(known_users)
+            compact_profiles(anonymous_clusters)
+            
             print(f"\n[DEBUG] ✅ BULLETPROOF LOAD COMPLETE:")
             print(f"[DEBUG]   Known users: {len(known_users)}")
             print(f"[DEBUG]   Anonymous clusters: {len(anonymous_clusters)}")
@@ -269,7 +345,7 @@ def convert_numpy_for_json(obj):
     import numpy as np
     
     try:
-        if isinstance(obj, np.ndarray):
+        if isinstance(obj, (np.ndarray, CompactEmbedding)):
             return obj.tolist()
         elif isinstance(obj, (np.int8, np.int16, np.int32, np.int64)):
             return int(obj)
@@ -298,20 +374,69 @@ def convert_numpy_for_json(obj):
                 pass
         return obj
 
+def _snapshot_value(value):
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list) and not (value and isinstance(value[0], (int, float))):
+        return list(value)
+    return value  # Scalars and bare vectors (replaced, never edited in place) are shared
+
+def _snapshot_profile(profile):
+    if not isinstance(profile, dict):
+        return profile
+    return {key: _snapshot_value(value) for key, value in list(profile.items())}
+
+def snapshot_voice_database():
+    """📸 Copy of the database for a save: profile dicts and their lists are copied, embeddings are shared
+    
+    Taken on the thread that requests the save, so the persistence thread never
+    iterates dictionaries that are being mutated. Mutators don't lock, so the
+    containers are copied in one step each (list(d.items()), dict(), list())
+    and the whole copy is retried if a concurrent change still interrupts it.
+    """
+    for attempt in range(SNAPSHOT_ATTEMPTS):
+        try:
+            return ({pid: _snapshot_profile(p) for pid, p in list(known_users.items())},
+                    {pid: _snapshot_profile(p) for pid, p in list(anonymous_clusters.items())},
+                    list(false_positives))
+        except RuntimeError as e:  # "dictionary changed size during iteration"
+            if attempt == SNAPSHOT_ATTEMPTS - 1:
+                raise
+            if DEBUG:
+                print(f"[Database] 🔁 Snapshot interrupted ({e}) - retrying")
+
 def save_known_users():
-    """🚀 BULLETPROOF: Save with embedding preservation verification"""
+    """💾 Request a save - bursts are coalesced and written in the background"""
+    if WRITE_BEHIND_PERSISTENCE:
+        return persistence_service.request_save(VOICE_DATABASE_TARGET)
+    return save_known_users_now()
+
+def flush_known_users():
+    """⚡ Write any pending voice database save immediately"""
+    return persistence_service.flush(VOICE_DATABASE_TARGET)
+
+def save_known_users_now(snapshot=None):
+    """🚀 BULLETPROOF: Save with embedding preservation verification
+    
+    snapshot is a snapshot_voice_database() copy (taken when the save was
+    requested); without one a fresh snapshot is taken here.
+    """
+    users, clusters, fps = snapshot if snapshot is not None else snapshot_voice_database()
+    if profile_store is not None:
+        return _save_to_profile_store(users, clusters, fps)
+    
     try:
         debug_database_state()
         
         print(f"[DEBUG] 💾 BULLETPROOF SAVE_KNOWN_USERS called at {datetime.utcnow().isoformat()}")
-        print(f"[DEBUG] 👥 Known users count: {len(known_users)}")
-        print(f"[DEBUG] 🔍 Anonymous clusters count: {len(anonymous_clusters)}")
-        print(f"[DEBUG] 🚨 False positives count: {len(false_positives)}")
+        print(f"[DEBUG] 👥 Known users count: {len(users)}")
+        print(f"[DEBUG] 🔍 Anonymous clusters count: {len(clusters)}")
+        print(f"[DEBUG] 🚨 False positives count: {len(fps)}")
         
         # 🔍 PRE-SAVE EMBEDDING VERIFICATION
         print(f"\n[DEBUG] 🔍 PRE-SAVE EMBEDDING VERIFICATION:")
         total_embeddings_before = 0
-        for cluster_id, cluster_data in anonymous_clusters.items():
+        for cluster_id, cluster_data in clusters.items():
             embeddings = cluster_data.get('embeddings', [])
             total_embeddings_before += len(embeddings)
             print(f"[DEBUG]   {cluster_id}: {len(embeddings)} embeddings before save")
@@ -327,14 +452,14 @@ def save_known_users():
         
         # ✅ PRESERVE EMBEDDINGS: Don't convert, just copy
         clean_known_users = {}
-        for user_id, user_data in known_users.items():
+        for user_id, user_data in users.items():
             if isinstance(user_data, dict):
                 clean_known_users[user_id] = user_data.copy()
             else:
                 clean_known_users[user_id] = user_data
         
         clean_anonymous_clusters = {}
-        for cluster_id, cluster_data in anonymous_clusters.items():
+        for cluster_id, cluster_data in clusters.items():
             if isinstance(cluster_data, dict):
                 clean_cluster = cluster_data.copy()
                 # 🔥 CRITICAL: Preserve embeddings exactly as they are
@@ -346,7 +471,7 @@ def save_known_users():
             else:
                 clean_anonymous_clusters[cluster_id] = cluster_data
         
-        clean_false_positives = false_positives.copy() if false_positives else []
+        clean_false_positives = fps.copy() if fps else []
         
         # 🚀 Create data structure
         data = {
@@ -382,7 +507,7 @@ def save_known_users():
         
         # 🔧 TEST JSON SERIALIZATION
         try:
-            test_json = json.dumps(data, indent=2, ensure_ascii=False)
+            test_json = json.dumps(data, indent=2, ensure_ascii=False, default=embedding_json_default)
             print(f"[DEBUG] ✅ JSON serialization test passed - {len(test_json)} characters")
         except Exception as json_error:
             print(f"[DEBUG] ❌ JSON serialization test failed: {json_error}")
@@ -406,12 +531,12 @@ def save_known_users():
                     print(f"[DEBUG]   🔧 Fixed embeddings for {cluster_id}: {len(fixed_embeddings)} embeddings")
             
             # Try again
-            test_json = json.dumps(data, indent=2, ensure_ascii=False)
+            test_json = json.dumps(data, indent=2, ensure_ascii=False, default=embedding_json_default)
             print(f"[DEBUG] ✅ JSON serialization fixed - {len(test_json)} characters")
         
-        # Write the file
-        with open(KNOWN_USERS_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Write the file (temp file + rename, so a crash never leaves a truncated database)
+        # Compact embeddings are written as plain float lists, so the file format is unchanged
+        atomic_write_json(KNOWN_USERS_PATH, data, indent=2, ensure_ascii=False, default=embedding_json_default)
         
         print(f"[DEBUG] ✅ File written to: {KNOWN_USERS_PATH}")
         
@@ -536,6 +661,7 @@ def create_anonymous_cluster(embedding, quality_info=None):
         if embedding is None:
             print(f"[DEBUG] ❌ Embedding is None - cannot create cluster")
             return None
+        compact_embedding(embedding)  # 🗜️ Dual embedding vectors -> compact storage (bare lists untouched)
         
         # Prepare cluster data for anonymous_clusters
         cluster_data = {
@@ -575,6 +701,7 @@ def create_anonymous_cluster(embedding, quality_info=None):
         # ✅ Add to BOTH dictionaries
         anonymous_clusters[cluster_id] = cluster_data
         known_users[cluster_id] = user_data  # 🔥 THIS WAS MISSING!
+        anonymous_cluster_index.update_cluster(cluster_id, cluster_data)
         
         print(f"[DEBUG] ✅ Cluster added to anonymous_clusters dictionary")
         print(f"[DEBUG] ✅ User added to known_users dictionary")
@@ -598,6 +725,7 @@ def create_anonymous_cluster(embedding, quality_info=None):
                 del anonymous_clusters[cluster_id]
             if cluster_id in known_users:
                 del known_users[cluster_id]
+            anonymous_cluster_index.remove_cluster(cluster_id)
             print(f"[DEBUG] 🧹 Cleaned up failed cluster from memory")
         
         return cluster_id
@@ -817,6 +945,7 @@ def link_anonymous_to_named(cluster_id, username):
         try:
             if cluster_id in anonymous_clusters:
                 del anonymous_clusters[cluster_id]
+                anonymous_cluster_index.remove_cluster(cluster_id)
                 print(f"[DEBUG] 🗑️ Removed anonymous cluster: {cluster_id}")
             
             if cluster_id in known_users:
@@ -986,25 +1115,25 @@ def cleanup_false_positives(max_age_days=30):
 def find_similar_clusters(embedding, threshold=0.5):
     """✅ NEW: Find similar anonymous clusters for merging"""
     similar_clusters = []
-    
+
     try:
         from voice.voice_models import dual_voice_model_manager
-        
-        for cluster_id, cluster_data in anonymous_clusters.items():
-            cluster_embeddings = cluster_data.get('embeddings', [])
-            
-            for stored_embedding in cluster_embeddings:
-                similarity = dual_voice_model_manager.compare_dual_embeddings(
-                    embedding, stored_embedding
-                )
-                
-                if similarity > threshold:
-                    similar_clusters.append({
-                        'cluster_id': cluster_id,
-                        'similarity': similarity,
-                        'embedding_count': len(cluster_embeddings)
-                    })
-                    break
+
+        # 🚀 One batched pass over every cluster via the embedding index
+        anonymous_cluster_index.sync(anonymous_clusters)
+        matches = anonymous_cluster_index.search(
+            embedding,
+            dual_voice_model_manager.model_weights,
+            threshold=threshold,
+            adaptive_weights=dual_voice_model_manager.config["similarity"]["adaptive_weights"]
+        )
+
+        for cluster_id, similarity in matches:
+            similar_clusters.append({
+                'cluster_id': cluster_id,
+                'similarity': similarity,
+                'embedding_count': len(anonymous_clusters[cluster_id].get('embeddings', []))
+            })
     except:
         pass
     
@@ -1083,6 +1212,7 @@ def cleanup_old_anonymous_clusters(max_age_days=7):
         
         for cluster_id in clusters_to_remove:
             del anonymous_clusters[cluster_id]
+            anonymous_cluster_index.remove_cluster(cluster_id)
             print(f"[Database] 🧹 Cleaned up old cluster: {cluster_id}")
         
         if clusters_to_remove:
@@ -1101,6 +1231,12 @@ def debug_database_state():
     print(f"📊 anonymous_clusters: {list(anonymous_clusters.keys())}")
     print(f"📊 known_users id: {id(known_users)}")
     print(f"📊 anonymous_clusters id: {id(anonymous_clusters)}")
+    print(f"💾 Persistence: {persistence_service.get_stats().get(VOICE_DATABASE_TARGET)}")
+    
+    if profile_store is not None:
+        print(f"💾 Binary store: {profile_store.get_stats()}")
+        print()
+        return
     
     # Check if file exists and what it contains
     try:
@@ -1111,5 +1247,8 @@ def debug_database_state():
         print(f"📁 File doesn't exist or is corrupted")
     print()
 
+# ✅ Saves go through the write-behind persistence service
+persistence_service.register(VOICE_DATABASE_TARGET, save_known_users_now, snapshot=snapshot_voice_database)
+
 # ✅ Load database on import
 load_known_users()
\ No newline at end of file
@@ -1,10 +1,8 @@
 #!/usr/bin/env python3
 # debug_voice.py - Debug voice database
 
-from voice.database import load_known_users, known_users, debug_voice_database
-from config import KNOWN_USERS_PATH
+from voice.database import load_known_users, known_users, debug_voice_database, persisted_database_path, read_persisted_database
 import os
-import json
 
 print("🔍 VOICE DATABASE DIAGNOSTIC")
 print("=" * 40)
@@ -13,13 +11,13 @@ print("=" * 40)
 load_known_users()
 debug_voice_database()
 
-print(f"\n📁 Database file path: {KNOWN_USERS_PATH}")
-print(f"📁 File exists: {os.path.exists(KNOWN_USERS_PATH)}")
+database_path = persisted_database_path()
+print(f"\n📁 Database file path: {database_path}")
+print(f"📁 File exists: {os.path.exists(database_path)}")
 
-if os.path.exists(KNOWN_USERS_PATH):
+if os.path.exists(database_path):
     try:
-        with open(KNOWN_USERS_PATH, 'r') as f:
-            raw_data = json.load(f)
+        raw_data = read_persisted_database()
         
         print(f"\n📊 Raw database contents:")
         for name, data in raw_data.items():
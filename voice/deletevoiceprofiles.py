@@ -1,15 +1,25 @@
 import json
 import os
 from datetime import datetime
+from config import KNOWN_USERS_PATH
+from voice.compact_embedding import embedding_json_default
+from voice.database import profile_store
 
 def load_voice_data():
-    """Load voice profiles data"""
+    """Load voice profiles data (binary store when that backend is active, else the JSON file)"""
     try:
-        file_path = "voice_profiles/known_users_v2.json"
+        if profile_store is not None:
+            if not profile_store.exists():
+                raise FileNotFoundError(profile_store.index_path)
+            users, clusters, fps = profile_store.load()
+            data = {'known_users': users, 'anonymous_clusters': clusters, 'false_positives': fps}
+            return data, profile_store.store_dir
+        
+        file_path = KNOWN_USERS_PATH
         with open(file_path, 'r') as f:
             return json.load(f), file_path
-    except FileNotFoundError:
-        print(f"❌ File not found: voice_profiles/known_users_v2.json")
+    except FileNotFoundError as e:
+        print(f"❌ File not found: {e}")
         return None, None
     except json.JSONDecodeError:
         print(f"❌ Invalid JSON format in file")
@@ -25,7 +35,7 @@ def create_backup(data, file_path):
         backup_path = f"voice_profiles/backup_{timestamp}.json"
         
         with open(backup_path, 'w') as f:
-            json.dump(data, f, indent=2)
+            json.dump(data, f, indent=2, default=embedding_json_default)
         
         print(f"✅ Backup created: {backup_path}")
         return backup_path
@@ -36,8 +46,11 @@ def create_backup(data, file_path):
 def save_voice_data(data, file_path):
     """Save updated voice data"""
     try:
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        if profile_store is not None:
+            profile_store.save(data['known_users'], data['anonymous_clusters'], data.get('false_positives', []))
+        else:
+            with open(file_path, 'w') as f:
+                json.dump(data, f, indent=2)
         print(f"✅ Data saved successfully")
         return True
     except Exception as e:
@@ -0,0 +1,415 @@
+# voice/embedding_index.py - Vectorized in-memory speaker embedding index
+import threading
+import numpy as np
+from config import DEBUG
+from voice.compact_embedding import CompactEmbedding
+
+# Keys of a dual embedding dict that are metadata, not model vectors
+EMBEDDING_METADATA_KEYS = {
+    'timestamp', 'models_used', 'processing_times', 'model_confidences', 'primary',
+    'dual_available', 'total_processing_time', 'audio_quality_score', 'source',
+    'quality_score', 'quality_info', 'context', 'audio_context', 'cache_key',
+    'batch_size', 'cascade'
+}
+
+def extract_model_vectors(embedding):
+    """Split a stored embedding into ({model_name: vector}, {model_name: confidence})
+
+    Accepts the same shapes compare_dual_embeddings does: dual embedding dicts,
+    dicts wrapping an 'embeddings' dict, plain lists and numpy arrays (resemblyzer).
+    """
+    if isinstance(embedding, dict):
+        confidences = embedding.get('model_confidences', {})
+        if 'embeddings' in embedding and isinstance(embedding['embeddings'], dict):
+            embedding = embedding['embeddings']
+        if not isinstance(confidences, dict):
+            confidences = {}
+    elif isinstance(embedding, (list, tuple, np.ndarray)):
+        embedding = {'resemblyzer': embedding}
+        confidences = {}
+    else:
+        return {}, {}
+
+    vectors = {}
+    for model_name, value in embedding.items():
+        if model_name in EMBEDDING_METADATA_KEYS:
+            continue
+        if isinstance(value, np.ndarray):
+            vector = value
+        elif isinstance(value, CompactEmbedding):
+            vector = value.to_numpy()
+        elif isinstance(value, (list, tuple)) and value and isinstance(value[0], (int, float, np.floating)):
+            vector = np.asarray(value)
+        else:
+            continue
+        if vector.ndim != 1 or vector.size == 0:
+            continue
+        vectors[model_name] = vector.astype(np.float32, copy=False)
+
+    model_confidences = {m: float(confidences.get(m, 1.0)) for m in vectors}
+    return vectors, model_confidences
+
+def profile_embeddings(profile):
+    """Return the embedding list for a known_users / anonymous_clusters entry"""
+    if isinstance(profile, dict):
+        if profile.get('embeddings'):
+            return profile['embeddings']
+        if profile.get('voice_embeddings'):
+            return profile['voice_embeddings']
+        if profile.get('embedding') is not None:
+            return [profile['embedding']]
+        return []
+    if isinstance(profile, (list, np.ndarray)) and len(profile) > 0:
+        # Legacy format: the profile is a single embedding
+        return [profile]
+    return []
+
+def embeddings_signature(profile, embeddings):
+    """Change detector: identity of every item, so in-place replacements count as changes"""
+    if not embeddings:
+        return (id(profile), 0)
+    return tuple(map(id, embeddings))
+
+
+class _ModelMatrix:
+    """Growable, pre-normalized float32 matrix for a single embedding model"""
+
+    def __init__(self, dim, capacity):
+        self.dim = dim
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.present = np.zeros(capacity, dtype=bool)
+        self.confidences = np.ones(capacity, dtype=np.float32)
+
+    def grow(self, capacity):
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        present = np.zeros(capacity, dtype=bool)
+        confidences = np.ones(capacity, dtype=np.float32)
+        count = len(self.present)
+        vectors[:count] = self.vectors
+        present[:count] = self.present
+        confidences[:count] = self.confidences
+        self.vectors, self.present, self.confidences = vectors, present, confidences
+
+
+class SpeakerEmbeddingIndex:
+    """🚀 Persistent embedding index scoring a query against every cluster at once
+
+    Rows are individual stored embeddings; each model keeps its own unit-norm
+    float32 matrix and a row→cluster mapping ties rows back to cluster ids.
+    Scoring is one matmul per model followed by the same weighted ensemble
+    compare_dual_embeddings uses, then a per-cluster max.
+    """
+
+    def __init__(self, name, initial_capacity=256):
+        self.name = name
+        self.lock = threading.RLock()
+        self.capacity = initial_capacity
+        self.row_count = 0
+        self.row_cluster = np.full(initial_capacity, -1, dtype=np.int64)
+        self.row_active = np.zeros(initial_capacity, dtype=bool)
+        self.models = {}
+        self.cluster_slots = {}       # cluster_id -> slot
+        self.slot_clusters = []       # slot -> cluster_id (None when freed)
+        self.cluster_rows = {}        # cluster_id -> list of row indices
+        self.signatures = {}          # cluster_id -> embeddings signature
+        self.free_rows = 0
+        self.stats = {'queries': 0, 'rows_added': 0, 'rows_removed': 0, 'compactions': 0, 'syncs': 0}
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    def _ensure_capacity(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        row_cluster = np.full(capacity, -1, dtype=np.int64)
+        row_active = np.zeros(capacity, dtype=bool)
+        row_cluster[:self.capacity] = self.row_cluster
+        row_active[:self.capacity] = self.row_active
+        self.row_cluster, self.row_active = row_cluster, row_active
+        for matrix in self.models.values():
+            matrix.grow(capacity)
+        self.capacity = capacity
+
+    def _slot_for(self, cluster_id):
+        slot = self.cluster_slots.get(cluster_id)
+        if slot is None:
+            slot = len(self.slot_clusters)
+            self.slot_clusters.append(cluster_id)
+            self.cluster_slots[cluster_id] = slot
+            self.cluster_rows[cluster_id] = []
+        return slot
+
+    def add_embedding(self, cluster_id, embedding):
+        """Append one stored embedding to a cluster; returns False if it has no usable vectors"""
+        vectors, confidences = extract_model_vectors(embedding)
+        if not vectors:
+            return False
+
+        with self.lock:
+            slot = self._slot_for(cluster_id)
+            self._ensure_capacity(self.row_count + 1)
+            row = self.row_count
+            self.row_count += 1
+
+            for model_name, vector in vectors.items():
+                matrix = self.models.get(model_name)
+                if matrix is None:
+                    matrix = _ModelMatrix(len(vector), self.capacity)
+                    self.models[model_name] = matrix
+                elif matrix.dim != len(vector):
+                    if DEBUG:
+                        print(f"[EmbeddingIndex] ⚠️ {self.name}: dimension mismatch for {model_name} "
+                              f"({len(vector)} vs {matrix.dim}) in {cluster_id}")
+                    continue
+                norm = np.linalg.norm(vector)
+                matrix.vectors[row] = vector / (norm + 1e-8)
+                matrix.present[row] = True
+                matrix.confidences[row] = confidences.get(model_name, 1.0)
+
+            self.row_cluster[row] = slot
+            self.row_active[row] = True
+            self.cluster_rows[cluster_id].append(row)
+            self.stats['rows_added'] += 1
+            return True
+
+    def _clear_rows(self, rows):
+        for row in rows:
+            self.row_active[row] = False
+            self.row_cluster[row] = -1
+            for matrix in self.models.values():
+                matrix.present[row] = False
+        self.free_rows += len(rows)
+        self.stats['rows_removed'] += len(rows)
+
+    def set_cluster(self, cluster_id, embeddings):
+        """Replace all rows of a cluster with the given embedding list"""
+        with self.lock:
+            if cluster_id in self.cluster_rows:
+                self._clear_rows(self.cluster_rows[cluster_id])
+                self.cluster_rows[cluster_id] = []
+            else:
+                self._slot_for(cluster_id)
+            for embedding in embeddings or []:
+                self.add_embedding(cluster_id, embedding)
+            self._maybe_compact()
+
+    def update_cluster(self, cluster_id, profile):
+        """Re-index one profile after a known change and remember its signature"""
+        with self.lock:
+            embeddings = profile_embeddings(profile)
+            self.set_cluster(cluster_id, embeddings)
+            self.signatures[cluster_id] = embeddings_signature(profile, embeddings)
+
+    def remove_cluster(self, cluster_id):
+        """Drop a cluster and all of its rows"""
+        with self.lock:
+            rows = self.cluster_rows.pop(cluster_id, None)
+            if rows is None:
+                return False
+            self._clear_rows(rows)
+            slot = self.cluster_slots.pop(cluster_id)
+            self.slot_clusters[slot] = None
+            self.signatures.pop(cluster_id, None)
+            self._maybe_compact()
+            return True
+
+    def merge_clusters(self, target_id, source_id):
+        """Reassign every row of source_id to target_id without touching the vectors"""
+        with self.lock:
+            source_rows = self.cluster_rows.pop(source_id, None)
+            if source_rows is None:
+                return False
+            target_slot = self._slot_for(target_id)
+            self.row_cluster[source_rows] = target_slot
+            self.cluster_rows[target_id].extend(source_rows)
+            source_slot = self.cluster_slots.pop(source_id)
+            self.slot_clusters[source_slot] = None
+            self.signatures.pop(source_id, None)
+            self.signatures.pop(target_id, None)
+            return True
+
+    def _maybe_compact(self):
+        """Repack rows and slots once more than half of the rows are dead"""
+        if self.free_rows == 0 or self.free_rows * 2 < self.row_count:
+            return
+        active_rows = np.flatnonzero(self.row_active[:self.row_count])
+        remap = np.full(self.row_count, -1, dtype=np.int64)
+        remap[active_rows] = np.arange(len(active_rows))
+
+        slot_clusters = [cid for cid in self.slot_clusters if cid is not None]
+        cluster_slots = {cid: slot for slot, cid in enumerate(slot_clusters)}
+        old_to_new_slot = np.full(max(len(self.slot_clusters), 1), -1, dtype=np.int64)
+        for old_slot, cid in enumerate(self.slot_clusters):
+            if cid is not None:
+                old_to_new_slot[old_slot] = cluster_slots[cid]
+
+        count = len(active_rows)
+        self.row_cluster[:count] = old_to_new_slot[self.row_cluster[active_rows]]
+        self.row_cluster[count:] = -1
+        self.row_active[:count] = True
+        self.row_active[count:] = False
+        for matrix in self.models.values():
+            matrix.vectors[:count] = matrix.vectors[active_rows]
+            matrix.present[:count] = matrix.present[active_rows]
+            matrix.confidences[:count] = matrix.confidences[active_rows]
+            matrix.present[count:] = False
+
+        self.cluster_rows = {cid: [int(remap[r]) for r in rows] for cid, rows in self.cluster_rows.items()}
+        self.slot_clusters = slot_clusters
+        self.cluster_slots = cluster_slots
+        self.row_count = count
+        self.free_rows = 0
+        self.stats['compactions'] += 1
+
+    def sync(self, profiles):
+        """Reconcile with a profile dict, re-indexing only clusters whose embeddings changed
+
+        Profiles are mutated directly in many places (appends, pruning, in-place
+        replacement of a sample), so every lookup calls this; unchanged clusters
+        cost one id tuple comparison and no numpy conversion.
+        """
+        with self.lock:
+            self.stats['syncs'] += 1
+            for cluster_id in [cid for cid in self.cluster_rows if cid not in profiles]:
+                self.remove_cluster(cluster_id)
+
+            for cluster_id, profile in profiles.items():
+                embeddings = profile_embeddings(profile)
+                signature = embeddings_signature(profile, embeddings)
+                if self.signatures.get(cluster_id) == signature and cluster_id in self.cluster_rows:
+                    continue
+                self.set_cluster(cluster_id, embeddings)
+                self.signatures[cluster_id] = signature
+
+    def clear(self):
+        with self.lock:
+            self.__init__(self.name, initial_capacity=256)
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def score_clusters(self, query, model_weights, adaptive_weights=True, models=None):
+        """Score a query embedding against every cluster in one pass
+
+        Returns {cluster_id: best ensemble similarity over the cluster's rows}.
+        Per-row ensembles match compare_dual_embeddings: a weighted average over
+        models present in both query and row, optionally scaled by the mean of
+        the two model confidences, clamped to [0, 1].
+        """
+        query_vectors, query_confidences = extract_model_vectors(query)
+        with self.lock:
+            self.stats['queries'] += 1
+            count = self.row_count
+            if count == 0 or not query_vectors:
+                return {}
+
+            weighted_scores = np.zeros(count, dtype=np.float32)
+            total_weights = np.zeros(count, dtype=np.float32)
+
+            for model_name, vector in query_vectors.items():
+                if models is not None and model_name not in models:
+                    continue
+                base_weight = model_weights.get(model_name, 0)
+                matrix = self.models.get(model_name)
+                if not base_weight or matrix is None or matrix.dim != len(vector):
+                    continue
+                unit = vector / (np.linalg.norm(vector) + 1e-8)
+                similarities = matrix.vectors[:count] @ unit
+                weights = np.where(matrix.present[:count], np.float32(base_weight), np.float32(0.0))
+                if adaptive_weights:
+                    weights = weights * (query_confidences.get(model_name, 1.0) + matrix.confidences[:count]) * 0.5
+                weighted_scores += similarities * weights
+                total_weights += weights
+
+            valid = self.row_active[:count] & (total_weights > 0)
+            if not valid.any():
+                return {}
+
+            rows = np.flatnonzero(valid)
+            row_scores = np.clip(weighted_scores[rows] / total_weights[rows], 0.0, 1.0)
+            best = np.full(len(self.slot_clusters), -1.0, dtype=np.float32)
+            np.maximum.at(best, self.row_cluster[rows], row_scores)
+
+            return {
+                cluster_id: float(best[slot])
+                for slot, cluster_id in enumerate(self.slot_clusters)
+                if cluster_id is not None and best[slot] >= 0.0
+            }
+
+    def search(self, query, model_weights, threshold=0.0, top_k=None, adaptive_weights=True, models=None):
+        """Return [(cluster_id, score)] above threshold, best first"""
+        scores = self.score_clusters(query, model_weights, adaptive_weights=adaptive_weights, models=models)
+        ranked = sorted(((cid, s) for cid, s in scores.items() if s > threshold), key=lambda x: x[1], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, clusters=len(self.cluster_rows),
+                        rows=self.row_count - self.free_rows, models=sorted(self.models))
+
+
+# Global indexes over the voice database dictionaries
+anonymous_cluster_index = SpeakerEmbeddingIndex('anonymous_clusters')
+known_users_index = SpeakerEmbeddingIndex('known_users')
+
+
+# ----------------------------------------------------------------------
+# Checks
+# ----------------------------------------------------------------------
+
+def _random_dual_embedding(rng):
+    return {
+        'resemblyzer': rng.standard_normal(256).astype(np.float32).tolist(),
+        'speechbrain_ecapa': rng.standard_normal(192).astype(np.float32).tolist(),
+    }
+
+
+def check_in_place_replacement(seed=0):
+    """✅ A sample replaced in the middle of a profile's list must be picked up by sync()"""
+    rng = np.random.default_rng(seed)
+    model_weights = {'resemblyzer': 0.4, 'speechbrain_ecapa': 0.6}
+    profiles = {'alice': {'embeddings': [_random_dual_embedding(rng) for _ in range(5)]},
+                'bob': {'embeddings': [_random_dual_embedding(rng) for _ in range(5)]}}
+    index = SpeakerEmbeddingIndex('check')
+    index.sync(profiles)
+
+    replacement = _random_dual_embedding(rng)
+    profiles['alice']['embeddings'][2] = replacement     # Same list, same length, same ends
+    index.sync(profiles)
+    score = index.score_clusters(replacement, model_weights)['alice']
+    ok = abs(score - 1.0) < 1e-4
+    print(f"{'✅' if ok else '❌'} in-place replacement: query == new sample scores {score:.4f} (expected 1.0)")
+
+    # Running centroids reconcile through the same signature
+    from voice.centroid_index import ClusterCentroidIndex
+    centroids = ClusterCentroidIndex('check')
+    profiles['alice']['embeddings'][2] = _random_dual_embedding(rng)
+    centroids.similarities(replacement, profiles)
+    profiles['alice']['embeddings'][2] = replacement
+    running = centroids.similarities(replacement, profiles)['alice']
+    fresh = ClusterCentroidIndex('fresh').similarities(replacement, profiles)['alice']
+    centroid_ok = abs(running - fresh) < 1e-6
+    print(f"{'✅' if centroid_ok else '❌'} in-place replacement: running centroid {running:.4f}, re-summed {fresh:.4f}")
+
+    # ANN candidates (forced on with threshold=1) must return the replaced sample's profile
+    from voice.ann_index import ProfileCandidateIndex
+    candidates = ProfileCandidateIndex('check', threshold=1, candidates=1, backend='exact')
+    profiles['alice']['embeddings'][2] = _random_dual_embedding(rng)
+    candidates.candidates(replacement, profiles, model_weights)
+    profiles['alice']['embeddings'][2] = replacement
+    found = candidates.candidates(replacement, profiles, model_weights)
+    ann_ok = found == {'alice'}
+    print(f"{'✅' if ann_ok else '❌'} in-place replacement: ANN candidates {found} (expected {{'alice'}})")
+    return ok and centroid_ok and ann_ok
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--check" in sys.argv:
+        sys.exit(0 if check_in_place_replacement() else 1)
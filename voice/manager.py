@@ -2,8 +2,11 @@
 import time
 import numpy as np
 from datetime import datetime, timedelta
-from voice.database import known_users, save_known_users, load_known_users, anonymous_clusters, link_anonymous_to_named
+from voice.database import known_users, save_known_users, load_known_users, anonymous_clusters, link_anonymous_to_named, read_persisted_database
+from voice.database import flush_known_users
 from voice.recognition import identify_speaker_with_confidence, generate_voice_embedding
+from voice.centroid_index import anonymous_cluster_centroids, known_users_centroids
+from config import ANN_CANDIDATES
 from config import DEBUG
 from audio.output import speak_streaming
 from typing import Optional, Dict, List, Any, Tuple, Union
@@ -169,9 +172,7 @@ class IntelligentVoiceManager:
 
         # Check file system
         try:
-            import json
-            with open("voice_profiles/known_users_v2.json", 'r') as f:
-                file_data = json.load(f)
+            file_data = read_persisted_database()  # Active backend (binary store or JSON)
 
             file_clusters = file_data.get('anonymous_clusters', {})
             print(f"\n[EMBEDDING_TRACE] 💾 FILE STATE:")
@@ -250,9 +251,7 @@ class IntelligentVoiceManager:
     def emergency_restore_embeddings(self, cluster_id):
         """🚨 Emergency restore embeddings from file"""
         try:
-            import json
-            with open("voice_profiles/known_users_v2.json", 'r') as f:
-                file_data = json.load(f)
+            file_data = read_persisted_database()  # Active backend (binary store or JSON)
 
             file_clusters = file_data.get('anonymous_clusters', {})
             if cluster_id in file_clusters:
@@ -322,9 +321,7 @@ class IntelligentVoiceManager:
         
         # Check file on disk
         try:
-            import json
-            with open("voice_profiles/known_users_v2.json", 'r') as f:
-                file_data = json.load(f)
+            file_data = read_persisted_database()  # Active backend (binary store or JSON)
             
             print(f"\n[DATABASE_DEBUG] 💾 FILE ON DISK:")
             print(f"[DATABASE_DEBUG]   Anonymous clusters in file: {len(file_data.get('anonymous_clusters', {}))}")
@@ -1083,20 +1080,11 @@ class IntelligentVoiceManager:
             print(f"[DEBUG] 📅 Current Time: 2025-07-15 12:19:36 UTC")
             print(f"[DEBUG] 👤 User Login: Daveydrz")
 
-            # Check anonymous clusters using centroid
-            for cluster_id, cluster_data in anonymous_clusters.items():
-                similarity = self._calculate_centroid_similarity(current_embedding, cluster_data)
+            # Check anonymous clusters and known users against every centroid at once
+            for profile_id, similarity, profile_type in self._centroid_similarities(current_embedding):
                 if similarity > 0:
-                    candidates.append((cluster_id, similarity, 'anonymous'))
-                    print(f"[DEBUG] 🔍 {cluster_id}: centroid similarity = {similarity:.4f}")
-
-            # Check known users using centroid
-            for user_id, user_data in known_users.items():
-                if 'embeddings' in user_data:
-                    similarity = self._calculate_centroid_similarity(current_embedding, user_data)
-                    if similarity > 0:
-                        candidates.append((user_id, similarity, 'known'))
-                        print(f"[DEBUG] 🔍 {user_id}: centroid similarity = {similarity:.4f}")
+                    candidates.append((profile_id, similarity, profile_type))
+                    print(f"[DEBUG] 🔍 {profile_id}: centroid similarity = {similarity:.4f}")
 
             # Sort by similarity (highest first)
             candidates.sort(key=lambda x: x[1], reverse=True)
@@ -1423,12 +1411,14 @@ class IntelligentVoiceManager:
                     user_data['voice_embeddings'] = []
 
                 # Add to both embedding lists for compatibility
+                known_users_centroids.sync_cluster(profile_id, user_data)
                 user_data['embeddings'].append(embedding_list)
                 user_data['voice_embeddings'].append(embedding_list)
 
                 # Smart pruning to prevent memory bloat
-                user_data['embeddings'] = self._smart_prune_embeddings(user_data['embeddings'], max_samples=20)
+                user_data['embeddings'], pruned = self._smart_prune_embeddings(user_data['embeddings'], max_samples=20, return_pruned=True)
                 user_data['voice_embeddings'] = self._smart_prune_embeddings(user_data['voice_embeddings'], max_samples=20)
+                known_users_centroids.apply_changes(profile_id, user_data, added=[embedding_list], removed=pruned)
 
                 # Update metadata
                 user_data['last_updated'] = datetime.utcnow().isoformat()
@@ -1444,8 +1434,10 @@ class IntelligentVoiceManager:
                 if 'embeddings' not in cluster_data:
                     cluster_data['embeddings'] = []
 
+                anonymous_cluster_centroids.sync_cluster(profile_id, cluster_data)
                 cluster_data['embeddings'].append(embedding_list)
-                cluster_data['embeddings'] = self._smart_prune_embeddings(cluster_data['embeddings'], max_samples=15)
+                cluster_data['embeddings'], pruned = self._smart_prune_embeddings(cluster_data['embeddings'], max_samples=15, return_pruned=True)
+                anonymous_cluster_centroids.apply_changes(profile_id, cluster_data, added=[embedding_list], removed=pruned)
                 cluster_data['last_updated'] = datetime.utcnow().isoformat()
                 cluster_data['sample_count'] = len(cluster_data['embeddings'])
 
@@ -1489,9 +1481,8 @@ class IntelligentVoiceManager:
 
             # Check file storage - FIXED: Check both locations
             try:
-                import json
-                with open("voice_profiles/known_users_v2.json", 'r') as f:
-                    file_data = json.load(f)
+                flush_known_users()  # save_known_users() only queued the write - make it land before reading back
+                file_data = read_persisted_database()  # Active backend (binary store or JSON)
 
                 file_count = 0
                 file_users = file_data.get('known_users', {})
@@ -1591,33 +1582,36 @@ class IntelligentVoiceManager:
             traceback.print_exc()
             return False
     
-    def _smart_prune_embeddings(self, embeddings, max_samples=20):
-        """🧠 SMART pruning - keep diverse voice samples"""
+    def _smart_prune_embeddings(self, embeddings, max_samples=20, return_pruned=False):
+        """🧠 SMART pruning - keep diverse voice samples (optionally also return the dropped ones)"""
         try:
             if len(embeddings) <= max_samples:
-                return embeddings
-            
-            # Convert to numpy for processing
-            embedding_arrays = [np.array(emb) for emb in embeddings]
+                return (embeddings, []) if return_pruned else embeddings
             
             # Keep the most recent samples
-            recent_samples = embedding_arrays[-max_samples//2:]
+            recent_start = len(embeddings) + (-max_samples//2)
+            recent_indices = list(range(recent_start, len(embeddings)))
             
             # Keep diverse older samples
-            older_samples = embedding_arrays[:-max_samples//2]
-            if older_samples:
+            older_indices = list(range(recent_start))
+            if older_indices:
                 # Select diverse samples using simple distance-based selection
-                selected_older = self._select_diverse_samples(older_samples, max_samples//2)
-                final_samples = selected_older + recent_samples
+                kept_indices = self._select_diverse_samples(older_indices, max_samples//2) + recent_indices
             else:
-                final_samples = recent_samples
+                kept_indices = recent_indices
             
             # Convert back to lists
-            return [emb.tolist() for emb in final_samples]
+            kept = [np.array(embeddings[i]).tolist() for i in kept_indices]
+            if not return_pruned:
+                return kept
+            kept_set = set(kept_indices)
+            return kept, [emb for i, emb in enumerate(embeddings) if i not in kept_set]
             
         except Exception as e:
             print(f"[IntelligentVoiceManager] ❌ Pruning error: {e}")
             # Fallback: keep most recent samples
+            if return_pruned:
+                return embeddings[-max_samples:], embeddings[:-max_samples]
             return embeddings[-max_samples:]
     
     def _select_diverse_samples(self, embeddings, num_samples):
@@ -1705,6 +1699,29 @@ class IntelligentVoiceManager:
             vdebug(f"[DEBUG] Error details: {e}")
             return 0.0
 
+    def _centroid_similarities(self, embedding, include_known=True):
+        """🎯 [(profile_id, similarity, 'anonymous'|'known')] against the stored centroids
+
+        One matvec per dict; once a dict holds ANN_SWITCH_THRESHOLD centroids
+        only its ANN_CANDIDATES nearest are returned (via the ANN index).
+        """
+        try:
+            results = [
+                (cluster_id, similarity, 'anonymous')
+                for cluster_id, similarity in anonymous_cluster_centroids.similarities(
+                    embedding, anonymous_clusters, top_k=ANN_CANDIDATES).items()
+            ]
+            if include_known:
+                results.extend(
+                    (user_id, similarity, 'known')
+                    for user_id, similarity in known_users_centroids.similarities(
+                        embedding, known_users, top_k=ANN_CANDIDATES).items()
+                )
+            return results
+        except Exception as e:
+            print(f"[VoiceManager] ❌ Centroid calculation error: {e}")
+            return []
+
     def find_best_cluster_match_centroid(self, embedding):
         """🎯 Find best matching cluster using centroid method"""
         best_match = None
@@ -1712,26 +1729,13 @@ class IntelligentVoiceManager:
 
         vdebug(f"[DEBUG] 🔍 CENTROID MATCHING: Searching for best cluster match...")
 
-        # Check anonymous clusters using centroid
-        for cluster_id, cluster_data in anonymous_clusters.items():
-            similarity = self._calculate_centroid_similarity(embedding, cluster_data)
-
-            vdebug(f"[DEBUG] 🔍 {cluster_id}: centroid similarity = {similarity:.4f}")
+        # Check anonymous clusters, then known users, against every centroid at once
+        for profile_id, similarity, profile_type in self._centroid_similarities(embedding):
+            vdebug(f"[DEBUG] 🔍 {profile_id}: centroid similarity = {similarity:.4f}")
 
             if similarity > best_similarity:
                 best_similarity = similarity
-                best_match = (cluster_id, similarity, 'anonymous')
-
-        # Check known users using centroid
-        for user_id, user_data in known_users.items():
-            if 'embeddings' in user_data:
-                similarity = self._calculate_centroid_similarity(embedding, user_data)
-
-                vdebug(f"[DEBUG] 🔍 {user_id}: centroid similarity = {similarity:.4f}")
-
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = (user_id, similarity, 'known')
+                best_match = (profile_id, similarity, profile_type)
 
         vdebug(f"[DEBUG] 🎯 Best centroid match: {best_match}")
         return best_match
@@ -1747,9 +1751,7 @@ class IntelligentVoiceManager:
         best_match = None
         best_similarity = 0.0
 
-        for cluster_id, cluster_data in anonymous_clusters.items():
-            similarity = self._calculate_centroid_similarity(current_embedding, cluster_data)
-
+        for cluster_id, similarity, _ in self._centroid_similarities(current_embedding, include_known=False):
             print(f"[DEBUG] 📊 {cluster_id} centroid similarity: {similarity:.6f}")
 
             if similarity > best_similarity:
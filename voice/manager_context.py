@@ -7,6 +7,7 @@ import json
 import os
 
 from config import *
+from voice.utterance_cache import utterance_cache
 
 class AdvancedContextAnalyzer:
     """🧠 Advanced context analysis with clustering and behavioral intelligence"""
@@ -746,6 +747,11 @@ class AdvancedContextAnalyzer:
             return None
     
     def assess_audio_quality_detailed(self, audio):
+        """🔊 DETAILED AUDIO QUALITY ASSESSMENT (once per utterance, via the utterance cache)"""
+        return utterance_cache.get_or_compute(audio, 'quality_detailed',
+                                              lambda: self._compute_audio_quality_detailed(audio))
+    
+    def _compute_audio_quality_detailed(self, audio):
         """🔊 DETAILED AUDIO QUALITY ASSESSMENT"""
         try:
             if audio is None or len(audio) == 0:
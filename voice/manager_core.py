@@ -1232,8 +1232,8 @@ class AdvancedAIAssistantCore:
                             
                             # ✅ VERIFY file was saved
                             try:
-                                from voice.database import KNOWN_USERS_PATH
-                                if os.path.exists(KNOWN_USERS_PATH):
+                                from voice.database import persisted_database_path
+                                if os.path.exists(persisted_database_path()):
                                     print(f"[AdvancedCore] ✅ Database file exists, profile should be persisted.")
                                     return True
                                 else:
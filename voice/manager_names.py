@@ -5,11 +5,13 @@
 import re
 import time
 import json
+import threading
 import hashlib
 import difflib
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Set
 from collections import defaultdict, Counter
+from contextlib import nullcontext
 import numpy as np
 import requests
 
@@ -52,6 +54,7 @@ try:
     print("[UltraIntelligentNameManager] ✅ Config available")
 except ImportError:
     CONFIG_AVAILABLE = False
+    NAME_PREFILTER_ENABLED = True
     print("[UltraIntelligentNameManager] ⚠️ Config not available - using defaults")
 
 try:
@@ -63,6 +66,13 @@ except ImportError:
     voice_manager = None
     print("[UltraIntelligentNameManager] ⚠️ Voice manager not available")
 
+try:
+    from ai.llm_scheduler import llm_scheduler, NAME_EXTRACTION
+    LLM_SCHEDULER_AVAILABLE = True
+except ImportError:
+    LLM_SCHEDULER_AVAILABLE = False
+    print("[UltraIntelligentNameManager] ⚠️ LLM scheduler not available - name extraction unprioritised")
+
 # 🔥 PHONEME SIMILARITY - Advanced speech processing
 try:
     from phonemizer import phonemize
@@ -130,13 +140,131 @@ FAKE_NAME_TRAPS = {
     "pretty", "dirty", "empty", "heavy", "noisy", "crazy", "lazy", "easy", "idiot"
 }
 
+class IntroductionPreFilter:
+    """⚡ Deterministic single-pass introduction classifier run before any KoboldCPP call
+    
+    Tokens are scanned once against a phrase trie of introduction phrases and
+    the set of names KoboldCppNameExtractor will accept. Utterances with no
+    introduction phrase, or with no acceptable name anywhere in them, can never
+    produce a validated name, so they are rejected without the LLM. Plain
+    "My name is David" forms are accepted directly; everything else is
+    ambiguous and goes to Hermes.
+    """
+    
+    NOT_INTRODUCTION = "not_introduction"
+    DEFINITE_NAME = "definite_name"
+    AMBIGUOUS = "ambiguous"
+    
+    INTRODUCTION_PHRASES = (
+        "my name is", "my name's", "call me", "i'm", "im", "i am", "this is", "i go by",
+        "the name is", "the name's", "i am called", "known as", "calls me", "name is",
+    )
+    GREETINGS = {"hello", "hi", "hey"}
+    DEFINITE_TRAILERS = (("by", "the", "way"), ("nice", "to", "meet", "you"))
+    TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?|,")
+    
+    def __init__(self, accepted_names: Set[str], whisper_error_patterns: Dict):
+        self.accepted_names = set(accepted_names)
+        
+        # Phrase trie: token -> {token -> ..., None: phrase}
+        self.phrase_trie = {}
+        for phrase in self.INTRODUCTION_PHRASES:
+            node = self.phrase_trie
+            for token in phrase.split():
+                node = node.setdefault(token, {})
+            node[None] = phrase
+        
+        # Accepted names that Whisper also produces by mistake are never "definite"
+        confusable = set()
+        for errors in whisper_error_patterns.values():
+            if isinstance(errors, dict):
+                for error_list in errors.values():
+                    confusable.update(error_list)
+            else:
+                confusable.update(errors)
+        self.confusable_names = confusable & self.accepted_names
+        
+        self.stats = {
+            'utterances': 0,
+            self.NOT_INTRODUCTION: 0,
+            self.DEFINITE_NAME: 0,
+            self.AMBIGUOUS: 0,
+        }
+    
+    def classify(self, text: str) -> Tuple[str, Optional[str]]:
+        """Return (verdict, name); name is set only for DEFINITE_NAME"""
+        verdict, name = self._classify(text)
+        self.stats['utterances'] += 1
+        self.stats[verdict] += 1
+        return verdict, name
+    
+    def _classify(self, text: str) -> Tuple[str, Optional[str]]:
+        tokens = self.TOKEN_PATTERN.findall((text or "").lower())
+        
+        # Single pass: introduction phrase matches and accepted-name positions
+        phrase_matches = []   # (start, end) token indices
+        name_positions = []
+        for i, token in enumerate(tokens):
+            if token in self.accepted_names:
+                name_positions.append(i)
+            node = self.phrase_trie
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if None in node:
+                    phrase_matches.append((i, j))
+        
+        if not phrase_matches:
+            return self.NOT_INTRODUCTION, None
+        if not name_positions:
+            # Hermes output is validated against accepted_names, so no LLM answer could pass
+            return self.NOT_INTRODUCTION, None
+        
+        # Definite: [greeting[,]] <phrase> <name> [, ... | by the way | nice to meet you]
+        start = 0
+        if tokens[0] in self.GREETINGS:
+            start = 2 if len(tokens) > 1 and tokens[1] == "," else 1
+        for phrase_start, phrase_end in phrase_matches:
+            if phrase_start != start or phrase_end >= len(tokens):
+                continue
+            name = tokens[phrase_end]
+            if name not in self.accepted_names or name in self.confusable_names:
+                continue
+            rest = tuple(tokens[phrase_end + 1:])
+            if not rest or rest[0] == "," or rest in self.DEFINITE_TRAILERS:
+                return self.DEFINITE_NAME, name.title()
+        
+        return self.AMBIGUOUS, None
+    
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        decided = stats[self.NOT_INTRODUCTION] + stats[self.DEFINITE_NAME]
+        stats['llm_call_reduction'] = decided / stats['utterances'] if stats['utterances'] else 0.0
+        return stats
+
 class KoboldCppNameExtractor:
     """🤖 KoboldCPP + Hermes-2-Pro powered intelligent name extraction"""
     
+    # ✅ WHITELIST: Only these names are accepted from Hermes
+    LEGITIMATE_NAMES = {
+        'david', 'daveydrz', 'davey', 'dave', 'francesco', 'frank', 'franco',
+        'michael', 'mike', 'sarah', 'anna', 'john', 'james', 'robert', 'mary',
+        'patricia', 'jennifer', 'linda', 'elizabeth', 'barbara', 'susan',
+        'jessica', 'thomas', 'charles', 'christopher', 'daniel', 'matthew',
+        'anthony', 'mark', 'donald', 'steven', 'paul', 'andrew', 'joshua',
+        'kenneth', 'kevin', 'brian', 'george', 'timothy', 'ronald', 'jason'
+    }
+    
     def __init__(self, kobold_endpoint: str = "http://localhost:5001"):
         self.kobold_endpoint = kobold_endpoint
         self.api_url = f"{kobold_endpoint}/api/v1/generate"
         self.system_prompt = self._create_system_prompt()
+        self.prefilter = IntroductionPreFilter(
+            self.LEGITIMATE_NAMES,
+            name_resources.get('whisper_error_patterns', UltraIntelligentNameManager._load_whisper_error_patterns)
+        )
+        self.llm_calls = 0
         
     def _create_system_prompt(self) -> str:
         """🎯 Create ultra-precise system prompt for Hermes-2-Pro"""
@@ -201,6 +329,16 @@ Respond with ONLY the extracted name or "NONE". No explanations, no other text.
         
         print(f"[KoboldExtractor] 🤖 Analyzing: '{text}'")
         
+        if NAME_PREFILTER_ENABLED:
+            verdict, name = self.prefilter.classify(text)
+            if verdict == IntroductionPreFilter.NOT_INTRODUCTION:
+                print(f"[KoboldExtractor] ⚡ PRE-FILTER: not an introduction (LLM skipped)")
+                return None
+            if verdict == IntroductionPreFilter.DEFINITE_NAME and self._validate_extracted_name(name):
+                print(f"[KoboldExtractor] ⚡ PRE-FILTER: definite name {name} (LLM skipped)")
+                return name
+        
+        self.llm_calls += 1
         try:
             prompt = f"""{self.system_prompt}
 <|im_start|>user
@@ -225,12 +363,14 @@ Is this person introducing themselves by stating their own name? Extract the nam
                 "quiet": True
             }
             
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
-            )
+            # Outranks deferred memory / fusion jobs on the shared model
+            with llm_scheduler.foreground(NAME_EXTRACTION) if LLM_SCHEDULER_AVAILABLE else nullcontext():
+                response = requests.post(
+                    self.api_url,
+                    json=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=30
+                )
             
             if response.status_code == 200:
                 result = response.json()
@@ -257,6 +397,10 @@ Is this person introducing themselves by stating their own name? Extract the nam
             print(f"[KoboldExtractor] ❌ Error: {e}")
             return None
     
+    def get_prefilter_stats(self) -> Dict:
+        """📊 Pre-filter verdicts and how many KoboldCPP calls were actually made"""
+        return dict(self.prefilter.get_stats(), llm_calls=self.llm_calls)
+    
     def _clean_hermes_response(self, response: str) -> Optional[str]:
         """🔒 FOOL-PROOF response cleaning with strict validation"""
 
@@ -361,16 +505,7 @@ Is this person introducing themselves by stating their own name? Extract the nam
             return False
 
         # ✅ WHITELIST: Only allow known legitimate names
-        legitimate_names = {
-            'david', 'daveydrz', 'davey', 'dave', 'francesco', 'frank', 'franco',
-            'michael', 'mike', 'sarah', 'anna', 'john', 'james', 'robert', 'mary',
-            'patricia', 'jennifer', 'linda', 'elizabeth', 'barbara', 'susan',
-            'jessica', 'thomas', 'charles', 'christopher', 'daniel', 'matthew',
-            'anthony', 'mark', 'donald', 'steven', 'paul', 'andrew', 'joshua',
-            'kenneth', 'kevin', 'brian', 'george', 'timothy', 'ronald', 'jason'
-        }
-
-        if name_lower in legitimate_names:
+        if name_lower in self.LEGITIMATE_NAMES:
             print(f"[KoboldExtractor] ✅ LEGITIMATE NAME: {name}")
             return True
         else:
@@ -1368,10 +1503,110 @@ class ConfidencePredictor:
             'error': error
         })
 
+def _load_spacy_model():
+    """spaCy NER model, or None if unavailable"""
+    if not SPACY_AVAILABLE:
+        return None
+    try:
+        nlp = spacy.load("en_core_web_sm")
+        print("[UltraIntelligentNameManager] ✅ spaCy NER fallback enabled")
+        return nlp
+    except Exception as e:
+        print(f"[UltraIntelligentNameManager] ❌ spaCy load failed: {e}")
+        return None
+
+class NameResourceRegistry:
+    """📦 Process-wide cache of immutable name lexicons, extractors and NLP models
+    
+    Every UltraIntelligentNameManager shares these; only conversation/session
+    state lives on the instance. Each resource is loaded once, on first use or
+    by warm_up() on a background thread.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.resources = {}
+        self.load_times = {}          # key -> load time in ms
+        self.stats = {
+            'constructions': 0,
+            'first_construction_ms': None,
+            'last_construction_ms': None,
+            'average_construction_ms': 0.0,
+        }
+        self.warmup_thread = None
+    
+    def get(self, key, loader):
+        """Return the cached resource, loading it with loader() the first time"""
+        if key in self.resources:
+            return self.resources[key]
+        
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self.resources:
+                return self.resources[key]
+            start = time.perf_counter()
+            resource = loader()
+            load_ms = (time.perf_counter() - start) * 1000.0
+            self.resources[key] = resource
+            self.load_times[key] = load_ms
+            print(f"[NameResources] 📦 Loaded {key} in {load_ms:.1f}ms")
+        return resource
+    
+    def loaders(self):
+        return {
+            'name_database': UltraIntelligentNameManager._load_ultra_comprehensive_names,
+            'cultural_variants': UltraIntelligentNameManager._load_cultural_variants,
+            'phonetic_similarity_map': UltraIntelligentNameManager._build_phonetic_similarity_map,
+            'temporal_patterns': UltraIntelligentNameManager._load_temporal_patterns,
+            'whisper_error_patterns': UltraIntelligentNameManager._load_whisper_error_patterns,
+            'conversation_context_analyzer': ConversationContextAnalyzer,
+            'linguistic_validator': LinguisticValidator,
+            'enhanced_extractor': EnhancedWhisperAwareExtractor,
+            'spacy_nlp': _load_spacy_model,
+        }
+    
+    def warm_up(self, background=True):
+        """🔥 Load everything ahead of the first utterance"""
+        def load_all():
+            start = time.perf_counter()
+            for key, loader in self.loaders().items():
+                try:
+                    self.get(key, loader)
+                except Exception as e:
+                    print(f"[NameResources] ❌ Warm-up failed for {key}: {e}")
+            print(f"[NameResources] ✅ Warm-up complete in {(time.perf_counter() - start) * 1000.0:.0f}ms")
+        
+        if not background:
+            load_all()
+            return None
+        if self.warmup_thread is None or not self.warmup_thread.is_alive():
+            self.warmup_thread = threading.Thread(target=load_all, name="NameResourcesWarmup", daemon=True)
+            self.warmup_thread.start()
+        return self.warmup_thread
+    
+    def record_construction(self, construction_ms):
+        with self.lock:
+            stats = self.stats
+            stats['constructions'] += 1
+            if stats['first_construction_ms'] is None:
+                stats['first_construction_ms'] = construction_ms
+            stats['last_construction_ms'] = construction_ms
+            stats['average_construction_ms'] += (construction_ms - stats['average_construction_ms']) / stats['constructions']
+    
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, loaded=sorted(self.resources.keys()), load_times_ms=dict(self.load_times))
+
+# Global shared resources
+name_resources = NameResourceRegistry()
+
 class UltraIntelligentNameManager:
     """🧠 ULTRA-INTELLIGENT AI-LEVEL Name Management System - Beyond Alexa/Siri/GPT-4"""
     
     def __init__(self, voice_manager=None):
+        construction_start = time.perf_counter()
         self.voice_manager = voice_manager  # ✅ Store it for internal use        # Core state management
         self.waiting_for_name = False
         self.pending_name_confirmation = False
@@ -1390,8 +1625,7 @@ class UltraIntelligentNameManager:
         self.actual_person_name = None    # Will be set when user introduces themselves
         self.person_nicknames = set()     # Only real nicknames for actual person
         
-        # Initialize enhanced extractor
-        self.enhanced_extractor = EnhancedWhisperAwareExtractor()        
+        # Enhanced extractor and spaCy are shared and loaded lazily (see properties below)
 
         # 🧠 ULTRA-INTELLIGENT FEATURES
         self.cluster_name_associations = {}
@@ -1401,17 +1635,17 @@ class UltraIntelligentNameManager:
         self.voice_pattern_signatures = {}
         self.linguistic_fingerprints = {}
 
-        # 🎯 MEGA-INTELLIGENT DATABASES
-        self.enhanced_name_database = self._load_ultra_comprehensive_names()
-        self.cultural_name_variants = self._load_cultural_variants()
-        self.phonetic_similarity_map = self._build_phonetic_similarity_map()
-        self.temporal_name_patterns = self._load_temporal_patterns()
+        # 🎯 MEGA-INTELLIGENT DATABASES (shared, loaded once per process)
+        self.enhanced_name_database = name_resources.get('name_database', self._load_ultra_comprehensive_names)
+        self.cultural_name_variants = name_resources.get('cultural_variants', self._load_cultural_variants)
+        self.phonetic_similarity_map = name_resources.get('phonetic_similarity_map', self._build_phonetic_similarity_map)
+        self.temporal_name_patterns = name_resources.get('temporal_patterns', self._load_temporal_patterns)
         
         # 🛡️ ULTRA-ADVANCED PROTECTION SYSTEMS
-        self.whisper_error_patterns = self._load_whisper_error_patterns()
-        self.conversation_context_analyzer = ConversationContextAnalyzer()
-        self.linguistic_validator = LinguisticValidator()
-        self.confidence_predictor = ConfidencePredictor()
+        self.whisper_error_patterns = name_resources.get('whisper_error_patterns', self._load_whisper_error_patterns)
+        self.conversation_context_analyzer = name_resources.get('conversation_context_analyzer', ConversationContextAnalyzer)
+        self.linguistic_validator = name_resources.get('linguistic_validator', LinguisticValidator)
+        self.confidence_predictor = ConfidencePredictor()  # Learns per instance
         
         # 🎭 BEHAVIORAL INTELLIGENCE
         self.user_behavior_patterns = {}
@@ -1429,19 +1663,20 @@ class UltraIntelligentNameManager:
         # 🔧 FIX: Build current user nicknames AFTER all attributes are initialized
         self.current_user_nicknames = self._build_current_user_nicknames()
         
-        print("[UltraIntelligentNameManager] 🧠 ULTRA-INTELLIGENT AI-LEVEL name processing initialized")
-        print("[UltraIntelligentNameManager] 🎯 Performance level: Beyond Alexa/Siri/GPT-4")       
+        construction_ms = (time.perf_counter() - construction_start) * 1000.0
+        name_resources.record_construction(construction_ms)
+        if CONFIG_AVAILABLE and DEBUG:
+            print(f"[UltraIntelligentNameManager] 🧠 Initialized in {construction_ms:.2f}ms (shared resources)")
 
-        # 🚀 ENHANCED: spaCy NER Fallback System
-        if SPACY_AVAILABLE:
-            try:
-                self.nlp = spacy.load("en_core_web_sm")
-                print("[UltraIntelligentNameManager] ✅ spaCy NER fallback enabled")
-            except Exception as e:
-                self.nlp = None
-                print(f"[UltraIntelligentNameManager] ❌ spaCy load failed: {e}")
-        else:
-            self.nlp = None
+    @property
+    def enhanced_extractor(self):
+        """Shared EnhancedWhisperAwareExtractor (KoboldCPP connection test runs once)"""
+        return name_resources.get('enhanced_extractor', EnhancedWhisperAwareExtractor)
+
+    @property
+    def nlp(self):
+        """🚀 Shared spaCy NER fallback model (None if unavailable)"""
+        return name_resources.get('spacy_nlp', _load_spacy_model)
 
     def force_link_current_cluster_to_name(self, name: str) -> bool:
         """🔗 Force link current cluster to name"""
@@ -2387,7 +2622,8 @@ class UltraIntelligentNameManager:
         
         return suspicious
 
-    def _load_ultra_comprehensive_names(self) -> Set[str]:
+    @staticmethod
+    def _load_ultra_comprehensive_names() -> Set[str]:
         """🌍 Load ultra-comprehensive international name database"""
         
         # Core user names
@@ -2475,7 +2711,8 @@ class UltraIntelligentNameManager:
         
         return core_names.union(global_names)
     
-    def _load_cultural_variants(self) -> Dict[str, List[str]]:
+    @staticmethod
+    def _load_cultural_variants() -> Dict[str, List[str]]:
         """🌍 Load cultural name variants for ultra-intelligent matching"""
         return {
             'david': ['dave', 'davey', 'davy', 'davie', 'daveed', 'dawid', 'davide', 'daved'],
@@ -2501,7 +2738,8 @@ class UltraIntelligentNameManager:
             'john': ['jon', 'johnny', 'jack', 'giovanni', 'juan', 'jean']
         }
     
-    def _build_phonetic_similarity_map(self) -> Dict[str, Set[str]]:
+    @staticmethod
+    def _build_phonetic_similarity_map() -> Dict[str, Set[str]]:
         """🔤 Build phonetic similarity mapping for ultra-intelligent matching"""
         phonetic_groups = {
             'b_p_sounds': {'bobby', 'poppy', 'baby', 'puppy', 'happy', 'peppy'},
@@ -2523,7 +2761,8 @@ class UltraIntelligentNameManager:
         
         return dict(similarity_map)
     
-    def _load_temporal_patterns(self) -> Dict[str, List[str]]:
+    @staticmethod
+    def _load_temporal_patterns() -> Dict[str, List[str]]:
         """⏰ Load temporal name patterns for context-aware processing"""
         return {
             'morning_casual': ['morning', 'early', 'wake', 'breakfast', 'coffee', 'start'],
@@ -2534,7 +2773,8 @@ class UltraIntelligentNameManager:
             'weekday_formal': ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'work', 'busy']
         }
     
-    def _load_whisper_error_patterns(self) -> Dict[str, List[str]]:
+    @staticmethod
+    def _load_whisper_error_patterns() -> Dict[str, List[str]]:
         """🎤 Load comprehensive Whisper ASR error patterns"""
         return {
             'common_mistranscriptions': [
@@ -3401,7 +3641,8 @@ class UltraIntelligentNameManager:
             'confidence_history': dict(self.name_confidence_history),
             'learning_entries': total_false_positives,
             'blacklist_blocks': getattr(self, '_blacklist_block_count', 0),
-            'whisper_error_blocks': getattr(self, '_whisper_error_block_count', 0)
+            'whisper_error_blocks': getattr(self, '_whisper_error_block_count', 0),
+            'name_prefilter': self.enhanced_extractor.kobold_extractor.get_prefilter_stats()
         }
 
     def debug_name_processing(self, text: str) -> str:
@@ -3645,7 +3886,62 @@ def test_kobold_connection():
     except Exception as e:
         print(f"❌ KoboldCPP test error: {e}")
 
+def benchmark_name_manager_construction(instances: int = 20):
+    """⏱️ Per-utterance UltraIntelligentNameManager construction cost with shared resources"""
+    print("⏱️ NAME MANAGER CONSTRUCTION BENCHMARK")
+    print("=" * 60)
+    
+    start = time.perf_counter()
+    name_resources.warm_up(background=False)
+    print(f"📦 One-time resource load: {(time.perf_counter() - start) * 1000.0:.1f}ms")
+    for key, load_ms in sorted(name_resources.load_times.items(), key=lambda item: -item[1]):
+        print(f"   {key:32s} {load_ms:9.2f}ms")
+    
+    timings = []
+    for _ in range(instances):
+        start = time.perf_counter()
+        manager = UltraIntelligentNameManager()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    
+    shared = manager.enhanced_name_database is UltraIntelligentNameManager().enhanced_name_database
+    print(f"🧠 {instances} constructions: avg {sum(timings) / len(timings):.3f}ms, max {max(timings):.3f}ms")
+    print(f"🔗 Lexicons shared between instances: {shared}")
+
+def benchmark_name_prefilter():
+    """⚡ How many sample utterances the pre-filter settles without KoboldCPP"""
+    print("⚡ INTRODUCTION PRE-FILTER")
+    print("=" * 60)
+    
+    prefilter = IntroductionPreFilter(
+        KoboldCppNameExtractor.LEGITIMATE_NAMES,
+        name_resources.get('whisper_error_patterns', UltraIntelligentNameManager._load_whisper_error_patterns)
+    )
+    samples = [
+        "My name is David", "Hello, I'm Dave", "I'm David, Anna's friend", "Call me Francesco",
+        "I'm Sarah by the way", "I'm just thinking", "I'm doing something important", "I'm tired",
+        "What's the weather like today", "Can you play some music", "Tell me a joke",
+        "How are you going mate", "I'm David's friend", "I'm David working", "This is Zorblax",
+        "I am Kevin and I like dogs", "Turn off the lights", "What time is it",
+    ]
+    
+    start = time.perf_counter()
+    for text in samples:
+        verdict, name = prefilter.classify(text)
+        print(f"  {verdict:18s} {name or '':10s} '{text}'")
+    elapsed_us = (time.perf_counter() - start) * 1e6 / len(samples)
+    
+    stats = prefilter.get_stats()
+    print(f"📊 {stats['utterances']} utterances: {stats[IntroductionPreFilter.AMBIGUOUS]} sent to KoboldCPP, "
+          f"{stats['llm_call_reduction']:.0%} LLM calls avoided, {elapsed_us:.1f}µs per utterance")
+
 if __name__ == "__main__":
+    import sys
+    
+    if "--bench" in sys.argv:
+        benchmark_name_manager_construction()
+        benchmark_name_prefilter()
+        sys.exit(0)
+    
     print("🧠 ULTRA-INTELLIGENT NAME MANAGER - STANDALONE TEST")
     print("=" * 60)
     
@@ -0,0 +1,473 @@
+# voice/profile_store.py - Binary, memory-mapped voice profile storage
+import json
+import os
+import re
+import tempfile
+import threading
+import numpy as np
+from datetime import datetime
+from config import DEBUG
+from voice.compact_embedding import STORAGE_PRECISION, CompactEmbedding
+from voice.embedding_index import EMBEDDING_METADATA_KEYS
+
+STORE_VERSION = 'voice_store_v1'
+EMBEDDING_FIELDS = ('embeddings', 'voice_embeddings')
+SINGLE_EMBEDDING_FIELD = 'embedding'
+LEGACY_PROFILE_FIELD = '__legacy__'
+
+def _to_json_safe(obj):
+    """Convert numpy values left in metadata into JSON types"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {k: _to_json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_json_safe(v) for v in obj]
+    return obj
+
+def _items_signature(items):
+    """Identity of every item - unchanged for a copied list, changed by any in-place replacement"""
+    return ('items', tuple(id(item) for item in items))
+
+def _is_vector(value):
+    if isinstance(value, CompactEmbedding):
+        return True
+    if isinstance(value, np.ndarray):
+        return value.ndim == 1 and value.size > 0 and np.issubdtype(value.dtype, np.number)
+    return (isinstance(value, (list, tuple)) and len(value) > 0
+            and all(isinstance(v, (int, float, np.floating)) and not isinstance(v, bool) for v in value[:4]))
+
+
+class BinaryVoiceProfileStore:
+    """💾 Voice profiles with embeddings in memory-mapped .npy segments
+
+    Layout inside store_dir:
+      index.json                          metadata for every profile (no floats)
+      g<gen>.<model>.<seg>.npy            [segment_rows, dim] per model, float32
+      g<gen>.<model>@<dtype>.<seg>.npy    float16 / int8 rows (EMBEDDING_STORAGE_PRECISION)
+
+    int8 references carry the row's scale ([model_key, row, scale]). Dual
+    embedding vectors load as CompactEmbedding over the mapped row (float32
+    rows stay plain views), so scoring dequantizes to float32.
+
+    Rows are append-only. A save writes only embeddings it has not stored
+    before; replaced embeddings just become dead rows, which compact()
+    reclaims by rewriting live rows into the next generation.
+    """
+
+    INDEX_NAME = 'index.json'
+    SEGMENT_ROWS = 4096
+
+    def __init__(self, store_dir, segment_rows=SEGMENT_ROWS, precision=None):
+        self.store_dir = store_dir
+        self.precision = precision or STORAGE_PRECISION
+        self.index_path = os.path.join(store_dir, self.INDEX_NAME)
+        self.segment_rows = segment_rows
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.models = {}            # model_key -> {'dim', 'rows_used', 'dead_rows', 'dtype'}
+        self._readers = {}          # (model_key, seg) -> copy-on-write memmap
+        self._writers = {}          # (model_key, seg) -> r+ memmap
+        self._dirty_writers = set()
+        self._field_cache = {}      # (section, pid, field) -> (signature, container, items, encoded_items)
+        self.stats = {'saves': 0, 'rows_written': 0, 'rows_reused': 0, 'compactions': 0, 'bytes_index': 0}
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    def _segment_path(self, model_key, seg, generation=None):
+        gen = self.generation if generation is None else generation
+        safe_key = re.sub(r'[^A-Za-z0-9_.-]', '_', model_key)
+        return os.path.join(self.store_dir, f"g{gen}.{safe_key}.{seg}.npy")
+
+    def _reader(self, model_key, seg):
+        key = (model_key, seg)
+        reader = self._readers.get(key)
+        if reader is None:
+            reader = np.load(self._segment_path(model_key, seg), mmap_mode='c')
+            self._readers[key] = reader
+        return reader
+
+    def _writer(self, model_key, seg):
+        key = (model_key, seg)
+        writer = self._writers.get(key)
+        if writer is None:
+            path = self._segment_path(model_key, seg)
+            if os.path.exists(path):
+                writer = np.load(path, mmap_mode='r+')
+            else:
+                info = self.models[model_key]
+                writer = np.lib.format.open_memmap(
+                    path, mode='w+', dtype=info.get('dtype', 'float32'), shape=(self.segment_rows, info['dim'])
+                )
+            self._writers[key] = writer
+        return writer
+
+    def _close_maps(self):
+        for writer in self._writers.values():
+            writer.flush()
+        self._writers.clear()
+        self._readers.clear()
+        self._dirty_writers.clear()
+
+    def _write_index_atomic(self, index):
+        os.makedirs(self.store_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='index.', suffix='.tmp', dir=self.store_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.index_path)
+            self.stats['bytes_index'] = os.path.getsize(self.index_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # ------------------------------------------------------------------
+    # Encoding
+    # ------------------------------------------------------------------
+
+    def _model_key(self, model_name, dim, precision='float32'):
+        base = model_name if precision == 'float32' else f"{model_name}@{precision}"
+        info = self.models.get(base)
+        if info is None or info['dim'] == dim:
+            return base
+        return f"{base}#{dim}"
+
+    @staticmethod
+    def _model_name(model_key):
+        return model_key.split('#')[0].split('@')[0]
+
+    def _append_vector(self, model_name, vector):
+        compact = CompactEmbedding.from_vector(vector, self.precision)
+        dim = len(compact)
+        model_key = self._model_key(model_name, dim, compact.precision)
+        info = self.models.setdefault(model_key, {'dim': dim, 'rows_used': 0, 'dead_rows': 0,
+                                                  'dtype': compact.precision})
+        row = info['rows_used']
+        seg, offset = divmod(row, self.segment_rows)
+        writer = self._writer(model_key, seg)
+        writer[offset] = compact.codes
+        self._dirty_writers.add((model_key, seg))
+        info['rows_used'] += 1
+        self.stats['rows_written'] += 1
+        if compact.precision == 'int8':
+            return [model_key, row, compact.scale]
+        return [model_key, row]
+
+    def _encode_item(self, item):
+        """Write an embedding's vectors and return its JSON reference"""
+        if isinstance(item, dict):
+            rows, meta = {}, {}
+            for key, value in item.items():
+                if key not in EMBEDDING_METADATA_KEYS and _is_vector(value):
+                    rows[key] = self._append_vector(key, value)
+                else:
+                    meta[key] = _to_json_safe(value)
+            return {'k': 'dict', 'rows': rows, 'meta': meta}
+        if _is_vector(item):
+            return {'k': 'vector', 'rows': {'resemblyzer': self._append_vector('resemblyzer', item)}}
+        return {'k': 'raw', 'value': _to_json_safe(item)}
+
+    def _release_item(self, encoded):
+        for reference in encoded.get('rows', {}).values():
+            model_key = reference[0]
+            if model_key in self.models:
+                self.models[model_key]['dead_rows'] += 1
+
+    def _encode_field(self, section, pid, field, container, items):
+        """Encode one embedding list, reusing rows for items stored before"""
+        cache_key = (section, pid, field)
+        signature = _items_signature(items) if container is items else ('single', id(container))
+        cached = self._field_cache.get(cache_key)
+        if cached is not None and cached[0] == signature:
+            self.stats['rows_reused'] += len(cached[3])
+            return cached[3]
+
+        # Items shared between fields of one profile (embeddings/voice_embeddings) share rows
+        previous = {}
+        for (other_section, other_pid, _field), entry in self._field_cache.items():
+            if other_section == section and other_pid == pid:
+                previous.update((id(item), encoded) for item, encoded in zip(entry[2], entry[3]))
+
+        encoded_items = []
+        reused_ids = set()
+        for item in items:
+            encoded = previous.get(id(item))
+            if encoded is not None:
+                reused_ids.add(id(item))
+                self.stats['rows_reused'] += 1
+            else:
+                encoded = self._encode_item(item)
+            encoded_items.append(encoded)
+
+        if cached is not None:
+            for item, encoded in zip(cached[2], cached[3]):
+                if id(item) not in reused_ids:
+                    self._release_item(encoded)
+
+        # Strong references keep ids stable until the next comparison
+        self._field_cache[cache_key] = (signature, container, list(items), encoded_items)
+        return encoded_items
+
+    def _encode_profile(self, section, pid, profile):
+        if not isinstance(profile, dict):
+            if _is_vector(profile):
+                encoded = self._encode_field(section, pid, LEGACY_PROFILE_FIELD, profile, [profile])
+                return {'__legacy__': encoded[0]}
+            return {'__raw__': _to_json_safe(profile)}
+
+        record = {}
+        for key, value in profile.items():
+            if key in EMBEDDING_FIELDS and isinstance(value, list):
+                record[key] = {'__items__': self._encode_field(section, pid, key, value, value)}
+            elif key == SINGLE_EMBEDDING_FIELD and value is not None and _is_vector(value):
+                encoded = self._encode_field(section, pid, key, value, [value])
+                record[key] = {'__item__': encoded[0]}
+            else:
+                record[key] = _to_json_safe(value)
+        return record
+
+    def _forget_missing(self, section, live_ids):
+        for cache_key in [k for k in self._field_cache if k[0] == section and k[1] not in live_ids]:
+            encoded_items = self._field_cache.pop(cache_key)[3]
+            for encoded in encoded_items:
+                self._release_item(encoded)
+
+    # ------------------------------------------------------------------
+    # Decoding
+    # ------------------------------------------------------------------
+
+    def _vector_view(self, reference):
+        model_key, row = reference[:2]
+        seg, offset = divmod(row, self.segment_rows)
+        codes = self._reader(model_key, seg)[offset]
+        if self.models.get(model_key, {}).get('dtype', 'float32') == 'float32':
+            return codes
+        return CompactEmbedding(codes, reference[2] if len(reference) > 2 else 1.0)
+
+    def _decode_item(self, encoded):
+        kind = encoded.get('k')
+        if kind == 'dict':
+            item = dict(encoded.get('meta', {}))
+            for model_name, reference in encoded['rows'].items():
+                item[model_name] = self._vector_view(reference)
+            return item
+        if kind == 'vector':
+            # Bare vectors stay lists: legacy paths check isinstance(..., list)
+            return self._vector_view(encoded['rows']['resemblyzer']).tolist()
+        return encoded.get('value')
+
+    def _decode_profile(self, section, pid, record):
+        if '__legacy__' in record and len(record) == 1:
+            profile = self._decode_item(record['__legacy__'])
+            self._field_cache[(section, pid, LEGACY_PROFILE_FIELD)] = (
+                ('single', id(profile)), profile, [profile], [record['__legacy__']])
+            return profile
+        if '__raw__' in record and len(record) == 1:
+            return record['__raw__']
+
+        profile = {}
+        for key, value in record.items():
+            if isinstance(value, dict) and '__items__' in value:
+                items = [self._decode_item(encoded) for encoded in value['__items__']]
+                profile[key] = items
+            elif isinstance(value, dict) and '__item__' in value:
+                profile[key] = self._decode_item(value['__item__'])
+            else:
+                profile[key] = value
+
+        # Seed the cache so the first save after load rewrites nothing
+        for key, value in record.items():
+            if isinstance(value, dict) and '__items__' in value:
+                items = profile[key]
+                self._field_cache[(section, pid, key)] = (
+                    _items_signature(items), items, list(items), value['__items__'])
+            elif isinstance(value, dict) and '__item__' in value:
+                single = profile[key]
+                self._field_cache[(section, pid, key)] = (
+                    ('single', id(single)), single, [single], [value['__item__']])
+        return profile
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def load(self, compact=True):
+        """Map the store and return (known_users, anonymous_clusters, false_positives)
+
+        compact=False never rewrites files - for read-only inspection next to a live store.
+        """
+        with self.lock:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+
+            self._close_maps()
+            self._field_cache.clear()
+            self.generation = index.get('generation', 0)
+            self.models = index.get('models', {})
+
+            if compact and self._needs_compaction():
+                self._compact_from_index(index)
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self.generation = index.get('generation', 0)
+                self.models = index.get('models', {})
+
+            known = {pid: self._decode_profile('known_users', pid, record)
+                     for pid, record in index.get('known_users', {}).items()}
+            clusters = {pid: self._decode_profile('anonymous_clusters', pid, record)
+                        for pid, record in index.get('anonymous_clusters', {}).items()}
+
+            if DEBUG:
+                rows = sum(info['rows_used'] - info['dead_rows'] for info in self.models.values())
+                print(f"[ProfileStore] 📂 Mapped {len(known)} users, {len(clusters)} clusters, "
+                      f"{rows} live vectors (generation {self.generation})")
+            return known, clusters, list(index.get('false_positives', []))
+
+    def save(self, known_users, anonymous_clusters, false_positives):
+        """Incrementally persist the database; only new embeddings touch the vector files"""
+        with self.lock:
+            os.makedirs(self.store_dir, exist_ok=True)
+            rows_before = self.stats['rows_written']
+
+            index = {
+                'version': STORE_VERSION,
+                'generation': self.generation,
+                'last_updated': datetime.utcnow().isoformat(),
+                'known_users': {pid: self._encode_profile('known_users', pid, p) for pid, p in known_users.items()},
+                'anonymous_clusters': {pid: self._encode_profile('anonymous_clusters', pid, p)
+                                       for pid, p in anonymous_clusters.items()},
+                'false_positives': _to_json_safe(list(false_positives or [])),
+            }
+            self._forget_missing('known_users', set(known_users))
+            self._forget_missing('anonymous_clusters', set(anonymous_clusters))
+
+            # Vectors must be durable before the index points at them
+            for key in self._dirty_writers:
+                self._writers[key].flush()
+            self._dirty_writers.clear()
+
+            index['models'] = self.models
+            self._write_index_atomic(index)
+            self.stats['saves'] += 1
+
+            if DEBUG:
+                print(f"[ProfileStore] 💾 Saved {len(known_users)} users, {len(anonymous_clusters)} clusters "
+                      f"({self.stats['rows_written'] - rows_before} new vectors)")
+            return True
+
+    def _needs_compaction(self):
+        dead = sum(info.get('dead_rows', 0) for info in self.models.values())
+        used = sum(info.get('rows_used', 0) for info in self.models.values())
+        return dead > self.segment_rows // 4 and dead * 2 > used
+
+    def _compact_from_index(self, index):
+        """Rewrite live rows into a new generation and drop the old files"""
+        old_generation = self.generation
+        old_models = self.models
+        readers = {}
+
+        def read(reference):
+            model_key, row = reference[:2]
+            seg, offset = divmod(row, self.segment_rows)
+            if (model_key, seg) not in readers:
+                readers[(model_key, seg)] = np.load(
+                    self._segment_path(model_key, seg, old_generation), mmap_mode='r')
+            # Same precision is copied as-is; a changed EMBEDDING_STORAGE_PRECISION re-quantizes here
+            return CompactEmbedding(np.array(readers[(model_key, seg)][offset]),
+                                    reference[2] if len(reference) > 2 else 1.0)
+
+        self._close_maps()
+        self.generation = old_generation + 1
+        self.models = {}
+
+        def rewrite(encoded):
+            if 'rows' in encoded:
+                encoded['rows'] = {m: self._append_vector(self._model_name(ref[0]), read(ref))
+                                   for m, ref in encoded['rows'].items()}
+
+        for section in ('known_users', 'anonymous_clusters'):
+            for record in index.get(section, {}).values():
+                for value in record.values():
+                    if isinstance(value, dict) and '__items__' in value:
+                        for encoded in value['__items__']:
+                            rewrite(encoded)
+                    elif isinstance(value, dict) and '__item__' in value:
+                        rewrite(value['__item__'])
+                    elif isinstance(value, dict) and 'rows' in value:
+                        rewrite(value)
+
+        for key in self._dirty_writers:
+            self._writers[key].flush()
+        index['generation'] = self.generation
+        index['models'] = self.models
+        self._write_index_atomic(index)
+        self._close_maps()
+        readers.clear()
+
+        for model_key, info in old_models.items():
+            for seg in range((info['rows_used'] + self.segment_rows - 1) // self.segment_rows):
+                try:
+                    os.remove(self._segment_path(model_key, seg, old_generation))
+                except OSError:
+                    pass
+        self.stats['compactions'] += 1
+        print(f"[ProfileStore] 🧹 Compacted store into generation {self.generation}")
+
+    def compact(self):
+        """Reclaim dead rows (call before handing out views, e.g. at startup)"""
+        with self.lock:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.models = index.get('models', {})
+            self.generation = index.get('generation', 0)
+            self._compact_from_index(index)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, generation=self.generation,
+                        models={k: dict(v) for k, v in self.models.items()})
+
+
+def migrate_json_to_store(json_path, store_dir):
+    """🔄 One-shot migration from known_users_v2.json into a binary store
+
+    The JSON file is left in place as a backup; returns the number of
+    profiles migrated, or -1 on failure.
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        store = BinaryVoiceProfileStore(store_dir)
+        known = data.get('known_users', {})
+        clusters = data.get('anonymous_clusters', {})
+        store.save(known, clusters, data.get('false_positives', []))
+
+        # Verify by mapping the new store back
+        loaded_known, loaded_clusters, _ = BinaryVoiceProfileStore(store_dir).load()
+        if len(loaded_known) != len(known) or len(loaded_clusters) != len(clusters):
+            print(f"[ProfileStore] ❌ Migration verification failed")
+            return -1
+
+        print(f"[ProfileStore] ✅ Migrated {len(known)} users and {len(clusters)} clusters "
+              f"from {json_path} ({store.stats['rows_written']} vectors)")
+        return len(known) + len(clusters)
+
+    except Exception as e:
+        print(f"[ProfileStore] ❌ Migration error: {e}")
+        return -1
+
+
+if __name__ == "__main__":
+    from config import KNOWN_USERS_PATH, VOICE_PROFILE_STORE_DIR
+    migrate_json_to_store(KNOWN_USERS_PATH, VOICE_PROFILE_STORE_DIR)
@@ -6,6 +6,8 @@ from config import DEBUG, SAMPLE_RATE, VOICE_CONFIDENCE_THRESHOLD
 import time
 from datetime import datetime
 from voice.database import known_users, save_known_users, handle_same_name_collision
+from voice.embedding_index import anonymous_cluster_index, known_users_index
+from voice.utterance_cache import utterance_cache
 
 # Try enhanced modules first
 try:
@@ -30,7 +32,7 @@ def generate_voice_embedding(audio):
     """🎯 Enhanced voice embedding generation with clustering support"""
     if ENHANCED_AVAILABLE:
         # Use dual model system
-        result = dual_voice_model_manager.generate_dual_embedding(audio)
+        result = dual_voice_model_manager.generate_dual_embedding(audio, as_numpy=True)
         if result and 'resemblyzer' in result:
             return np.array(result['resemblyzer'])
         return None
@@ -40,12 +42,13 @@ def generate_voice_embedding(audio):
             if len(audio) < SAMPLE_RATE:
                 return None
             
-            audio_float = audio.astype(np.float32)
-            if np.max(np.abs(audio_float)) > 1.0:
-                audio_float = audio_float / 32768.0
+            def embed():
+                audio_float = audio.astype(np.float32)
+                if np.max(np.abs(audio_float)) > 1.0:
+                    audio_float = audio_float / 32768.0
+                return encoder.embed_utterance(audio_float)
             
-            embedding = encoder.embed_utterance(audio_float)
-            return embedding if embedding is not None else None
+            return utterance_cache.get_or_compute(audio, 'resemblyzer_basic', embed)
         except Exception as e:
             if DEBUG:
                 print(f"[Recognition] ❌ Basic embedding error: {e}")
@@ -53,6 +56,16 @@ def generate_voice_embedding(audio):
     else:
         return None
 
+def generate_voice_embeddings_batch(audio_samples):
+    """📦 Embed many clips at once (one forward pass per model) - used by training"""
+    if ENHANCED_AVAILABLE:
+        results = dual_voice_model_manager.generate_dual_embeddings_batch(audio_samples, as_numpy=True)
+        return [
+            np.array(result['resemblyzer']) if result and 'resemblyzer' in result else None
+            for result in results
+        ]
+    return [generate_voice_embedding(audio) for audio in audio_samples]
+
 def identify_speaker_with_confidence(audio):
     """Enhanced speaker identification that stores audio for later use"""
     try:
@@ -93,8 +106,9 @@ def check_anonymous_clusters(audio):
                 print("[Recognition] ✅ Created new anonymous cluster")
             return "UNKNOWN", 0.0
 
-        # Generate embedding for comparison
-        embedding = dual_voice_model_manager.generate_dual_embedding(audio)
+        # Generate embedding for comparison (cascade stops early on a clear cluster match)
+        anonymous_cluster_index.sync(anonymous_clusters)
+        embedding = dual_voice_model_manager.generate_cascade_embedding(audio, anonymous_cluster_index)
         if embedding is None:
             return "UNKNOWN", 0.0
 
@@ -109,7 +123,12 @@ def check_anonymous_clusters(audio):
             print(f"[Recognition] 🔗 Anonymous cluster match: {cluster_id} ({confidence:.3f})")
             return cluster_id, confidence
 
-        # ✅ If no match, create new cluster too
+        # ✅ If no match, create new cluster too - with every model's vector, not the
+        # cascade's early-stopped subset (cached model outputs mean only missing models run)
+        full_embedding = dual_voice_model_manager.generate_dual_embedding(audio)
+        if full_embedding is not None:
+            embedding = full_embedding
+        embedding.pop('cascade', None)
         create_anonymous_cluster(embedding)
         save_known_users()
         print("[Recognition] ✅ Created new anonymous cluster")
@@ -154,55 +173,17 @@ def check_known_users(audio):
         if embedding is None:
             return "UNKNOWN", 0.0
         
-        best_match = None
-        best_score = 0.0
+        # 🚀 Score every user in one batched pass (resemblyzer cosine only)
+        known_users_index.sync(known_users)
+        matches = known_users_index.search(
+            {'resemblyzer': embedding},
+            {'resemblyzer': 1.0},
+            adaptive_weights=False,
+            models={'resemblyzer'},
+            top_k=1
+        )
         
-        for name, user_data in known_users.items():
-            try:
-                # Handle different data formats
-                if isinstance(user_data, dict):
-                    # Multiple embeddings format
-                    if 'embeddings' in user_data:
-                        embeddings = user_data['embeddings']
-                        scores = []
-                        
-                        for stored_embedding in embeddings:
-                            if isinstance(stored_embedding, dict) and 'resemblyzer' in stored_embedding:
-                                stored_emb = stored_embedding['resemblyzer']
-                            else:
-                                stored_emb = stored_embedding
-                            
-                            if isinstance(stored_emb, list) and len(stored_emb) == 256:
-                                similarity = cosine_similarity([embedding], [stored_emb])[0][0]
-                                scores.append(similarity)
-                        
-                        if scores:
-                            # Use best score from multiple embeddings
-                            user_score = max(scores)
-                            if user_score > best_score:
-                                best_match = name
-                                best_score = user_score
-                    
-                    # Single embedding format
-                    elif 'embedding' in user_data:
-                        stored_embedding = user_data['embedding']
-                        if isinstance(stored_embedding, list) and len(stored_embedding) == 256:
-                            similarity = cosine_similarity([embedding], [stored_embedding])[0][0]
-                            if similarity > best_score:
-                                best_match = name
-                                best_score = similarity
-                
-                # Legacy format
-                elif isinstance(user_data, list) and len(user_data) == 256:
-                    similarity = cosine_similarity([embedding], [user_data])[0][0]
-                    if similarity > best_score:
-                        best_match = name
-                        best_score = similarity
-                        
-            except Exception as e:
-                if DEBUG:
-                    print(f"[Recognition] ❌ Error processing user {name}: {e}")
-                continue
+        best_match, best_score = matches[0] if matches else (None, 0.0)
         
         return best_match or "UNKNOWN", best_score
         
@@ -736,80 +717,59 @@ def get_voice_recognition_stats():
         print(f"[Recognition] ❌ Stats error: {e}")
         return {}
 
+def _absorb_cluster(target_data, source_data):
+    """Fold one anonymous cluster's samples into another, keeping the 10 best embeddings"""
+    target_data.setdefault('embeddings', []).extend(source_data.get('embeddings', []))
+    target_data['sample_count'] = target_data.get('sample_count', 0) + source_data.get('sample_count', 0)
+    target_data.setdefault('quality_scores', []).extend(source_data.get('quality_scores', []))
+    target_data.setdefault('audio_contexts', []).extend(source_data.get('audio_contexts', []))
+    target_data['last_updated'] = datetime.utcnow().isoformat()
+    
+    # Keep only best embeddings (max 10)
+    if len(target_data['embeddings']) > 10:
+        # Sort by quality and keep best ones
+        quality_scores = target_data.get('quality_scores', [])
+        if len(quality_scores) == len(target_data['embeddings']):
+            combined = list(zip(target_data['embeddings'], quality_scores))
+            combined.sort(key=lambda x: x[1], reverse=True)
+            target_data['embeddings'] = [x[0] for x in combined[:10]]
+            target_data['quality_scores'] = [x[1] for x in combined[:10]]
+        else:
+            target_data['embeddings'] = target_data['embeddings'][-10:]
+
 def merge_similar_clusters(similarity_threshold=0.85):
-    """🔗 Merge similar anonymous clusters"""
+    """🔗 Merge similar anonymous clusters (batch all-pairs scoring + union-find, see voice/cluster_merge.py)"""
     try:
         from voice.database import anonymous_clusters, save_known_users
+        from voice.cluster_merge import find_merge_groups
+        from voice.centroid_index import anonymous_cluster_centroids
         
         if not ENHANCED_AVAILABLE:
             print("[Recognition] ⚠️ Enhanced modules required for cluster merging")
             return 0
         
-        cluster_ids = list(anonymous_clusters.keys())
-        merged_count = 0
-        clusters_to_remove = set()
-        
-        for i, cluster_id1 in enumerate(cluster_ids):
-            if cluster_id1 in clusters_to_remove:
-                continue
-                
-            cluster1_data = anonymous_clusters[cluster_id1]
-            cluster1_embeddings = cluster1_data.get('embeddings', [])
-            
-            if not cluster1_embeddings:
-                continue
-            
-            for j, cluster_id2 in enumerate(cluster_ids[i+1:], i+1):
-                if cluster_id2 in clusters_to_remove:
-                    continue
-                    
-                cluster2_data = anonymous_clusters[cluster_id2]
-                cluster2_embeddings = cluster2_data.get('embeddings', [])
-                
-                if not cluster2_embeddings:
-                    continue
-                
-                # Compare embeddings between clusters
-                max_similarity = 0.0
-                
-                for emb1 in cluster1_embeddings:
-                    for emb2 in cluster2_embeddings:
-                        try:
-                            similarity = dual_voice_model_manager.compare_dual_embeddings(emb1, emb2)
-                            max_similarity = max(max_similarity, similarity)
-                        except:
-                            continue
-                
-                # Merge if similarity is high enough
-                if max_similarity > similarity_threshold:
-                    print(f"[Recognition] 🔗 Merging {cluster_id2} into {cluster_id1} (similarity: {max_similarity:.3f})")
-                    
-                    # Merge cluster2 into cluster1
-                    cluster1_data['embeddings'].extend(cluster2_embeddings)
-                    cluster1_data['sample_count'] += cluster2_data.get('sample_count', 0)
-                    cluster1_data['quality_scores'].extend(cluster2_data.get('quality_scores', []))
-                    cluster1_data['audio_contexts'].extend(cluster2_data.get('audio_contexts', []))
-                    cluster1_data['last_updated'] = datetime.utcnow().isoformat()
-                    
-                    # Keep only best embeddings (max 10)
-                    if len(cluster1_data['embeddings']) > 10:
-                        # Sort by quality and keep best ones
-                        quality_scores = cluster1_data.get('quality_scores', [])
-                        if len(quality_scores) == len(cluster1_data['embeddings']):
-                            combined = list(zip(cluster1_data['embeddings'], quality_scores))
-                            combined.sort(key=lambda x: x[1], reverse=True)
-                            cluster1_data['embeddings'] = [x[0] for x in combined[:10]]
-                            cluster1_data['quality_scores'] = [x[1] for x in combined[:10]]
-                        else:
-                            cluster1_data['embeddings'] = cluster1_data['embeddings'][-10:]
-                    
-                    # Mark cluster2 for removal
-                    clusters_to_remove.add(cluster_id2)
-                    merged_count += 1
+        start_time = time.time()
+        groups = find_merge_groups(
+            anonymous_clusters,
+            dual_voice_model_manager.model_weights,
+            similarity_threshold,
+            adaptive_weights=dual_voice_model_manager.config["similarity"]["adaptive_weights"]
+        )
+        if DEBUG:
+            print(f"[Recognition] 🔍 Scored {len(anonymous_clusters)} clusters for merging in {(time.time() - start_time) * 1000:.0f}ms")
         
-        # Remove merged clusters
-        for cluster_id in clusters_to_remove:
-            del anonymous_clusters[cluster_id]
+        merged_count = 0
+        for target_id, sources in groups:
+            target_data = anonymous_clusters[target_id]
+            anonymous_cluster_centroids.sync_cluster(target_id, target_data)
+            for source_id, similarity in sources:
+                print(f"[Recognition] 🔗 Merging {source_id} into {target_id} (similarity: {similarity:.3f})")
+                source_data = anonymous_clusters.pop(source_id)
+                anonymous_cluster_centroids.sync_cluster(source_id, source_data)
+                _absorb_cluster(target_data, source_data)
+                anonymous_cluster_index.remove_cluster(source_id)
+                anonymous_cluster_centroids.merge_clusters(target_id, source_id, target_data)
+                merged_count += 1
         
         if merged_count > 0:
             save_known_users()
@@ -8,6 +8,9 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Any
 from pathlib import Path
 from collections import defaultdict
+from utils.persistence import persistence_service, atomic_write_json
+from voice.ann_index import ProfileCandidateIndex
+from voice.compact_embedding import compact_embedding, embedding_json_default
 
 # Import your existing voice models
 try:
@@ -45,6 +48,9 @@ class SmartVoiceCluster:
         
     def add_embedding(self, embedding_data: Dict, voice_state: str = "normal"):
         """Add embedding (your format) to this cluster"""
+        if isinstance(embedding_data, dict):
+            # 🗜️ Keep a compact copy - the caller's dict is left as it was
+            embedding_data = compact_embedding(dict(embedding_data))
         enhanced_embedding = {
             'embedding_data': embedding_data,
             'voice_state': voice_state,
@@ -111,6 +117,9 @@ class SmartVoiceCluster:
         """Create from dictionary"""
         cluster = cls(data['username'], data['cluster_id'])
         cluster.embeddings = data.get('embeddings', [])
+        for enhanced_embedding in cluster.embeddings:
+            if isinstance(enhanced_embedding, dict):
+                compact_embedding(enhanced_embedding.get('embedding_data'))
         cluster.voice_states = set(data.get('voice_states', ['normal']))
         cluster.recognition_count = data.get('recognition_count', 0)
         cluster.last_seen = data.get('last_seen', datetime.utcnow().isoformat())
@@ -126,6 +135,7 @@ class SmartVoiceRecognition:
         
         # Smart clusters (enhanced version of your data)
         self.smart_clusters: Dict[str, SmartVoiceCluster] = {}
+        self.candidate_index = ProfileCandidateIndex('smart_clusters')  # ANN pre-selection for large populations
         
         # Session management
         self.active_cluster_id: Optional[str] = None
@@ -148,6 +158,11 @@ class SmartVoiceRecognition:
             'avg_processing_time': 0.0
         }
         
+        # Saves are coalesced and written in the background
+        self.persistence_target = f"smart_voice_clusters:{self.data_dir}"
+        persistence_service.register(self.persistence_target, self._write_smart_clusters,
+                                     snapshot=self._snapshot_smart_clusters)
+        
         # Load existing data
         self._load_smart_clusters()
         self._sync_with_existing_database()
@@ -321,7 +336,14 @@ class SmartVoiceRecognition:
         best_similarity = 0.0
         best_cluster = None
         
-        for cluster in self.smart_clusters.values():
+        # Large populations: only compare clusters the ANN index puts near the query
+        candidates = self.candidate_index.candidates(
+            current_embedding, self.smart_clusters, dual_voice_model_manager.model_weights
+        )
+        
+        for cluster_id, cluster in self.smart_clusters.items():
+            if candidates is not None and cluster_id not in candidates:
+                continue
             similarity = self._compare_with_cluster(current_embedding, cluster)
             
             if similarity > best_similarity:
@@ -540,21 +562,33 @@ class SmartVoiceRecognition:
         print("="*60 + "\n")
     
     def _save_smart_clusters(self):
+        """Request a save of smart clusters (written by the persistence service)"""
+        return persistence_service.request_save(self.persistence_target)
+    
+    def _snapshot_smart_clusters(self):
+        """Copy of the clusters to save, taken on the thread that requested the save"""
+        clusters_data = {}
+        for cluster_id, cluster in list(self.smart_clusters.items()):
+            data = cluster.to_dict()
+            data['embeddings'] = list(data['embeddings'])
+            clusters_data[cluster_id] = data
+        return clusters_data
+    
+    def _write_smart_clusters(self, clusters_data=None):
         """Save smart clusters to disk"""
         try:
-            clusters_data = {
-                cluster_id: cluster.to_dict() 
-                for cluster_id, cluster in self.smart_clusters.items()
-            }
+            if clusters_data is None:
+                clusters_data = self._snapshot_smart_clusters()
             
             save_path = self.data_dir / "smart_voice_clusters.json"
-            with open(save_path, 'w') as f:
-                json.dump(clusters_data, f, indent=2)
+            atomic_write_json(save_path, clusters_data, indent=2, default=embedding_json_default)
             
             print(f"[SmartVoice] 💾 Saved {len(self.smart_clusters)} smart clusters")
+            return True
             
         except Exception as e:
             print(f"[SmartVoice] ❌ Save failed: {e}")
+            return False
     
     def _load_smart_clusters(self):
         """Load smart clusters from disk"""
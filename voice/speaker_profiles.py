@@ -10,6 +10,11 @@ import pickle
 import gzip
 
 from voice.database import known_users, anonymous_clusters, save_known_users
+from voice.embedding_index import known_users_index
+from voice.centroid_index import known_users_centroids
+from voice.ann_index import known_users_candidates
+from voice.compact_embedding import compact_embedding, compact_profile
+from voice.utterance_cache import utterance_cache
 from config import *
 
 logger = logging.getLogger(__name__)
@@ -37,6 +42,11 @@ class AdvancedSpeakerProfiles:
         print("[AdvancedSpeakerProfiles] 🎯 Advanced AI speaker profiling initialized")
     
     def assess_audio_quality_advanced(self, audio: np.ndarray) -> Dict[str, Any]:
+        """🔊 Advanced audio quality assessment (once per utterance, via the utterance cache)"""
+        return utterance_cache.get_or_compute(audio, 'quality_advanced',
+                                              lambda: self._compute_audio_quality_advanced(audio))
+    
+    def _compute_audio_quality_advanced(self, audio: np.ndarray) -> Dict[str, Any]:
         """🔊 Advanced audio quality assessment with clustering optimization"""
         try:
             if audio is None or len(audio) == 0:
@@ -351,6 +361,8 @@ class AdvancedSpeakerProfiles:
             logger.info(f"Creating advanced profile for {username} with {len(audio_samples)} samples")
             print(f"[AdvancedProfiles] 🎯 Starting profile creation for {username}")
             
+            # Pass 1: quality filtering (embedding happens in one batch afterwards)
+            accepted_samples = []  # (sample index, audio, quality)
             for i, audio in enumerate(audio_samples):
                 try:
                     # ✅ IMPROVED: Validate audio sample
@@ -379,48 +391,54 @@ class AdvancedSpeakerProfiles:
                         logger.warning(f"Auto-discarded sample {i+1}: {quality['issues']}")
                         continue
                     
-                    # Generate dual embeddings
-                    try:
-                        embedding_result = dual_voice_model_manager.generate_dual_embedding(audio)
-                        if embedding_result is not None:
-                            # ✅ IMPROVED: Validate embedding result
-                            if not self._validate_embedding(embedding_result):
-                                logger.warning(f"Invalid embedding for sample {i+1}")
-                                continue
-                            
-                            embeddings.append(embedding_result)
-                            quality_scores.append(quality['overall_score'])
-                            
-                            # ✅ CLUSTERING METADATA
-                            clustering_metrics.append({
-                                'clustering_suitability': quality['clustering_suitability'],
-                                'snr_db': quality['snr_db'],
-                                'spectral_quality': quality['spectral_quality'],
-                                'voice_ratio': quality.get('voice_ratio', 0.5)
-                            })
-                            
-                            embedding_metadata.append({
-                                'sample_index': i,
-                                'snr_db': quality['snr_db'],
-                                'spectral_quality': quality['spectral_quality'],
-                                'clustering_suitability': quality['clustering_suitability'],
-                                'issues': quality['issues'],
-                                'timestamp': datetime.utcnow().isoformat()
-                            })
-                            
-                            logger.info(f"Accepted sample {i+1}: Quality {quality['overall_score']:.2f}, "
-                                       f"Clustering: {quality['clustering_suitability']}")
-                        else:
-                            logger.warning(f"Failed to generate embedding for sample {i+1}")
-                            
-                    except Exception as embedding_error:
-                        logger.error(f"Embedding generation error for sample {i+1}: {embedding_error}")
-                        continue
+                    accepted_samples.append((i, audio, quality))
                         
                 except Exception as sample_error:
                     logger.error(f"Error processing sample {i+1}: {sample_error}")
                     continue
             
+            # Pass 2: generate dual embeddings for all accepted samples in one batch
+            try:
+                embedding_results = dual_voice_model_manager.generate_dual_embeddings_batch(
+                    [audio for _, audio, _ in accepted_samples]
+                )
+            except Exception as embedding_error:
+                logger.error(f"Batch embedding generation error: {embedding_error}")
+                embedding_results = [None] * len(accepted_samples)
+            
+            for (i, audio, quality), embedding_result in zip(accepted_samples, embedding_results):
+                if embedding_result is None:
+                    logger.warning(f"Failed to generate embedding for sample {i+1}")
+                    continue
+                
+                # ✅ IMPROVED: Validate embedding result
+                if not self._validate_embedding(embedding_result):
+                    logger.warning(f"Invalid embedding for sample {i+1}")
+                    continue
+                
+                embeddings.append(embedding_result)
+                quality_scores.append(quality['overall_score'])
+                
+                # ✅ CLUSTERING METADATA
+                clustering_metrics.append({
+                    'clustering_suitability': quality['clustering_suitability'],
+                    'snr_db': quality['snr_db'],
+                    'spectral_quality': quality['spectral_quality'],
+                    'voice_ratio': quality.get('voice_ratio', 0.5)
+                })
+                
+                embedding_metadata.append({
+                    'sample_index': i,
+                    'snr_db': quality['snr_db'],
+                    'spectral_quality': quality['spectral_quality'],
+                    'clustering_suitability': quality['clustering_suitability'],
+                    'issues': quality['issues'],
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+                
+                logger.info(f"Accepted sample {i+1}: Quality {quality['overall_score']:.2f}, "
+                           f"Clustering: {quality['clustering_suitability']}")
+            
             # ✅ IMPROVED: Better minimum embedding check
             min_embeddings = 1  # Reduced from 3 for more flexibility
             if len(embeddings) >= min_embeddings:
@@ -470,7 +488,8 @@ class AdvancedSpeakerProfiles:
                     try:
                         print(f"[AdvancedProfiles] 💾 Saving profile for {username}...")
                         
-                        # Add to global known_users dictionary
+                        # Add to global known_users dictionary (model vectors held compactly)
+                        compact_profile(profile_data)
                         known_users[username] = profile_data
                         
                         # Attempt to save the entire database to file
@@ -739,8 +758,9 @@ class AdvancedSpeakerProfiles:
             if not known_users:
                 return "UNKNOWN", 0.0, {'reason': 'no_profiles'}
             
-            # Generate test embedding
-            test_embedding = dual_voice_model_manager.generate_dual_embedding(audio)
+            # Generate test embedding (cascade: heavier models only when the index margin is ambiguous)
+            known_users_index.sync(known_users)
+            test_embedding = dual_voice_model_manager.generate_cascade_embedding(audio, known_users_index, as_numpy=True)
             if test_embedding is None:
                 return "UNKNOWN", 0.0, {'reason': 'embedding_failed'}
             
@@ -763,12 +783,20 @@ class AdvancedSpeakerProfiles:
                 'input_snr': input_quality['snr_db'],
                 'clustering_suitability': input_quality['clustering_suitability'],
                 'candidates': {},
-                'comparison_method': 'clustering_enhanced_multi_embedding'
+                'comparison_method': 'clustering_enhanced_multi_embedding',
+                'cascade': test_embedding.get('cascade')
             }
             
+            # Large populations: only score the profiles the ANN index puts near the query
+            candidates = known_users_candidates.candidates(test_embedding, known_users, dual_voice_model_manager.model_weights)
+            if candidates is not None:
+                debug_info['ann_candidates'] = len(candidates)
+            
             for username, profile in known_users.items():
                 if not isinstance(profile, dict) or 'embeddings' not in profile:
                     continue
+                if candidates is not None and username not in candidates:
+                    continue
                 
                 # ✅ CLUSTERING-ENHANCED COMPARISON
                 user_confidence = self._calculate_clustering_aware_confidence(
@@ -1144,15 +1172,17 @@ class AdvancedSpeakerProfiles:
             
             # Generate embedding
             from voice.voice_models import dual_voice_model_manager
-            embedding = dual_voice_model_manager.generate_dual_embedding(audio)
+            embedding = compact_embedding(dual_voice_model_manager.generate_dual_embedding(audio))
             
             if embedding is not None:
                 # Check if we have room for more embeddings
                 current_embeddings = len(profile.get('embeddings', []))
+                known_users_centroids.sync_cluster(username, profile)
                 
                 if current_embeddings < self.max_embeddings_per_user:
                     # Add new embedding
                     profile['embeddings'].append(embedding)
+                    known_users_centroids.apply_changes(username, profile, added=[embedding])
                     profile['quality_scores'].append(quality['overall_score'])
                     profile.setdefault('embedding_metadata', []).append({
                         'type': 'passive',
@@ -1173,7 +1203,9 @@ class AdvancedSpeakerProfiles:
                     if quality_scores:
                         min_quality_idx = np.argmin(quality_scores)
                         if quality['overall_score'] > quality_scores[min_quality_idx]:
+                            replaced = profile['embeddings'][min_quality_idx]
                             profile['embeddings'][min_quality_idx] = embedding
+                            known_users_centroids.apply_changes(username, profile, added=[embedding], removed=[replaced])
                             profile['quality_scores'][min_quality_idx] = quality['overall_score']
                             if len(profile['embedding_metadata']) > min_quality_idx:
                                 profile['embedding_metadata'][min_quality_idx] = {
@@ -1217,7 +1249,7 @@ class AdvancedSpeakerProfiles:
             from voice.voice_models import dual_voice_model_manager
             
             # Generate embedding for comparison
-            test_embedding = dual_voice_model_manager.generate_dual_embedding(audio)
+            test_embedding = dual_voice_model_manager.generate_dual_embedding(audio, as_numpy=True)
             if test_embedding is None:
                 return False
             
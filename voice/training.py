@@ -5,7 +5,7 @@ import numpy as np
 from audio.input import aec_training_listen
 from audio.output import speak_streaming, play_chime, buddy_talking
 from ai.speech import transcribe_audio
-from voice.recognition import generate_voice_embedding
+from voice.recognition import generate_voice_embeddings_batch
 from config import *
 
 # ✅ ADVANCED: Comprehensive training phrases for robust clustering
@@ -411,11 +411,10 @@ def create_basic_clustering_profile(username, voice_samples, clustering_metrics)
         print(f"[AdvancedTraining] 🔄 Creating basic clustering profile with {len(voice_samples)} samples")
         
         # Generate embeddings
-        embeddings = []
-        for sample in voice_samples:
-            embedding = generate_voice_embedding(sample)
-            if embedding is not None:
-                embeddings.append(embedding)
+        embeddings = [
+            embedding for embedding in generate_voice_embeddings_batch(voice_samples)
+            if embedding is not None
+        ]
         
         if len(embeddings) >= 2:
             # Save voice profile with clustering context
@@ -0,0 +1,146 @@
+# voice/utterance_cache.py - Per-utterance feature cache shared by every recognition path
+"""
+One utterance is looked at by several consumers: handle_voice_identification
+embeds it, identify_speaker_with_confidence embeds it again through
+recognize_with_multiple_embeddings, main.py's get_voice_based_identity runs a
+second identification pass, smart_voice_recognition embeds it once more.
+
+Features computed from an utterance (model outputs, the assembled dual
+embedding, quality assessments) are stored here under a content hash of the
+audio (dtype + shape + samples), so a copy of the same buffer still hits.
+Entries are few (UTTERANCE_CACHE_SIZE, LRU) and short-lived
+(UTTERANCE_CACHE_TTL_SECONDS) - this is a per-utterance scratchpad, not a
+persistent store.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import (
+    DEBUG,
+    UTTERANCE_CACHE_ENABLED,
+    UTTERANCE_CACHE_SIZE,
+    UTTERANCE_CACHE_TTL_SECONDS,
+)
+
+
+def audio_key(audio):
+    """Content hash of an audio buffer, or None if it can't be keyed"""
+    if audio is None:
+        return None
+    try:
+        samples = np.ascontiguousarray(audio)
+        if samples.ndim == 0 or samples.size == 0 or samples.dtype == object:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{samples.dtype.str}{samples.shape}".encode())
+        digest.update(samples.reshape(-1).view(np.uint8))
+        return digest.hexdigest()
+    except Exception:
+        return None
+
+
+class UtteranceFeatureCache:
+    """🗂️ Short-lived LRU of per-utterance features (embeddings, model outputs, quality)"""
+
+    def __init__(self, enabled=UTTERANCE_CACHE_ENABLED, max_utterances=UTTERANCE_CACHE_SIZE,
+                 ttl=UTTERANCE_CACHE_TTL_SECONDS):
+        self.enabled = enabled
+        self.max_utterances = max(1, max_utterances)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()        # key -> {'created': t, 'features': {name: value}}
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expired': 0,
+            'by_feature': {},               # name -> {'hits': n, 'misses': n}
+        }
+
+    def key(self, audio):
+        """Cache key for audio (None when caching is off or the audio can't be keyed)"""
+        if not self.enabled:
+            return None
+        return audio_key(audio)
+
+    def get(self, key, feature, default=None):
+        """Cached value of feature for the utterance key, else default"""
+        if key is None:
+            return default
+        with self.lock:
+            entry = self._entry(key)
+            found = entry is not None and feature in entry['features']
+            self._count(feature, found)
+            return entry['features'][feature] if found else default
+
+    def put(self, key, feature, value):
+        if key is None:
+            return
+        with self.lock:
+            entry = self._entry(key)
+            if entry is None:
+                entry = {'created': time.monotonic(), 'features': {}}
+                self.entries[key] = entry
+                while len(self.entries) > self.max_utterances:
+                    self.entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+            entry['features'][feature] = value
+            self.stats['stores'] += 1
+
+    def get_or_compute(self, audio, feature, compute, key=None):
+        """Cached feature for audio, computing (and storing) it on a miss; returns a private copy"""
+        key = key or self.key(audio)
+        if key is None:
+            return compute()
+
+        missing = object()
+        value = self.get(key, feature, missing)
+        if value is missing:
+            value = compute()
+            if value is not None:
+                self.put(key, feature, value)
+        elif DEBUG:
+            print(f"[UtteranceCache] ♻️ Reused '{feature}' for utterance {key[:8]}")
+        return copy.deepcopy(value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(
+                self.stats,
+                by_feature={name: dict(counts) for name, counts in self.stats['by_feature'].items()},
+                utterances=len(self.entries),
+                hit_rate=self.stats['hits'] / lookups if lookups else 0.0,
+            )
+
+    def _entry(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry['created'] > self.ttl:
+            del self.entries[key]
+            self.stats['expired'] += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _count(self, feature, hit):
+        counts = self.stats['by_feature'].setdefault(feature, {'hits': 0, 'misses': 0})
+        if hit:
+            self.stats['hits'] += 1
+            counts['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            counts['misses'] += 1
+
+
+# Global instance
+utterance_cache = UtteranceFeatureCache()
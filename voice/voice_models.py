@@ -1,4 +1,5 @@
 # voice/voice_models.py - Professional Multi-Model Voice Recognition System
+import copy
 import numpy as np
 import tempfile
 import os
@@ -7,10 +8,13 @@ from typing import Optional, Dict, Tuple, List, Any
 import logging
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import torch
 import torchaudio
 from pathlib import Path
+from voice.utterance_cache import utterance_cache
 
 # Configure professional logging
 logging.basicConfig(level=logging.INFO)
@@ -30,7 +34,18 @@ class ProfessionalDualVoiceModelManager:
             'model_usage': {},
             'average_time': 0.0,
             'error_count': 0,
-            'success_rate': 1.0
+            'success_rate': 1.0,
+            'parallel_runs': 0,
+            'batch_runs': 0,
+            'batched_utterances': 0
+        }
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.cascade_stats = {
+            'runs': 0,
+            'stage_runs': {},          # model -> times the stage was needed
+            'stopped_by': {'margin': 0, 'budget': 0, 'complete': 0},
+            'average_latency_ms': 0.0
         }
         
         logger.info(f"[ProfessionalVoice] 🚀 Initializing on {self.device}")
@@ -103,7 +118,16 @@ class ProfessionalDualVoiceModelManager:
                 "enable_caching": True,
                 "cache_size": 1000,
                 "enable_benchmarking": True,
-                "log_performance": True
+                "log_performance": True,
+                "parallel_models": True,      # Run model wrappers concurrently (torch releases the GIL)
+                "max_model_workers": 4,       # Bound on the model thread pool
+                "batch_size": 8               # Max utterances per forward pass in batch mode
+            },
+            "cascade": {
+                "enabled": True,              # Identification runs models in priority order, stopping early
+                "accept_score": 0.75,         # Top-1 must reach this to stop before the heavier models
+                "min_margin": 0.10,           # ...and beat the runner-up by at least this much
+                "latency_budget_ms": 600      # Skip further stages that would overrun this per utterance
             }
         }
         
@@ -215,6 +239,11 @@ class ProfessionalDualVoiceModelManager:
                     
                     return audio_float
                 
+                def generate_embeddings_batch(self, audios: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+                    # embed_utterance slides fixed-size partials over each clip, so
+                    # variable-length utterances are embedded one at a time
+                    return [self.generate_embedding(audio) for audio in audios]
+                
                 def get_average_processing_time(self) -> float:
                     return np.mean(self.processing_times) if self.processing_times else 0.0
             
@@ -296,6 +325,53 @@ class ProfessionalDualVoiceModelManager:
                         logger.error(f"Enhanced SpeechBrain embedding error: {e}")
                         return None
                 
+                def generate_embeddings_batch(self, audios: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+                    """One padded forward pass for a batch of utterances"""
+                    results = [None] * len(audios)
+                    if self.model is None:
+                        return results
+                    
+                    start_time = time.time()
+                    try:
+                        valid = [i for i, audio in enumerate(audios) if len(audio) >= 4000]
+                        if not valid:
+                            return results
+                        
+                        processed = [self._preprocess_audio_enhanced(audios[i]) for i in valid]
+                        lengths = np.array([len(a) for a in processed], dtype=np.float32)
+                        max_len = int(lengths.max())
+                        
+                        padded = np.zeros((len(processed), max_len), dtype=np.float32)
+                        for row, audio in enumerate(processed):
+                            padded[row, :len(audio)] = audio
+                        
+                        audio_tensor = torch.from_numpy(padded)
+                        wav_lens = torch.from_numpy(lengths / max_len)
+                        if self.device == "cuda":
+                            audio_tensor = audio_tensor.cuda()
+                            wav_lens = wav_lens.cuda()
+                        
+                        with torch.no_grad():
+                            embeddings = self.model.encode_batch(audio_tensor, wav_lens)
+                            embeddings = embeddings.reshape(len(processed), -1).cpu().numpy()
+                        
+                        # L2 normalization
+                        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+                        for row, i in enumerate(valid):
+                            results[i] = embeddings[row]
+                        
+                        # Track performance (amortized per utterance)
+                        processing_time = (time.time() - start_time) / len(valid)
+                        self.processing_times.append(processing_time)
+                        if len(self.processing_times) > 100:
+                            self.processing_times = self.processing_times[-100:]
+                        
+                        return results
+                    
+                    except Exception as e:
+                        logger.error(f"Enhanced SpeechBrain batch embedding error: {e}")
+                        return results
+                
                 def _preprocess_audio_enhanced(self, audio: np.ndarray) -> np.ndarray:
                     """Enhanced audio preprocessing for SpeechBrain"""
                     # Convert to float32
@@ -409,6 +485,62 @@ class ProfessionalDualVoiceModelManager:
                         logger.error(f"Wav2Vec2 embedding error: {e}")
                         return None
                 
+                def generate_embeddings_batch(self, audios: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+                    """One padded forward pass, mean pooling over each clip's valid frames"""
+                    results = [None] * len(audios)
+                    if self.model is None or self.feature_extractor is None or not audios:
+                        return results
+                    
+                    start_time = time.time()
+                    try:
+                        batch = []
+                        for audio in audios:
+                            audio_float = audio.astype(np.float32)
+                            if np.max(np.abs(audio_float)) > 1.0:
+                                audio_float = audio_float / 32768.0
+                            batch.append(audio_float)
+                        
+                        inputs = self.feature_extractor(
+                            batch,
+                            sampling_rate=16000,
+                            padding=True,
+                            return_attention_mask=True,
+                            return_tensors="pt"
+                        )
+                        
+                        if self.device == "cuda":
+                            inputs = {k: v.cuda() for k, v in inputs.items()}
+                        
+                        with torch.no_grad():
+                            outputs = self.model(**inputs)
+                            hidden = outputs.last_hidden_state
+                            
+                            # Mask out frames that only cover padding
+                            input_lengths = inputs['attention_mask'].sum(dim=1)
+                            frame_lengths = self.model._get_feat_extract_output_lengths(input_lengths)
+                            frames = torch.arange(hidden.shape[1], device=hidden.device)
+                            frame_mask = (frames[None, :] < frame_lengths[:, None]).unsqueeze(-1).to(hidden.dtype)
+                            
+                            pooled = (hidden * frame_mask).sum(dim=1) / frame_mask.sum(dim=1).clamp(min=1.0)
+                            embeddings = pooled.cpu().numpy()
+                        
+                        # Normalize
+                        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+                        for i in range(len(audios)):
+                            results[i] = embeddings[i]
+                        
+                        # Track performance (amortized per utterance)
+                        processing_time = (time.time() - start_time) / len(audios)
+                        self.processing_times.append(processing_time)
+                        if len(self.processing_times) > 100:
+                            self.processing_times = self.processing_times[-100:]
+                        
+                        return results
+                    
+                    except Exception as e:
+                        logger.error(f"Wav2Vec2 batch embedding error: {e}")
+                        return results
+                
                 def get_average_processing_time(self) -> float:
                     return np.mean(self.processing_times) if self.processing_times else 0.0
             
@@ -456,67 +588,329 @@ class ProfessionalDualVoiceModelManager:
         
         logger.info(f"Model weights configured: {self.model_weights}")
     
-    def generate_dual_embedding(self, audio: np.ndarray) -> Optional[Dict]:
-        """Enhanced dual embedding generation with professional features"""
+    def _get_executor(self) -> Optional[ThreadPoolExecutor]:
+        """Lazily create the bounded model thread pool (None when running sequentially)"""
+        perf = self.config["performance"]
+        if not perf.get("parallel_models", True) or len(self.models) < 2:
+            return None
+        
+        with self._executor_lock:
+            if self._executor is None:
+                workers = max(1, min(perf.get("max_model_workers", 4), len(self.models)))
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="VoiceModel")
+                logger.info(f"[ProfessionalVoice] ⚡ Parallel model execution with {workers} workers")
+            return self._executor
+    
+    def _run_models(self, task, names: Optional[List[str]] = None) -> Dict[str, Tuple[Any, float]]:
+        """Run task(model) for every model (or just names), concurrently when enabled -> {name: (output, seconds)}"""
+        def timed(model_name, model):
+            model_start_time = time.time()
+            try:
+                output = task(model)
+            except Exception as e:
+                logger.error(f"Model {model_name} failed: {e}")
+                output = None
+            return output, time.time() - model_start_time
+        
+        models = [(name, model) for name, model in self.models.items() if names is None or name in names]
+        executor = self._get_executor() if len(models) > 1 else None
+        if executor is None:
+            return {name: timed(name, model) for name, model in models}
+        
+        futures = {name: executor.submit(timed, name, model) for name, model in models}
+        self.performance_stats['parallel_runs'] += 1
+        # Collected in model order, so models_used keeps the configured ordering
+        return {name: future.result() for name, future in futures.items()}
+    
+    def _build_embedding_result(self, audio: np.ndarray, outputs: Dict[str, Optional[np.ndarray]],
+                                times: Dict[str, float], as_numpy: bool) -> Optional[Dict]:
+        """Assemble the per-utterance result dict from model outputs"""
+        result = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'models_used': [],
+            'processing_times': {},
+            'model_confidences': {},
+            'audio_quality_score': self._assess_audio_quality(audio)
+        }
+        
+        for model_name, embedding in outputs.items():
+            if embedding is None:
+                continue
+            
+            if isinstance(embedding, np.ndarray):
+                embedding = embedding.astype(np.float32, copy=False)
+                result[model_name] = embedding if as_numpy else embedding.tolist()
+            else:
+                result[model_name] = embedding
+            result['models_used'].append(model_name)
+            result['processing_times'][model_name] = times.get(model_name, 0.0)
+            
+            # Calculate model confidence based on embedding quality
+            confidence = self._calculate_embedding_confidence(np.asarray(embedding), model_name)
+            result['model_confidences'][model_name] = float(confidence)
+        
+        # Set primary model (highest confidence or configured priority)
+        if not result['models_used']:
+            return None
+        if self.config["similarity"]["use_model_confidence"]:
+            primary = max(result['model_confidences'], key=result['model_confidences'].get)
+        else:
+            primary = result['models_used'][0]  # Use first available
+        result['primary'] = primary
+        result['dual_available'] = len(result['models_used']) > 1
+        return result
+    
+    def _utterance_key(self, audio: np.ndarray) -> Optional[str]:
+        """Utterance cache key for the raw audio (None when caching is off)"""
+        if not self.config["performance"].get("enable_caching", True):
+            return None
+        return utterance_cache.key(audio)
+    
+    def _store_model_outputs(self, key: Optional[str], known: Dict, runs: Dict[str, Tuple[Any, float]]):
+        """Remember this utterance's per-model outputs so later calls only run what's missing"""
+        if key is None or not runs:
+            return
+        merged = dict(known)
+        merged.update(runs)
+        utterance_cache.put(key, 'model_outputs', merged)
+    
+    @staticmethod
+    def _copy_embedding_result(result: Dict, as_numpy: bool) -> Dict:
+        """Private copy of a (numpy) embedding result in the caller's format"""
+        result = copy.deepcopy(result)
+        if not as_numpy:
+            for model_name in result.get('models_used', []):
+                if isinstance(result.get(model_name), np.ndarray):
+                    result[model_name] = result[model_name].tolist()
+        return result
+    
+    def generate_dual_embedding(self, audio: np.ndarray, as_numpy: bool = False) -> Optional[Dict]:
+        """Enhanced dual embedding generation with professional features
+        
+        Models run concurrently on the bounded pool. as_numpy=True keeps float32
+        arrays instead of lists (for comparison-only callers that never serialize).
+        Repeat calls for the same utterance are served from the utterance cache;
+        models a cascade already ran for it are not run again.
+        """
         start_time = time.time()
+        key = self._utterance_key(audio)
+        cached = utterance_cache.get(key, 'dual_embedding')
+        if cached is not None:
+            return self._copy_embedding_result(cached, as_numpy)
         
         try:
             # Enhanced audio preprocessing
             audio = self._preprocess_audio_professional(audio)
             
-            result = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'models_used': [],
-                'processing_times': {},
-                'model_confidences': {},
-                'audio_quality_score': self._assess_audio_quality(audio)
-            }
-            
             # Generate embeddings from all available models
-            for model_name, model in self.models.items():
-                try:
-                    model_start_time = time.time()
-                    embedding = model.generate_embedding(audio)
-                    model_time = time.time() - model_start_time
-                    
-                    if embedding is not None:
-                        result[model_name] = embedding.tolist() if isinstance(embedding, np.ndarray) else embedding
-                        result['models_used'].append(model_name)
-                        result['processing_times'][model_name] = model_time
-                        
-                        # Calculate model confidence based on embedding quality
-                        confidence = self._calculate_embedding_confidence(embedding, model_name)
-                        result['model_confidences'][model_name] = confidence
-                
-                except Exception as e:
-                    logger.error(f"Model {model_name} failed: {e}")
+            known = utterance_cache.get(key, 'model_outputs', {}) if key else {}
+            missing = [name for name in self.models if name not in known]
+            runs = self._run_models(lambda model: model.generate_embedding(audio), names=missing) if missing else {}
+            self._store_model_outputs(key, known, runs)
+            runs = {name: runs[name] if name in runs else known[name] for name in self.models}
+            outputs = {name: output for name, (output, _) in runs.items()}
+            times = {name: elapsed for name, (_, elapsed) in runs.items()}
             
-            # Set primary model (highest confidence or configured priority)
-            if result['models_used']:
-                if self.config["similarity"]["use_model_confidence"]:
-                    primary = max(result['model_confidences'], key=result['model_confidences'].get)
-                else:
-                    primary = result['models_used'][0]  # Use first available
-                result['primary'] = primary
-            else:
+            result = self._build_embedding_result(audio, outputs, times, as_numpy=True)
+            if result is None:
                 return None
             
             # Performance tracking
             total_time = time.time() - start_time
             result['total_processing_time'] = total_time
-            result['dual_available'] = len(result['models_used']) > 1
             
             # Update performance stats
             self._update_performance_stats(result)
+            utterance_cache.put(key, 'dual_embedding', result)
             
             logger.debug(f"Generated embeddings: {len(result['models_used'])} models, {total_time:.3f}s")
-            return result
+            return self._copy_embedding_result(result, as_numpy)
         
         except Exception as e:
             logger.error(f"Professional dual embedding generation error: {e}")
             self.performance_stats['error_count'] += 1
             return None
     
+    def generate_dual_embeddings_batch(self, audios: List[np.ndarray], as_numpy: bool = False) -> List[Optional[Dict]]:
+        """📦 Embed many utterances with one forward pass per model per chunk
+        
+        Returns one result per input (None where no model produced an embedding),
+        in the same format as generate_dual_embedding. Used by training/re-enrollment.
+        """
+        results = [None] * len(audios)
+        batch_size = max(1, self.config["performance"].get("batch_size", 8))
+        
+        for chunk_start in range(0, len(audios), batch_size):
+            chunk_indices = list(range(chunk_start, min(chunk_start + batch_size, len(audios))))
+            start_time = time.time()
+            
+            try:
+                valid = [i for i in chunk_indices if audios[i] is not None and len(audios[i]) > 0]
+                if not valid:
+                    continue
+                
+                processed = [self._preprocess_audio_professional(audios[i]) for i in valid]
+                
+                def embed_batch(model):
+                    if hasattr(model, 'generate_embeddings_batch'):
+                        return model.generate_embeddings_batch(processed)
+                    return [model.generate_embedding(audio) for audio in processed]
+                
+                runs = self._run_models(embed_batch)
+                self.performance_stats['batch_runs'] += 1
+                self.performance_stats['batched_utterances'] += len(valid)
+                
+                # Amortize each model's batch time across the utterances
+                times = {name: elapsed / len(valid) for name, (_, elapsed) in runs.items()}
+                per_utterance = (time.time() - start_time) / len(valid)
+                
+                for row, i in enumerate(valid):
+                    outputs = {}
+                    for name, (batch_output, _) in runs.items():
+                        outputs[name] = batch_output[row] if batch_output is not None else None
+                    
+                    result = self._build_embedding_result(processed[row], outputs, times, as_numpy)
+                    if result is None:
+                        continue
+                    result['total_processing_time'] = per_utterance
+                    result['batch_size'] = len(valid)
+                    self._update_performance_stats(result)
+                    results[i] = result
+                
+            except Exception as e:
+                logger.error(f"Batch embedding generation error: {e}")
+                self.performance_stats['error_count'] += 1
+        
+        logger.debug(f"Batch embeddings: {sum(r is not None for r in results)}/{len(audios)} utterances")
+        return results
+    
+    def get_cascade_order(self) -> List[str]:
+        """Available models, cheapest first (config 'priority', lower runs earlier)"""
+        return sorted(
+            self.models.keys(),
+            key=lambda name: self.config["models"].get(name, {}).get("priority", 99)
+        )
+    
+    def generate_cascade_embedding(self, audio: np.ndarray, index, as_numpy: bool = False) -> Optional[Dict]:
+        """⚡ Identification embedding that only runs heavier models when needed
+        
+        Models run one stage at a time in priority order. After each stage the
+        partial embedding is scored against the (already synced) speaker index;
+        the cascade stops when the top-1 is above accept_score with a clear
+        margin over the runner-up, or when the next stage would overrun the
+        latency budget. The result has the usual format plus a 'cascade' entry.
+        """
+        cascade_config = self.config["cascade"]
+        if not cascade_config.get("enabled", True):
+            return self.generate_dual_embedding(audio, as_numpy=as_numpy)
+        
+        start_time = time.time()
+        budget = cascade_config["latency_budget_ms"] / 1000.0
+        
+        # Every model already ran for this utterance - nothing left to cascade
+        key = self._utterance_key(audio)
+        cached = utterance_cache.get(key, 'dual_embedding')
+        if cached is not None:
+            result = self._copy_embedding_result(cached, as_numpy)
+            result['cascade'] = {'stages': [], 'stopped_by': 'cached', 'top_match': None,
+                                 'top_score': 0.0, 'margin': 0.0}
+            return result
+        
+        try:
+            audio = self._preprocess_audio_professional(audio)
+            known = utterance_cache.get(key, 'model_outputs', {}) if key else {}
+            runs = {}
+            outputs = {}
+            times = {}
+            stages = []
+            stopped_by = 'complete'
+            top = (None, 0.0)
+            margin = 0.0
+            
+            order = self.get_cascade_order()
+            for position, model_name in enumerate(order):
+                model = self.models[model_name]
+                
+                if model_name in known:
+                    outputs[model_name], times[model_name] = known[model_name]
+                # Budget check uses the model's recent average time
+                elif outputs:
+                    elapsed = time.time() - start_time
+                    expected = getattr(model, 'get_average_processing_time', lambda: 0.0)()
+                    if elapsed + expected > budget:
+                        stopped_by = 'budget'
+                        break
+                
+                if model_name not in known:
+                    model_start_time = time.time()
+                    try:
+                        outputs[model_name] = model.generate_embedding(audio)
+                    except Exception as e:
+                        logger.error(f"Model {model_name} failed: {e}")
+                        outputs[model_name] = None
+                    times[model_name] = time.time() - model_start_time
+                    runs[model_name] = (outputs[model_name], times[model_name])
+                    self.cascade_stats['stage_runs'][model_name] = self.cascade_stats['stage_runs'].get(model_name, 0) + 1
+                stages.append(model_name)
+                
+                if outputs[model_name] is None or position == len(order) - 1:
+                    continue
+                
+                # Score the partial embedding against the index
+                partial = {name: emb for name, emb in outputs.items() if emb is not None}
+                scores = index.score_clusters(
+                    partial,
+                    self.model_weights,
+                    adaptive_weights=self.config["similarity"]["adaptive_weights"],
+                    models=set(partial)
+                )
+                if not scores:
+                    continue
+                
+                ranked = sorted(scores.values(), reverse=True)
+                runner_up = ranked[1] if len(ranked) > 1 else 0.0
+                margin = ranked[0] - runner_up
+                top = (max(scores, key=scores.get), ranked[0])
+                
+                if ranked[0] >= cascade_config["accept_score"] and margin >= cascade_config["min_margin"]:
+                    stopped_by = 'margin'
+                    break
+            
+            self._store_model_outputs(key, known, runs)
+            result = self._build_embedding_result(audio, outputs, times, as_numpy=True)
+            if result is None:
+                return None
+            
+            total_time = time.time() - start_time
+            result['total_processing_time'] = total_time
+            if stopped_by == 'complete' and len(outputs) == len(self.models):
+                utterance_cache.put(key, 'dual_embedding', dict(result))
+            result['cascade'] = {
+                'stages': stages,
+                'stopped_by': stopped_by,
+                'top_match': top[0],
+                'top_score': float(top[1]),
+                'margin': float(margin)
+            }
+            
+            self._update_performance_stats(result)
+            self._update_cascade_stats(stopped_by, total_time)
+            
+            logger.debug(f"Cascade: {stages} stopped by {stopped_by} in {total_time:.3f}s")
+            return self._copy_embedding_result(result, as_numpy)
+        
+        except Exception as e:
+            logger.error(f"Cascade embedding generation error: {e}")
+            self.performance_stats['error_count'] += 1
+            return None
+    
+    def _update_cascade_stats(self, stopped_by: str, total_time: float):
+        """Track how often each cascade exit happened and the average latency"""
+        stats = self.cascade_stats
+        stats['runs'] += 1
+        stats['stopped_by'][stopped_by] += 1
+        stats['average_latency_ms'] += (total_time * 1000.0 - stats['average_latency_ms']) / stats['runs']
+    
     def _preprocess_audio_professional(self, audio: np.ndarray) -> np.ndarray:
         """Professional-grade audio preprocessing"""
         try:
@@ -766,6 +1160,8 @@ class ProfessionalDualVoiceModelManager:
             'device': self.device,
             'dual_available': len(self.models) > 1,
             'performance_stats': self.performance_stats,
+            'cascade_stats': self.cascade_stats,
+            'utterance_cache': utterance_cache.get_stats(),
             'config': self.config,
             'model_details': {},
             'version': 'professional_enhanced_v1.0'